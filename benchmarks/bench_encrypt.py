@@ -0,0 +1,140 @@
+"""
+Encryption overhead benchmark: compressed backup throughput with and without encryption.
+
+Generates synthetic dump data of the given size and entropy in memory, then
+for every codec, cipher and worker count times the backup direction
+(compress, then encrypt) and the restore direction (decrypt, then
+decompress) in memory, so storage and disk speed do not blur the result.
+Each result records MB/s of dump data, CPU seconds (all threads) and the
+throughput lost to encryption against the same codec without it.
+
+    python benchmarks/bench_encrypt.py --size-mb 512 --codec gzip zstd:3 --workers 1 4 --output encrypt.json
+
+Compression and encryption run on separate thread pools, each sized by
+`--workers` (DBBACKUP_COMPRESS_WORKERS and DBBACKUP_ENCRYPT_WORKERS).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi_dbbackup.__version__ import __version__
+from fastapi_dbbackup.compress import get_codec, open_decompressed, parse_codec
+from fastapi_dbbackup.encrypt import CIPHERS, Encryptor, Keyring, generate_key, open_decrypted
+from fastapi_dbbackup.streams import copy_stream
+
+MB = 1024 * 1024
+FILLER = b"INSERT INTO `events` VALUES (1024,'2026-01-01 00:00:00','user.login','{\"ok\":true}');\n"
+
+def synthetic_data(size: int, entropy: float) -> bytes:
+    """`size` bytes, each MB a fraction `entropy` random and the rest SQL text."""
+    filler = FILLER * (MB // len(FILLER) + 1)
+    blocks = []
+    for start in range(0, size, MB):
+        n = min(MB, size - start)
+        k = int(n * entropy)
+        blocks.append(os.urandom(k) + filler[:n - k])
+    return b"".join(blocks)
+
+class NullWriter(io.RawIOBase):
+    """Write sink that discards the data, so only the restore direction's CPU is measured."""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return memoryview(data).nbytes
+
+class Output(io.BytesIO):
+    """In-memory backup that survives the writers closing it (some codecs close their file)."""
+
+    def close(self):
+        pass
+
+def measure(func, runs: int) -> dict:
+    """The fastest of `runs` calls."""
+    best = None
+    for _ in range(runs):
+        start, cpu_start = time.perf_counter(), time.process_time()
+        func()
+        seconds, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        if best is None or seconds < best["seconds"]:
+            best = {"seconds": round(seconds, 3), "cpu_seconds": round(cpu, 3)}
+    return best
+
+def backup(data: bytes, codec, level: Optional[int], workers: int, encryptor: Optional[Encryptor]) -> bytes:
+    out = Output()
+    sealed = encryptor.open_writer(out) if encryptor else out
+    writer = codec.open_writer(sealed, level=level, workers=workers) if codec else sealed
+    view = memoryview(data)
+    for start in range(0, len(data), MB):
+        writer.write(view[start:start + MB])
+    writer.close()
+    if encryptor:
+        sealed.close()
+    return out.getvalue()
+
+def restore(stored: bytes, keyring: Keyring, workers: int):
+    with open_decompressed(open_decrypted(io.BytesIO(stored), keyring, workers=workers)) as reader:
+        copy_stream(reader, NullWriter())
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--entropy", type=float, default=0.3, help="Fraction of random, incompressible bytes")
+    parser.add_argument("--codec", nargs="+", default=["gzip"], help="Codecs as in DBBACKUP_COMPRESS; 'none' for no compression")
+    parser.add_argument("--cipher", nargs="+", choices=list(CIPHERS), default=list(CIPHERS))
+    parser.add_argument("--workers", nargs="+", type=int, default=[os.cpu_count() or 1], help="Compression and encryption threads")
+    parser.add_argument("--chunk-kb", type=int, default=1024, help="Encrypted chunk size (DBBACKUP_ENCRYPT_CHUNK_KB)")
+    parser.add_argument("--runs", type=int, default=3, help="Repeat each measurement and keep the fastest")
+    parser.add_argument("--output", default=None, help="Write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.size_mb} MB of data...", file=sys.stderr)
+    data = synthetic_data(args.size_mb * MB, args.entropy)
+    keyring = Keyring.from_text(generate_key())
+    results = []
+    for spec in args.codec:
+        codec_name, level = parse_codec(spec) or (None, None)
+        codec = get_codec(codec_name) if codec_name else None
+        for workers in args.workers:
+            baseline = None
+            for cipher in [None] + args.cipher:
+                encryptor = Encryptor(keyring, cipher, workers=workers, chunk_size=args.chunk_kb * 1024) if cipher else None
+                stored = []
+                result = {"codec": spec, "cipher": cipher or "none", "workers": workers}
+                result["backup"] = measure(lambda: stored.append(backup(data, codec, level, workers, encryptor)), args.runs)
+                result["restore"] = measure(lambda: restore(stored[-1], keyring, workers), args.runs)
+                result["stored_bytes"] = len(stored[-1])
+                for direction in ("backup", "restore"):
+                    stats = result[direction]
+                    stats["mb_per_s"] = round(len(data) / MB / stats["seconds"], 1)
+                    if baseline:
+                        # Throughput lost to encryption, against the same codec and workers without it
+                        stats["overhead_pct"] = round((1 - stats["mb_per_s"] / baseline[direction]["mb_per_s"]) * 100, 1)
+                baseline = baseline or result
+                results.append(result)
+                print(f"{spec} {cipher or 'none'} x{workers}: backup {result['backup']['mb_per_s']} MB/s, restore {result['restore']['mb_per_s']} MB/s", file=sys.stderr)
+
+    report = {
+        "benchmark": "encrypt",
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
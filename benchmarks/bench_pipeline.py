@@ -0,0 +1,375 @@
+"""
+End-to-end backup and restore throughput benchmark.
+
+Generates a synthetic SQLite database, or a synthetic dump stream, of the
+given size and entropy, then times each stage of a backup and restore
+(dump, compress, upload, download, decompress, restore) plus the streamed
+backup pipeline, against local storage and an S3 stand-in. For every stage
+it records MB/s, CPU time and peak RSS, and writes the results as JSON so
+runs can be compared between releases.
+
+    python benchmarks/bench_pipeline.py --size-mb 1024 --entropy 0.3 --output results.json
+
+Entropy is the fraction of incompressible (random) bytes in the data; the
+rest is repetitive SQL text. The S3 stand-in keeps objects on disk, so
+multi-GB runs do not need the memory to hold them; `--s3 moto` uses moto's
+in-memory S3 instead.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+from unittest.mock import patch
+
+from fastapi_dbbackup import pipeline
+from fastapi_dbbackup.__version__ import __version__
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import compress, decompress, get_codec, parse_codec
+from fastapi_dbbackup.engines.sqlite import SQLiteBackup
+from fastapi_dbbackup.storage.local import LocalStorage
+from fastapi_dbbackup.storage.s3 import S3Storage
+from fastapi_dbbackup.streams import ProcessReader, grow_pipe
+
+MB = 1024 * 1024
+BLOCK_SIZE = MB
+FILLER = b"INSERT INTO `events` VALUES (1024,'2026-01-01 00:00:00','user.login','{\"ok\":true}');\n"
+STAGES = ["dump", "compress", "upload", "download", "decompress", "restore", "pipeline"]
+
+def synthetic_block(size: int, entropy: float) -> bytes:
+    """`size` bytes of which a fraction `entropy` is random and the rest SQL text."""
+    random_size = int(size * entropy)
+    filler = FILLER * (size // len(FILLER) + 1)
+    return os.urandom(random_size) + filler[:size - random_size]
+
+# Stand-in dump tool: writes argv[1] bytes at entropy argv[2] to stdout.
+# Kept free of imports from this package so the process starts quickly.
+EMIT_SCRIPT = f"""
+import os, sys
+size, entropy = int(sys.argv[1]), float(sys.argv[2])
+filler = {FILLER!r} * ({BLOCK_SIZE} // {len(FILLER)} + 1)
+while size > 0:
+    n = min(size, {BLOCK_SIZE})
+    k = int(n * entropy)
+    sys.stdout.buffer.write(os.urandom(k) + filler[:n - k])
+    size -= n
+"""
+
+def create_sqlite(path: Path, size: int, entropy: float):
+    row_size = 4096
+    rows = max(size // row_size, 1)
+    with sqlite3.connect(str(path)) as conn:
+        conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, payload BLOB)")
+        for start in range(0, rows, 256):
+            batch = min(256, rows - start)
+            conn.executemany("INSERT INTO events (payload) VALUES (?)", [(synthetic_block(row_size, entropy),) for _ in range(batch)])
+    conn.close()
+
+class SyntheticEngine(BackupEngine):
+    """Engine whose dump tool is a subprocess emitting synthetic data."""
+    name = "synthetic"
+
+    def __init__(self, output_dir: Path, size: int, entropy: float):
+        super().__init__("synthetic://", output_dir)
+        self.size = size
+        self.entropy = entropy
+
+    def stream_command(self):
+        cmd = [sys.executable, "-c", EMIT_SCRIPT, str(self.size), str(self.entropy)]
+        return cmd, os.environ.copy()
+
+    def backup_stream(self):
+        # Keep the process so its CPU time is collected within the stage that ran it
+        cmd, env = self.stream_command()
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env, bufsize=0)
+        grow_pipe(self.process.stdout.fileno())
+        return ProcessReader(self.process, cmd)
+
+    def backup(self) -> Path:
+        dest = self.output_dir / "synthetic.dump"
+        with open(dest, "wb") as f, self.backup_stream() as src:
+            shutil.copyfileobj(src, f, BLOCK_SIZE)
+        self.process.wait()
+        return dest
+
+    def restore(self, backup_path: Path):
+        # Feed the dump to a process that discards it, like a restore tool would read it
+        cmd = [sys.executable, "-c", "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open(__import__('os').devnull, 'wb'), 1 << 20)"]
+        with open(backup_path, "rb") as f:
+            self._pipe_to_command(cmd, f, os.environ.copy())
+
+class DiskS3:
+    """
+    Minimal S3 client that keeps objects in a directory, with an optional
+    per-request latency and per-connection bandwidth cap.
+    """
+
+    def __init__(self, root: Path, latency: float = 0, conn_bandwidth: float = 0):
+        self.root = root
+        self.latency = latency
+        self.conn_bandwidth = conn_bandwidth
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._uploads = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key.replace("/", "%2F")
+
+    def _transfer(self, size: int):
+        delay = self.latency + (size / self.conn_bandwidth if self.conn_bandwidth else 0)
+        if delay:
+            time.sleep(delay)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._transfer(len(Body))
+        self._path(Key).write_bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._transfer(0)
+        with self._lock:
+            self._uploads += 1
+            upload_id = str(self._uploads)
+        (self.root / f".upload-{upload_id}").mkdir()
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._transfer(len(Body))
+        (self.root / f".upload-{UploadId}" / str(PartNumber)).write_bytes(Body)
+        return {"ETag": f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._transfer(0)
+        parts_dir = self.root / f".upload-{UploadId}"
+        with open(self._path(Key), "wb") as out:
+            for part in MultipartUpload["Parts"]:
+                with open(parts_dir / str(part["PartNumber"]), "rb") as src:
+                    shutil.copyfileobj(src, out, BLOCK_SIZE)
+        shutil.rmtree(parts_dir)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        shutil.rmtree(self.root / f".upload-{UploadId}", ignore_errors=True)
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._transfer(0)
+        path = self._path(Key)
+        return {"ContentLength": path.stat().st_size, "ETag": f'"{path.stat().st_mtime_ns}"'}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        path = self._path(Key)
+        with open(path, "rb") as f:
+            if Range:
+                start, end = (int(n) for n in Range[len("bytes="):].split("-"))
+                f.seek(start)
+                data = f.read(end - start + 1)
+            else:
+                data = f.read()
+        self._transfer(len(data))
+        return {"Body": io.BytesIO(data)}
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        self._transfer(self._path(Key).stat().st_size)
+        shutil.copyfile(self._path(Key), Filename)
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        self._transfer(os.path.getsize(Filename))
+        shutil.copyfile(Filename, self._path(Key))
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._path(Key).unlink(missing_ok=True)
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        for obj in Delete["Objects"]:
+            self.delete_object(Bucket, obj["Key"])
+        return {}
+
+    def get_paginator(self, name):
+        root = self.root
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix=""):
+                keys = [p.name.replace("%2F", "/") for p in root.iterdir() if p.is_file()]
+                yield {"Contents": [{"Key": key} for key in keys if key.startswith(Prefix)]}
+
+        return Paginator()
+
+class StageMeter:
+    """Measures wall time, CPU time (including child processes) and peak RSS of a stage."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+
+    @staticmethod
+    def rss() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            # Not Linux: fall back to the process-lifetime peak
+            try:
+                import resource
+            except ImportError:
+                return 0
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.rss())
+
+    def __enter__(self):
+        self.peak_rss = self.rss()
+        self._times = os.times()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        end = os.times()
+        self.cpu_seconds = sum(end[:4]) - sum(self._times[:4])
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self.rss())
+
+def _result(stage: str, storage: str, codec: str, size: int, meter: StageMeter) -> dict:
+    return {
+        "stage": stage,
+        "storage": storage,
+        "codec": codec,
+        "bytes": size,
+        "seconds": round(meter.seconds, 3),
+        "mb_per_s": round(size / MB / meter.seconds, 1) if meter.seconds else None,
+        "cpu_seconds": round(meter.cpu_seconds, 3),
+        "cpu_percent": round(100 * meter.cpu_seconds / meter.seconds, 1) if meter.seconds else None,
+        "peak_rss_mb": round(meter.peak_rss / MB, 1),
+    }
+
+def make_storage(kind: str, work_dir: Path, args, stack: contextlib.ExitStack):
+    if kind == "local":
+        return LocalStorage(work_dir / "storage")
+    if args.s3 == "moto":
+        import boto3
+        from moto import mock_aws
+
+        stack.enter_context(mock_aws())
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bench")
+        return S3Storage(bucket="bench", region="us-east-1", part_size=args.part_mb * MB, max_concurrency=args.concurrency)
+    stub = DiskS3(work_dir / "s3", args.latency_ms / 1000, args.conn_mbps * MB)
+    with patch("boto3.client", return_value=stub):
+        return S3Storage(bucket="bench", part_size=args.part_mb * MB, max_concurrency=args.concurrency)
+
+def run(kind: str, codec_spec: str, args, stages: List[str]) -> List[dict]:
+    codec_name, level = parse_codec(codec_spec) or (None, None)
+    codec = get_codec(codec_name) if codec_name else None
+    label = codec_spec if codec else "none"
+    results = []
+    size = args.size_mb * MB
+
+    with contextlib.ExitStack() as stack:
+        work_dir = Path(stack.enter_context(tempfile.TemporaryDirectory(dir=args.work_dir)))
+        dumps = work_dir / "dumps"
+        dumps.mkdir()
+        storage = make_storage(kind, work_dir, args, stack)
+        if args.source == "sqlite":
+            source = work_dir / "source.sqlite3"
+            create_sqlite(source, size, args.entropy)
+            engine = SQLiteBackup(f"sqlite:///{source}", dumps)
+            restore_engine = SQLiteBackup(f"sqlite:///{work_dir / 'restored.sqlite3'}", dumps)
+        else:
+            engine = restore_engine = SyntheticEngine(dumps, size, args.entropy)
+
+        def measure(stage, fn, nbytes=None):
+            if stage not in stages:
+                return fn()
+            with StageMeter() as meter:
+                value = fn()
+            measured = nbytes(value) if callable(nbytes) else nbytes
+            results.append(_result(stage, kind, label, measured, meter))
+            print(json.dumps(results[-1]), file=sys.stderr)
+            return value
+
+        dump_file = measure("dump", engine.backup, lambda path: path.stat().st_size)
+        raw_size = dump_file.stat().st_size
+        if codec:
+            dump_file = measure("compress", lambda: compress(dump_file, workers=args.workers, codec=codec.name, level=level), raw_size)
+        stored_size = dump_file.stat().st_size
+
+        def upload():
+            with open(dump_file, "rb") as f:
+                return storage.upload_fileobj(f, dump_file.name)
+        remote = measure("upload", upload, stored_size)
+        dump_file.unlink(missing_ok=True)
+
+        downloaded = work_dir / "download" / remote
+        downloaded.parent.mkdir()
+        def download():
+            with storage.open_read(remote) as src, open(downloaded, "wb") as dst:
+                shutil.copyfileobj(src, dst, BLOCK_SIZE)
+        measure("download", download, stored_size)
+        restored = measure("decompress", lambda: decompress(downloaded), raw_size) if codec else downloaded
+        measure("restore", lambda: restore_engine.restore(restored), raw_size)
+
+        def streamed():
+            remote_path = pipeline.backup(engine, storage, codec=codec, level=level, workers=args.workers, stream=True, keep_local=kind == "local")
+            engine.process.wait()
+            return remote_path
+        if args.source == "stream":
+            # The os.pipe + compression thread path used for remote storage
+            measure("pipeline", streamed, raw_size)
+    return results
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--entropy", type=float, default=0.3, help="Fraction of incompressible bytes (0-1)")
+    parser.add_argument("--source", choices=["sqlite", "stream"], default="sqlite", help="Synthetic SQLite database, or a dump tool emitting a synthetic stream")
+    parser.add_argument("--codec", nargs="+", default=["gzip"], help="Codecs to compare, e.g. gzip zstd:3 lz4 false")
+    parser.add_argument("--storage", nargs="+", choices=["local", "s3"], default=["local", "s3"])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--workers", type=int, default=None, help="Compression threads (default: one per CPU core)")
+    parser.add_argument("--s3", choices=["stub", "moto"], default="stub", help="S3 stand-in")
+    parser.add_argument("--part-mb", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Stub S3 round trip per request")
+    parser.add_argument("--conn-mbps", type=float, default=0, help="Stub S3 bandwidth of one connection in MB/s (0 = unlimited)")
+    parser.add_argument("--work-dir", default=None, help="Directory for temporary files (default: system temp)")
+    parser.add_argument("--output", default=None, help="Write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    # Keep progress messages from the pipeline out of the JSON on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        for kind in args.storage:
+            for codec_spec in args.codec:
+                results.extend(run(kind, codec_spec, args, args.stages))
+
+    report = {
+        "benchmark": "pipeline",
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "work_dir")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Streamed S3 upload benchmark against a local stub client.
+
+The stub simulates a per-request round trip and a per-connection bandwidth
+cap, which is what limits a single-stream upload in practice. It compares
+the multipart uploader at several concurrency settings on a non-seekable
+stream of the given size.
+
+    python benchmarks/bench_s3_upload.py --size-mb 512 --latency-ms 40 --conn-mbps 50
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from unittest.mock import patch
+
+from fastapi_dbbackup.storage.s3 import S3Storage
+
+MB = 1024 * 1024
+
+class StubS3:
+    def __init__(self, latency: float, conn_bandwidth: float):
+        self.latency = latency
+        self.conn_bandwidth = conn_bandwidth
+        self.lock = threading.Lock()
+        self.bytes = 0
+
+    def _transfer(self, body: bytes):
+        time.sleep(self.latency + len(body) / self.conn_bandwidth)
+        with self.lock:
+            self.bytes += len(body)
+
+    def put_object(self, Body, **kwargs):
+        self._transfer(Body)
+
+    def create_multipart_upload(self, **kwargs):
+        time.sleep(self.latency)
+        return {"UploadId": "bench"}
+
+    def upload_part(self, Body, PartNumber, **kwargs):
+        self._transfer(Body)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, **kwargs):
+        time.sleep(self.latency)
+
+    def abort_multipart_upload(self, **kwargs):
+        pass
+
+class SyntheticStream:
+    """Non-seekable source that yields `size` bytes in pipe-sized reads."""
+
+    def __init__(self, size: int):
+        self.remaining = size
+        self.block = os.urandom(64 * 1024)
+
+    def read(self, n: int = -1) -> bytes:
+        n = min(n if n > 0 else len(self.block), len(self.block), self.remaining)
+        self.remaining -= n
+        return self.block[:n]
+
+def run(size_mb: int, part_mb: int, concurrency: int, latency: float, conn_bandwidth: float) -> dict:
+    stub = StubS3(latency, conn_bandwidth)
+    with patch("boto3.client", return_value=stub):
+        storage = S3Storage(
+            bucket="bench",
+            part_size=part_mb * MB,
+            max_concurrency=concurrency,
+            max_buffer=part_mb * MB * concurrency * 2,
+        )
+    start = time.perf_counter()
+    storage.upload_fileobj(SyntheticStream(size_mb * MB), "bench.dump")
+    elapsed = time.perf_counter() - start
+    return {
+        "size_mb": size_mb,
+        "part_mb": part_mb,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(stub.bytes / MB / elapsed, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--part-mb", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--conn-mbps", type=float, default=50, help="Bandwidth of one connection in MB/s")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        result = run(args.size_mb, args.part_mb, concurrency, args.latency_ms / 1000, args.conn_mbps * MB)
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
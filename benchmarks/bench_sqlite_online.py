@@ -0,0 +1,170 @@
+"""
+SQLite online backup benchmark: backup speed against writer latency.
+
+Generates a SQLite database of the given size, starts a writer process that
+commits small transactions in a loop, and backs the database up with each
+method while the writer runs:
+
+    single    one-step sqlite3 backup (the whole copy under one lock)
+    stepped   SQLiteBackup.backup(): N pages per step, pausing between steps
+    stream    SQLiteBackup.backup_stream() read to the end (WAL only)
+
+For every method it records the backup's wall time and MB/s, and the
+writer's commit latency (p50, p99, max) and commits per second while the
+backup ran, next to a baseline window with no backup running.
+
+    python benchmarks/bench_sqlite_online.py --size-mb 1024 --journal-mode wal --output sqlite.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi_dbbackup.__version__ import __version__
+from fastapi_dbbackup.engines.sqlite import SQLiteBackup
+
+MB = 1024 * 1024
+METHODS = ["single", "stepped", "stream"]
+
+# Commits one small row at a time until the stop file appears, then writes
+# (wall time, latency) pairs for every commit as JSON.
+WRITER_SCRIPT = """
+import json, os, sqlite3, sys, time
+db, stop, out, interval = sys.argv[1], sys.argv[2], sys.argv[3], float(sys.argv[4])
+conn = sqlite3.connect(db, timeout=60, isolation_level=None)
+samples = []
+while not os.path.exists(stop):
+    start = time.perf_counter()
+    conn.execute("INSERT INTO events (payload) VALUES (?)", ("x" * 100,))
+    samples.append((time.time(), time.perf_counter() - start))
+    if interval:
+        time.sleep(interval)
+with open(out, "w") as f:
+    json.dump(samples, f)
+"""
+
+def create_database(path: Path, size_mb: int, journal_mode: str):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, payload BLOB)")
+    row = os.urandom(4000)
+    conn.execute("BEGIN")
+    for _ in range(size_mb * MB // len(row)):
+        conn.execute("INSERT INTO events (payload) VALUES (?)", (row,))
+    conn.execute("COMMIT")
+    if journal_mode == "wal":
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+def run_method(method: str, db: Path, work_dir: Path, args) -> int:
+    """Back up `db` with `method` and return the bytes produced."""
+    engine = SQLiteBackup(f"sqlite:///{db}", work_dir, step_pages=args.step_pages, step_sleep=args.step_sleep_ms / 1000)
+    if method == "single":
+        dest = work_dir / "single.sqlite3"
+        with contextlib.closing(sqlite3.connect(db, timeout=60)) as src, contextlib.closing(sqlite3.connect(dest)) as dst:
+            src.backup(dst)
+    elif method == "stepped":
+        dest = engine.backup()
+    else:
+        reader = engine.backup_stream()
+        if reader is None:
+            raise RuntimeError("stream needs a WAL database (--journal-mode wal)")
+        size = 0
+        with reader:
+            for chunk in iter(lambda: reader.read(MB), b""):
+                size += len(chunk)
+        return size
+    size = dest.stat().st_size
+    dest.unlink()
+    return size
+
+def latency_summary(samples: List[list], start: float, end: float) -> dict:
+    latencies = sorted(latency for ts, latency in samples if start <= ts <= end)
+    if not latencies:
+        return {"commits": 0}
+
+    def pct(p: float) -> float:
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2)
+
+    return {
+        "commits": len(latencies),
+        "commits_per_s": round(len(latencies) / (end - start), 1),
+        "p50_ms": pct(0.5),
+        "p99_ms": pct(0.99),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--journal-mode", choices=["wal", "delete"], default="wal")
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=METHODS)
+    parser.add_argument("--step-pages", type=int, default=1024)
+    parser.add_argument("--step-sleep-ms", type=float, default=0)
+    parser.add_argument("--write-interval-ms", type=float, default=1, help="Pause between the writer's commits")
+    parser.add_argument("--baseline-s", type=float, default=2, help="Writer-only window measured before the backups")
+    parser.add_argument("--work-dir", default=None, help="Directory for temporary files (default: system temp)")
+    parser.add_argument("--output", default=None, help="Write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+    methods = [m for m in args.methods if m != "stream" or args.journal_mode == "wal"]
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        tmp = Path(tmp)
+        db = tmp / "bench.sqlite3"
+        print(f"Creating {args.size_mb} MB database...", file=sys.stderr)
+        create_database(db, args.size_mb, args.journal_mode)
+        stop, samples_file = tmp / "stop", tmp / "samples.json"
+        writer = subprocess.Popen([
+            sys.executable, "-c", WRITER_SCRIPT, str(db), str(stop), str(samples_file), str(args.write_interval_ms / 1000)
+        ])
+
+        windows = [("baseline", time.time(), None)]
+        time.sleep(args.baseline_s)
+        windows[0] = ("baseline", windows[0][1], time.time())
+        results = []
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                for method in methods:
+                    start = time.time()
+                    size = run_method(method, db, tmp, args)
+                    end = time.time()
+                    windows.append((method, start, end))
+                    results.append({"method": method, "bytes": size, "seconds": round(end - start, 3), "mb_per_s": round(size / MB / (end - start), 1)})
+                    print(f"{method}: {end - start:.2f}s", file=sys.stderr)
+                    time.sleep(0.5)
+        finally:
+            stop.touch()
+            writer.wait()
+        samples = json.loads(samples_file.read_text())
+
+    writer_stats = {name: latency_summary(samples, start, end) for name, start, end in windows}
+    for result in results:
+        result["writer"] = writer_stats[result["method"]]
+
+    report = {
+        "benchmark": "sqlite_online",
+        "version": __version__,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "work_dir")},
+        "baseline": writer_stats["baseline"],
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+CLI startup time benchmark.
+
+Runs short commands (`--help`, `list` on local storage, and a bare import
+of the CLI module) in fresh interpreters, and reports the wall time of each
+next to that of an empty interpreter, plus which heavy dependencies every
+command imported. Results are written as JSON so runs can be compared
+between releases.
+
+    python benchmarks/bench_startup.py --runs 20 --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi_dbbackup.__version__ import __version__
+
+# Dependencies a command should only import when it needs them
+HEAVY_MODULES = ["boto3", "botocore", "sqlalchemy", "urllib.request", "dotenv"]
+
+# Runs the CLI, then reports which heavy modules it imported on stderr
+RUNNER = f"""
+import sys
+sys.argv = ["fastapi-dbbackup"] + sys.argv[1:]
+try:
+    from fastapi_dbbackup.cli import main
+    main()
+except SystemExit:
+    pass
+finally:
+    print("MODULES=" + ",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)
+"""
+
+COMMANDS = {
+    "python": None,
+    "import": ["-c", "import fastapi_dbbackup.cli"],
+    "help": ["-c", RUNNER, "--help"],
+    "list": ["-c", RUNNER, "list"],
+}
+
+def time_command(args: Optional[List[str]], env: dict, runs: int) -> dict:
+    cmd = [sys.executable] + (args if args else ["-c", "pass"])
+    times = []
+    modules = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start)
+        for line in result.stderr.splitlines():
+            if line.startswith("MODULES="):
+                modules = [m for m in line[len("MODULES="):].split(",") if m]
+    return {
+        "min_ms": round(min(times) * 1000, 1),
+        "median_ms": round(statistics.median(times) * 1000, 1),
+        "heavy_modules": modules,
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10, help="Runs per command; the median and minimum are reported")
+    parser.add_argument("--commands", nargs="+", choices=list(COMMANDS), default=list(COMMANDS))
+    parser.add_argument("--output", default=None, help="Write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A clean configuration, so a .env in the working directory doesn't affect the numbers
+        env = {k: v for k, v in os.environ.items() if not k.startswith(("DBBACKUP_", "AWS_", "DATABASE_URL"))}
+        env.update({
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.sqlite3",
+            "DBBACKUP_STORAGE": "local",
+            "DBBACKUP_DIR": str(Path(tmp) / "backups"),
+        })
+        results = {}
+        for name in args.commands:
+            results[name] = time_command(COMMANDS[name], env, args.runs)
+            print(f"{name}: {results[name]['median_ms']} ms", file=sys.stderr)
+
+    report = {
+        "benchmark": "startup",
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"runs": args.runs},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
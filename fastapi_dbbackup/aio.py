@@ -0,0 +1,244 @@
+"""
+Asyncio API for running backups and restores from inside an application.
+
+The dump client runs under `asyncio.create_subprocess_exec` and its output is
+read on the event loop. Compression and storage calls (boto3 is blocking) run
+on executor threads connected by an OS pipe, so a running backup never
+blocks the loop.
+"""
+import asyncio
+import functools
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from fastapi_dbbackup import pipeline
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import Codec
+from fastapi_dbbackup.encrypt import Encryptor, Keyring
+from fastapi_dbbackup.metrics import RunMetrics
+from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.storage.local import LocalStorage
+
+CHUNK_SIZE = 1024 * 1024
+
+class _PipeReader(io.RawIOBase):
+    """Read end of the upload pipe that fails at EOF if the dump failed, so the storage aborts."""
+
+    def __init__(self, fd: int):
+        self._file = os.fdopen(fd, "rb", buffering=0)
+        self.error: Optional[BaseException] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._file.readinto(buffer)
+        if not n and self.error:
+            raise self.error
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+def _defaults(engine: Optional[BackupEngine], storage: Optional[StorageBackend]):
+    # Fall back to the environment configuration used by the CLI
+    if engine is None or storage is None:
+        from fastapi_dbbackup import cli
+        try:
+            engine = engine or cli.get_engine()
+            storage = storage or cli.get_storage(engine)
+        except SystemExit:
+            # The CLI helpers print the reason and exit; never exit the application
+            raise RuntimeError("Invalid backup configuration")
+    return engine, storage
+
+def _encryption_defaults(encryptor: Optional[Encryptor], keyring: Optional[Keyring]):
+    # As _defaults, for the encryption configured for the CLI
+    from fastapi_dbbackup import cli
+    try:
+        settings = cli._settings()
+        encryptor = encryptor or cli.build_encryptor(settings)
+        keyring = keyring or (encryptor.keyring if encryptor else None) or cli.build_keyring(settings)
+    except SystemExit:
+        raise RuntimeError("Invalid backup configuration")
+    return encryptor, keyring
+
+async def _run_sync(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+async def _stream_backup(
+    engine: BackupEngine,
+    storage: StorageBackend,
+    cmd,
+    env: dict,
+    codec: Optional[Codec],
+    level: Optional[int],
+    workers: Optional[int],
+    metrics: RunMetrics,
+    encryptor: Optional[Encryptor] = None,
+) -> str:
+    filename = f"default-{datetime.now():%Y%m%d-%H%M%S}{engine.stream_suffix}"
+    if codec:
+        filename += codec.suffix
+    if encryptor:
+        filename += encryptor.suffix
+
+    r, w = os.pipe()
+    reader = _PipeReader(r)
+    sink = os.fdopen(w, "wb")
+    sealed = encryptor.open_writer(sink) if encryptor else sink
+    if codec:
+        writer = codec.open_writer(metrics.writer(sealed, "encrypt") if encryptor else sealed, level=level, workers=workers)
+        write = metrics.writer(writer, "compress").write
+    else:
+        writer = sealed
+        write = metrics.writer(writer, "encrypt").write if encryptor else writer.write
+    dump_stage = metrics.stage("dump")
+
+    def upload():
+        try:
+            return storage.upload_fileobj(metrics.reader(reader, "upload"), filename)
+        finally:
+            reader.close()
+
+    def close_writer():
+        for f in (writer, sealed, sink):
+            try:
+                f.close()
+            except BrokenPipeError:
+                # The upload already stopped reading
+                pass
+
+    # Dedicated threads for the upload and the writes feeding it: on a shared
+    # executor, uploads blocked on their pipes could starve their own writers
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=2)
+    upload_task = loop.run_in_executor(pool, upload)
+    cmd = engine.prioritized(cmd)
+    limiter = engine.read_limiter
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, env=env, limit=CHUNK_SIZE
+    )
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk = await process.stdout.read(CHUNK_SIZE)
+            end = time.perf_counter()
+            dump_stage.bytes += len(chunk)
+            dump_stage.io_seconds += end - start
+            dump_stage.mark(start, end)
+            if not chunk:
+                break
+            if limiter:
+                delay = limiter.reserve(len(chunk))
+                if delay:
+                    await asyncio.sleep(delay)
+            # Compression and pipe writes may block; keep them off the loop
+            await loop.run_in_executor(pool, write, chunk)
+        returncode = await process.wait()
+        if returncode:
+            reader.error = RuntimeError(f"{cmd[0]} exited with status {returncode}")
+        await loop.run_in_executor(pool, close_writer)
+        remote_path = await upload_task
+    except BaseException as e:
+        reader.error = e if isinstance(e, Exception) else RuntimeError("Backup was cancelled")
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        await loop.run_in_executor(pool, close_writer)
+        # Let the upload abort; if it failed first, its error explains the broken pipe
+        (result,) = await asyncio.gather(upload_task, return_exceptions=True)
+        if isinstance(e, BrokenPipeError) and isinstance(result, Exception):
+            raise result from e
+        raise
+    finally:
+        pool.shutdown(wait=False)
+
+    engine.backup_uploaded(Path(filename))
+    return remote_path
+
+async def run_backup(
+    engine: Optional[BackupEngine] = None,
+    storage: Optional[StorageBackend] = None,
+    codec: Optional[Codec] = None,
+    level: Optional[int] = None,
+    workers: Optional[int] = None,
+    retention_days: int = 0,
+    max_backups: int = 0,
+    metrics: Optional[RunMetrics] = None,
+    encryptor: Optional[Encryptor] = None,
+) -> str:
+    """
+    Back up the database without blocking the event loop and return the
+    remote path, encrypted with `encryptor` if given. Engines without a dump command (e.g. SQLite) run the
+    blocking pipeline on a worker thread instead. Per-stage timings and
+    byte counts are recorded in `metrics`.
+    """
+    engine, storage = _defaults(engine, storage)
+    metrics = metrics or RunMetrics("backup")
+    command = await _run_sync(engine.stream_command)
+    if command:
+        cmd, env = command
+        await _run_sync(pipeline.recover_uploads, storage)
+        remote_path = await _stream_backup(engine, storage, cmd, env, codec, level, workers, metrics, encryptor)
+        with metrics.timed("retention"):
+            await _run_sync(pipeline.apply_retention, storage, retention_days, max_backups)
+        return remote_path
+
+    return await _run_sync(
+        pipeline.backup,
+        engine,
+        storage,
+        codec=codec,
+        level=level,
+        workers=workers,
+        keep_local=_stores_in_place(engine, storage),
+        retention_days=retention_days,
+        max_backups=max_backups,
+        metrics=metrics,
+        encryptor=encryptor,
+    )
+
+def _stores_in_place(engine: BackupEngine, storage: StorageBackend) -> bool:
+    # Local storage in the engine's output directory keeps the dump file itself
+    while hasattr(storage, "storage"):
+        storage = storage.storage
+    return isinstance(storage, LocalStorage) and storage.backup_dir.resolve() == engine.output_dir.resolve()
+
+async def run_restore(
+    engine: Optional[BackupEngine] = None,
+    storage: Optional[StorageBackend] = None,
+    remote_path: Optional[str] = None,
+    work_dir: Optional[Path] = None,
+    metrics: Optional[RunMetrics] = None,
+    keyring: Optional[Keyring] = None,
+) -> Optional[str]:
+    """
+    Restore `remote_path` (or the latest backup) on a worker thread and return
+    its name, or None if there is nothing to restore. Encrypted backups need
+    a `keyring` holding their key.
+    """
+    engine, storage = _defaults(engine, storage)
+
+    def restore():
+        if work_dir:
+            return pipeline.restore(engine, storage, remote_path, work_dir=work_dir, metrics=metrics, keyring=keyring)
+        # Stage downloads in a private directory, so a local storage sharing
+        # the engine's output directory never has its backups cleaned up
+        with tempfile.TemporaryDirectory(dir=engine.output_dir) as tmp:
+            return pipeline.restore(engine, storage, remote_path, work_dir=Path(tmp), metrics=metrics, keyring=keyring)
+
+    return await _run_sync(restore)
+
+async def list_backups(storage: Optional[StorageBackend] = None):
+    if storage is None:
+        _, storage = _defaults(None, None)
+    return sorted(await _run_sync(storage.list_backups))
@@ -1,24 +1,122 @@
+import os
+import subprocess
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import BinaryIO, Optional
+from typing import BinaryIO, List, Optional, Tuple
+from fastapi_dbbackup.config import Settings
+from fastapi_dbbackup.streams import ProcessReader, copy_stream, grow_pipe
+from fastapi_dbbackup.throttle import RateLimiter, priority_prefix, throttled
 
 class BackupEngine(ABC):
-    def __init__(self, db_url: str, output_dir: Path):
+    name = ""
+    # Suffix of streamed backups, before any compression suffix
+    stream_suffix = ".dump"
+    # Optional limits for production hosts: a cap on the streamed dump's
+    # read rate, and the CPU/I/O priority the dump tools run at
+    read_limiter: Optional[RateLimiter] = None
+    nice: Optional[int] = None
+    ionice: Optional[str] = None
+
+    def __init__(self, db_url: str, output_dir: Path, jobs: Optional[int] = None):
         self.db_url = db_url
         self.output_dir = output_dir
+        # Parallel workers for engines that support them (defaults to all cores)
+        self.jobs = jobs or os.cpu_count() or 1
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
+    @classmethod
+    def from_settings(cls, db_url: str, output_dir: Path, settings: Settings, **options) -> "BackupEngine":
+        """
+        Create the engine with its settings. `options` are per-database
+        overrides (e.g. `include_tables` from a daemon config) that engines
+        without the option ignore.
+        """
+        return cls(db_url, output_dir, jobs=settings.jobs)
+
     @abstractmethod
     def backup(self) -> Path:
         pass
 
+    def prioritized(self, cmd: List[str]) -> List[str]:
+        """`cmd` prefixed with nice/ionice if the engine runs its dumps at a lower priority."""
+        if self.nice is None and not self.ionice:
+            return cmd
+        return priority_prefix(self.nice, self.ionice) + cmd
+
+    def stream_command(self) -> Optional[Tuple[List[str], dict]]:
+        """
+        Optional: The (command, environment) of a dump written to stdout.
+        Returns None if the engine cannot dump to a stream.
+        """
+        return None
+
     def backup_stream(self) -> BinaryIO:
         """
         Optional: Start a streaming backup and return a file-like object (stdout).
-        Returns None if streaming is not supported by the engine.
+        Returns None if streaming is not supported by the engine. Reading to
+        the end raises CalledProcessError if the dump command failed.
         """
-        return None
+        command = self.stream_command()
+        if not command:
+            return None
+        cmd, env = command
+        cmd = self.prioritized(cmd)
+        # Unbuffered, so the output can be spliced kernel-side (see streams.copy_stream)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env, bufsize=0)
+        grow_pipe(process.stdout.fileno())
+        return throttled(ProcessReader(process, cmd), self.read_limiter)
+
+    def backup_uploaded(self, backup_path: Path):
+        """
+        Optional: Called once the backup has been stored successfully, so
+        engines that keep state between runs (e.g. incremental chains) can commit it.
+        """
+        pass
 
     @abstractmethod
     def restore(self, backup_path: Path):
         pass
+
+    def restore_dependencies(self, backup_path: Path) -> List[str]:
+        """
+        Optional: Names of other backups (without compression suffix) that must
+        be downloaded next to `backup_path` before it can be restored.
+        """
+        return []
+
+    def restore_stream(self, fileobj: BinaryIO) -> bool:
+        """
+        Optional: Restore from a file-like object of uncompressed dump data.
+        Returns False if streaming restore is not supported by the engine.
+        """
+        return False
+
+    @property
+    def supports_stream_restore(self) -> bool:
+        """Whether the engine implements `restore_stream`, checked before a backup is opened for streaming."""
+        return type(self).restore_stream is not BackupEngine.restore_stream
+
+    def verify_stream(self, fileobj: BinaryIO) -> bool:
+        """
+        Optional: Check that uncompressed dump data is structurally valid
+        without restoring it, raising if it is not. Returns False if the
+        engine has no structural check.
+        """
+        return False
+
+    def _pipe_to_command(self, cmd: List[str], fileobj: BinaryIO, env: dict, stdout=None):
+        """Run `cmd`, feeding `fileobj` to its stdin, and fail like `check=True`."""
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=stdout, env=env)
+        try:
+            copy_stream(fileobj, process.stdin)
+        except BrokenPipeError:
+            # The command exited early; its return code reports why.
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = process.wait()
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, cmd)
@@ -1,176 +1,604 @@
 import argparse
+import shlex
 import sys
-import os
-import gzip
-import threading
-import shutil
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import BinaryIO
-from fastapi_dbbackup.config import (
-    DATABASE_URL, ENGINE, BACKUP_DIR, COMPRESS, STORAGE, 
-    RETENTION_DAYS, MAX_BACKUPS, S3_BUCKET, S3_REGION,
-    AWS_S3_ACCESS_KEY_ID, AWS_S3_SECRET_ACCESS_KEY, AWS_S3_ENDPOINT_URL, AWS_S3_DEFAULT_ACL
-)
+from typing import List, Optional
+from fastapi_dbbackup.config import Settings, get_settings
 from fastapi_dbbackup.detector import detect_backend
-from fastapi_dbbackup.compress import compress, decompress
-from fastapi_dbbackup.retention import purge_old_backups, purge_max_backups
-
-from fastapi_dbbackup.engines.sqlite import SQLiteBackup
-from fastapi_dbbackup.engines.postgres import PostgresBackup
-from fastapi_dbbackup.engines.mysql import MySQLBackup
-
-from fastapi_dbbackup.storage.local import LocalStorage
-from fastapi_dbbackup.storage.s3 import S3Storage
-
-ENGINE_MAP = {
-    "sqlite": SQLiteBackup,
-    "postgresql": PostgresBackup, # detector returns postgresql for urls
-    "postgres": PostgresBackup,
-    "mysql": MySQLBackup,
-}
-
-def get_storage():
-    if STORAGE == "s3":
-        if not S3_BUCKET:
-            print("Error: DBBACKUP_S3_BUCKET or AWS_STORAGE_BUCKET_NAME is required for s3 storage")
+from fastapi_dbbackup import pipeline
+from fastapi_dbbackup.compress import get_codec
+from fastapi_dbbackup.encrypt import Encryptor, Keyring, generate_key
+from fastapi_dbbackup.metrics import MetricsExporter, RunMetrics
+from fastapi_dbbackup.pitr import BASE_PREFIX, WALArchive, parse_target_time
+# Engines and storages come from the registry, imported only when selected,
+# so e.g. `list` on local storage never loads boto3 or SQLAlchemy
+from fastapi_dbbackup.registry import load_engine, load_storage
+from fastapi_dbbackup.retention import abort_orphaned_uploads, client_retention_days, collect_garbage, lifecycle_storages, plan_deletions
+from fastapi_dbbackup.verify import VerificationError, verify_backup
+
+from fastapi_dbbackup.storage.catalog import CatalogStorage
+from fastapi_dbbackup.storage.checksum import ChecksumStorage
+from fastapi_dbbackup.storage.dedup import DedupStorage
+from fastapi_dbbackup.storage.fanout import FanoutStorage
+from fastapi_dbbackup.storage.throttle import ThrottledStorage
+from fastapi_dbbackup.throttle import RateLimiter, parse_ionice
+
+_metrics_exporter = None
+
+def _settings(settings: Optional[Settings] = None) -> Settings:
+    """`settings`, or those of the environment; exits on invalid ones."""
+    if settings is not None:
+        return settings
+    try:
+        return get_settings()
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+def get_metrics_exporter() -> MetricsExporter:
+    """The process-wide exporter for run metrics, as configured."""
+    global _metrics_exporter
+    if _metrics_exporter is None:
+        settings = _settings()
+        try:
+            _metrics_exporter = MetricsExporter(
+                textfile=Path(settings.metrics_file) if settings.metrics_file else None,
+                pushgateway=settings.metrics_pushgateway,
+                summary=settings.metrics_summary,
+                otel=settings.otel,
+            )
+        except RuntimeError as e:
+            print(f"Error: {e}")
             sys.exit(1)
-        return S3Storage(
-            bucket=S3_BUCKET, 
-            region=S3_REGION, 
-            prefix=str(BACKUP_DIR),
-            access_key=AWS_S3_ACCESS_KEY_ID,
-            secret_key=AWS_S3_SECRET_ACCESS_KEY,
-            endpoint_url=AWS_S3_ENDPOINT_URL,
-            default_acl=AWS_S3_DEFAULT_ACL
+    return _metrics_exporter
+
+# One limiter per direction for the whole process, so concurrent jobs share the budget
+_limiters = {}
+
+def get_limiter(spec: str):
+    """The process-wide RateLimiter for a limit spec, or None; raises ValueError for bad specs."""
+    if spec not in _limiters:
+        _limiters[spec] = RateLimiter.parse(spec)
+    return _limiters[spec]
+
+def get_storage(engine=None, settings: Optional[Settings] = None):
+    settings = _settings(settings)
+    return wrap_storage(_get_base_storage(settings), engine, settings)
+
+def wrap_storage(storage, engine=None, settings: Optional[Settings] = None):
+    """Layer deduplication and the catalog on a base storage, as configured."""
+    settings = _settings(settings)
+    if settings.dedup:
+        # Chunks are compressed individually; compressing the whole stream would defeat deduplication
+        codec = get_compress_codec(settings)
+        storage = DedupStorage(
+            storage,
+            codec=codec.name if codec else None,
+            level=settings.compress_level,
+            workers=settings.s3_concurrency,
+            gc_grace=settings.dedup_gc_grace_hours * 3600,
         )
-    return LocalStorage(BACKUP_DIR)
+    if settings.catalog:
+        return CatalogStorage(storage, engine=engine.name if engine else None, checksum=settings.checksum)
+    if settings.checksum:
+        return ChecksumStorage(storage, algorithm=settings.checksum)
+    return storage
 
-def get_engine():
-    backend = ENGINE
-    if backend == "auto":
-        backend = detect_backend(DATABASE_URL)
-    
-    engine_cls = ENGINE_MAP.get(backend)
-    if not engine_cls:
-        print(f"Error: Unsupported database backend '{backend}'")
+def _get_base_storage(settings: Optional[Settings] = None):
+    settings = _settings(settings)
+    if settings.targets:
+        targets = {name: _get_target_storage(name, settings) for name in settings.targets}
+        return FanoutStorage(targets, buffer_size=settings.fanout_buffer_mb * 1024 * 1024, timeout=settings.fanout_timeout)
+    return _get_named_storage(settings.storage, settings)
+
+def _get_target_storage(name: str, settings: Settings):
+    if name in ("local", "s3"):
+        return _get_named_storage(name, settings)
+    # Other targets override the S3 settings with DBBACKUP_TARGET_<NAME>_*
+    return _get_s3_storage(settings, target=name, **settings.target(name))
+
+def _get_named_storage(name: str, settings: Settings):
+    if name == "s3":
+        return _get_s3_storage(
+            settings,
+            bucket=settings.s3_bucket,
+            region=settings.s3_region,
+            endpoint_url=settings.aws_s3_endpoint_url,
+            access_key=settings.aws_s3_access_key_id,
+            secret_key=settings.aws_s3_secret_access_key,
+        )
+    try:
+        return load_storage(name).from_settings(settings)
+    except (ValueError, NotImplementedError) as e:
+        print(f"Error: {e}")
         sys.exit(1)
-    return engine_cls(DATABASE_URL, BACKUP_DIR)
 
-def cmd_backup(args):
-    engine = get_engine()
-    storage = get_storage()
-    
-    print(f"Starting backup for {DATABASE_URL}...")
-    
-    # Try streaming if not local storage and engine supports it
-    stream = None
-    if STORAGE != "local":
-        stream = engine.backup_stream()
-        
-    if stream:
-        filename = f"default-{datetime.now():%Y%m%d-%H%M%S}.dump"
-        if COMPRESS:
-            filename += ".gz"
-            print("Streaming and compressing backup directly to cloud...")
-            # Use os.pipe and a thread for streaming compression
-            r, w = os.pipe()
-            def compress_worker():
-                try:
-                    with os.fdopen(w, "wb") as f_out:
-                        with gzip.GzipFile(fileobj=f_out, mode="wb") as gz:
-                            shutil.copyfileobj(stream, gz)
-                finally:
-                    stream.close()
-            
-            t = threading.Thread(target=compress_worker, daemon=True)
-            t.start()
-            fileobj = os.fdopen(r, "rb")
+def _get_s3_storage(settings: Settings, bucket, region, endpoint_url, access_key, secret_key, target=None):
+    if not bucket:
+        if target:
+            print(f"Error: DBBACKUP_TARGET_{target.upper()}_BUCKET is required for backup target '{target}'")
         else:
-            print("Streaming backup directly to cloud...")
-            fileobj = stream
+            print("Error: DBBACKUP_S3_BUCKET or AWS_STORAGE_BUCKET_NAME is required for s3 storage")
+        sys.exit(1)
+    try:
+        limiter = get_limiter(settings.upload_limit)
+    except ValueError as e:
+        print(f"Error: DBBACKUP_UPLOAD_LIMIT: {e}")
+        sys.exit(1)
+    storage = load_storage("s3")(
+        bucket=bucket, 
+        region=region, 
+        prefix=str(settings.backup_dir),
+        access_key=access_key,
+        secret_key=secret_key,
+        endpoint_url=endpoint_url,
+        default_acl=settings.aws_s3_default_acl,
+        part_size=settings.s3_part_size_mb * 1024 * 1024,
+        max_concurrency=settings.s3_concurrency,
+        max_buffer=settings.s3_max_buffer_mb * 1024 * 1024,
+        part_retries=settings.s3_part_retries,
+        part_timeout=settings.s3_part_timeout,
+        download_concurrency=settings.s3_download_concurrency,
+        download_window=settings.s3_download_window_mb * 1024 * 1024,
+        spool_dir=Path(settings.s3_spool_dir) if settings.s3_spool_dir else None,
+        max_spool=settings.s3_spool_max_mb * 1024 * 1024,
+        orphan_age=settings.s3_orphan_hours * 3600,
+    )
+    return ThrottledStorage(storage, limiter) if limiter else storage
 
-        try:
-            remote_path = storage.upload_fileobj(fileobj, filename)
-        finally:
-            fileobj.close()
-    else:
-        # Fallback to file-based backup (or definitely file-based for local)
-        backup_file = engine.backup()
+def _local_primary(settings: Settings) -> bool:
+    # Whether backups are read from (and written in place to) the local backup directory
+    return (settings.targets[0] if settings.targets else settings.storage) == "local"
+
+def build_engine(
+    db_url: str,
+    output_dir,
+    backend: str = "auto",
+    include_tables=None,
+    exclude_tables=None,
+    settings: Optional[Settings] = None,
+):
+    """
+    Create the engine for `db_url`; raises ValueError for bad settings.
+    Table filters default to DBBACKUP_MYSQL_INCLUDE_TABLES/EXCLUDE_TABLES.
+    """
+    settings = _settings(settings)
+    if backend == "auto":
+        if not db_url:
+            raise ValueError("DATABASE_URL is required for automatic engine detection. Otherwise, set DBBACKUP_ENGINE.")
+        backend = detect_backend(db_url)
 
-        if COMPRESS:
-            print("Compressing backup...")
-            backup_file = compress(backup_file)
+    engine_cls = load_engine(backend)
+    engine = engine_cls.from_settings(
+        db_url, output_dir, settings, include_tables=include_tables, exclude_tables=exclude_tables
+    )
+    engine.read_limiter = get_limiter(settings.read_limit)
+    if settings.dump_ionice:
+        parse_ionice(settings.dump_ionice)  # Fail early on a bad setting
+    engine.nice, engine.ionice = settings.dump_nice, settings.dump_ionice
+    return engine
 
-        print(f"Uploading backup to {STORAGE} storage...")
-        remote_path = storage.upload(backup_file)
+def get_engine(settings: Optional[Settings] = None):
+    settings = _settings(settings)
+    try:
+        return build_engine(settings.database_url, settings.backup_dir, settings.engine, settings=settings)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-        # If using non-local storage, delete the temporary local backup file
-        if STORAGE != "local" and backup_file.exists():
-            print(f"Cleaning up local backup file {backup_file}...")
-            backup_file.unlink()
+def get_compress_codec(settings: Optional[Settings] = None):
+    settings = _settings(settings)
+    if not settings.compress:
+        return None
+    try:
+        return get_codec(settings.compress_codec)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    if RETENTION_DAYS > 0:
-        print(f"Purging backups older than {RETENTION_DAYS} days...")
-        purge_old_backups(storage, RETENTION_DAYS)
+def build_keyring(settings: Settings) -> Optional[Keyring]:
+    """The configured encryption keys, or None; raises ValueError for bad keys."""
+    text = settings.encrypt_key
+    if settings.encrypt_key_file:
+        try:
+            text = Path(settings.encrypt_key_file).read_text()
+        except OSError as e:
+            raise ValueError(f"DBBACKUP_ENCRYPT_KEY_FILE: {e}")
+    if not text or not text.strip():
+        return None
+    return Keyring.from_text(text)
 
-    if MAX_BACKUPS > 0:
-        print(f"Limiting backups to latest {MAX_BACKUPS} files...")
-        purge_max_backups(storage, MAX_BACKUPS)
+def build_encryptor(settings: Settings) -> Optional[Encryptor]:
+    """The Encryptor for new backups, or None if encryption is off; raises ValueError if misconfigured."""
+    if not settings.encrypt_cipher:
+        return None
+    if settings.dedup:
+        # Chunks are deduplicated by content; sealing the stream would make every chunk new
+        raise ValueError("DBBACKUP_ENCRYPT cannot be combined with DBBACKUP_DEDUP")
+    keyring = build_keyring(settings)
+    if keyring is None:
+        raise ValueError("DBBACKUP_ENCRYPT needs a key: set DBBACKUP_ENCRYPT_KEY or DBBACKUP_ENCRYPT_KEY_FILE (create one with `fastapi-dbbackup keygen`)")
+    return Encryptor(keyring, settings.encrypt_cipher, workers=settings.encrypt_workers, chunk_size=settings.encrypt_chunk_kb * 1024)
 
-    print(f"Backup successful: {remote_path}")
+def get_keyring(settings: Optional[Settings] = None) -> Optional[Keyring]:
+    settings = _settings(settings)
+    try:
+        return build_keyring(settings)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-def cmd_restore(args):
-    engine = get_engine()
-    storage = get_storage()
-    
-    remote_path = args.filename
-    if not remote_path:
-        backups = storage.list_backups()
-        if not backups:
-            print("No backups found to restore.")
-            return
-        # Use latest backup if none specified
-        remote_path = sorted(backups)[-1]
-        print(f"No backup specified. Using latest: {remote_path}")
-
-    local_path = BACKUP_DIR / remote_path
-    # Ensure backup directory exists before downloading
-    local_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    print(f"Downloading {remote_path}...")
-    storage.download(remote_path, local_path)
+def get_encryptor(settings: Optional[Settings] = None) -> Optional[Encryptor]:
+    settings = _settings(settings)
+    try:
+        return build_encryptor(settings)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    temp_path = local_path
-    if local_path.suffix == ".gz":
-        print("Decompressing backup...")
-        temp_path = decompress(local_path)
+def get_wal_archive(settings: Optional[Settings] = None) -> WALArchive:
+    """Base backups and archived WAL for point-in-time recovery, under DBBACKUP_PITR_PREFIX."""
+    settings = _settings(settings)
+    storage = _get_base_storage(settings).with_prefix(settings.pitr_prefix)
+    return WALArchive(
+        storage,
+        base=wrap_storage(storage.with_prefix(BASE_PREFIX), settings=settings),
+        codec=get_compress_codec(settings),
+        level=settings.compress_level,
+        jobs=settings.wal_jobs,
+        state_dir=settings.wal_state_dir,
+    )
 
-    print(f"Restoring from {temp_path}...")
-    engine.restore(temp_path)
+def cmd_backup(args):
+    settings = _settings()
+    engine = get_engine(settings)
+    storage = get_storage(engine, settings)
+    codec = None if settings.dedup else get_compress_codec(settings)
+    encryptor = get_encryptor(settings)
     
-    # Cleanup temporary files
-    if temp_path != local_path and temp_path.exists():
-        temp_path.unlink()
+    exporter = get_metrics_exporter()
+    metrics = RunMetrics("backup")
+
+    print(f"Starting backup for {settings.database_url}...")
     
-    # If using remote storage, cleanup the downloaded backup file as well
-    if STORAGE != "local" and local_path.exists():
-        print(f"Cleaning up downloaded backup file {local_path}...")
-        local_path.unlink()
+    # Stream whenever the engine can, also into local storage: the dump goes
+    # through the compressor into the final file with no uncompressed copy on disk
+    try:
+        remote_path = pipeline.backup(
+            engine,
+            storage,
+            codec=codec,
+            level=settings.compress_level,
+            workers=settings.compress_workers,
+            stream=True,
+            keep_local=_local_primary(settings) or "local" in settings.targets,
+            # Outside inline mode retention runs apart from backups (`retention apply`)
+            retention_days=settings.retention_days if settings.retention_mode == "inline" else 0,
+            max_backups=settings.max_backups if settings.retention_mode == "inline" else 0,
+            metrics=metrics,
+            encryptor=encryptor,
+        )
+    except Exception as e:
+        metrics.finish(e)
+        exporter.export(metrics)
+        raise
 
-    print("Restore successful.")
+    print(f"Backup successful: {remote_path}")
+    metrics.finish(backup=remote_path)
+    exporter.export(metrics)
+
+def cmd_restore(args):
+    settings = _settings()
+    engine = get_engine(settings)
+    storage = get_storage(engine, settings)
+    keyring = get_keyring(settings)
+    exporter = get_metrics_exporter()
+    metrics = RunMetrics("restore")
+
+    try:
+        restored = pipeline.restore(
+            engine,
+            storage,
+            args.filename,
+            work_dir=settings.backup_dir,
+            keep_downloads=_local_primary(settings),
+            metrics=metrics,
+            keyring=keyring,
+        )
+    except Exception as e:
+        metrics.finish(e)
+        exporter.export(metrics)
+        # A missing backup or key, or a backup that fails authentication
+        if not isinstance(e, (FileNotFoundError, ValueError)):
+            raise
+        print(f"Error: {e}")
+        sys.exit(1)
+    if restored:
+        print("Restore successful.")
+        metrics.finish(backup=restored)
+        exporter.export(metrics)
 
 def cmd_list(args):
-    storage = get_storage()
+    settings = _settings()
+    storage = get_storage(settings=settings)
     backups = storage.list_backups()
     if not backups:
         print("No backups found.")
         return
     
-    print(f"Backups in {STORAGE} storage:")
+    print(f"Backups in {settings.storage} storage:")
+    if isinstance(storage, CatalogStorage):
+        for entry in storage.entries():
+            details = ", ".join(
+                f"{key}={entry[key]}" for key in ("size", "codec", "engine") if entry.get(key) is not None
+            )
+            print(f" - {entry['name']}" + (f" ({details})" if details else ""))
+        return
     for b in sorted(backups):
         print(f" - {b}")
 
+def cmd_gc(args):
+    storage = get_storage()
+    removed = collect_garbage(storage)
+    print(f"Removed {len(removed)} unreferenced chunks.")
+
+def cmd_reindex(args):
+    storage = get_storage()
+    if not isinstance(storage, CatalogStorage):
+        storage = CatalogStorage(storage)
+    count = storage.reindex()
+    print(f"Catalog rebuilt with {count} backups.")
+
+def _describe_rule(rule: dict) -> List[str]:
+    lines = [f"after {t['Days']} days: move to {t['StorageClass']}" for t in rule.get("Transitions", [])]
+    if "Expiration" in rule:
+        lines.append(f"after {rule['Expiration']['Days']} days: delete")
+    if "AbortIncompleteMultipartUpload" in rule:
+        lines.append(f"after {rule['AbortIncompleteMultipartUpload']['DaysAfterInitiation']} days: abort unfinished uploads")
+    return lines
+
+def check_lifecycle_mode(settings: Settings):
+    """Raise ValueError if lifecycle retention would break backups other backups depend on."""
+    if settings.retention_mode != "lifecycle":
+        return
+    # S3 expires objects by age alone: manifests, the catalog and incremental
+    # chains would lose objects they still reference
+    conflicts = [
+        name for name, enabled in (
+            ("DBBACKUP_DEDUP", settings.dedup),
+            ("DBBACKUP_CATALOG", settings.catalog),
+            ("DBBACKUP_SQLITE_INCREMENTAL", settings.sqlite_incremental),
+        ) if enabled
+    ]
+    if conflicts:
+        raise ValueError(
+            f"DBBACKUP_RETENTION_MODE=lifecycle cannot be combined with {' or '.join(conflicts)}: "
+            "S3 would delete objects other backups still need"
+        )
+
+def cmd_retention(args):
+    settings = _settings()
+    lifecycle = settings.retention_mode == "lifecycle"
+    try:
+        check_lifecycle_mode(settings)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    storage = get_storage(settings=settings)
+    rules = []
+    if lifecycle:
+        try:
+            rules = [(target, target.lifecycle_rule(settings.retention_days, settings.s3_transitions)) for target in lifecycle_storages(storage)]
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    # What lifecycle rules don't enforce is left to the client
+    retention_days = client_retention_days(storage, settings.retention_days, lifecycle)
+    backups = storage.list_backups()
+    to_delete, protected = plan_deletions(backups, retention_days, settings.max_backups)
+
+    if args.action == "apply":
+        for target, rule in rules:
+            target.put_lifecycle_rule(rule)
+            print(f"Installed lifecycle rule {target.lifecycle_rule_id} on bucket {target.bucket_name}")
+        if not lifecycle:
+            # Lifecycle rules abort incomplete uploads themselves
+            abort_orphaned_uploads(storage)
+        deleted = [backup for backup in to_delete if backup not in protected]
+        if deleted:
+            storage.delete_many(deleted)
+        print(f"Deleted {len(deleted)} of {len(backups)} backups.")
+        return
+
+    rules_text = []
+    if settings.retention_days:
+        rules_text.append(f"delete backups older than {settings.retention_days} days")
+    if settings.max_backups:
+        rules_text.append(f"keep the newest {settings.max_backups}")
+    print(f"Policy: {'; '.join(rules_text) or 'keep every backup'} ({settings.retention_mode} mode)")
+    if settings.retention_mode == "inline":
+        print("Applied after every backup.")
+    else:
+        print("Backups do no retention work; `fastapi-dbbackup retention apply` (and the daemon, after its backups) enforces it.")
+
+    for target, rule in rules:
+        installed = target.get_lifecycle_rule()
+        if installed is None:
+            status = "not installed"
+        else:
+            # S3 may return the rule with fields of its own
+            same = {key: installed.get(key) for key in rule or {}} == (rule or {}) and _describe_rule(installed) == _describe_rule(rule or {})
+            status = "installed" if same else "differs from the installed rule"
+        print(f"\nS3 lifecycle rule {target.lifecycle_rule_id} on bucket {target.bucket_name} ({status}):")
+        for line in _describe_rule(rule) if rule else ["nothing to enforce; the rule is removed"]:
+            print(f"  {line}")
+        if rule:
+            print(f"  Applies to every object under '{rule['Filter']['Prefix'] or '(whole bucket)'}', including nested prefixes.")
+
+    if rules and settings.retention_days:
+        expired, _ = plan_deletions(backups, settings.retention_days)
+        print(f"  {len(expired)} backups are past the age limit; S3 deletes them within a day of reaching it.")
+
+    print(f"\n{len(backups)} backups stored; {len(to_delete) - len(protected)} would be deleted now:")
+    for backup in sorted(to_delete):
+        if backup in protected:
+            print(f"  {backup} (kept: a newer incremental backup needs it)")
+        else:
+            print(f"  {backup} ({to_delete[backup]})")
+
+def cmd_verify(args):
+    # Structural checks need the engine, but checksums can be verified without one
+    settings = _settings()
+    try:
+        engine = build_engine(settings.database_url, settings.backup_dir, settings.engine, settings=settings)
+    except ValueError:
+        engine = None
+    storage = get_storage(engine, settings)
+    keyring = get_keyring(settings)
+
+    backups = sorted(storage.list_backups())
+    if args.all:
+        names = backups
+    elif args.filename:
+        names = [args.filename]
+    else:
+        names = backups[-1:]
+    if not names:
+        print("No backups found to verify.")
+        return
+
+    def verify(name):
+        try:
+            return name, verify_backup(storage, name, engine, keyring), None
+        except (VerificationError, FileNotFoundError) as e:
+            return name, None, e
+
+    failed = 0
+    # Backups are checked concurrently; each is read in a single streaming pass
+    with ThreadPoolExecutor(max_workers=min(len(names), 4)) as pool:
+        for name, notes, error in pool.map(verify, names):
+            if error:
+                failed += 1
+                print(f"FAILED {name}: {error}")
+            else:
+                print(f"OK {name} ({', '.join(notes)})")
+
+    if failed:
+        print(f"{failed} of {len(names)} backups failed verification.")
+        sys.exit(1)
+    print(f"Verified {len(names)} backups.")
+
+def cmd_daemon(args):
+    # Imported here so one-shot commands don't pay for the scheduler
+    import asyncio
+    from fastapi_dbbackup.daemon import build_daemon, load_config
+
+    config_path = args.config or _settings().daemon_config
+    if not config_path:
+        print("Error: pass --config or set DBBACKUP_DAEMON_CONFIG")
+        sys.exit(1)
+    try:
+        daemon = build_daemon(load_config(Path(config_path)))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Managing {len(daemon.jobs)} databases (max {daemon.max_concurrent} concurrent, {daemon.max_per_host} per host).")
+    if args.once:
+        results = asyncio.run(daemon.run_once())
+        if not all(results):
+            sys.exit(1)
+        return
+    asyncio.run(daemon.run())
+    print("Daemon stopped.")
+
+def cmd_keygen(args):
+    # Printed alone, so it can be redirected into a key file
+    print(generate_key())
+
+def cmd_basebackup(args):
+    settings = _settings()
+    try:
+        engine = build_engine(settings.database_url, settings.backup_dir, "postgres-base", settings=settings)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    archive = get_wal_archive(settings)
+    codec = None if settings.dedup else get_compress_codec(settings)
+
+    exporter = get_metrics_exporter()
+    metrics = RunMetrics("basebackup")
+
+    print(f"Starting base backup for {settings.database_url}...")
+    started = time.time()
+    try:
+        remote_path = pipeline.backup(
+            engine,
+            archive.base,
+            codec=codec,
+            level=settings.compress_level,
+            workers=settings.compress_workers,
+            stream=True,
+            retention_days=settings.retention_days,
+            max_backups=settings.max_backups,
+            metrics=metrics,
+        )
+        archive.record_base(remote_path, started, time.time(), engine.start_segment)
+        # WAL older than the oldest base backup left after retention can never be replayed
+        pruned = archive.prune()
+    except Exception as e:
+        metrics.finish(e)
+        exporter.export(metrics)
+        raise
+
+    if engine.start_segment is None:
+        print("Warning: no backup_label at the start of the base backup; archived WAL will not be pruned")
+    elif pruned:
+        print(f"Deleted {len(pruned)} archived WAL files older than the oldest base backup")
+    print(f"Base backup successful: {remote_path}")
+    metrics.finish(backup=remote_path)
+    exporter.export(metrics)
+
+def cmd_wal_push(args):
+    archive = get_wal_archive()
+    try:
+        names = archive.push(Path(args.path))
+    except Exception as e:
+        # PostgreSQL keeps the file and retries until archive_command succeeds
+        print(f"Error: {e}")
+        sys.exit(1)
+    for name in names:
+        print(f"Archived {name}")
+
+def cmd_wal_fetch(args):
+    archive = get_wal_archive()
+    try:
+        found = archive.fetch(args.name, Path(args.path))
+    except Exception as e:
+        # A plain failure would tell PostgreSQL the archive ends here, and it would
+        # finish recovery early; an exit status above 125 makes it stop instead
+        print(f"Error: {e}")
+        sys.exit(255)
+    if not found:
+        sys.exit(1)
+
+def cmd_pitr_restore(args):
+    archive = get_wal_archive()
+    # The interpreter running this command, so the server finds it without our PATH
+    restore_command = args.restore_command or f"{shlex.quote(sys.executable)} -m fastapi_dbbackup.cli wal-fetch %f %p"
+    try:
+        target = parse_target_time(args.target_time) if args.target_time else None
+        name = archive.prepare_restore(Path(args.pgdata), target, base=args.base, restore_command=restore_command)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Restored base backup {name} into {args.pgdata}")
+    until = f"up to {target.isoformat(sep=' ')}" if target else "to the end of the archive"
+    print(f"Start PostgreSQL on it to replay archived WAL {until}; it is promoted once recovery ends.")
+
 def main():
     parser = argparse.ArgumentParser(prog="fastapi-dbbackup", description="FastAPI Database Backup Tool")
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
@@ -185,6 +613,42 @@ def main():
     # List command
     list_parser = subparsers.add_parser("list", help="List available backups")
 
+    # Reindex command
+    reindex_parser = subparsers.add_parser("reindex", help="Rebuild the backup catalog from a full storage listing")
+
+    # Garbage collection command
+    gc_parser = subparsers.add_parser("gc", help="Delete deduplicated chunks no backup references")
+
+    # Verify command
+    verify_parser = subparsers.add_parser("verify", help="Check backups against their checksums without restoring")
+    verify_parser.add_argument("filename", nargs="?", help="Backup to verify (defaults to latest)")
+    verify_parser.add_argument("--all", action="store_true", help="Verify every backup")
+
+    # Retention command
+    retention_parser = subparsers.add_parser("retention", help="Show or enforce the retention policy")
+    retention_parser.add_argument("action", choices=["plan", "apply"], help="plan: show what the policy will do; apply: install lifecycle rules and delete what it selects")
+
+    # Keygen command
+    subparsers.add_parser("keygen", help="Print a new random encryption key (for DBBACKUP_ENCRYPT_KEY)")
+
+    # Daemon command
+    daemon_parser = subparsers.add_parser("daemon", help="Back up many databases on cron schedules")
+    daemon_parser.add_argument("--config", help="JSON config listing the databases (defaults to DBBACKUP_DAEMON_CONFIG)")
+    daemon_parser.add_argument("--once", action="store_true", help="Back up every database once and exit")
+
+    # Point-in-time recovery (Postgres)
+    subparsers.add_parser("basebackup", help="Take a Postgres base backup for point-in-time recovery")
+    wal_push_parser = subparsers.add_parser("wal-push", help="Archive a WAL file (archive_command = 'fastapi-dbbackup wal-push %%p')")
+    wal_push_parser.add_argument("path", help="Path of the WAL file (%%p)")
+    wal_fetch_parser = subparsers.add_parser("wal-fetch", help="Restore an archived WAL file (used as restore_command)")
+    wal_fetch_parser.add_argument("name", help="Name of the WAL file (%%f)")
+    wal_fetch_parser.add_argument("path", help="Where to write it (%%p)")
+    pitr_parser = subparsers.add_parser("pitr-restore", help="Prepare a Postgres data directory that recovers to a point in time")
+    pitr_parser.add_argument("--pgdata", required=True, help="Empty directory for the restored cluster")
+    pitr_parser.add_argument("--target-time", help="Recover up to this time, e.g. '2026-01-31 22:05:00+00:00' (defaults to the end of the archive)")
+    pitr_parser.add_argument("--base", help="Base backup to start from (defaults to the newest one before the target)")
+    pitr_parser.add_argument("--restore-command", help="restore_command for the server (defaults to wal-fetch with this interpreter)")
+
     args = parser.parse_args()
 
     if args.command == "backup":
@@ -193,6 +657,26 @@ def main():
         cmd_restore(args)
     elif args.command == "list":
         cmd_list(args)
+    elif args.command == "reindex":
+        cmd_reindex(args)
+    elif args.command == "gc":
+        cmd_gc(args)
+    elif args.command == "verify":
+        cmd_verify(args)
+    elif args.command == "retention":
+        cmd_retention(args)
+    elif args.command == "keygen":
+        cmd_keygen(args)
+    elif args.command == "daemon":
+        cmd_daemon(args)
+    elif args.command == "basebackup":
+        cmd_basebackup(args)
+    elif args.command == "wal-push":
+        cmd_wal_push(args)
+    elif args.command == "wal-fetch":
+        cmd_wal_fetch(args)
+    elif args.command == "pitr-restore":
+        cmd_pitr_restore(args)
     else:
         parser.print_help()
 
@@ -1,19 +1,268 @@
 import gzip
-import shutil
+import io
+import lzma
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple
+from fastapi_dbbackup.streams import PeekableReader, copy_stream
 
-def compress(file: Path) -> Path:
-    gz_file = file.with_suffix(file.suffix + ".gz")
-    with open(file, "rb") as src, gzip.open(gz_file, "wb") as dst:
-        shutil.copyfileobj(src, dst)
+# Size of the independent blocks handed to the compression workers.
+BLOCK_SIZE = 1024 * 1024
+
+# Number of leading bytes needed to recognise any registered codec.
+MAGIC_SIZE = 8
+
+def _gzip_member(block: bytes, level: int) -> bytes:
+    # wbits=31 makes zlib emit a complete gzip member (header + trailer).
+    # zlib releases the GIL while deflating, so threads scale across cores.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(block) + compressor.flush()
+
+class ParallelGzipWriter(io.BufferedIOBase):
+    """
+    Write-only file object that compresses fixed-size blocks on a thread pool
+    and writes them, in order, as a multi-member gzip stream.
+    The output is readable by `gunzip` and `gzip.open`.
+    """
+
+    def __init__(
+        self,
+        fileobj: BinaryIO,
+        workers: Optional[int] = None,
+        level: int = 9,
+        block_size: int = BLOCK_SIZE,
+    ):
+        self.fileobj = fileobj
+        self.workers = workers or os.cpu_count() or 1
+        self.level = level
+        self.block_size = block_size
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._members = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        view = memoryview(data).cast("B")
+        self._buffer += view
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._submit(block)
+        return view.nbytes
+
+    def _submit(self, block: bytes):
+        # Bound memory: never keep more than two blocks per worker in flight.
+        if len(self._pending) >= self.workers * 2:
+            self.fileobj.write(self._pending.popleft().result())
+        self._pending.append(self._pool.submit(_gzip_member, block, self.level))
+        self._members += 1
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            # Always emit at least one member so empty input is still valid gzip.
+            if self._buffer or not self._members:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().result())
+            self.fileobj.flush()
+        finally:
+            for future in self._pending:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+            super().close()
+
+class Codec:
+    """
+    A compression format. Writers and readers wrap an existing binary file
+    object and never close it.
+    """
+    name = ""
+    suffix = ""
+    magic = b""
+    default_level = 0
+
+    def open_writer(self, fileobj: BinaryIO, level: Optional[int] = None, workers: Optional[int] = None) -> BinaryIO:
+        raise NotImplementedError
+
+    def open_reader(self, fileobj: BinaryIO) -> BinaryIO:
+        raise NotImplementedError
+
+class GzipCodec(Codec):
+    name = "gzip"
+    suffix = ".gz"
+    magic = b"\x1f\x8b"
+    default_level = 9
+
+    def open_writer(self, fileobj, level=None, workers=None):
+        return ParallelGzipWriter(fileobj, workers=workers, level=self.default_level if level is None else level)
+
+    def open_reader(self, fileobj):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+class XzCodec(Codec):
+    name = "xz"
+    suffix = ".xz"
+    magic = b"\xfd7zXZ\x00"
+    default_level = 6
+
+    def open_writer(self, fileobj, level=None, workers=None):
+        return lzma.LZMAFile(fileobj, "wb", preset=self.default_level if level is None else level)
+
+    def open_reader(self, fileobj):
+        return lzma.LZMAFile(fileobj, "rb")
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    suffix = ".zst"
+    magic = b"\x28\xb5\x2f\xfd"
+    default_level = 3
+
+    def _module(self):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd compression requires the 'zstandard' package: pip install fastapi-dbbackup[zstd]")
+        return zstandard
+
+    def open_writer(self, fileobj, level=None, workers=None):
+        zstandard = self._module()
+        compressor = zstandard.ZstdCompressor(
+            level=self.default_level if level is None else level,
+            threads=workers or -1,
+        )
+        return compressor.stream_writer(fileobj, closefd=False)
+
+    def open_reader(self, fileobj):
+        zstandard = self._module()
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True, closefd=False)
+
+class Lz4Codec(Codec):
+    name = "lz4"
+    suffix = ".lz4"
+    magic = b"\x04\x22\x4d\x18"
+    default_level = 0
+
+    def _module(self):
+        try:
+            import lz4.frame
+        except ImportError:
+            raise RuntimeError("lz4 compression requires the 'lz4' package: pip install fastapi-dbbackup[lz4]")
+        return lz4.frame
+
+    def open_writer(self, fileobj, level=None, workers=None):
+        frame = self._module()
+        return frame.LZ4FrameFile(fileobj, mode="wb", compression_level=self.default_level if level is None else level)
+
+    def open_reader(self, fileobj):
+        frame = self._module()
+        return frame.LZ4FrameFile(fileobj, mode="rb")
+
+CODECS: Dict[str, Codec] = {}
+
+def register_codec(codec: Codec):
+    CODECS[codec.name] = codec
+
+for _codec in (GzipCodec(), ZstdCodec(), Lz4Codec(), XzCodec()):
+    register_codec(_codec)
+
+def get_codec(name: str) -> Codec:
+    codec = CODECS.get(name)
+    if not codec:
+        raise ValueError(f"Unsupported compression codec: {name}")
+    return codec
+
+def parse_codec(value: str) -> Optional[Tuple[str, Optional[int]]]:
+    """
+    Parse a DBBACKUP_COMPRESS value such as `true`, `false`, `zstd` or `zstd:3`
+    into a (codec name, level) pair. Returns None when compression is disabled.
+    """
+    value = value.strip().lower()
+    if value in ("", "false", "0", "no", "off", "none"):
+        return None
+    if value in ("true", "1", "yes", "on"):
+        return "gzip", None
+
+    name, _, level = value.partition(":")
+    return name, int(level) if level else None
+
+def detect_codec(head: bytes) -> Optional[Codec]:
+    """Return the codec whose magic bytes start `head`, or None for raw data."""
+    for codec in CODECS.values():
+        if codec.magic and head.startswith(codec.magic):
+            return codec
+    return None
+
+def open_decompressed(fileobj: BinaryIO) -> BinaryIO:
+    """
+    Wrap a (possibly non-seekable) stream so that reading it yields the
+    decompressed bytes. The codec is detected from the magic bytes; raw
+    streams are passed through unchanged. Closing the result closes `fileobj`.
+    """
+    reader = PeekableReader(fileobj)
+    codec = detect_codec(reader.peek(MAGIC_SIZE))
+    if not codec:
+        return reader
+    return _ClosingReader(codec.open_reader(reader), reader)
+
+class _ClosingReader(io.RawIOBase):
+    # Codec readers leave the underlying stream open; close both together.
+    def __init__(self, decoder: BinaryIO, source: BinaryIO):
+        self.decoder = decoder
+        self.source = source
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        data = self.decoder.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.decoder.close()
+                self.source.close()
+            finally:
+                super().close()
+
+def compress(
+    file: Path,
+    workers: Optional[int] = None,
+    codec: str = "gzip",
+    level: Optional[int] = None,
+) -> Path:
+    codec_impl = get_codec(codec)
+    out_file = file.with_suffix(file.suffix + codec_impl.suffix)
+    with open(file, "rb") as src, open(out_file, "wb") as raw:
+        with codec_impl.open_writer(raw, level=level, workers=workers) as dst:
+            copy_stream(src, dst, BLOCK_SIZE)
     file.unlink()
-    return gz_file
+    return out_file
 
 def decompress(file: Path) -> Path:
-    if not file.suffix == ".gz":
+    with open(file, "rb") as f:
+        codec = detect_codec(f.read(MAGIC_SIZE))
+    if not codec:
         return file
-    
-    decompressed = file.with_suffix("")
-    with gzip.open(file, "rb") as src, open(decompressed, "wb") as dst:
-        shutil.copyfileobj(src, dst)
+
+    if file.suffix == codec.suffix:
+        decompressed = file.with_suffix("")
+    else:
+        decompressed = file.with_name(file.name + ".raw")
+    with open(file, "rb") as raw, open(decompressed, "wb") as dst:
+        with codec.open_reader(raw) as src:
+            copy_stream(src, dst, BLOCK_SIZE)
     return decompressed
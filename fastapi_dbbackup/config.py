@@ -1,32 +1,225 @@
+"""
+Settings read from environment variables (and a .env file, if present).
+
+Nothing is read at import time: `get_settings()` loads the environment on
+first use and returns the same Settings afterwards, and applications can
+build their own with `Settings(environ)`. The old module-level constants,
+e.g. `config.BACKUP_DIR`, still resolve to the shared settings.
+"""
 import os
+import tempfile
 from pathlib import Path
-from dotenv import load_dotenv, find_dotenv
-
-# Load environment variables from .env file if it exists
-load_dotenv(find_dotenv(usecwd=True))
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-ENGINE = os.getenv("DBBACKUP_ENGINE", "auto")
-
-BACKUP_DIR = Path(os.getenv("DBBACKUP_DIR", "backups"))
-COMPRESS = os.getenv("DBBACKUP_COMPRESS", "true").lower() == "true"
-STORAGE = os.getenv("DBBACKUP_STORAGE", "local")
-RETENTION_DAYS = int(os.getenv("DBBACKUP_RETENTION_DAYS", "0"))
-MAX_BACKUPS = int(os.getenv("DBBACKUP_MAX_BACKUPS", "0"))
-
-# S3 Settings
-# New AWS S3 Variable names provided by user
-AWS_S3_ACCESS_KEY_ID = os.getenv("AWS_S3_ACCESS_KEY_ID")
-AWS_S3_SECRET_ACCESS_KEY = os.getenv("AWS_S3_SECRET_ACCESS_KEY")
-AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL")
-AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
-AWS_S3_REGION = os.getenv("AWS_S3_REGION")
-AWS_S3_DEFAULT_ACL = os.getenv("AWS_S3_DEFAULT_ACL", "private")
-
-# Legacy/Alternative DBBACKUP_S3_* Variables
-S3_BUCKET = AWS_STORAGE_BUCKET_NAME or os.getenv("DBBACKUP_S3_BUCKET")
-S3_REGION = AWS_S3_REGION or os.getenv("DBBACKUP_S3_REGION")
-# BACKUP_DIR is used for both local storage path and S3 prefix
-
-if not DATABASE_URL and ENGINE == "auto":
-    raise RuntimeError("DATABASE_URL is required for automatic engine detection. Otherwise, set DBBACKUP_ENGINE.")
+from typing import Dict, List, Mapping, Optional, Tuple
+from fastapi_dbbackup.compress import parse_codec
+from fastapi_dbbackup.encrypt import CIPHERS
+
+_FALSE = ("", "false", "0", "no", "off", "none")
+RETENTION_MODES = ("inline", "offline", "lifecycle")
+
+def _list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+class Settings:
+    """
+    The configuration of the CLI and of the environment defaults used by the
+    FastAPI integration. Raises ValueError naming the variable if one is invalid.
+    """
+
+    def __init__(self, environ: Optional[Mapping[str, str]] = None):
+        self.environ = os.environ if environ is None else environ
+        env = self.environ.get
+
+        self.database_url = env("DATABASE_URL")
+        self.engine = env("DBBACKUP_ENGINE", "auto")
+
+        self.backup_dir = Path(env("DBBACKUP_DIR", "backups"))
+        # DBBACKUP_COMPRESS accepts true/false or a codec with an optional level, e.g. "zstd:3"
+        try:
+            self.compress_codec, self.compress_level = parse_codec(env("DBBACKUP_COMPRESS", "true")) or (None, None)
+        except ValueError as e:
+            raise ValueError(f"DBBACKUP_COMPRESS: {e}")
+        # Number of compression threads (0 = one per CPU core)
+        self.compress_workers = self._int("DBBACKUP_COMPRESS_WORKERS", 0) or None
+        # Parallel jobs for dump/restore tools that support them (0 = one per CPU core)
+        self.jobs = self._int("DBBACKUP_JOBS", 0) or os.cpu_count() or 1
+        # pg_dump output: "custom" (single file, streamable) or "directory" (parallel -Fd -j)
+        self.pg_format = env("DBBACKUP_PG_FORMAT", "custom").lower()
+        # Postgres point-in-time recovery: the storage prefix of base backups and archived WAL,
+        # segments uploaded/prefetched in parallel by wal-push/wal-fetch, and their local state
+        self.pitr_prefix = env("DBBACKUP_PITR_PREFIX", "pitr").strip("/")
+        self.wal_jobs = self._int("DBBACKUP_WAL_JOBS", 4)
+        self.wal_state_dir = Path(env("DBBACKUP_WAL_STATE_DIR") or Path(tempfile.gettempdir()) / "fastapi-dbbackup-wal")
+        # SQLite page-level incremental backups, with a new full backup every N increments
+        self.sqlite_incremental = self._bool("DBBACKUP_SQLITE_INCREMENTAL", False)
+        self.sqlite_full_every = self._int("DBBACKUP_SQLITE_FULL_EVERY", 24)
+        # Online SQLite backups copy this many pages per step (0 = all at once), pausing between steps
+        self.sqlite_step_pages = self._int("DBBACKUP_SQLITE_STEP_PAGES", 1024)
+        self.sqlite_step_sleep_ms = self._float("DBBACKUP_SQLITE_STEP_SLEEP_MS", 0)
+        # mysqldump output: "sql" (single file, streamable) or "tables" (parallel, one file per table)
+        self.mysql_format = env("DBBACKUP_MYSQL_FORMAT", "sql").lower()
+        # Comma-separated table name patterns (e.g. "audit_*") to back up, or to leave out
+        self.mysql_include_tables = _list(env("DBBACKUP_MYSQL_INCLUDE_TABLES", ""))
+        self.mysql_exclude_tables = _list(env("DBBACKUP_MYSQL_EXCLUDE_TABLES", ""))
+        self.storage = env("DBBACKUP_STORAGE", "local").lower()
+        self.retention_days = self._int("DBBACKUP_RETENTION_DAYS", 0)
+        self.max_backups = self._int("DBBACKUP_MAX_BACKUPS", 0)
+        # When retention runs: "inline" (after every backup), "offline" (only `retention apply`
+        # and the daemon's background pass) or "lifecycle" (offline, with S3 lifecycle rules
+        # expiring old backups storage-side)
+        self.retention_mode = env("DBBACKUP_RETENTION_MODE", "inline").lower()
+        if self.retention_mode not in RETENTION_MODES:
+            raise ValueError(f"DBBACKUP_RETENTION_MODE must be one of {', '.join(RETENTION_MODES)}, got {self.retention_mode!r}")
+        # Store backups as deduplicated, content-defined chunks
+        self.dedup = self._bool("DBBACKUP_DEDUP", False)
+        # Unreferenced chunks are only garbage-collected after this long, so uploads
+        # running in other processes keep the chunks they rely on
+        self.dedup_gc_grace_hours = self._float("DBBACKUP_DEDUP_GC_GRACE_HOURS", 24)
+        # Keep a .catalog.json manifest next to the backups instead of listing storage
+        self.catalog = self._bool("DBBACKUP_CATALOG", False)
+        # hashlib algorithm for backup checksums (e.g. sha256, blake2b), or "false" to disable.
+        # Stored in the catalog when enabled, otherwise in a hidden .<name>.checksum sidecar.
+        checksum = env("DBBACKUP_CHECKSUM", "sha256").lower()
+        self.checksum = None if checksum in _FALSE else checksum
+        # Encrypt backups after compression: true (= aes-256-gcm), aes-256-gcm or chacha20-poly1305.
+        # Keys come from DBBACKUP_ENCRYPT_KEY or DBBACKUP_ENCRYPT_KEY_FILE (base64 or hex, the
+        # first encrypts, all decrypt); they are also needed to restore, even with encryption off.
+        cipher = env("DBBACKUP_ENCRYPT", "false").lower()
+        self.encrypt_cipher = None if cipher in _FALSE else "aes-256-gcm" if cipher == "true" else cipher
+        if self.encrypt_cipher and self.encrypt_cipher not in CIPHERS:
+            raise ValueError(f"DBBACKUP_ENCRYPT must be true, false or one of {', '.join(CIPHERS)}, got {cipher!r}")
+        self.encrypt_key = env("DBBACKUP_ENCRYPT_KEY")
+        self.encrypt_key_file = env("DBBACKUP_ENCRYPT_KEY_FILE")
+        # Encryption threads (0 = one per CPU core) and the size of each authenticated chunk
+        self.encrypt_workers = self._int("DBBACKUP_ENCRYPT_WORKERS", 0) or None
+        self.encrypt_chunk_kb = self._int("DBBACKUP_ENCRYPT_CHUNK_KB", 1024)
+        # Prometheus text file with per-stage metrics of the latest runs (for node_exporter's textfile collector)
+        self.metrics_file = env("DBBACKUP_METRICS_FILE")
+        # Prometheus pushgateway URL, e.g. http://pushgateway:9091
+        self.metrics_pushgateway = env("DBBACKUP_METRICS_PUSHGATEWAY")
+        # Print a one-line JSON summary of every run
+        self.metrics_summary = self._bool("DBBACKUP_METRICS_SUMMARY", True)
+        # Emit OpenTelemetry spans for runs and stages (needs opentelemetry-api and a configured SDK)
+        self.otel = self._bool("DBBACKUP_OTEL", False)
+        # Rate limits in MB/s, optionally by time of day, e.g. "08:00-20:00=10,100" (see throttle.py):
+        # reading a streamed dump from the database tool, and uploading to remote storage
+        self.read_limit = env("DBBACKUP_READ_LIMIT")
+        self.upload_limit = env("DBBACKUP_UPLOAD_LIMIT")
+        # Run dump tools under `nice -n <N>` and `ionice -c <CLASS[:LEVEL]>`, e.g. 10 and "idle"
+        self.dump_nice = self._int("DBBACKUP_DUMP_NICE", None)
+        self.dump_ionice = env("DBBACKUP_DUMP_IONICE")
+
+        # S3 Settings
+        self.aws_s3_access_key_id = env("AWS_S3_ACCESS_KEY_ID")
+        self.aws_s3_secret_access_key = env("AWS_S3_SECRET_ACCESS_KEY")
+        self.aws_s3_endpoint_url = env("AWS_S3_ENDPOINT_URL")
+        self.aws_storage_bucket_name = env("AWS_STORAGE_BUCKET_NAME")
+        self.aws_s3_region = env("AWS_S3_REGION")
+        self.aws_s3_default_acl = env("AWS_S3_DEFAULT_ACL", "private")
+
+        # Multipart upload tuning for streamed backups
+        self.s3_part_size_mb = self._int("DBBACKUP_S3_PART_SIZE_MB", 16)
+        self.s3_concurrency = self._int("DBBACKUP_S3_CONCURRENCY", 8)
+        self.s3_max_buffer_mb = self._int("DBBACKUP_S3_MAX_BUFFER_MB", 256)
+        self.s3_part_retries = self._int("DBBACKUP_S3_PART_RETRIES", 5)
+        self.s3_part_timeout = self._float("DBBACKUP_S3_PART_TIMEOUT", 300)
+        # Spool streamed uploads to this directory so an interrupted upload resumes on the next run
+        self.s3_spool_dir = env("DBBACKUP_S3_SPOOL_DIR")
+        self.s3_spool_max_mb = self._int("DBBACKUP_S3_SPOOL_MAX_MB", 4096)
+        # Abort multipart uploads left behind for longer than this (0 = never)
+        self.s3_orphan_hours = self._float("DBBACKUP_S3_ORPHAN_HOURS", 24)
+        # Storage classes backups move to as they age, e.g. "30=STANDARD_IA,180=GLACIER" (lifecycle mode)
+        self.s3_transitions = self._transitions("DBBACKUP_S3_TRANSITIONS")
+        # Concurrent ranged downloads for streamed restores
+        self.s3_download_concurrency = self._int("DBBACKUP_S3_DOWNLOAD_CONCURRENCY", 8)
+        self.s3_download_window_mb = self._int("DBBACKUP_S3_DOWNLOAD_WINDOW_MB", 128)
+
+        # Store each backup on several targets, e.g. "local,s3,offsite". "local" and
+        # "s3" use the settings above; other names are S3 targets configured with
+        # DBBACKUP_TARGET_<NAME>_BUCKET / _REGION / _ENDPOINT_URL / _ACCESS_KEY_ID / _SECRET_ACCESS_KEY
+        self.targets = [t.lower() for t in _list(env("DBBACKUP_TARGETS", ""))]
+        # Data buffered per target before a slow target holds back the others
+        self.fanout_buffer_mb = self._int("DBBACKUP_FANOUT_BUFFER_MB", 64)
+        # Seconds a target may hold back the others before it is dropped
+        self.fanout_timeout = self._float("DBBACKUP_FANOUT_TIMEOUT", 60)
+
+        # Legacy/Alternative DBBACKUP_S3_* Variables
+        self.s3_bucket = self.aws_storage_bucket_name or env("DBBACKUP_S3_BUCKET")
+        self.s3_region = self.aws_s3_region or env("DBBACKUP_S3_REGION")
+        # backup_dir is used for both local storage path and S3 prefix
+
+        # Multi-database schedule for `fastapi-dbbackup daemon`
+        self.daemon_config = env("DBBACKUP_DAEMON_CONFIG")
+
+    @property
+    def compress(self) -> bool:
+        return self.compress_codec is not None
+
+    def target(self, name: str) -> Dict[str, Optional[str]]:
+        """S3 settings of a named backup target, falling back to the main S3 settings."""
+        prefix = f"DBBACKUP_TARGET_{name.upper()}_"
+        env = self.environ.get
+        return {
+            "bucket": env(prefix + "BUCKET"),
+            "region": env(prefix + "REGION", self.s3_region),
+            "endpoint_url": env(prefix + "ENDPOINT_URL", self.aws_s3_endpoint_url),
+            "access_key": env(prefix + "ACCESS_KEY_ID", self.aws_s3_access_key_id),
+            "secret_key": env(prefix + "SECRET_ACCESS_KEY", self.aws_s3_secret_access_key),
+        }
+
+    def _int(self, name: str, default: Optional[int]) -> Optional[int]:
+        value = self.environ.get(name)
+        if not value:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"{name} must be an integer, got {value!r}")
+
+    def _float(self, name: str, default: float) -> float:
+        value = self.environ.get(name)
+        if not value:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number, got {value!r}")
+
+    def _transitions(self, name: str) -> List[Tuple[int, str]]:
+        transitions = []
+        for item in _list(self.environ.get(name, "")):
+            days, _, storage_class = item.partition("=")
+            if not days.strip().isdigit() or not storage_class.strip():
+                raise ValueError(f"{name} must look like 30=STANDARD_IA,180=GLACIER, got {item!r}")
+            transitions.append((int(days), storage_class.strip().upper()))
+        return sorted(transitions)
+
+    def _bool(self, name: str, default: bool) -> bool:
+        value = self.environ.get(name)
+        if value is None:
+            return default
+        return value.lower() == "true"
+
+_settings: Optional[Settings] = None
+
+def get_settings() -> Settings:
+    """The settings of this process, loaded from the environment and .env on first use."""
+    global _settings
+    if _settings is None:
+        # Load environment variables from .env file if it exists
+        from dotenv import find_dotenv, load_dotenv
+        load_dotenv(find_dotenv(usecwd=True))
+        _settings = Settings()
+    return _settings
+
+def reset_settings():
+    """Forget the loaded settings, so the next `get_settings()` reads the environment again."""
+    global _settings
+    _settings = None
+
+def __getattr__(name: str):
+    # Backwards compatibility for the module-level constants, e.g. config.BACKUP_DIR
+    if name.isupper():
+        settings = get_settings()
+        if hasattr(settings, name.lower()):
+            return getattr(settings, name.lower())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
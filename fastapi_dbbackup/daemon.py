@@ -0,0 +1,269 @@
+"""
+Long-running scheduler that backs up many databases from one process.
+
+The config file is JSON. Top-level settings are defaults for every database:
+
+    {
+        "max_concurrent": 4,
+        "max_per_host": 1,
+        "schedule": "@daily",
+        "jitter": 300,
+        "databases": [
+            {"name": "orders", "url_env": "ORDERS_DATABASE_URL", "schedule": "*/30 * * * *"},
+            {"name": "auth", "url": "sqlite:///auth.sqlite3", "retention_days": 14}
+        ]
+    }
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from sqlalchemy.engine.url import make_url
+from fastapi_dbbackup import aio
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import Codec
+from fastapi_dbbackup.config import Settings
+from fastapi_dbbackup.encrypt import Encryptor
+from fastapi_dbbackup.metrics import MetricsExporter, RunMetrics
+from fastapi_dbbackup.retention import apply_offline_retention
+from fastapi_dbbackup.schedule import CronSchedule
+from fastapi_dbbackup.storage.base import StorageBackend
+
+DEFAULT_SCHEDULE = "@daily"
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+class DatabaseJob:
+    """One scheduled database: its engine and storage live as long as the daemon."""
+
+    def __init__(
+        self,
+        name: str,
+        engine: BackupEngine,
+        storage: StorageBackend,
+        schedule: CronSchedule,
+        host: str,
+        jitter: float = 0,
+        codec: Optional[Codec] = None,
+        level: Optional[int] = None,
+        retention_days: int = 0,
+        max_backups: int = 0,
+        encryptor: Optional[Encryptor] = None,
+    ):
+        self.name = name
+        self.engine = engine
+        self.storage = storage
+        self.schedule = schedule
+        self.host = host
+        self.jitter = jitter
+        self.codec = codec
+        self.level = level
+        self.retention_days = retention_days
+        self.max_backups = max_backups
+        self.encryptor = encryptor
+
+    def next_run(self, now: datetime) -> float:
+        """Seconds from `now` until the next scheduled run, including jitter."""
+        delay = (self.schedule.next_after(now) - now).total_seconds()
+        return delay + random.uniform(0, self.jitter)
+
+def host_key(db_url: str) -> str:
+    """Databases on the same server share a per-host concurrency limit."""
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite":
+        return "localhost"
+    return f"{url.host or 'localhost'}:{url.port or ''}"
+
+def load_config(path: Path) -> dict:
+    with open(path) as f:
+        config = json.load(f)
+    databases = config.get("databases")
+    if not databases:
+        raise ValueError(f"{path} lists no databases")
+    names = set()
+    for database in databases:
+        name = database.get("name", "")
+        if not NAME_PATTERN.match(name):
+            # The name is used as a storage prefix and directory
+            raise ValueError(f"Invalid database name: {name!r}")
+        if name in names:
+            raise ValueError(f"Duplicate database name: {name}")
+        names.add(name)
+        if not database.get("url") and not database.get("url_env"):
+            raise ValueError(f"Database {name} needs 'url' or 'url_env'")
+    return config
+
+class Daemon:
+    """
+    Runs each job on its cron schedule. At most `max_concurrent` backups run
+    at once, and at most `max_per_host` against the same database server.
+    Outside the "inline" `retention_mode`, retention runs after a backup has
+    released its slots rather than as part of it.
+    """
+
+    def __init__(
+        self,
+        jobs: List[DatabaseJob],
+        max_concurrent: int = 4,
+        max_per_host: int = 1,
+        workers: Optional[int] = None,
+        exporter: Optional[MetricsExporter] = None,
+        retention_mode: str = "inline",
+    ):
+        self.jobs = jobs
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_per_host = max(max_per_host, 1)
+        self.workers = workers
+        self.exporter = exporter
+        self.retention_mode = retention_mode
+        self._global: Optional[asyncio.Semaphore] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._stop: Optional[asyncio.Event] = None
+
+    def _start(self):
+        # Created inside the running loop (asyncio primitives bind to it on Python < 3.10)
+        self._global = asyncio.Semaphore(self.max_concurrent)
+        self._hosts = {job.host: asyncio.Semaphore(self.max_per_host) for job in self.jobs}
+        self._stop = asyncio.Event()
+
+    async def run_job(self, job: DatabaseJob) -> Optional[str]:
+        """Back up one database within the concurrency limits. Errors are reported, not raised."""
+        inline = self.retention_mode == "inline"
+        # Take the host slot first, so a job waiting on a busy host never holds a global slot
+        async with self._hosts[job.host], self._global:
+            print(f"[{job.name}] Starting backup...")
+            metrics = RunMetrics("backup", database=job.name)
+            try:
+                remote_path = await aio.run_backup(
+                    job.engine,
+                    job.storage,
+                    codec=job.codec,
+                    level=job.level,
+                    workers=self.workers,
+                    retention_days=job.retention_days if inline else 0,
+                    max_backups=job.max_backups if inline else 0,
+                    metrics=metrics,
+                    encryptor=job.encryptor,
+                )
+            except Exception as e:
+                print(f"[{job.name}] Error: {e}")
+                metrics.finish(e)
+                await self._export(metrics)
+                return None
+            print(f"[{job.name}] Backup successful: {remote_path}")
+            metrics.finish(backup=remote_path)
+            await self._export(metrics)
+
+        if not inline:
+            await self._apply_retention(job)
+        return remote_path
+
+    async def _apply_retention(self, job: DatabaseJob):
+        lifecycle = self.retention_mode == "lifecycle"
+        try:
+            await aio._run_sync(apply_offline_retention, job.storage, job.retention_days, job.max_backups, lifecycle)
+        except Exception as e:
+            # The backup itself succeeded; the next pass retries
+            print(f"[{job.name}] Retention failed: {e}")
+
+    async def _export(self, metrics: RunMetrics):
+        if self.exporter:
+            # Writing the textfile or pushing may block
+            await aio._run_sync(self.exporter.export, metrics)
+
+    async def _schedule(self, job: DatabaseJob):
+        while not self._stop.is_set():
+            delay = job.next_run(datetime.now())
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            await self.run_job(job)
+
+    def stop(self):
+        """Stop scheduling; backups already running are allowed to finish."""
+        if self._stop:
+            self._stop.set()
+
+    async def run(self):
+        self._start()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # Not supported on this platform or outside the main thread
+                pass
+        for job in self.jobs:
+            print(f"[{job.name}] Scheduled '{job.schedule.expression}', next run at {job.schedule.next_after(datetime.now()):%Y-%m-%d %H:%M}")
+        await asyncio.gather(*(self._schedule(job) for job in self.jobs))
+
+    async def run_once(self) -> List[Optional[str]]:
+        """Back up every database once, then return."""
+        self._start()
+        return await asyncio.gather(*(self.run_job(job) for job in self.jobs))
+
+def build_daemon(config: dict, settings: Optional[Settings] = None) -> Daemon:
+    """
+    Create the engines, storages and schedules described by a daemon config.
+    Settings it leaves out come from `settings`, by default the environment.
+    """
+    from fastapi_dbbackup import cli
+    from fastapi_dbbackup.compress import get_codec, parse_codec
+
+    settings = cli._settings(settings)
+    cli.check_lifecycle_mode(settings)
+    # One base storage (and so one S3 client and connection pool) for every database
+    base_storage = cli._get_base_storage(settings)
+    encryptor = cli.build_encryptor(settings)
+    jobs = []
+    for database in config["databases"]:
+        options = {**config, **database}
+        name = database["name"]
+        db_url = database.get("url") or os.getenv(database["url_env"])
+        if not db_url:
+            raise ValueError(f"Environment variable {database['url_env']} for {name} is not set")
+
+        if settings.dedup:
+            codec, level = None, None
+        elif "compress" in options:
+            codec_name, level = parse_codec(str(options["compress"])) or (None, None)
+            codec = get_codec(codec_name) if codec_name else None
+        else:
+            codec, level = cli.get_compress_codec(settings), settings.compress_level
+
+        engine = cli.build_engine(
+            db_url,
+            settings.backup_dir / name,
+            options.get("engine", "auto"),
+            include_tables=options.get("include_tables"),
+            exclude_tables=options.get("exclude_tables"),
+            settings=settings,
+        )
+        jobs.append(DatabaseJob(
+            name,
+            engine,
+            cli.wrap_storage(base_storage.with_prefix(name), engine, settings),
+            CronSchedule(options.get("schedule", DEFAULT_SCHEDULE)),
+            host_key(db_url),
+            jitter=float(options.get("jitter", 0)),
+            codec=codec,
+            level=level,
+            retention_days=int(options.get("retention_days", settings.retention_days)),
+            max_backups=int(options.get("max_backups", settings.max_backups)),
+            encryptor=encryptor,
+        ))
+
+    return Daemon(
+        jobs,
+        max_concurrent=int(config.get("max_concurrent", 4)),
+        max_per_host=int(config.get("max_per_host", 1)),
+        workers=settings.compress_workers,
+        exporter=cli.get_metrics_exporter(),
+        retention_mode=settings.retention_mode,
+    )
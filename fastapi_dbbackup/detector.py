@@ -1,6 +1,7 @@
-from sqlalchemy.engine.url import make_url
-
 def detect_backend(database_url: str) -> str:
+    # Imported here so commands that need no engine don't load SQLAlchemy
+    from sqlalchemy.engine.url import make_url
+
     backend = make_url(database_url).get_backend_name()
 
     if backend == "sqlite":
@@ -0,0 +1,372 @@
+"""
+Authenticated encryption of backups in independent fixed-size chunks.
+
+Backups are encrypted after compression, so they leave the host sealed.
+The stream is a header followed by chunks:
+
+    header  magic "DBBKENC1", cipher id, chunk size, 16-byte salt, key id
+    chunk   AEAD(chunk_key, nonce = chunk index + final flag, aad = header)
+
+Each file is encrypted with its own key, derived from the configured key
+and the file's random salt with HKDF-SHA256, so nonces never repeat across
+files. A chunk's nonce holds its index and whether it is the last one, so
+chunks cannot be reordered, dropped or truncated without failing
+authentication. Chunks are sealed and opened on a thread pool, and
+because every chunk has the same size on disk any range of a seekable
+file can be decrypted on its own (see EncryptedFile).
+
+Keys are 32 random bytes, written as base64 or hex (`fastapi-dbbackup
+keygen` prints one). Several keys can be given, separated by commas or
+newlines: the first encrypts, and all of them are tried by key id when
+decrypting, so keys can be rotated without losing access to old backups.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional
+from fastapi_dbbackup.streams import PeekableReader, copy_stream
+
+MAGIC = b"DBBKENC1"
+# magic, cipher id, chunk size, salt, key id, reserved
+HEADER = struct.Struct(">8sBI16s8s3x")
+TAG_SIZE = 16
+KEY_SIZE = 32
+CHUNK_SIZE = 1024 * 1024
+SUFFIX = ".enc"
+CIPHERS = {"aes-256-gcm": 1, "chacha20-poly1305": 2}
+
+def _aead(cipher_id: int, key: bytes):
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    except ImportError:
+        raise RuntimeError("Encryption requires the 'cryptography' package: pip install fastapi-dbbackup[encrypt]")
+    return AESGCM(key) if cipher_id == CIPHERS["aes-256-gcm"] else ChaCha20Poly1305(key)
+
+def _file_key(key: bytes, salt: bytes, cipher_id: int) -> bytes:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    return HKDF(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=salt, info=b"fastapi-dbbackup" + bytes([cipher_id])).derive(key)
+
+def _nonce(index: int, final: bool) -> bytes:
+    return struct.pack(">QI", index, final)
+
+def key_id(key: bytes) -> bytes:
+    """A short public identifier of `key`, stored in headers to pick the key for decryption."""
+    return hashlib.sha256(b"fastapi-dbbackup key id" + key).digest()[:8]
+
+def generate_key() -> str:
+    """A new random key, base64-encoded."""
+    return base64.b64encode(os.urandom(KEY_SIZE)).decode()
+
+def is_encrypted(head: bytes) -> bool:
+    return head.startswith(MAGIC)
+
+class Keyring:
+    """Encryption keys: the first encrypts, any of them decrypts."""
+
+    def __init__(self, keys: List[bytes]):
+        if not keys:
+            raise ValueError("No encryption key given")
+        for key in keys:
+            if len(key) != KEY_SIZE:
+                raise ValueError(f"Encryption keys must be {KEY_SIZE} bytes, got {len(key)}")
+        self.keys = keys
+        self._by_id: Dict[bytes, bytes] = {key_id(key): key for key in keys}
+
+    @classmethod
+    def from_text(cls, text: str) -> "Keyring":
+        """Keys written as base64 or hex, separated by commas, whitespace or newlines."""
+        keys = []
+        for item in text.replace(",", " ").split():
+            try:
+                keys.append(bytes.fromhex(item) if len(item) == KEY_SIZE * 2 else base64.b64decode(item, validate=True))
+            except (ValueError, binascii.Error):
+                raise ValueError("Encryption keys must be base64 or hex (create one with `fastapi-dbbackup keygen`)")
+        return cls(keys)
+
+    @property
+    def current(self) -> bytes:
+        return self.keys[0]
+
+    def find(self, kid: bytes) -> bytes:
+        key = self._by_id.get(kid)
+        if key is None:
+            raise ValueError(f"Backup was encrypted with a key that is not configured (key id {kid.hex()})")
+        return key
+
+class _Header:
+    # The parsed header, with the cipher for the file's own key
+    def __init__(self, raw: bytes, keyring: Keyring):
+        magic, self.cipher_id, self.chunk_size, salt, kid = HEADER.unpack(raw)
+        if magic != MAGIC:
+            raise ValueError("Not an encrypted backup")
+        if self.cipher_id not in CIPHERS.values() or not self.chunk_size:
+            raise ValueError("Unsupported or corrupt encryption header")
+        self.raw = raw
+        self.aead = _aead(self.cipher_id, _file_key(keyring.find(kid), salt, self.cipher_id))
+
+    def open(self, index: int, final: bool, sealed: bytes) -> bytes:
+        from cryptography.exceptions import InvalidTag
+        try:
+            return self.aead.decrypt(_nonce(index, final), sealed, self.raw)
+        except InvalidTag:
+            raise ValueError(f"Encrypted backup is corrupt or truncated (chunk {index} failed authentication)")
+
+def _read_exact(fileobj: BinaryIO, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = fileobj.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+class Encryptor:
+    """
+    Seals backups with the keyring's current key and `cipher`, `workers`
+    chunks at a time (defaults to all cores).
+    """
+    suffix = SUFFIX
+
+    def __init__(self, keyring: Keyring, cipher: str = "aes-256-gcm", workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE):
+        if cipher not in CIPHERS:
+            raise ValueError(f"Unsupported cipher '{cipher}', expected one of {', '.join(CIPHERS)}")
+        self.keyring = keyring
+        self.cipher = cipher
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def open_writer(self, fileobj: BinaryIO) -> "EncryptingWriter":
+        """A writer that encrypts into `fileobj`; closing it writes the last chunk but leaves `fileobj` open."""
+        return EncryptingWriter(fileobj, self)
+
+class EncryptingWriter(io.BufferedIOBase):
+    """
+    Write-only file object that seals fixed-size chunks on a thread pool
+    and writes them in order, like compress.ParallelGzipWriter.
+    """
+
+    def __init__(self, fileobj: BinaryIO, encryptor: Encryptor):
+        cipher_id = CIPHERS[encryptor.cipher]
+        salt = os.urandom(16)
+        key = encryptor.keyring.current
+        # Before any attribute, so a missing `cryptography` fails without a half-built writer
+        self._aead = _aead(cipher_id, _file_key(key, salt, cipher_id))
+        self.fileobj = fileobj
+        self.workers = encryptor.workers
+        self.chunk_size = encryptor.chunk_size
+        self._header = HEADER.pack(MAGIC, cipher_id, self.chunk_size, salt, key_id(key))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._index = 0
+        self.fileobj.write(self._header)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        view = memoryview(data).cast("B")
+        size = view.nbytes
+        # Keep at least one byte back: only close() knows which chunk is the last
+        if self._buffer:
+            take = min(self.chunk_size - len(self._buffer), size)
+            self._buffer += view[:take]
+            view = view[take:]
+            if not view:
+                return size
+            self._submit(bytes(self._buffer), final=False)
+            self._buffer.clear()
+        # Whole chunks are sealed straight from the caller's data
+        while view.nbytes > self.chunk_size:
+            self._submit(bytes(view[:self.chunk_size]), final=False)
+            view = view[self.chunk_size:]
+        self._buffer += view
+        return size
+
+    def _submit(self, chunk: bytes, final: bool):
+        # Bound memory: never keep more than two chunks per worker in flight
+        if len(self._pending) >= self.workers * 2:
+            self.fileobj.write(self._pending.popleft().result())
+        self._pending.append(self._pool.submit(self._aead.encrypt, _nonce(self._index, final), chunk, self._header))
+        self._index += 1
+
+    def close(self):
+        if self.closed or not hasattr(self, "_pool"):
+            return
+        try:
+            self._submit(bytes(self._buffer), final=True)
+            self._buffer.clear()
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().result())
+            self.fileobj.flush()
+        finally:
+            for future in self._pending:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+            super().close()
+
+class DecryptingReader(io.RawIOBase):
+    """
+    Read-only stream of the plaintext of an encrypted (possibly non-seekable)
+    stream. Chunks are read ahead and opened on a thread pool; reading
+    raises ValueError at the first chunk that fails authentication.
+    Closing it closes `fileobj`.
+    """
+
+    def __init__(self, fileobj: BinaryIO, keyring: Keyring, workers: Optional[int] = None):
+        self.fileobj = fileobj
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._pending = deque()
+        self._header = _Header(_read_exact(fileobj, HEADER.size), keyring)
+        self._sealed_size = self._header.chunk_size + TAG_SIZE
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._plain = b""
+        self._offset = 0
+        self._index = 0
+        # One chunk of look-ahead tells whether the current chunk is the last
+        self._next = _read_exact(fileobj, self._sealed_size)
+        self._done = False
+        if not self._next:
+            raise ValueError("Encrypted backup is truncated (no chunks)")
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self):
+        while not self._done and len(self._pending) < self.workers * 2:
+            sealed, self._next = self._next, _read_exact(self.fileobj, self._sealed_size)
+            final = not self._next
+            self._pending.append(self._pool.submit(self._header.open, self._index, final, sealed))
+            self._index += 1
+            self._done = final
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        while self._offset == len(self._plain):
+            self._fill()
+            if not self._pending:
+                return 0
+            self._plain, self._offset = self._pending.popleft().result(), 0
+        n = min(len(view), len(self._plain) - self._offset)
+        view[:n] = memoryview(self._plain)[self._offset:self._offset + n]
+        self._offset += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            try:
+                for future in self._pending:
+                    future.cancel()
+                if self._pool:
+                    self._pool.shutdown(wait=True)
+                self.fileobj.close()
+            finally:
+                super().close()
+
+class EncryptedFile(io.RawIOBase):
+    """
+    Seekable plaintext view of an encrypted file: reading at any offset
+    decrypts only the chunks that cover it.
+    """
+
+    def __init__(self, fileobj: BinaryIO, keyring: Keyring):
+        self.fileobj = fileobj
+        fileobj.seek(0)
+        self._header = _Header(_read_exact(fileobj, HEADER.size), keyring)
+        self._sealed_size = self._header.chunk_size + TAG_SIZE
+        sealed_total = fileobj.seek(0, io.SEEK_END) - HEADER.size
+        self._chunks = max(-(-sealed_total // self._sealed_size), 1)
+        last = sealed_total - (self._chunks - 1) * self._sealed_size - TAG_SIZE
+        if last < 0:
+            raise ValueError("Encrypted backup is truncated")
+        self.size = (self._chunks - 1) * self._header.chunk_size + last
+        self._position = 0
+        self._cached = (-1, b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def read_chunk(self, index: int) -> bytes:
+        """The plaintext of chunk `index`, authenticated."""
+        if self._cached[0] != index:
+            self.fileobj.seek(HEADER.size + index * self._sealed_size)
+            sealed = _read_exact(self.fileobj, self._sealed_size)
+            self._cached = (index, self._header.open(index, index == self._chunks - 1, sealed))
+        return self._cached[1]
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        n = 0
+        # Fill the buffer across chunk boundaries, so reads are only short at the end
+        while n < len(view) and self._position < self.size:
+            index, offset = divmod(self._position, self._header.chunk_size)
+            data = self.read_chunk(index)[offset:offset + len(view) - n]
+            view[n:n + len(data)] = data
+            n += len(data)
+            self._position += len(data)
+        return n
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.fileobj.close()
+            finally:
+                super().close()
+
+def open_decrypted(fileobj: BinaryIO, keyring: Optional[Keyring] = None, workers: Optional[int] = None) -> BinaryIO:
+    """
+    Wrap a (possibly non-seekable) stream so that reading it yields the
+    plaintext if it is encrypted; other streams pass through unchanged.
+    Raises ValueError for an encrypted stream without a keyring. Closing
+    the result closes `fileobj`.
+    """
+    reader = PeekableReader(fileobj)
+    if not is_encrypted(reader.peek(len(MAGIC))):
+        return reader
+    if keyring is None:
+        raise ValueError("Backup is encrypted; set DBBACKUP_ENCRYPT_KEY or DBBACKUP_ENCRYPT_KEY_FILE to read it")
+    return DecryptingReader(reader, keyring, workers=workers)
+
+def encrypt_file(file: Path, encryptor: Encryptor) -> Path:
+    """Encrypt `file` into `<file>.enc` and remove the plaintext."""
+    out_file = file.with_name(file.name + encryptor.suffix)
+    with open(file, "rb") as src, open(out_file, "wb") as raw:
+        with encryptor.open_writer(raw) as dst:
+            copy_stream(src, dst, encryptor.chunk_size)
+    file.unlink()
+    return out_file
+
+def decrypt_file(file: Path, keyring: Optional[Keyring] = None) -> Path:
+    """
+    Decrypt `file` next to it (dropping a `.enc` suffix) and return the new
+    path; returns `file` itself if it is not encrypted.
+    """
+    with open(file, "rb") as f:
+        if not is_encrypted(f.read(len(MAGIC))):
+            return file
+    out_file = file.with_name(file.name[:-len(SUFFIX)] if file.name.endswith(SUFFIX) else file.name + ".dec")
+    with open_decrypted(open(file, "rb"), keyring) as src, open(out_file, "wb") as dst:
+        copy_stream(src, dst)
+    return out_file
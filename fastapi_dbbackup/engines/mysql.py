@@ -1,69 +1,467 @@
+import fnmatch
+import io
+import json
 import os
+import re
+import shutil
 import subprocess
+import tarfile
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, List, Optional, Tuple
 from sqlalchemy.engine.url import make_url
 from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.config import Settings
+from fastapi_dbbackup.streams import PeekableReader
+
+MB = 1024 * 1024
+DUMP_COMPLETED = b"-- Dump completed"
+ARCHIVE_FORMAT = "fastapi-dbbackup-mysql-tables"
+INDEX_NAME = "index.json"
+HEADER_NAME = "header.sql"
+VIEWS_NAME = "views.sql"
+
+# mysqldump writes this comment before each table, after its snapshot has started
+TABLE_MARKER = re.compile(rb"^-- Table structure for table `((?:[^`]|``)+)`$")
+# First line of the footer that restores the session settings
+FOOTER_START = b"/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;"
+# Secondary indexes and foreign keys in a mysqldump CREATE TABLE statement
+DEFERRABLE_KEY = re.compile(rb"^\s+(?:(?:UNIQUE|FULLTEXT|SPATIAL) )?KEY `(?:[^`]|``)+` \(`((?:[^`]|``)+)`")
+FOREIGN_KEY = re.compile(rb"^\s+CONSTRAINT `(?:[^`]|``)+` FOREIGN KEY ")
+AUTO_INCREMENT_COLUMN = re.compile(rb"^\s+`((?:[^`]|``)+)` .*\bAUTO_INCREMENT\b")
+
+def _quote(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+def _unquote(name: bytes) -> str:
+    return name.replace(b"``", b"`").decode()
+
+def _is_tar_header(head: bytes) -> bool:
+    return head[257:262] == b"ustar"
+
+def _matches(name: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+def _balance(tables: List[Tuple[str, int]], groups: int) -> List[List[str]]:
+    """Split tables into `groups` lists of similar total size, largest tables first."""
+    buckets = [[0, []] for _ in range(max(min(groups, len(tables)), 1))]
+    for name, size in sorted(tables, key=lambda t: -t[1]):
+        bucket = min(buckets, key=lambda b: b[0])
+        bucket[0] += size
+        bucket[1].append(name)
+    return [names for _, names in buckets if names]
+
+def _defer_keys(create: List[bytes]) -> Tuple[List[bytes], List[bytes], List[bytes]]:
+    """
+    Remove secondary indexes and foreign keys from a CREATE TABLE statement's
+    lines. Returns (lines, index clauses, foreign key clauses). Indexes on the
+    AUTO_INCREMENT column stay, since MySQL requires one.
+    """
+    auto_increment = None
+    for line in create:
+        match = AUTO_INCREMENT_COLUMN.match(line)
+        if match:
+            auto_increment = match.group(1)
+            break
+
+    kept, indexes, foreign_keys = [], [], []
+    for line in create:
+        key = DEFERRABLE_KEY.match(line)
+        if key and key.group(1) != auto_increment:
+            indexes.append(b"ADD " + line.strip().rstrip(b","))
+        elif FOREIGN_KEY.match(line):
+            foreign_keys.append(b"ADD " + line.strip().rstrip(b","))
+        else:
+            kept.append(line)
+    if len(kept) < len(create):
+        # The last definition before the closing parenthesis must not end with a comma
+        closing = next(i for i in range(len(kept) - 1, -1, -1) if kept[i].startswith(b")"))
+        kept[closing - 1] = kept[closing - 1].rstrip(b"\n").rstrip(b",") + b"\n"
+    return kept, indexes, foreign_keys
+
+class _ConcatReader(io.RawIOBase):
+    def __init__(self, *parts: BinaryIO):
+        self._parts = list(parts)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._parts:
+            data = self._parts[0].read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                return len(data)
+            self._parts.pop(0)
+        return 0
 
 class MySQLBackup(BackupEngine):
-    def backup(self) -> Path:
-        url = make_url(self.db_url)
-        outfile = self.output_dir / f"default-{datetime.now():%Y%m%d-%H%M%S}.dump"
+    name = "mysql"
+
+    def __init__(
+        self,
+        db_url: str,
+        output_dir: Path,
+        jobs: Optional[int] = None,
+        dump_format: str = "sql",
+        include_tables: Optional[List[str]] = None,
+        exclude_tables: Optional[List[str]] = None,
+    ):
+        super().__init__(db_url, output_dir, jobs=jobs)
+        if dump_format not in ("sql", "tables"):
+            raise ValueError(f"Unsupported mysqldump format: {dump_format}")
+        self.dump_format = dump_format
+        # Shell-style patterns, e.g. "audit_*"
+        self.include_tables = include_tables or []
+        self.exclude_tables = exclude_tables or []
 
+    @classmethod
+    def from_settings(
+        cls,
+        db_url: str,
+        output_dir: Path,
+        settings: Settings,
+        include_tables: Optional[List[str]] = None,
+        exclude_tables: Optional[List[str]] = None,
+        **options,
+    ) -> "MySQLBackup":
+        """Table filters default to DBBACKUP_MYSQL_INCLUDE_TABLES/EXCLUDE_TABLES."""
+        return cls(
+            db_url,
+            output_dir,
+            jobs=settings.jobs,
+            dump_format=settings.mysql_format,
+            include_tables=settings.mysql_include_tables if include_tables is None else include_tables,
+            exclude_tables=settings.mysql_exclude_tables if exclude_tables is None else exclude_tables,
+        )
+
+    def _client_args(self, url) -> Tuple[List[str], dict]:
         env = os.environ.copy()
         if url.password:
             env["MYSQL_PWD"] = url.password
 
-        cmd = ["mysqldump"]
+        args = []
         if url.host:
-            cmd.extend(["-h", url.host])
+            args.extend(["-h", url.host])
         if url.port:
-            cmd.extend(["-P", str(url.port)])
+            args.extend(["-P", str(url.port)])
         if url.username:
-            cmd.extend(["-u", url.username])
-        
-        cmd.append(url.database)
+            args.extend(["-u", url.username])
+        return args, env
+
+    def _dump_command(self, url):
+        args, env = self._client_args(url)
+        # A consistent InnoDB snapshot without locking tables, streamed row by row
+        cmd = ["mysqldump", "--single-transaction", "--quick"] + args
+        return cmd, env
+
+    def _list_tables(self, url) -> List[Tuple[str, str, int]]:
+        """(name, type, size) of every table and view in the database."""
+        args, env = self._client_args(url)
+        query = (
+            "SELECT TABLE_NAME, TABLE_TYPE, COALESCE(DATA_LENGTH, 0) + COALESCE(INDEX_LENGTH, 0) "
+            "FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+        )
+        result = subprocess.run(
+            ["mysql", "-N", "-B", "-r"] + args + ["-e", query, url.database],
+            check=True, capture_output=True, env=env,
+        )
+        tables = []
+        for line in result.stdout.decode().splitlines():
+            name, table_type, size = line.split("\t")
+            tables.append((name, table_type, int(size)))
+        return tables
 
-        with open(outfile, "w") as f:
-            subprocess.run(cmd, stdout=f, check=True, env=env)
+    def _selected(self, name: str) -> bool:
+        if self.include_tables and not _matches(name, self.include_tables):
+            return False
+        return not _matches(name, self.exclude_tables)
+
+    def _filter_args(self, url) -> List[str]:
+        """Table arguments for mysqldump that apply the include/exclude filters."""
+        if not self.include_tables and not self.exclude_tables:
+            return [url.database]
+        names = [name for name, _, _ in self._list_tables(url)]
+        if self.include_tables:
+            selected = [name for name in names if self._selected(name)]
+            if not selected:
+                raise ValueError("No tables match the include/exclude filters")
+            return [url.database] + selected
+        return [f"--ignore-table={url.database}.{name}" for name in names if not self._selected(name)] + [url.database]
+
+    def backup(self) -> Path:
+        if self.dump_format == "tables":
+            return self._backup_tables()
+
+        url = make_url(self.db_url)
+        outfile = self.output_dir / f"default-{datetime.now():%Y%m%d-%H%M%S}.dump"
+        cmd, env = self._dump_command(url)
+        cmd.extend(self._filter_args(url))
+
+        with open(outfile, "wb") as f:
+            subprocess.run(self.prioritized(cmd), stdout=f, check=True, env=env)
 
         return outfile
 
-    def backup_stream(self) -> BinaryIO:
+    def stream_command(self):
+        # A per-table archive is assembled from several dumps and cannot be streamed
+        if self.dump_format == "tables":
+            return None
+
         url = make_url(self.db_url)
-        env = os.environ.copy()
-        if url.password:
-            env["MYSQL_PWD"] = url.password
+        cmd, env = self._dump_command(url)
+        cmd.extend(self._filter_args(url))
+        return cmd, env
 
-        cmd = ["mysqldump"]
-        if url.host:
-            cmd.extend(["-h", url.host])
-        if url.port:
-            cmd.extend(["-P", str(url.port)])
-        if url.username:
-            cmd.extend(["-u", url.username])
-        
-        cmd.append(url.database)
+    def _lock_for_snapshot(self, url) -> Optional[subprocess.Popen]:
+        """
+        Hold FLUSH TABLES WITH READ LOCK in a control session while the dump
+        workers open their snapshots, so all of them see the same point in time.
+        """
+        args, env = self._client_args(url)
+        control = subprocess.Popen(
+            ["mysql", "-N", "-B"] + args + [url.database],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+        )
+        control.stdin.write(b"FLUSH TABLES WITH READ LOCK;\nSELECT 'locked';\n")
+        control.stdin.flush()
+        if control.stdout.readline().strip() == b"locked":
+            return control
+        control.kill()
+        error = control.communicate()[1].decode().strip()
+        print(f"Warning: could not take a global read lock ({error}); tables are consistent per dump worker only")
+        return None
 
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env)
-        return process.stdout
+    def _dump_group(self, cmd: List[str], env: dict, dump_dir: Path, prefix: str, started: threading.Event) -> Tuple[bytes, List[dict]]:
+        """
+        Run one mysqldump over several tables, splitting its output into a file
+        per table. Returns the session header and the tables written.
+        """
+        process = subprocess.Popen(self.prioritized(cmd), stdout=subprocess.PIPE, env=env)
+        tables = []
+        header = []
+        out = None
+        try:
+            for line in process.stdout:
+                marker = TABLE_MARKER.match(line.rstrip(b"\n"))
+                if marker:
+                    # This worker's snapshot is open once it reaches its first table
+                    started.set()
+                    if out:
+                        out.close()
+                    tables.append({"name": _unquote(marker.group(1)), "file": f"{prefix}-{len(tables)}.sql"})
+                    out = open(dump_dir / tables[-1]["file"], "wb")
+                    # Keep the comment block that opens on the previous line
+                    out.write(b"--\n")
+                elif line.startswith(FOOTER_START):
+                    break
+                if out:
+                    out.write(line)
+                else:
+                    header.append(line)
+            # Drain the footer
+            for _ in process.stdout:
+                pass
+        finally:
+            started.set()
+            if out:
+                out.close()
+        returncode = process.wait()
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, cmd)
 
-    def restore(self, backup_path: Path):
+        # Drop the "--" that opens the first table's comment block
+        while header and header[-1].strip() == b"--":
+            header.pop()
+        return b"".join(header), tables
+
+    def _backup_tables(self) -> Path:
+        """
+        Dump tables with `jobs` concurrent mysqldump workers inside one
+        consistent snapshot, into a tar of one SQL file per table plus an index.
+        """
         url = make_url(self.db_url)
-        env = os.environ.copy()
-        if url.password:
-            env["MYSQL_PWD"] = url.password
+        name = f"default-{datetime.now():%Y%m%d-%H%M%S}"
+        dump_dir = self.output_dir / name
+        outfile = self.output_dir / f"{name}.tar"
+        listing = [t for t in self._list_tables(url) if self._selected(t[0])]
+        base_tables = [(n, size) for n, table_type, size in listing if table_type == "BASE TABLE"]
+        views = [n for n, table_type, _ in listing if table_type == "VIEW"]
+        if not base_tables:
+            raise ValueError("No tables match the include/exclude filters")
 
-        cmd = ["mysql"]
-        if url.host:
-            cmd.extend(["-h", url.host])
-        if url.port:
-            cmd.extend(["-P", str(url.port)])
-        if url.username:
-            cmd.extend(["-u", url.username])
-        
+        cmd, env = self._dump_command(url)
+        groups = _balance(base_tables, self.jobs)
+        dump_dir.mkdir()
+        try:
+            control = self._lock_for_snapshot(url)
+            events = [threading.Event() for _ in groups]
+            try:
+                with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+                    futures = [
+                        pool.submit(self._dump_group, cmd + [url.database] + group, env, dump_dir, f"part{i}", event)
+                        for i, (group, event) in enumerate(zip(groups, events))
+                    ]
+                    for event in events:
+                        event.wait()
+                    if control:
+                        # Every worker has its snapshot; let writes resume
+                        control.communicate(b"UNLOCK TABLES;\n")
+                        control = None
+                    results = [f.result() for f in futures]
+                    dumped = {t["name"]: t for _, group in results for t in group}
+            finally:
+                if control:
+                    control.kill()
+                    control.wait()
+
+            # Every worker writes the same session settings
+            (dump_dir / HEADER_NAME).write_bytes(results[0][0])
+            if views:
+                with open(dump_dir / VIEWS_NAME, "wb") as f:
+                    subprocess.run(self.prioritized(cmd + ["--no-data", url.database] + views), stdout=f, check=True, env=env)
+
+            # Rename the table files in dump order
+            tables = []
+            for i, (table, _) in enumerate(sorted(base_tables)):
+                entry = dumped[table]
+                path = dump_dir / f"{i:05d}.sql"
+                (dump_dir / entry["file"]).rename(path)
+                tables.append({"name": table, "file": path.name, "size": path.stat().st_size})
+            index = {
+                "format": ARCHIVE_FORMAT,
+                "version": 1,
+                "database": url.database,
+                "tables": tables,
+                "views": VIEWS_NAME if views else None,
+            }
+            (dump_dir / INDEX_NAME).write_text(json.dumps(index, indent=1))
+
+            with tarfile.open(outfile, "w") as tar:
+                # The index goes first so readers can plan before the table data arrives
+                for path in [dump_dir / INDEX_NAME] + sorted(p for p in dump_dir.iterdir() if p.name != INDEX_NAME):
+                    tar.add(str(path), arcname=path.name)
+        finally:
+            shutil.rmtree(dump_dir, ignore_errors=True)
+
+        return outfile
+
+    def _restore_command(self, url):
+        args, env = self._client_args(url)
+        cmd = ["mysql"] + args
         cmd.append(url.database)
+        return cmd, env
+
+    def restore(self, backup_path: Path):
+        if tarfile.is_tarfile(str(backup_path)):
+            with tempfile.TemporaryDirectory(dir=self.output_dir) as tmp:
+                with tarfile.open(backup_path) as tar:
+                    self._extract(tar, Path(tmp))
+                self._restore_tables(Path(tmp))
+            return
+
+        cmd, env = self._restore_command(make_url(self.db_url))
 
         with open(backup_path, "r") as f:
             subprocess.run(cmd, stdin=f, check=True, env=env)
+
+    def restore_stream(self, fileobj: BinaryIO) -> bool:
+        reader = PeekableReader(fileobj)
+        if _is_tar_header(reader.peek(512)):
+            # Per-table archive: unpack as it arrives, then load tables in parallel
+            with tempfile.TemporaryDirectory(dir=self.output_dir) as tmp:
+                with tarfile.open(fileobj=reader, mode="r|") as tar:
+                    self._extract(tar, Path(tmp))
+                self._restore_tables(Path(tmp))
+            return True
+
+        cmd, env = self._restore_command(make_url(self.db_url))
+        self._pipe_to_command(cmd, reader, env)
+        return True
+
+    def _extract(self, tar: tarfile.TarFile, dest: Path):
+        for member in tar:
+            if not member.isfile():
+                continue
+            # Archives are flat: an index, a header and one file per table
+            name = Path(member.name).name
+            if not name or name != member.name:
+                raise ValueError(f"Unexpected path in dump archive: {member.name}")
+            with open(dest / name, "wb") as dst:
+                shutil.copyfileobj(tar.extractfile(member), dst, MB)
+
+    def _load_table(self, directory: Path, header: bytes, table: dict) -> Tuple[List[bytes], List[bytes]]:
+        """Load one table with its secondary indexes and foreign keys left out; returns them."""
+        cmd, env = self._restore_command(make_url(self.db_url))
+        with open(directory / table["file"], "rb") as f:
+            # The CREATE TABLE statement is near the top; read up to its end
+            prefix, create = [], None
+            for line in f:
+                if create is not None:
+                    create.append(line)
+                    if line.startswith(b")"):
+                        break
+                elif line.startswith(b"CREATE TABLE"):
+                    create = [line]
+                else:
+                    prefix.append(line)
+            kept, indexes, foreign_keys = _defer_keys(create or [])
+            head = io.BytesIO(header + b"".join(prefix + kept))
+            self._pipe_to_command(cmd, _ConcatReader(head, f), env)
+        return indexes, foreign_keys
+
+    def _alter(self, header: bytes, table: str, clauses: List[bytes]):
+        cmd, env = self._restore_command(make_url(self.db_url))
+        statement = b"ALTER TABLE " + _quote(table).encode() + b" " + b", ".join(clauses) + b";\n"
+        self._pipe_to_command(cmd, io.BytesIO(header + statement), env)
+
+    def _restore_tables(self, directory: Path):
+        """
+        Load every table in parallel without its secondary indexes and foreign
+        keys, then build the indexes (in parallel) and add the foreign keys.
+        """
+        index = json.loads((directory / INDEX_NAME).read_text())
+        if index.get("format") != ARCHIVE_FORMAT:
+            raise ValueError("Not a per-table MySQL archive")
+        header = (directory / HEADER_NAME).read_bytes()
+        tables = index["tables"]
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            deferred = list(pool.map(lambda t: self._load_table(directory, header, t), tables))
+            alters = [(t["name"], indexes) for t, (indexes, _) in zip(tables, deferred) if indexes]
+            list(pool.map(lambda a: self._alter(header, *a), alters))
+            alters = [(t["name"], foreign_keys) for t, (_, foreign_keys) in zip(tables, deferred) if foreign_keys]
+            list(pool.map(lambda a: self._alter(header, *a), alters))
+
+        if index.get("views"):
+            cmd, env = self._restore_command(make_url(self.db_url))
+            with open(directory / index["views"], "rb") as f:
+                self._pipe_to_command(cmd, f, env)
+
+    def verify_stream(self, fileobj: BinaryIO) -> bool:
+        reader = PeekableReader(fileobj)
+        if _is_tar_header(reader.peek(512)):
+            # Per-table archive: every file the index lists must be present and complete
+            index, sizes = None, {}
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                for member in tar:
+                    sizes[member.name] = member.size
+                    if member.name == INDEX_NAME:
+                        index = json.load(tar.extractfile(member))
+            if not index or index.get("format") != ARCHIVE_FORMAT:
+                raise ValueError("Dump archive has no index")
+            missing = [t["name"] for t in index["tables"] if sizes.get(t["file"]) != t["size"]]
+            if HEADER_NAME not in sizes or missing:
+                raise ValueError(f"Dump archive is incomplete: {', '.join(missing) or HEADER_NAME}")
+            return True
+
+        # mysqldump ends every complete dump with a "-- Dump completed" comment
+        tail = b""
+        for chunk in iter(lambda: reader.read(MB), b""):
+            tail = (tail + chunk)[-256:]
+        if DUMP_COMPLETED not in tail:
+            raise ValueError("Dump is incomplete: the '-- Dump completed' trailer is missing")
+        return True
@@ -1,16 +1,45 @@
 import os
+import re
+import shutil
 import subprocess
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Optional
 from sqlalchemy.engine.url import make_url
 from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.config import Settings
+from fastapi_dbbackup.streams import PeekableReader, copy_stream
+
+# backup_label line naming the first WAL segment a base backup needs
+_START_WAL = re.compile(r"^START WAL LOCATION: .* \(file ([0-9A-F]{24})\)$", re.MULTILINE)
+
+def _is_tar_header(head: bytes) -> bool:
+    return head[257:262] == b"ustar"
+
+def _safe_member_path(dest: Path, member: tarfile.TarInfo) -> Path:
+    # Directory-format archives are flat (toc.dat + one file per table).
+    name = Path(member.name).name
+    if not name or name != member.name:
+        raise ValueError(f"Unexpected path in dump archive: {member.name}")
+    return dest / name
 
 class PostgresBackup(BackupEngine):
-    def backup(self) -> Path:
-        url = make_url(self.db_url)
-        outfile = self.output_dir / f"default-{datetime.now():%Y%m%d-%H%M%S}.dump"
+    name = "postgres"
+
+    def __init__(self, db_url: str, output_dir: Path, jobs: Optional[int] = None, dump_format: str = "custom"):
+        super().__init__(db_url, output_dir, jobs=jobs)
+        if dump_format not in ("custom", "directory"):
+            raise ValueError(f"Unsupported pg_dump format: {dump_format}")
+        self.dump_format = dump_format
+
+    @classmethod
+    def from_settings(cls, db_url: str, output_dir: Path, settings: Settings, **options) -> "PostgresBackup":
+        return cls(db_url, output_dir, jobs=settings.jobs, dump_format=settings.pg_format)
 
+    def _dump_command(self, url):
         env = os.environ.copy()
         if url.password:
             env["PGPASSWORD"] = url.password
@@ -22,33 +51,57 @@ class PostgresBackup(BackupEngine):
             cmd.extend(["-p", str(url.port)])
         if url.username:
             cmd.extend(["-U", url.username])
-        
+
+        return cmd, env
+
+    def backup(self) -> Path:
+        if self.dump_format == "directory":
+            return self._backup_directory()
+
+        url = make_url(self.db_url)
+        outfile = self.output_dir / f"default-{datetime.now():%Y%m%d-%H%M%S}.dump"
+
+        cmd, env = self._dump_command(url)
         cmd.extend(["-f", str(outfile), url.database])
 
-        subprocess.run(cmd, check=True, env=env)
+        subprocess.run(self.prioritized(cmd), check=True, env=env)
         return outfile
 
-    def backup_stream(self) -> BinaryIO:
+    def _backup_directory(self) -> Path:
+        """
+        Dump with `pg_dump -Fd -j N` and package the directory as an
+        uncompressed tar so it is a single object for storage and retention.
+        """
         url = make_url(self.db_url)
-        env = os.environ.copy()
-        if url.password:
-            env["PGPASSWORD"] = url.password
+        name = f"default-{datetime.now():%Y%m%d-%H%M%S}"
+        dump_dir = self.output_dir / name
+        outfile = self.output_dir / f"{name}.tar"
 
-        cmd = ["pg_dump", "-Fc"]
-        if url.host:
-            cmd.extend(["-h", url.host])
-        if url.port:
-            cmd.extend(["-p", str(url.port)])
-        if url.username:
-            cmd.extend(["-U", url.username])
-        
-        cmd.append(url.database)
+        cmd, env = self._dump_command(url)
+        cmd[1] = "-Fd"
+        cmd.extend(["-j", str(self.jobs), "-f", str(dump_dir), url.database])
 
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env)
-        return process.stdout
+        try:
+            subprocess.run(self.prioritized(cmd), check=True, env=env)
+            with tarfile.open(outfile, "w") as tar:
+                for path in sorted(dump_dir.iterdir()):
+                    tar.add(str(path), arcname=path.name)
+        finally:
+            shutil.rmtree(dump_dir, ignore_errors=True)
+
+        return outfile
+
+    def stream_command(self):
+        # A directory-format dump cannot be written to stdout
+        if self.dump_format == "directory":
+            return None
 
-    def restore(self, backup_path: Path):
         url = make_url(self.db_url)
+        cmd, env = self._dump_command(url)
+        cmd.append(url.database)
+        return cmd, env
+
+    def _restore_command(self, url):
         env = os.environ.copy()
         if url.password:
             env["PGPASSWORD"] = url.password
@@ -60,7 +113,150 @@ class PostgresBackup(BackupEngine):
             cmd.extend(["-p", str(url.port)])
         if url.username:
             cmd.extend(["-U", url.username])
-        
-        cmd.extend(["-d", url.database, str(backup_path)])
+
+        cmd.extend(["-d", url.database])
+        return cmd, env
+
+    def _restore_path(self, path: Path, dump_format: str):
+        # pg_restore can only run jobs in parallel from a seekable file or directory
+        cmd, env = self._restore_command(make_url(self.db_url))
+        cmd.extend(["-j", str(self.jobs), "-F", dump_format[0], str(path)])
 
         subprocess.run(cmd, check=True, env=env)
+
+    def _extract_parallel(self, archive: Path, dest: Path):
+        with tarfile.open(archive) as tar:
+            members = [m for m in tar.getmembers() if m.isfile()]
+
+        def extract(member: tarfile.TarInfo):
+            target = _safe_member_path(dest, member)
+            with open(archive, "rb") as src, open(target, "wb") as dst:
+                src.seek(member.offset_data)
+                remaining = member.size
+                while remaining:
+                    chunk = src.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        raise EOFError(f"Truncated dump archive: {archive}")
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            list(pool.map(extract, members))
+
+    def restore(self, backup_path: Path):
+        if not tarfile.is_tarfile(str(backup_path)):
+            self._restore_path(backup_path, "custom")
+            return
+
+        with tempfile.TemporaryDirectory(dir=self.output_dir) as tmp:
+            self._extract_parallel(backup_path, Path(tmp))
+            self._restore_path(Path(tmp), "directory")
+
+    def restore_stream(self, fileobj: BinaryIO) -> bool:
+        reader = PeekableReader(fileobj)
+        if not _is_tar_header(reader.peek(512)):
+            # pg_restore reads a custom-format archive from stdin when no file is given
+            cmd, env = self._restore_command(make_url(self.db_url))
+            self._pipe_to_command(cmd, reader, env)
+            return True
+
+        # Directory-format archive: unpack as it arrives, then restore in parallel
+        with tempfile.TemporaryDirectory(dir=self.output_dir) as tmp:
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    src = tar.extractfile(member)
+                    with open(_safe_member_path(Path(tmp), member), "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+            self._restore_path(Path(tmp), "directory")
+        return True
+
+    def verify_stream(self, fileobj: BinaryIO) -> bool:
+        # `pg_restore --list` reads the archive's table of contents without a database
+        env = os.environ.copy()
+        reader = PeekableReader(fileobj)
+        if not _is_tar_header(reader.peek(512)):
+            self._pipe_to_command(["pg_restore", "--list"], reader, env, stdout=subprocess.DEVNULL)
+            return True
+
+        # Directory-format archive: only toc.dat is needed, table data is skipped
+        with tempfile.TemporaryDirectory(dir=self.output_dir) as tmp:
+            found = False
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                for member in tar:
+                    if member.isfile() and member.name == "toc.dat":
+                        with open(_safe_member_path(Path(tmp), member), "wb") as dst:
+                            shutil.copyfileobj(tar.extractfile(member), dst, 1024 * 1024)
+                        found = True
+            if not found:
+                raise ValueError("Dump archive has no toc.dat")
+            subprocess.run(["pg_restore", "--list", "-F", "d", tmp], check=True, stdout=subprocess.DEVNULL, env=env)
+        return True
+
+
+def read_start_segment(reader: PeekableReader) -> Optional[str]:
+    """
+    The first WAL segment a base backup needs, from the backup_label that
+    pg_basebackup sends at the start of its tar stream. Nothing is consumed;
+    returns None if the stream does not start with a backup_label.
+    """
+    try:
+        member = tarfile.TarInfo.frombuf(reader.peek(tarfile.BLOCKSIZE), tarfile.ENCODING, "surrogateescape")
+    except tarfile.TarError:
+        return None
+    if member.name != "backup_label":
+        return None
+    label = reader.peek(tarfile.BLOCKSIZE + member.size)[tarfile.BLOCKSIZE:]
+    match = _START_WAL.search(label.decode(errors="replace"))
+    return match.group(1) if match else None
+
+class PostgresBaseBackup(PostgresBackup):
+    """
+    A physical backup of the whole cluster with `pg_basebackup`, streamed as
+    one tar archive, for point-in-time recovery (see pitr.py). WAL is left
+    out (`-X none`); recovery replays it from the WAL archive. The role in
+    DATABASE_URL needs the REPLICATION attribute.
+    """
+    name = "postgres-base"
+    stream_suffix = ".tar"
+
+    def __init__(self, db_url: str, output_dir: Path, jobs: Optional[int] = None):
+        super().__init__(db_url, output_dir, jobs=jobs)
+        # Set from the backup_label once a streamed backup has started
+        self.start_segment: Optional[str] = None
+
+    @classmethod
+    def from_settings(cls, db_url: str, output_dir: Path, settings: Settings, **options) -> "PostgresBaseBackup":
+        return cls(db_url, output_dir, jobs=settings.jobs)
+
+    def stream_command(self):
+        url = make_url(self.db_url)
+        cmd, env = self._dump_command(url)
+        cmd[:2] = ["pg_basebackup", "-D", "-", "-F", "t", "-X", "none", "--label", f"fastapi-dbbackup {datetime.now():%Y-%m-%d %H:%M:%S}"]
+        return cmd, env
+
+    def backup_stream(self) -> BinaryIO:
+        reader = PeekableReader(super().backup_stream())
+        self.start_segment = read_start_segment(reader)
+        return reader
+
+    def backup(self) -> Path:
+        outfile = self.output_dir / f"default-{datetime.now():%Y%m%d-%H%M%S}{self.stream_suffix}"
+        with self.backup_stream() as reader, open(outfile, "wb") as f:
+            copy_stream(reader, f)
+        return outfile
+
+    def restore(self, backup_path: Path):
+        # A cluster is restored by unpacking it and replaying WAL, not into a running database
+        raise ValueError("Base backups are restored with `fastapi-dbbackup pitr-restore`")
+
+    def restore_stream(self, fileobj: BinaryIO) -> bool:
+        raise ValueError("Base backups are restored with `fastapi-dbbackup pitr-restore`")
+
+    def verify_stream(self, fileobj: BinaryIO) -> bool:
+        with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+            names = {member.name for member in tar}
+        if "backup_label" not in names:
+            raise ValueError("Base backup has no backup_label")
+        return True
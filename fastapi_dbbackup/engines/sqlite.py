@@ -1,32 +1,376 @@
+import hashlib
+import io
+import json
+import os
 import shutil
-import subprocess
+import struct
 import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from typing import BinaryIO, List, Optional
 from sqlalchemy.engine.url import make_url
 from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.config import Settings
+from fastapi_dbbackup.throttle import throttled
+
+INCREMENTAL_MAGIC = b"FDBSQINC"
+INCREMENTAL_SUFFIX = ".inc"
+STATE_NAME = ".sqlite-incremental.json"
+HASH_SIZE = 16
+SQLITE_MAGIC = b"SQLite format 3\x00"
+# Restarts of a stepped backup of a rollback-journal database, caused by
+# commits from other connections, before the rest is copied under a shared lock
+MAX_RESTARTS = 3
+
+def read_incremental_header(path: Path) -> Optional[dict]:
+    """Return the header of an incremental backup file, or None for a full backup."""
+    with open(path, "rb") as f:
+        if f.read(len(INCREMENTAL_MAGIC)) != INCREMENTAL_MAGIC:
+            return None
+        (length,) = struct.unpack(">I", f.read(4))
+        header = json.loads(f.read(length))
+        header["data_offset"] = len(INCREMENTAL_MAGIC) + 4 + length
+        return header
+
+def _drain(fileobj: BinaryIO) -> int:
+    size = 0
+    for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+        size += len(chunk)
+    return size
+
+class _BackupRestarted(Exception):
+    pass
+
+class _SnapshotReader(io.RawIOBase):
+    """
+    Reads a WAL database's main file while `conn` holds the read transaction
+    that pins it (see SQLiteBackup._pin_main_file). Closing the reader ends
+    the transaction and checkpoints the commits made in the meantime.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, path: Path, size: int):
+        self._conn = conn
+        self._file = open(path, "rb", buffering=0)
+        self._remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._remaining:
+            return 0
+        n = self._file.readinto(memoryview(buffer).cast("B")[:self._remaining])
+        if not n:
+            raise IOError(f"Database file ended {self._remaining} bytes short of its snapshot")
+        self._remaining -= n
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._file.close()
+            self._conn.execute("COMMIT")
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        except sqlite3.Error:
+            pass
+        finally:
+            self._conn.close()
+            super().close()
 
 class SQLiteBackup(BackupEngine):
+    name = "sqlite"
+    stream_suffix = ".sqlite3"
+
+    def __init__(
+        self,
+        db_url: str,
+        output_dir: Path,
+        jobs: Optional[int] = None,
+        incremental: bool = False,
+        full_every: int = 24,
+        step_pages: int = 1024,
+        step_sleep: float = 0.0,
+    ):
+        super().__init__(db_url, output_dir, jobs=jobs)
+        self.incremental = incremental
+        self.full_every = max(full_every, 1)
+        # Online backups copy `step_pages` pages at a time and pause `step_sleep`
+        # seconds between steps, so writers get the database in between
+        self.step_pages = step_pages if step_pages > 0 else -1
+        self.step_sleep = step_sleep
+        self._pending_state = None
+
+    @classmethod
+    def from_settings(cls, db_url: str, output_dir: Path, settings: Settings, **options) -> "SQLiteBackup":
+        return cls(
+            db_url,
+            output_dir,
+            jobs=settings.jobs,
+            incremental=settings.sqlite_incremental,
+            full_every=settings.sqlite_full_every,
+            step_pages=settings.sqlite_step_pages,
+            step_sleep=settings.sqlite_step_sleep_ms / 1000,
+        )
+
     def backup(self) -> Path:
+        if self.incremental:
+            return self._backup_incremental()
+
         src_path = make_url(self.db_url).database
         dest = self.output_dir / f"default-{datetime.now():%Y%m%d-%H%M%S}.sqlite3"
+        conn = sqlite3.connect(src_path, timeout=30, isolation_level=None)
+        try:
+            self._online_backup(conn, dest)
+        finally:
+            conn.close()
+        return dest
+
+    def backup_stream(self) -> Optional[BinaryIO]:
+        """
+        Stream a WAL database's main file straight from disk, pinned by a read
+        transaction, so no copy is made. Rollback-journal databases (which
+        would block writers for the whole upload) and incremental backups
+        return None and use the file-based backup.
+        """
+        if self.incremental:
+            return None
+        src_path = make_url(self.db_url).database
+        conn = sqlite3.connect(src_path, timeout=30, isolation_level=None)
+        try:
+            if self._journal_mode(conn) == "wal" and self._pin_main_file(conn, src_path, wal=True):
+                size = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+                return throttled(_SnapshotReader(conn, Path(src_path), size), self.read_limiter)
+        except BaseException:
+            conn.close()
+            raise
+        conn.close()
+        return None
+
+    def _journal_mode(self, conn: sqlite3.Connection) -> str:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
 
+    def _pin_main_file(self, conn: sqlite3.Connection, src_path: str, wal: bool) -> bool:
+        """
+        Start a read transaction in which the main database file alone holds
+        a consistent snapshot. Rollback-journal databases are pinned by the
+        shared lock. WAL databases are checkpointed first and read in a
+        transaction that started with an empty WAL, so later commits stay in
+        the WAL and never reach the main file. Returns False, with no
+        transaction open, if the WAL could not be emptied.
+        """
+        wal_file = Path(f"{src_path}-wal")
+        for _ in range(5):
+            if wal:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            conn.execute("BEGIN")
+            conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            if not wal or not wal_file.exists() or wal_file.stat().st_size == 0:
+                return True
+            conn.execute("COMMIT")
+        return False
+
+    def _online_backup(self, conn: sqlite3.Connection, dest: Path):
+        """
+        Copy the database behind `conn` to `dest` with SQLite's online backup,
+        `step_pages` pages at a time.
+
+        WAL databases are copied from one read transaction: writers append to
+        the WAL undisturbed and the copy never restarts, and the frames they
+        commit meanwhile are checkpointed afterwards. Rollback-journal
+        databases are unlocked between steps, so each commit by another
+        connection restarts the copy; after MAX_RESTARTS the rest is copied
+        in one step under a shared lock.
+        """
+        wal = self._journal_mode(conn) == "wal"
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        dest_conn = sqlite3.connect(str(dest))
+        try:
+            if wal:
+                conn.execute("BEGIN")
+                conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+                try:
+                    conn.backup(dest_conn, pages=self.step_pages, progress=self._pacer(page_size))
+                finally:
+                    conn.execute("COMMIT")
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                return
+            try:
+                conn.backup(dest_conn, pages=self.step_pages, progress=self._pacer(page_size, MAX_RESTARTS))
+            except _BackupRestarted:
+                print(f"Warning: SQLite backup restarted {MAX_RESTARTS} times by concurrent writes; finishing under a shared lock")
+                conn.backup(dest_conn)
+        finally:
+            dest_conn.close()
+
+    def _pacer(self, page_size: int, max_restarts: Optional[int] = None):
+        """Progress callback that rate-limits and spaces out the steps of an online backup."""
+        state = {"copied": 0, "restarts": 0}
+
+        def progress(status, remaining, total):
+            copied = total - remaining
+            if status == sqlite3.SQLITE_OK and state["copied"] and copied <= state["copied"]:
+                # Another connection wrote to the database and the copy started over
+                state["restarts"] += 1
+                if max_restarts is not None and state["restarts"] >= max_restarts:
+                    raise _BackupRestarted()
+                state["copied"] = 0
+            if self.read_limiter:
+                self.read_limiter.consume((copied - state["copied"]) * page_size)
+            state["copied"] = copied
+            if remaining and self.step_sleep:
+                time.sleep(self.step_sleep)
+
+        return progress
+
+    @contextmanager
+    def _consistent_file(self, src_path: str):
+        """
+        Yield (path, page_size) for a file whose pages form a consistent
+        snapshot of the database while the context is open: the database
+        itself (see _pin_main_file), or if the WAL cannot be emptied, an
+        online backup copy.
+        """
+        conn = sqlite3.connect(src_path, timeout=30, isolation_level=None)
         try:
-            # Try CLI first
-            subprocess.run(
-                ["sqlite3", src_path, f".backup {dest}"],
-                check=True,
-                capture_output=True
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            if self._pin_main_file(conn, src_path, wal=self._journal_mode(conn) == "wal"):
+                yield Path(src_path), page_size
+                return
+
+            with tempfile.TemporaryDirectory(dir=self.output_dir) as tmp:
+                snapshot = Path(tmp) / "snapshot.sqlite3"
+                self._online_backup(conn, snapshot)
+                yield snapshot, page_size
+        finally:
+            conn.close()
+
+    def _load_state(self, src_path: str) -> Optional[dict]:
+        state_file = self.output_dir / STATE_NAME
+        if not state_file.exists():
+            return None
+        state = json.loads(state_file.read_text())
+        if state.get("source") != os.path.abspath(src_path):
+            return None
+        return state
+
+    def _backup_incremental(self) -> Path:
+        """
+        Hash every page and write only the pages that changed since the last
+        backup. Every `full_every` increments a new full backup starts a chain.
+        """
+        src_path = make_url(self.db_url).database
+        name = f"default-{datetime.now():%Y%m%d-%H%M%S}.sqlite3"
+        state = self._load_state(src_path)
+
+        with self._consistent_file(src_path) as (snapshot, page_size):
+            full = (
+                state is None
+                or state["page_size"] != page_size
+                or len(state["chain"]) > self.full_every
             )
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            # Fallback to python sqlite3 module
-            with sqlite3.connect(src_path) as src_conn:
-                dest_conn = sqlite3.connect(str(dest))
-                src_conn.backup(dest_conn)
-                dest_conn.close()
+            old_hashes = b"" if full else bytes.fromhex(state["hashes"])
+            hashes = bytearray()
+            changed = []
+
+            if full:
+                dest = self.output_dir / name
+                out = open(dest, "wb")
+            else:
+                dest = self.output_dir / (name + INCREMENTAL_SUFFIX)
+                out = tempfile.TemporaryFile(dir=self.output_dir)
+
+            with out, open(snapshot, "rb") as src:
+                page_number = 0
+                while True:
+                    page = src.read(page_size)
+                    if not page:
+                        break
+                    page_number += 1
+                    digest = hashlib.blake2b(page, digest_size=HASH_SIZE).digest()
+                    hashes += digest
+                    offset = (page_number - 1) * HASH_SIZE
+                    if full or old_hashes[offset:offset + HASH_SIZE] != digest:
+                        out.write(page)
+                        changed.append(page_number)
+
+                if not full:
+                    header = json.dumps({
+                        "version": 1,
+                        "chain": state["chain"],
+                        "page_size": page_size,
+                        "page_count": page_number,
+                        "pages": changed,
+                    }).encode()
+                    out.seek(0)
+                    with open(dest, "wb") as f:
+                        f.write(INCREMENTAL_MAGIC + struct.pack(">I", len(header)) + header)
+                        shutil.copyfileobj(out, f, 1024 * 1024)
 
+        self._pending_state = {
+            "source": os.path.abspath(src_path),
+            "page_size": page_size,
+            "chain": [name] if full else state["chain"] + [dest.name],
+            "hashes": bytes(hashes).hex(),
+        }
         return dest
 
+    def backup_uploaded(self, backup_path: Path):
+        # Only advance the chain once the backup is safely in storage
+        if self._pending_state:
+            (self.output_dir / STATE_NAME).write_text(json.dumps(self._pending_state))
+            self._pending_state = None
+
+    def verify_stream(self, fileobj: BinaryIO) -> bool:
+        head = fileobj.read(len(INCREMENTAL_MAGIC))
+        if head == INCREMENTAL_MAGIC:
+            (length,) = struct.unpack(">I", fileobj.read(4))
+            header = json.loads(fileobj.read(length))
+            expected = len(header["pages"]) * header["page_size"]
+            size = _drain(fileobj)
+            if size != expected:
+                raise ValueError(f"Incremental backup holds {size} bytes of pages, expected {expected}")
+            return True
+
+        head += fileobj.read(len(SQLITE_MAGIC) + 2 - len(head))
+        if head[:len(SQLITE_MAGIC)] != SQLITE_MAGIC:
+            raise ValueError("Not an SQLite database or incremental backup")
+        # The page size is stored big-endian at offset 16; 1 means 65536
+        page_size = struct.unpack(">H", head[len(SQLITE_MAGIC):])[0] if len(head) == len(SQLITE_MAGIC) + 2 else 0
+        page_size = 65536 if page_size == 1 else page_size
+        size = len(head) + _drain(fileobj)
+        if not page_size or size % page_size:
+            raise ValueError(f"Database file of {size} bytes is not a whole number of {page_size} byte pages")
+        return True
+
+    def restore_dependencies(self, backup_path: Path) -> List[str]:
+        header = read_incremental_header(backup_path)
+        return header["chain"] if header else []
+
     def restore(self, backup_path: Path):
         dest = make_url(self.db_url).database
-        shutil.copy2(backup_path, dest)
+        header = read_incremental_header(backup_path)
+        if not header:
+            shutil.copy2(backup_path, dest)
+            return
+
+        # Rebuild the database from the full backup plus each increment in order
+        directory = backup_path.parent
+        with tempfile.TemporaryDirectory(dir=directory) as tmp:
+            rebuilt = Path(tmp) / "rebuilt.sqlite3"
+            chain = header["chain"]
+            shutil.copyfile(directory / chain[0], rebuilt)
+            with open(rebuilt, "r+b") as db:
+                for increment in [directory / n for n in chain[1:]] + [backup_path]:
+                    inc_header = read_incremental_header(increment)
+                    page_size = inc_header["page_size"]
+                    with open(increment, "rb") as f:
+                        f.seek(inc_header["data_offset"])
+                        for page_number in inc_header["pages"]:
+                            db.seek((page_number - 1) * page_size)
+                            db.write(f.read(page_size))
+                    db.truncate(inc_header["page_count"] * page_size)
+            shutil.copy2(rebuilt, dest)
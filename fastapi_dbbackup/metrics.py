@@ -0,0 +1,330 @@
+"""
+Per-stage metrics for backup and restore runs.
+
+Each run records, for every stage (dump, compress, upload, retention,
+download, decompress, restore), the bytes that passed through it, its wall
+time and the time it spent blocked in I/O on its input or output. Streams
+are counted by thin reader/writer wrappers that add two clock reads per
+chunk, so the copy loops stay as fast as before.
+
+Finished runs are exported as Prometheus text (a textfile for node_exporter
+or a pushgateway), optionally as OpenTelemetry spans, and as a JSON summary.
+"""
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+MB = 1024 * 1024
+
+class StageMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.bytes = 0
+        # Time blocked inside reads (waiting on the stage feeding this one)
+        # or writes (waiting on the stage this one feeds)
+        self.io_seconds = 0.0
+        self.started: Optional[float] = None
+        self.ended: Optional[float] = None
+
+    def mark(self, start: float, end: float):
+        if self.started is None:
+            self.started = start
+        self.ended = end
+
+    @property
+    def seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return self.ended - self.started
+
+    def summary(self) -> dict:
+        seconds = self.seconds
+        return {
+            "bytes": self.bytes,
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(self.bytes / MB / seconds, 1) if seconds else None,
+            "io_wait_seconds": round(self.io_seconds, 3),
+        }
+
+class MeteredReader(io.RawIOBase):
+    """Read-only pass-through that adds the bytes read and time spent reading to a stage."""
+
+    def __init__(self, fileobj: BinaryIO, stage: StageMetrics):
+        self.fileobj = fileobj
+        self.stage = stage
+
+    def readable(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        # Expose the descriptor only for unbuffered inputs, so kernel-side copies
+        # (see streams.copy_stream) never skip data buffered in Python
+        if not isinstance(self.fileobj, io.RawIOBase):
+            raise io.UnsupportedOperation("fileno")
+        return self.fileobj.fileno()
+
+    def count(self, n: int, start: float, end: float):
+        """Account for `n` bytes copied from the underlying file without passing through readinto."""
+        stage = self.stage
+        stage.bytes += n
+        stage.io_seconds += end - start
+        stage.mark(start, end)
+        if hasattr(self.fileobj, "count"):
+            self.fileobj.count(n, start, end)
+
+    def readinto(self, buffer) -> int:
+        start = time.perf_counter()
+        if hasattr(self.fileobj, "readinto"):
+            n = self.fileobj.readinto(buffer) or 0
+        else:
+            data = self.fileobj.read(len(buffer))
+            n = len(data)
+            memoryview(buffer).cast("B")[:n] = data
+        end = time.perf_counter()
+        stage = self.stage
+        stage.bytes += n
+        stage.io_seconds += end - start
+        stage.mark(start, end)
+        return n
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.fileobj.close()
+            finally:
+                super().close()
+
+class MeteredWriter(io.RawIOBase):
+    """Write-only pass-through that adds the bytes written and time spent writing to a stage."""
+
+    def __init__(self, fileobj: BinaryIO, stage: StageMetrics):
+        self.fileobj = fileobj
+        self.stage = stage
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        start = time.perf_counter()
+        self.fileobj.write(data)
+        end = time.perf_counter()
+        n = memoryview(data).nbytes
+        stage = self.stage
+        stage.bytes += n
+        stage.io_seconds += end - start
+        stage.mark(start, end)
+        return n
+
+class RunMetrics:
+    """The metrics of one backup or restore run, labelled e.g. with the database name."""
+
+    def __init__(self, operation: str, **labels: str):
+        self.operation = operation
+        self.labels = labels
+        self.stages: Dict[str, StageMetrics] = {}
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.details: dict = {}
+        # Wall-clock anchor for converting perf_counter readings into timestamps
+        self._perf_start = time.perf_counter()
+        self._wall_start = time.time()
+        self.ended: Optional[float] = None
+
+    def stage(self, name: str) -> StageMetrics:
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+        return self.stages[name]
+
+    def reader(self, fileobj: BinaryIO, stage: str) -> MeteredReader:
+        return MeteredReader(fileobj, self.stage(stage))
+
+    def writer(self, fileobj: BinaryIO, stage: str) -> MeteredWriter:
+        return MeteredWriter(fileobj, self.stage(stage))
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[StageMetrics]:
+        """Time a stage that runs as one call; the caller sets its `bytes`."""
+        stage = self.stage(name)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            end = time.perf_counter()
+            stage.io_seconds += end - start
+            stage.mark(start, end)
+
+    def finish(self, error: Optional[BaseException] = None, **details):
+        """Mark the run as finished; `details` (e.g. the backup name) go into the summary."""
+        self.ended = time.perf_counter()
+        if error is None:
+            self.status = "succeeded"
+        else:
+            self.status = "failed"
+            self.error = f"{type(error).__name__}: {error}"
+        self.details.update(details)
+
+    @property
+    def seconds(self) -> float:
+        return (self.ended or time.perf_counter()) - self._perf_start
+
+    def timestamp(self, perf: float) -> float:
+        return self._wall_start + (perf - self._perf_start)
+
+    def summary(self) -> dict:
+        summary = {
+            "operation": self.operation,
+            **self.labels,
+            "status": self.status,
+            **self.details,
+            "started": round(self._wall_start, 3),
+            "seconds": round(self.seconds, 3),
+            "stages": {name: stage.summary() for name, stage in self.stages.items()},
+        }
+        if self.error:
+            summary["error"] = self.error
+        return summary
+
+# Prometheus metrics as (name, help, value of a run or stage)
+RUN_METRICS = [
+    ("dbbackup_last_run_success", "Whether the last run succeeded (1) or failed (0).", lambda r: int(r.status == "succeeded")),
+    ("dbbackup_last_run_timestamp_seconds", "When the last run finished.", lambda r: r.timestamp(r.ended or time.perf_counter())),
+    ("dbbackup_last_run_duration_seconds", "Wall time of the last run.", lambda r: r.seconds),
+]
+STAGE_METRICS = [
+    ("dbbackup_stage_bytes", "Bytes that passed through the stage in the last run.", lambda s: s.bytes),
+    ("dbbackup_stage_duration_seconds", "Wall time of the stage in the last run.", lambda s: s.seconds),
+    ("dbbackup_stage_throughput_bytes_per_second", "Bytes per second through the stage in the last run.", lambda s: s.bytes / s.seconds if s.seconds else 0),
+    ("dbbackup_stage_io_wait_seconds", "Time the stage spent blocked reading its input or writing its output.", lambda s: s.io_seconds),
+    ("dbbackup_stage_io_wait_ratio", "Fraction of the stage's wall time spent blocked in I/O; near 1 means it was held back by a neighbouring stage.", lambda s: s.io_seconds / s.seconds if s.seconds else 0),
+]
+
+def _labels(labels: Dict[str, str]) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+def prometheus_text(runs: List[RunMetrics]) -> str:
+    """Render runs in the Prometheus text exposition format."""
+    lines = []
+    for name, help_text, value in RUN_METRICS:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for run in runs:
+            lines.append(f"{name}{_labels({'operation': run.operation, **run.labels})} {value(run):g}")
+    for name, help_text, value in STAGE_METRICS:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for run in runs:
+            for stage in run.stages.values():
+                labels = {"operation": run.operation, **run.labels, "stage": stage.name}
+                lines.append(f"{name}{_labels(labels)} {value(stage):g}")
+    return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    """
+    Keeps the latest run of each operation (and label set) and exports it.
+    A textfile holds every latest run, so one file serves a daemon backing
+    up many databases.
+    """
+
+    def __init__(
+        self,
+        textfile: Optional[Path] = None,
+        pushgateway: Optional[str] = None,
+        summary: bool = True,
+        otel: bool = False,
+    ):
+        self.textfile = textfile
+        self.pushgateway = pushgateway.rstrip("/") if pushgateway else None
+        self.summary = summary
+        self.tracer = _otel_tracer() if otel else None
+        self.latest: Dict[Tuple, RunMetrics] = {}
+        self._lock = threading.Lock()
+
+    def text(self) -> str:
+        with self._lock:
+            return prometheus_text(list(self.latest.values()))
+
+    def export(self, run: RunMetrics):
+        with self._lock:
+            self.latest[(run.operation,) + tuple(sorted(run.labels.items()))] = run
+            runs = list(self.latest.values())
+        if self.summary:
+            print(json.dumps(run.summary()))
+        if self.tracer:
+            _emit_spans(self.tracer, run)
+        # Metrics must never fail a backup that already succeeded
+        try:
+            if self.textfile:
+                self._write_textfile(prometheus_text(runs))
+            if self.pushgateway:
+                self._push(run)
+        except Exception as e:
+            print(f"Warning: could not export metrics: {e}")
+
+    def _write_textfile(self, text: str):
+        # Write and rename, so a scraper never reads a half-written file
+        tmp = self.textfile.with_name(f".{self.textfile.name}.{os.getpid()}.tmp")
+        with self._lock:
+            tmp.write_text(text)
+            os.replace(tmp, self.textfile)
+
+    def _push(self, run: RunMetrics):
+        # Imported here, as urllib.request pulls in http.client and email for every CLI start
+        import urllib.request
+
+        # One pushgateway group per operation and label set, replaced on each push
+        path = "/metrics/job/fastapi_dbbackup/operation/" + run.operation
+        for key, value in sorted(run.labels.items()):
+            path += f"/{key}/{urllib.request.quote(str(value), safe='')}"
+        request = urllib.request.Request(
+            self.pushgateway + path,
+            data=prometheus_text([run]).encode(),
+            method="PUT",
+            headers={"Content-Type": "text/plain; version=0.0.4"},
+        )
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+
+def _otel_tracer():
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        raise RuntimeError(
+            "OpenTelemetry tracing requires opentelemetry-api. "
+            "Install it with: pip install fastapi-dbbackup[otel]"
+        )
+    return trace.get_tracer("fastapi_dbbackup")
+
+def _emit_spans(tracer, run: RunMetrics):
+    """
+    Emit the run and its stages as spans after the fact, from the recorded
+    timestamps, so nothing is traced from inside the copy loops.
+    """
+    from opentelemetry import trace
+
+    def ns(perf: float) -> int:
+        return int(run.timestamp(perf) * 1e9)
+
+    root = tracer.start_span(
+        f"dbbackup.{run.operation}",
+        start_time=ns(run._perf_start),
+        attributes={**{f"dbbackup.{k}": str(v) for k, v in run.labels.items()}, "dbbackup.status": run.status},
+    )
+    if run.error:
+        root.set_status(trace.Status(trace.StatusCode.ERROR, run.error))
+    context = trace.set_span_in_context(root)
+    for stage in run.stages.values():
+        if stage.started is None:
+            continue
+        span = tracer.start_span(
+            f"dbbackup.{run.operation}.{stage.name}",
+            context=context,
+            start_time=ns(stage.started),
+            attributes={"dbbackup.bytes": stage.bytes, "dbbackup.io_wait_seconds": stage.io_seconds},
+        )
+        span.end(end_time=ns(stage.ended))
+    root.end(end_time=ns(run.ended or time.perf_counter()))
@@ -0,0 +1,255 @@
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import Codec, compress, decompress, open_decompressed
+from fastapi_dbbackup.encrypt import MAGIC as ENCRYPTION_MAGIC
+from fastapi_dbbackup.encrypt import Encryptor, Keyring, decrypt_file, encrypt_file, is_encrypted, open_decrypted
+from fastapi_dbbackup.metrics import RunMetrics
+from fastapi_dbbackup.retention import purge_backups
+from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.streams import CheckedReader, copy_stream, grow_pipe
+
+def backup(
+    engine: BackupEngine,
+    storage: StorageBackend,
+    codec: Optional[Codec] = None,
+    level: Optional[int] = None,
+    workers: Optional[int] = None,
+    stream: bool = True,
+    keep_local: bool = False,
+    retention_days: int = 0,
+    max_backups: int = 0,
+    metrics: Optional[RunMetrics] = None,
+    encryptor: Optional[Encryptor] = None,
+) -> str:
+    """
+    Dump the database, compress it with `codec`, encrypt it with `encryptor`
+    and store it, then apply retention. Streams straight to storage when
+    `stream` is set and the engine supports it; otherwise the dump file is
+    removed after upload unless `keep_local` is set (local storage keeps it
+    in place).
+    Per-stage timings and byte counts are recorded in `metrics`.
+    Returns the remote path of the new backup.
+    """
+    metrics = metrics or RunMetrics("backup")
+    recover_uploads(storage)
+    # Try streaming if requested and engine supports it
+    dump = engine.backup_stream() if stream else None
+
+    if dump:
+        dump = metrics.reader(dump, "dump")
+        filename = f"default-{datetime.now():%Y%m%d-%H%M%S}{engine.stream_suffix}"
+        if codec or encryptor:
+            filename += (codec.suffix if codec else "") + (encryptor.suffix if encryptor else "")
+            steps = [step for step, enabled in (("compressing", codec), ("encrypting", encryptor)) if enabled]
+            print(f"Streaming and {' and '.join(steps)} backup directly to storage...")
+            # Use os.pipe and a thread for streaming compression and encryption
+            r, w = os.pipe()
+            grow_pipe(w)
+            errors = []
+            def compress_worker():
+                try:
+                    with os.fdopen(w, "wb") as f_out:
+                        sink = f_out
+                        if encryptor:
+                            # Compressed data is sealed chunk by chunk on its own thread pool
+                            sink = encryptor.open_writer(f_out)
+                        with sink:
+                            if codec:
+                                with codec.open_writer(metrics.writer(sink, "encrypt") if encryptor else sink, level=level, workers=workers) as writer:
+                                    copy_stream(dump, metrics.writer(writer, "compress"))
+                            else:
+                                copy_stream(dump, metrics.writer(sink, "encrypt"))
+                except BaseException as e:
+                    errors.append(e)
+                finally:
+                    dump.close()
+
+            def check_worker():
+                # The stream ended; fail the upload if the dump or compressor did
+                t.join()
+                if errors:
+                    raise errors[0]
+
+            t = threading.Thread(target=compress_worker, daemon=True)
+            t.start()
+            # Unbuffered, so local storage can splice the compressed bytes into place
+            fileobj = CheckedReader(os.fdopen(r, "rb", buffering=0), check_worker)
+        else:
+            print("Streaming backup directly to storage...")
+            fileobj = dump
+
+        fileobj = metrics.reader(fileobj, "upload")
+        try:
+            remote_path = storage.upload_fileobj(fileobj, filename)
+        finally:
+            fileobj.close()
+        engine.backup_uploaded(Path(filename))
+    else:
+        # Fallback to file-based backup (or definitely file-based for local)
+        with metrics.timed("dump") as stage:
+            backup_file = engine.backup()
+            stage.bytes += backup_file.stat().st_size
+
+        if codec:
+            print(f"Compressing backup ({codec.name})...")
+            with metrics.timed("compress") as stage:
+                stage.bytes += backup_file.stat().st_size
+                backup_file = compress(backup_file, workers=workers, codec=codec.name, level=level)
+
+        if encryptor:
+            print(f"Encrypting backup ({encryptor.cipher})...")
+            with metrics.timed("encrypt") as stage:
+                stage.bytes += backup_file.stat().st_size
+                backup_file = encrypt_file(backup_file, encryptor)
+
+        print("Uploading backup...")
+        with metrics.timed("upload") as stage:
+            stage.bytes += backup_file.stat().st_size
+            remote_path = storage.upload(backup_file)
+        engine.backup_uploaded(backup_file)
+
+        # If the storage kept its own copy, delete the temporary local backup file
+        if not keep_local and backup_file.exists():
+            print(f"Cleaning up local backup file {backup_file}...")
+            backup_file.unlink()
+
+    with metrics.timed("retention"):
+        apply_retention(storage, retention_days, max_backups)
+    return remote_path
+
+def recover_uploads(storage: StorageBackend) -> List[str]:
+    """Finish uploads interrupted in an earlier run; failures only warn, so the new backup still runs."""
+    try:
+        resumed = storage.recover_uploads()
+    except Exception as e:
+        print(f"Warning: could not recover interrupted uploads: {e}")
+        return []
+    for remote_path in resumed:
+        print(f"Resumed interrupted upload: {remote_path}")
+    return resumed
+
+def apply_retention(storage: StorageBackend, retention_days: int = 0, max_backups: int = 0) -> List[str]:
+    if retention_days > 0:
+        print(f"Purging backups older than {retention_days} days...")
+    if max_backups > 0:
+        print(f"Limiting backups to latest {max_backups} files...")
+    return purge_backups(storage, retention_days, max_backups)
+
+def fetch_backup(
+    storage: StorageBackend,
+    remote_path: str,
+    work_dir: Path,
+    metrics: Optional[RunMetrics] = None,
+    keyring: Optional[Keyring] = None,
+) -> Tuple[Path, Path]:
+    """Download, decrypt and decompress a backup. Returns (downloaded path, decompressed path)."""
+    metrics = metrics or RunMetrics("restore")
+    local_path = work_dir / remote_path
+    # Ensure backup directory exists before downloading
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"Downloading {remote_path}...")
+    with metrics.timed("download") as stage:
+        storage.download(remote_path, local_path)
+        stage.bytes += local_path.stat().st_size
+
+    # Encryption and the codec are detected from magic bytes, not suffixes
+    decrypted = local_path
+    with open(local_path, "rb") as f:
+        encrypted = is_encrypted(f.read(len(ENCRYPTION_MAGIC)))
+    if encrypted:
+        with metrics.timed("decrypt") as stage:
+            decrypted = decrypt_file(local_path, keyring)
+            stage.bytes += decrypted.stat().st_size
+        print(f"Decrypted {remote_path}.")
+
+    with metrics.timed("decompress") as stage:
+        temp_path = decompress(decrypted)
+        stage.bytes += temp_path.stat().st_size
+    if temp_path != decrypted:
+        print(f"Decompressed {remote_path}.")
+        # Keep only the download and the file to restore
+        if decrypted != local_path:
+            decrypted.unlink()
+    return local_path, temp_path
+
+def restore(
+    engine: BackupEngine,
+    storage: StorageBackend,
+    remote_path: Optional[str] = None,
+    work_dir: Path = Path("backups"),
+    keep_downloads: bool = False,
+    metrics: Optional[RunMetrics] = None,
+    keyring: Optional[Keyring] = None,
+) -> Optional[str]:
+    """
+    Restore `remote_path` (or the latest backup) into the database,
+    decrypting it with `keyring` if it is encrypted. Returns the restored
+    backup's name, or None if there is nothing to restore.
+    """
+    metrics = metrics or RunMetrics("restore")
+    if not remote_path:
+        backups = storage.list_backups()
+        if not backups:
+            print("No backups found to restore.")
+            return None
+        # Use latest backup if none specified
+        remote_path = sorted(backups)[-1]
+        print(f"No backup specified. Using latest: {remote_path}")
+
+    # Prefer streaming straight from storage through decryption and the
+    # decompressor into the database client, so nothing is staged on local disk.
+    # Engines that cannot stream are not sent a stream, which S3 would start prefetching.
+    if engine.supports_stream_restore:
+        # The restore stage's I/O wait includes the download and decompression feeding it
+        download = metrics.reader(storage.open_read(remote_path), "download")
+        try:
+            fileobj = metrics.reader(open_decompressed(open_decrypted(download, keyring)), "restore")
+        except ValueError:
+            # Encrypted and no key for it
+            download.close()
+            raise
+        try:
+            streamed = engine.restore_stream(fileobj)
+        finally:
+            fileobj.close()
+        if streamed:
+            print(f"Restored by streaming {remote_path} from storage.")
+            return remote_path
+        # Nothing was streamed; start the stages over for the file-based restore
+        metrics.stages.clear()
+
+    local_path, temp_path = fetch_backup(storage, remote_path, work_dir, metrics, keyring)
+    fetched: List[Tuple[Path, Path]] = [(local_path, temp_path)]
+
+    try:
+        dependencies = engine.restore_dependencies(temp_path)
+        if dependencies:
+            backups = storage.list_backups()
+            for dependency in dependencies:
+                # Dependencies are named without the compression suffix added on upload
+                matches = [b for b in backups if b == dependency or b.startswith(dependency + ".")]
+                if not matches:
+                    raise FileNotFoundError(f"Backup {dependency} required by {remote_path} was not found.")
+                fetched.append(fetch_backup(storage, matches[0], work_dir, metrics, keyring))
+
+        print(f"Restoring from {temp_path}...")
+        with metrics.timed("restore") as stage:
+            stage.bytes += sum(decompressed.stat().st_size for _, decompressed in fetched)
+            engine.restore(temp_path)
+    finally:
+        for downloaded, decompressed in fetched:
+            # Cleanup temporary files
+            if decompressed != downloaded and decompressed.exists():
+                decompressed.unlink()
+
+            # If using remote storage, cleanup the downloaded backup file as well
+            if not keep_downloads and downloaded.exists():
+                print(f"Cleaning up downloaded backup file {downloaded}...")
+                downloaded.unlink()
+
+    return remote_path
@@ -0,0 +1,307 @@
+"""
+Continuous WAL archiving and point-in-time recovery for PostgreSQL.
+
+Instead of only periodic `pg_dump`s, the cluster is backed up as periodic
+base backups (`pg_basebackup`, see engines.postgres.PostgresBaseBackup) plus
+every WAL segment PostgreSQL writes, so it can be restored to any moment
+after the oldest base backup. Everything lives under one storage prefix:
+
+    base/               base backups, stored through the backup pipeline
+    wal/                WAL files, compressed one by one
+    .pitr-index.json    when each base backup finished and the WAL it needs
+
+PostgreSQL ships WAL itself, through its archive_command:
+
+    archive_mode = on
+    archive_command = 'fastapi-dbbackup wal-push %p'
+
+and `prepare_restore` sets up a data directory whose restore_command
+replays it with `fastapi-dbbackup wal-fetch %f %p`.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from fastapi_dbbackup.compress import CODECS, Codec, open_decompressed
+from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.streams import copy_stream
+
+BASE_PREFIX = "base"
+WAL_PREFIX = "wal"
+INDEX_NAME = ".pitr-index.json"
+# WAL segments are named by timeline, log and segment number, 8 hex digits each
+SEGMENT = re.compile(r"^[0-9A-F]{24}$")
+# Segments per log with the default 16 MB segment size; prefetching guesses
+# wrong names for clusters initialised with another size, which just miss
+SEGMENTS_PER_LOG = 0x100000000 // (16 * 1024 * 1024)
+# Enough of a segment to tell it apart from a same-named one of another
+# cluster: the first page header holds the system identifier
+FINGERPRINT_SIZE = 8192
+
+def next_segment(name: str) -> str:
+    """The name of the WAL segment after `name` on the same timeline."""
+    timeline, log, seg = int(name[:8], 16), int(name[8:16], 16), int(name[16:], 16) + 1
+    if seg == SEGMENTS_PER_LOG:
+        log, seg = log + 1, 0
+    return f"{timeline:08X}{log:08X}{seg:08X}"
+
+def parse_target_time(value: str) -> datetime:
+    """An ISO 8601 recovery target, e.g. "2026-01-31 22:05:00+00:00"; naive times are local."""
+    try:
+        target = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid target time '{value}', expected e.g. '2026-01-31 22:05:00+00:00'")
+    return target if target.tzinfo else target.astimezone()
+
+def _fingerprint(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(FINGERPRINT_SIZE)).hexdigest()
+
+def _conf_value(value: str) -> str:
+    # A quoted postgresql.conf string
+    return "'" + value.replace("'", "''") + "'"
+
+def _extract(fileobj, dest: Path):
+    with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(dest, filter="data")
+            return
+        for member in tar:
+            if member.name.startswith("/") or ".." in Path(member.name).parts:
+                raise ValueError(f"Unexpected path in base backup: {member.name}")
+            tar.extract(member, dest)
+
+class WALArchive:
+    """
+    The base backups and archived WAL of one cluster in `storage`. `base` is
+    the storage of the base backups (defaults to the `base/` prefix, unwrapped).
+    Each WAL file is compressed with `codec`; `jobs` files are uploaded or
+    prefetched at once, and `state_dir` keeps track of those handled ahead of
+    PostgreSQL asking for them.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        base: Optional[StorageBackend] = None,
+        codec: Optional[Codec] = None,
+        level: Optional[int] = None,
+        jobs: int = 4,
+        state_dir: Optional[Path] = None,
+    ):
+        self.storage = storage
+        self.base = base or storage.with_prefix(BASE_PREFIX)
+        self.wal = storage.with_prefix(WAL_PREFIX)
+        self.codec = codec
+        self.level = level
+        self.jobs = max(jobs, 1)
+        self.state_dir = Path(state_dir or Path(tempfile.gettempdir()) / "fastapi-dbbackup-wal")
+
+    def _state(self, kind: str, wal_dir: Path) -> Path:
+        # One directory per cluster, keyed by its WAL directory
+        key = hashlib.sha256(str(Path(wal_dir).resolve()).encode()).hexdigest()[:16]
+        path = self.state_dir / f"{kind}-{key}"
+        path.mkdir(parents=True, exist_ok=True, mode=0o700)
+        return path
+
+    # Archiving
+
+    def push(self, wal_path: Path) -> List[str]:
+        """
+        Archive the WAL file at `wal_path` (archive_command's %p), together with
+        up to `jobs - 1` other files PostgreSQL has marked ready, in parallel.
+        Returns the names uploaded; empty if `wal_path` was uploaded ahead by
+        an earlier call. Raises if `wal_path` itself could not be archived.
+        """
+        wal_path = Path(wal_path)
+        pushed = self._state("pushed", wal_path.parent)
+        marker = pushed / wal_path.name
+        if marker.exists():
+            uploaded = marker.read_text() == _fingerprint(wal_path)
+            marker.unlink()
+            if uploaded:
+                return []
+
+        ahead = self._ready(wal_path, pushed)[:self.jobs - 1]
+        with ThreadPoolExecutor(max_workers=len(ahead) + 1) as pool:
+            current = pool.submit(self._upload, wal_path)
+            others = {path: pool.submit(self._upload, path) for path in ahead}
+        names = [current.result()]
+        for path, future in others.items():
+            # A failed look-ahead upload is retried when PostgreSQL asks for the file
+            if future.exception() is None:
+                (pushed / path.name).write_text(_fingerprint(path))
+                names.append(future.result())
+        return names
+
+    def _ready(self, wal_path: Path, pushed: Path) -> List[Path]:
+        # Other completed WAL files waiting for archive_command, oldest first
+        try:
+            ready = sorted(p.name[:-len(".ready")] for p in (wal_path.parent / "archive_status").glob("*.ready"))
+        except OSError:
+            return []
+        return [
+            wal_path.parent / name
+            for name in ready
+            if name != wal_path.name and not (pushed / name).exists() and (wal_path.parent / name).exists()
+        ]
+
+    def _upload(self, path: Path) -> str:
+        with open(path, "rb") as f:
+            if not self.codec:
+                return self.wal.upload_fileobj(f, path.name)
+            # Segments are small (16 MB by default): compress in memory, one thread each
+            buffer = io.BytesIO()
+            with self.codec.open_writer(buffer, level=self.level, workers=1) as writer:
+                copy_stream(f, writer)
+        buffer.seek(0)
+        return self.wal.upload_fileobj(buffer, path.name + self.codec.suffix)
+
+    # Recovery
+
+    def fetch(self, name: str, dest: Path) -> bool:
+        """
+        Restore the archived WAL file `name` to `dest` (restore_command's %f
+        and %p). Returns False if the archive does not have it, which ends
+        recovery. On a cache miss the `jobs - 1` following segments are
+        downloaded in parallel with it, so the next calls are served locally.
+        """
+        dest = Path(dest)
+        cache = self._state("prefetch", dest.parent)
+        cached = cache / name
+        if cached.exists():
+            shutil.move(str(cached), str(dest))
+            return True
+
+        upcoming = []
+        if SEGMENT.match(name):
+            for _ in range(self.jobs - 1):
+                upcoming.append(next_segment(upcoming[-1] if upcoming else name))
+        with ThreadPoolExecutor(max_workers=len(upcoming) + 1) as pool:
+            found = pool.submit(self._download, name, dest)
+            for segment in upcoming:
+                pool.submit(self._download, segment, cache / segment)
+        return found.result()
+
+    def _candidates(self, name: str) -> List[str]:
+        # The configured codec first, then uncompressed, then any other codec
+        suffixes = [self.codec.suffix] if self.codec else []
+        suffixes += [""] + [codec.suffix for codec in CODECS.values() if codec is not self.codec]
+        return [name + suffix for suffix in suffixes]
+
+    def _download(self, name: str, dest: Path) -> bool:
+        for remote in self._candidates(name):
+            try:
+                source = self.wal.open_read(remote)
+            except FileNotFoundError:
+                continue
+            partial = dest.with_name(dest.name + ".part")
+            with open_decompressed(source) as reader, open(partial, "wb") as f:
+                copy_stream(reader, f)
+            os.replace(partial, dest)
+            return True
+        return False
+
+    # Base backups
+
+    def _load_index(self) -> Dict[str, dict]:
+        try:
+            with self.storage.open_read(INDEX_NAME) as f:
+                return json.load(f)["bases"]
+        except FileNotFoundError:
+            return {}
+
+    def _save_index(self, bases: Dict[str, dict]):
+        payload = json.dumps({"bases": bases}, indent=2, sort_keys=True).encode()
+        self.storage.upload_fileobj(io.BytesIO(payload), INDEX_NAME)
+
+    def record_base(self, name: str, started: float, finished: float, start_segment: Optional[str]):
+        """Remember when base backup `name` was taken and the first WAL segment it needs."""
+        bases = self._load_index()
+        bases[name] = {"started": started, "finished": finished, "start_segment": start_segment}
+        self._save_index(bases)
+
+    def base_before(self, target: Optional[datetime] = None) -> str:
+        """
+        The newest base backup that finished before `target` (the newest of
+        all without one); raises ValueError if there is none.
+        """
+        names = sorted(self.base.list_backups())
+        if target is None:
+            if not names:
+                raise ValueError("No base backups found")
+            return names[-1]
+        # Only the index knows when a backup finished, i.e. became consistent
+        bases = self._load_index()
+        finished = [(bases[name]["finished"], name) for name in names if name in bases]
+        candidates = [name for end, name in sorted(finished) if end <= target.timestamp()]
+        if not candidates:
+            raise ValueError(f"No base backup finished before {target.isoformat(sep=' ')}")
+        return candidates[-1]
+
+    def prune(self) -> List[str]:
+        """
+        Delete archived WAL older than the oldest stored base backup needs,
+        and forget base backups retention has removed. Keeps everything if
+        the start of any stored base backup is unknown. Returns the deleted names.
+        """
+        names = set(self.base.list_backups())
+        bases = self._load_index()
+        kept = {name: entry for name, entry in bases.items() if name in names}
+        if kept != bases:
+            self._save_index(kept)
+        if not names or names - set(kept) or not all(entry["start_segment"] for entry in kept.values()):
+            return []
+
+        # Positions (log and segment, without the timeline) compare as hex strings
+        oldest = min(entry["start_segment"][8:] for entry in kept.values())
+        old = [name for name in self.wal.list_backups() if SEGMENT.match(name[:24]) and name[8:24] < oldest]
+        if old:
+            self.wal.delete_many(old)
+        return old
+
+    def prepare_restore(
+        self,
+        pgdata: Path,
+        target: Optional[datetime] = None,
+        base: Optional[str] = None,
+        restore_command: str = "fastapi-dbbackup wal-fetch %f %p",
+    ) -> str:
+        """
+        Unpack base backup `base` (by default the newest that finished before
+        `target`) into the empty or missing directory `pgdata`, and configure
+        recovery: starting PostgreSQL on it replays the archived WAL up to
+        `target` (or to the end of the archive) and promotes. Returns the
+        base backup's name.
+        """
+        pgdata = Path(pgdata)
+        if pgdata.exists() and any(pgdata.iterdir()):
+            raise ValueError(f"{pgdata} is not empty")
+        name = base or self.base_before(target)
+
+        pgdata.mkdir(parents=True, exist_ok=True)
+        with open_decompressed(self.base.open_read(name)) as reader:
+            _extract(reader, pgdata)
+        # PostgreSQL refuses to start on a data directory others can read
+        pgdata.chmod(0o700)
+        (pgdata / "pg_wal").mkdir(exist_ok=True)
+
+        settings = [f"restore_command = {_conf_value(restore_command)}"]
+        if target is not None:
+            settings.append(f"recovery_target_time = {_conf_value(target.isoformat(sep=' '))}")
+        settings.append("recovery_target_action = 'promote'")
+        with open(pgdata / "postgresql.auto.conf", "a") as f:
+            f.write("\n# Added by fastapi-dbbackup pitr-restore\n" + "\n".join(settings) + "\n")
+        (pgdata / "recovery.signal").touch()
+
+        # Segments prefetched for an earlier restore to this path may be from another archive
+        shutil.rmtree(self._state("prefetch", pgdata / "pg_wal"), ignore_errors=True)
+        return name
@@ -0,0 +1,82 @@
+"""
+Database engines and storage backends by name, imported only when selected.
+
+Built-ins are listed by import path, so `fastapi-dbbackup list` on local
+storage never imports boto3 or SQLAlchemy. Other packages add engines and
+storages through entry points, which are only scanned for names that are
+not built in:
+
+    [project.entry-points."fastapi_dbbackup.engines"]
+    oracle = "my_package.oracle:OracleBackup"
+
+    [project.entry-points."fastapi_dbbackup.storages"]
+    sftp = "my_package.sftp:SFTPStorage"
+
+Applications can also register classes directly with `register_engine` and
+`register_storage`.
+"""
+import importlib
+from typing import Dict, List, Union
+
+ENGINE_GROUP = "fastapi_dbbackup.engines"
+STORAGE_GROUP = "fastapi_dbbackup.storages"
+
+_ENGINES: Dict[str, Union[str, type]] = {
+    "sqlite": "fastapi_dbbackup.engines.sqlite:SQLiteBackup",
+    "postgres": "fastapi_dbbackup.engines.postgres:PostgresBackup",
+    "postgresql": "fastapi_dbbackup.engines.postgres:PostgresBackup",
+    "postgres-base": "fastapi_dbbackup.engines.postgres:PostgresBaseBackup",
+    "mysql": "fastapi_dbbackup.engines.mysql:MySQLBackup",
+}
+_STORAGES: Dict[str, Union[str, type]] = {
+    "local": "fastapi_dbbackup.storage.local:LocalStorage",
+    "s3": "fastapi_dbbackup.storage.s3:S3Storage",
+}
+
+def register_engine(name: str, engine: Union[str, type]):
+    """Make a BackupEngine subclass, or its "module:Class" path, selectable as `name`."""
+    _ENGINES[name.lower()] = engine
+
+def register_storage(name: str, storage: Union[str, type]):
+    """Make a StorageBackend subclass, or its "module:Class" path, selectable as `name`."""
+    _STORAGES[name.lower()] = storage
+
+def load_engine(name: str) -> type:
+    """The engine class registered as `name`; raises ValueError if there is none."""
+    return _load(_ENGINES, ENGINE_GROUP, name, "database backend")
+
+def load_storage(name: str) -> type:
+    """The storage class registered as `name`; raises ValueError if there is none."""
+    return _load(_STORAGES, STORAGE_GROUP, name, "storage backend")
+
+def engine_names() -> List[str]:
+    return sorted(set(_ENGINES) | set(_entry_points(ENGINE_GROUP)))
+
+def storage_names() -> List[str]:
+    return sorted(set(_STORAGES) | set(_entry_points(STORAGE_GROUP)))
+
+def _load(registry: Dict[str, Union[str, type]], group: str, name: str, kind: str) -> type:
+    key = name.lower()
+    target = registry.get(key)
+    if target is None:
+        entry_point = _entry_points(group).get(key)
+        if entry_point is None:
+            raise ValueError(f"Unsupported {kind} '{name}'")
+        target = entry_point.value
+    if isinstance(target, str):
+        module, _, attr = target.partition(":")
+        target = getattr(importlib.import_module(module), attr)
+        # Later lookups skip the import machinery
+        registry[key] = target
+    return target
+
+def _entry_points(group: str) -> dict:
+    # importlib.metadata scans every installed distribution, so it is only
+    # consulted for names that are not built in
+    from importlib.metadata import entry_points
+    found = entry_points()
+    if hasattr(found, "select"):
+        found = found.select(group=group)
+    else:
+        found = found.get(group, [])
+    return {entry_point.name.lower(): entry_point for entry_point in found}
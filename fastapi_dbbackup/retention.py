@@ -1,45 +1,142 @@
-import os
-import time
 from datetime import datetime, timedelta
-from pathlib import Path
+from typing import Dict, List, Set, Tuple
 from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.storage.dedup import DedupStorage
+
+def _backup_date(backup: str) -> datetime:
+    # Expected format: default-YYYYMMDD-HHMMSS.extension[.gz]
+    # We try to extract the date part
+    parts = backup.split("-")
+    if len(parts) < 2:
+        raise ValueError(f"Unexpected backup name: {backup}")
+    date_str = parts[1] # YYYYMMDD
+    return datetime.strptime(date_str, "%Y%m%d")
+
+def _is_incremental(backup: str) -> bool:
+    # Incremental backups are named default-YYYYMMDD-HHMMSS.sqlite3.inc[.gz]
+    return "inc" in backup.split(".")[1:]
+
+def _chain_dependencies(backups: List[str], keep: Set[str]) -> Set[str]:
+    """
+    Backups that kept incremental backups depend on: every earlier backup
+    back to (and including) the most recent full backup.
+    """
+    protected = set()
+    chain = []
+    for backup in sorted(backups):
+        if not _is_incremental(backup):
+            chain = []
+        elif backup in keep:
+            protected.update(chain)
+        chain.append(backup)
+    return protected
+
+def plan_deletions(backups: List[str], retention_days: int = 0, max_backups: int = 0) -> Tuple[Dict[str, str], Set[str]]:
+    """
+    The backups the rules select, with the rule ("age" or "count") that
+    selects each, and those of them kept because a newer incremental backup needs them.
+    """
+    to_delete = {}
+
+    if retention_days > 0:
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        for backup in backups:
+            try:
+                if _backup_date(backup) < cutoff:
+                    to_delete[backup] = "age"
+            except (ValueError, IndexError):
+                # If filename doesn't match format, skip it
+                continue
+
+    if max_backups > 0:
+        # Sort backups by name (which includes YYYYMMDD-HHMMSS)
+        remaining = sorted(set(backups) - set(to_delete))
+        # Identify backups to delete (the oldest ones)
+        for backup in remaining[:-max_backups]:
+            to_delete[backup] = "count"
+
+    # Never break an incremental chain that a kept backup still needs
+    protected = _chain_dependencies(backups, set(backups) - set(to_delete))
+    return to_delete, protected & set(to_delete)
+
+def select_backups_to_delete(backups: List[str], retention_days: int = 0, max_backups: int = 0) -> List[str]:
+    """
+    Compute the full deletion set from a single listing: backups older than
+    `retention_days`, then the oldest of the rest beyond `max_backups`.
+    """
+    to_delete, protected = plan_deletions(backups, retention_days, max_backups)
+    for backup, reason in to_delete.items():
+        if backup in protected:
+            print(f"Keeping old backup {backup}: required by a newer incremental backup")
+        else:
+            print(f"Deleting old backup ({reason}): {backup}")
+    return [backup for backup in to_delete if backup not in protected]
+
+def purge_backups(storage: StorageBackend, retention_days: int = 0, max_backups: int = 0) -> List[str]:
+    """Apply both retention rules with one listing and one batched delete."""
+    if retention_days <= 0 and max_backups <= 0:
+        return []
+
+    to_delete = select_backups_to_delete(storage.list_backups(), retention_days, max_backups)
+    if to_delete:
+        storage.delete_many(to_delete)
+    return to_delete
+
+def storage_leaves(storage: StorageBackend) -> List[StorageBackend]:
+    """The storages that hold the data, below wrapper layers and fan-out targets."""
+    if hasattr(storage, "put_lifecycle_rule"):
+        return [storage]
+    if hasattr(storage, "targets"):
+        return [leaf for target in storage.targets.values() for leaf in storage_leaves(target)]
+    inner = getattr(storage, "storage", None)
+    return storage_leaves(inner) if inner is not None else [storage]
+
+def lifecycle_storages(storage: StorageBackend) -> List[StorageBackend]:
+    """The storages below `storage` that can enforce retention themselves (S3 lifecycle rules)."""
+    return [leaf for leaf in storage_leaves(storage) if hasattr(leaf, "put_lifecycle_rule")]
+
+def client_retention_days(storage: StorageBackend, retention_days: int, lifecycle: bool) -> int:
+    """
+    The age limit left for the client to enforce: none once lifecycle rules
+    expire old backups on every storage, since deleting them again is just API calls.
+    """
+    leaves = storage_leaves(storage)
+    if lifecycle and leaves and all(hasattr(leaf, "put_lifecycle_rule") for leaf in leaves):
+        return 0
+    return retention_days
+
+def apply_offline_retention(storage: StorageBackend, retention_days: int = 0, max_backups: int = 0, lifecycle: bool = False) -> List[str]:
+    """
+    Retention run apart from backups (`retention apply`, or the daemon once
+    a backup has released its slots): the rules lifecycle rules don't cover.
+    """
+    return purge_backups(storage, client_retention_days(storage, retention_days, lifecycle), max_backups)
+
+def abort_orphaned_uploads(storage: StorageBackend) -> List[str]:
+    """Abort multipart uploads left behind on the S3 storages below `storage`; returns their keys."""
+    return [key for leaf in lifecycle_storages(storage) for key in leaf.abort_orphaned_uploads()]
 
 def purge_old_backups(storage: StorageBackend, retention_days: int):
     if retention_days <= 0:
         return
-
-    cutoff = datetime.now() - timedelta(days=retention_days)
-    backups = storage.list_backups()
-
-    for backup in backups:
-        # Expected format: default-YYYYMMDD-HHMMSS.extension[.gz]
-        # We try to extract the date part
-        try:
-            parts = backup.split("-")
-            if len(parts) >= 2:
-                date_str = parts[1] # YYYYMMDD
-                backup_date = datetime.strptime(date_str, "%Y%m%d")
-                if backup_date < cutoff:
-                    print(f"Deleting old backup (age): {backup}")
-                    storage.delete(backup)
-        except (ValueError, IndexError):
-            # If filename doesn't match format, skip it
-            continue
+    purge_backups(storage, retention_days=retention_days)
 
 def purge_max_backups(storage: StorageBackend, max_backups: int):
     if max_backups <= 0:
         return
+    purge_backups(storage, max_backups=max_backups)
 
-    backups = storage.list_backups()
-    if len(backups) <= max_backups:
-        return
-
-    # Sort backups by name (which includes YYYYMMDD-HHMMSS)
-    sorted_backups = sorted(backups)
-    
-    # Identify backups to delete (the oldest ones)
-    to_delete = sorted_backups[:-max_backups]
+def collect_garbage(storage: StorageBackend) -> List[str]:
+    """
+    Reference-aware garbage collection for deduplicated storage: recount chunk
+    references from every backup manifest and delete chunks nothing uses,
+    including chunks left behind by interrupted uploads.
+    """
+    # Unwrap layers such as the catalog to reach the deduplicating storage
+    while not isinstance(storage, DedupStorage) and hasattr(storage, "storage"):
+        storage = storage.storage
+    if not isinstance(storage, DedupStorage):
+        return []
 
-    for backup in to_delete:
-        print(f"Deleting old backup (count): {backup}")
-        storage.delete(backup)
+    storage.recount_references()
+    return storage.collect_unreferenced()
@@ -0,0 +1,203 @@
+"""
+Optional FastAPI integration: a router to trigger backups and restores and
+poll their status, and a lifespan hook that owns the running jobs.
+
+    manager = BackupManager(retention_days=7)
+    app = FastAPI(lifespan=backup_lifespan(manager))
+    app.include_router(create_router(manager), prefix="/admin/backups")
+
+The routes have no authentication of their own; pass `dependencies=[...]`
+to `create_router` to protect them. `GET /metrics` serves per-stage metrics
+of the latest backup and restore in the Prometheus text format.
+"""
+import asyncio
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi_dbbackup import aio
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import Codec
+from fastapi_dbbackup.encrypt import Encryptor, Keyring
+from fastapi_dbbackup.metrics import MetricsExporter, RunMetrics
+from fastapi_dbbackup.storage.base import StorageBackend
+
+try:
+    from fastapi import APIRouter, HTTPException
+    from fastapi.responses import PlainTextResponse
+except ImportError:
+    raise RuntimeError("The FastAPI integration requires the 'fastapi' package: pip install fastapi-dbbackup[fastapi]")
+
+class BackupManager:
+    """
+    Runs backup and restore jobs as asyncio tasks, one at a time, and keeps
+    the status of the last `history` jobs. Engine, storage, encryptor and
+    keyring default to the environment configuration used by the CLI.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[BackupEngine] = None,
+        storage: Optional[StorageBackend] = None,
+        codec: Optional[Codec] = None,
+        level: Optional[int] = None,
+        workers: Optional[int] = None,
+        retention_days: int = 0,
+        max_backups: int = 0,
+        history: int = 100,
+        exporter: Optional[MetricsExporter] = None,
+        encryptor: Optional[Encryptor] = None,
+        keyring: Optional[Keyring] = None,
+    ):
+        self.engine = engine
+        self.storage = storage
+        self.codec = codec
+        self.level = level
+        self.workers = workers
+        self.retention_days = retention_days
+        self.max_backups = max_backups
+        self.history = history
+        self.encryptor = encryptor
+        self.keyring = keyring
+        self._encryption_resolved = False
+        # Keeps the latest runs for GET /metrics; pass one to also write a textfile or push
+        self.exporter = exporter or MetricsExporter(summary=False)
+        self.jobs: Dict[str, dict] = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _resolve(self):
+        if self.engine is None or self.storage is None:
+            self.engine, self.storage = aio._defaults(self.engine, self.storage)
+        if not self._encryption_resolved:
+            self.encryptor, self.keyring = aio._encryption_defaults(self.encryptor, self.keyring)
+            self._encryption_resolved = True
+
+    def _start(self, kind: str, run) -> dict:
+        if self._lock is None:
+            # Created lazily so it binds to the running loop
+            self._lock = asyncio.Lock()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "error": None,
+            "metrics": None,
+        }
+        self.jobs[job["id"]] = job
+        while len(self.jobs) > self.history:
+            oldest = next(iter(self.jobs))
+            if oldest in self._tasks:
+                break
+            del self.jobs[oldest]
+        self._tasks[job["id"]] = asyncio.ensure_future(self._run(job, run))
+        return job
+
+    async def _run(self, job: dict, run):
+        metrics = RunMetrics(job["kind"])
+        try:
+            # Backups and restores of the same database never overlap
+            async with self._lock:
+                job["status"] = "running"
+                job["started"] = datetime.now().isoformat(timespec="seconds")
+                self._resolve()
+                job["result"] = await run(metrics)
+                job["status"] = "succeeded"
+                metrics.finish(backup=job["result"])
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            metrics.finish(RuntimeError("Cancelled"))
+            raise
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            metrics.finish(e)
+        finally:
+            job["finished"] = datetime.now().isoformat(timespec="seconds")
+            job["metrics"] = metrics.summary()
+            self._tasks.pop(job["id"], None)
+            if job["started"]:
+                # Exporting may write a file or push over HTTP; keep it off the loop
+                asyncio.get_running_loop().run_in_executor(None, self.exporter.export, metrics)
+
+    def start_backup(self) -> dict:
+        return self._start("backup", lambda metrics: aio.run_backup(
+            self.engine,
+            self.storage,
+            codec=self.codec,
+            level=self.level,
+            workers=self.workers,
+            retention_days=self.retention_days,
+            max_backups=self.max_backups,
+            metrics=metrics,
+            encryptor=self.encryptor,
+        ))
+
+    def start_restore(self, remote_path: Optional[str] = None) -> dict:
+        return self._start("restore", lambda metrics: aio.run_restore(
+            self.engine, self.storage, remote_path, metrics=metrics, keyring=self.keyring
+        ))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.jobs.get(job_id)
+
+    async def list_backups(self) -> List[str]:
+        self._resolve()
+        return await aio.list_backups(self.storage)
+
+    async def shutdown(self, cancel: bool = False):
+        """Wait for running jobs to finish, or cancel them."""
+        tasks = list(self._tasks.values())
+        if cancel:
+            for task in tasks:
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def backup_lifespan(manager: BackupManager, cancel_on_shutdown: bool = False):
+    """Lifespan hook that exposes `manager` as `app.state.dbbackup` and drains its jobs on shutdown."""
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.dbbackup = manager
+        try:
+            yield
+        finally:
+            await manager.shutdown(cancel=cancel_on_shutdown)
+    return lifespan
+
+def create_router(manager: BackupManager, **kwargs) -> APIRouter:
+    """Build the backup routes; extra keyword arguments are passed to `APIRouter`."""
+    router = APIRouter(**kwargs)
+
+    @router.get("/")
+    async def list_backups():
+        return {"backups": await manager.list_backups()}
+
+    @router.post("/", status_code=202)
+    async def start_backup():
+        return manager.start_backup()
+
+    @router.post("/restore", status_code=202)
+    async def start_restore(filename: Optional[str] = None):
+        return manager.start_restore(filename)
+
+    @router.get("/jobs")
+    async def list_jobs():
+        return {"jobs": list(manager.jobs.values())}
+
+    @router.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        job = manager.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    @router.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return manager.exporter.text()
+
+    return router
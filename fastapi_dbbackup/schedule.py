@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from typing import List, Set
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+# (minimum, maximum) of each field: minute, hour, day of month, month, day of week
+FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+def _parse_field(field: str, minimum: int, maximum: int) -> Set[int]:
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+            if step < 1:
+                raise ValueError(f"Invalid step in cron field: {field}")
+        if part == "*":
+            start, end = minimum, maximum
+        elif "-" in part:
+            start_str, end_str = part.split("-", 1)
+            start, end = int(start_str), int(end_str)
+        else:
+            start = int(part)
+            # "5/15" means every 15 starting at 5
+            end = maximum if step > 1 else start
+        if maximum == 6 and end == 7:
+            # Both 0 and 7 mean Sunday
+            values.add(0)
+            end = 6
+            if start == 7:
+                continue
+        if start < minimum or end > maximum or start > end:
+            raise ValueError(f"Cron field out of range: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    """
+    A standard five-field cron expression (minute hour day month weekday),
+    with `*`, ranges, lists, steps and the `@daily`-style aliases.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        try:
+            parsed: List[Set[int]] = [
+                _parse_field(field, minimum, maximum) for field, (minimum, maximum) in zip(fields, FIELDS)
+            ]
+        except ValueError:
+            raise ValueError(f"Invalid cron expression: {expression}")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = parsed
+        # Like cron, restricting both day fields matches either of them
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        # datetime.weekday() counts from Monday, cron from Sunday
+        weekday = (moment.weekday() + 1) % 7
+        if self._any_day or self._any_weekday:
+            return moment.day in self.days and weekday in self.weekdays
+        return moment.day in self.days or weekday in self.weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching minute strictly after `moment`."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                # Jump to the first minute of the next month
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression}")
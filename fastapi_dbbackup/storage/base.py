@@ -1,8 +1,31 @@
+import io
+import os
+import random
+import tempfile
+import time
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, BinaryIO
+from typing import Callable, List, BinaryIO, Optional, Tuple
+
+class _DownloadedFile(io.FileIO):
+    """A temporary download, deleted once closed."""
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            Path(self.name).unlink(missing_ok=True)
 
 class StorageBackend(ABC):
+    @classmethod
+    def from_settings(cls, settings) -> "StorageBackend":
+        """
+        Create the storage from the environment settings (a config.Settings).
+        Storages added through the registry implement this to be selectable
+        with DBBACKUP_STORAGE.
+        """
+        raise NotImplementedError(f"{cls.__name__} cannot be configured from the environment")
+
     @abstractmethod
     def upload(self, local_path: Path) -> str:
         """Upload a file to storage and return its remote path/identifier."""
@@ -18,6 +41,21 @@ class StorageBackend(ABC):
         """Download a file from storage to a local path."""
         pass
 
+    def open_read(self, remote_path: str) -> BinaryIO:
+        """
+        Open a backup in storage as a readable file-like object. By default it
+        is downloaded to a temporary file first; backends that can stream
+        override this.
+        """
+        fd, path = tempfile.mkstemp(prefix=".dbbackup-")
+        os.close(fd)
+        try:
+            self.download(remote_path, Path(path))
+            return _DownloadedFile(path, "rb")
+        except BaseException:
+            Path(path).unlink(missing_ok=True)
+            raise
+
     @abstractmethod
     def list_backups(self) -> List[str]:
         """List all available backups in storage."""
@@ -27,3 +65,55 @@ class StorageBackend(ABC):
     def delete(self, remote_path: str):
         """Delete a backup from storage."""
         pass
+
+    def delete_many(self, remote_paths: List[str]):
+        """Delete several backups from storage. Backends may batch or parallelise this."""
+        for remote_path in remote_paths:
+            self.delete(remote_path)
+
+    def read_versioned(self, remote_path: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        Read a small metadata object (catalog, chunk index) and a version tag
+        to pass to `write_versioned`. Returns (None, None) if it does not exist.
+        """
+        try:
+            with self.open_read(remote_path) as f:
+                return f.read(), None
+        except FileNotFoundError:
+            return None, None
+
+    def write_versioned(self, remote_path: str, data: bytes, version: Optional[str]) -> bool:
+        """
+        Write a small metadata object unless another writer replaced it since
+        `read_versioned` returned `version` (None: it did not exist), and
+        return whether it was written. Backends without conditional writes
+        always write.
+        """
+        self.upload_fileobj(io.BytesIO(data), remote_path)
+        return True
+
+    def recover_uploads(self) -> List[str]:
+        """
+        Optional: Finish uploads interrupted in an earlier run and clean up
+        those that cannot be finished. Returns the remote paths completed.
+        """
+        return []
+
+def update_object(
+    storage: StorageBackend,
+    remote_path: str,
+    update: Callable[[Optional[bytes]], bytes],
+    attempts: int = 10,
+) -> bytes:
+    """
+    Read-modify-write a metadata object: `update` maps its current contents
+    (None if missing) to the new ones. It runs again on the latest contents
+    if another process wrote the object in between.
+    """
+    for attempt in range(attempts):
+        data, version = storage.read_versioned(remote_path)
+        new = update(data)
+        if storage.write_versioned(remote_path, new, version):
+            return new
+        time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+    raise RuntimeError(f"Could not update {remote_path}: it kept changing")
@@ -0,0 +1,151 @@
+import io
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional
+from fastapi_dbbackup.compress import MAGIC_SIZE, detect_codec
+from fastapi_dbbackup.storage.base import StorageBackend, update_object
+from fastapi_dbbackup.storage.checksum import file_checksum
+from fastapi_dbbackup.streams import CountingReader
+
+# Hidden names are never reported as backups by the storage backends.
+CATALOG_NAME = ".catalog.json"
+CATALOG_VERSION = 1
+MB = 1024 * 1024
+
+def _timestamp_from_name(name: str) -> Optional[str]:
+    # Expected format: default-YYYYMMDD-HHMMSS.extension[.gz]
+    parts = name.split(".")[0].split("-")
+    try:
+        return datetime.strptime(f"{parts[1]}-{parts[2]}", "%Y%m%d-%H%M%S").isoformat()
+    except (ValueError, IndexError):
+        return None
+
+class CatalogStorage(StorageBackend):
+    """
+    Wraps a storage backend and keeps a manifest of its backups in a single
+    `.catalog.json` object next to them. Listings are served from the
+    manifest instead of listing the whole prefix, and the manifest is
+    rewritten in one request whenever a backup is uploaded or deleted.
+    Each rewrite starts from the latest stored manifest and is a conditional
+    write where the backend supports one, so other processes' changes are kept.
+    """
+
+    def __init__(self, storage: StorageBackend, engine: Optional[str] = None, checksum: Optional[str] = None):
+        self.storage = storage
+        self.engine = engine
+        # hashlib algorithm for the checksum recorded with each upload
+        self.algorithm = checksum
+        self._entries: Optional[Dict[str, dict]] = None
+
+    def _load(self, reload: bool = False) -> Dict[str, dict]:
+        # Long-lived processes (daemon, router) reload before relying on the
+        # listing, as CLI runs and other hosts update the manifest too
+        if self._entries is None or reload:
+            data, _ = self.storage.read_versioned(CATALOG_NAME)
+            if data is None:
+                # First use: build the catalog from a full listing
+                self.reindex()
+            else:
+                self._entries = {entry["name"]: entry for entry in json.loads(data)["backups"]}
+        return self._entries
+
+    def _listed(self, previous: Dict[str, dict]) -> Dict[str, dict]:
+        entries = {}
+        for name in self.storage.list_backups():
+            entries[name] = previous.get(name) or {
+                "name": name,
+                "size": None,
+                "timestamp": _timestamp_from_name(name),
+                "codec": None,
+                "checksum": None,
+                "engine": None,
+            }
+        return entries
+
+    def _update(self, change: Callable[[Dict[str, dict]], None], rebuild: bool = False):
+        """Apply `change` to the latest stored manifest and write it back."""
+        def apply(data: Optional[bytes]) -> bytes:
+            entries = {entry["name"]: entry for entry in json.loads(data)["backups"]} if data is not None else {}
+            if rebuild or data is None:
+                entries = self._listed(entries)
+            change(entries)
+            self._entries = entries
+            manifest = {
+                "version": CATALOG_VERSION,
+                "updated": datetime.now().isoformat(),
+                "backups": sorted(entries.values(), key=lambda entry: entry["name"]),
+            }
+            return json.dumps(manifest, indent=1).encode()
+        update_object(self.storage, CATALOG_NAME, apply)
+
+    def reindex(self) -> int:
+        """Rebuild the catalog from a full listing, keeping known metadata."""
+        self._update(lambda entries: None, rebuild=True)
+        return len(self._entries)
+
+    def entries(self) -> List[dict]:
+        return sorted(self._load(reload=True).values(), key=lambda entry: entry["name"])
+
+    def record(self, name: str, size: Optional[int] = None, codec: Optional[str] = None, checksum: Optional[str] = None):
+        entry = {
+            "name": name,
+            "size": size,
+            "timestamp": _timestamp_from_name(name) or datetime.now().isoformat(),
+            "codec": codec,
+            "checksum": checksum,
+            "engine": self.engine,
+        }
+        self._update(lambda entries: entries.update({name: entry}))
+
+    def checksum(self, remote_path: str) -> Optional[str]:
+        entry = self._load().get(remote_path) or self._load(reload=True).get(remote_path)
+        return entry["checksum"] if entry else None
+
+    def upload(self, local_path: Path) -> str:
+        with open(local_path, "rb") as f:
+            codec = detect_codec(f.read(MAGIC_SIZE))
+        size = local_path.stat().st_size
+        checksum = file_checksum(local_path, self.algorithm) if self.algorithm else None
+        name = self.storage.upload(local_path)
+        self.record(name, size=size, codec=codec.name if codec else None, checksum=checksum)
+        return name
+
+    def upload_fileobj(self, fileobj: BinaryIO, remote_path: str) -> str:
+        counter = CountingReader(fileobj, MAGIC_SIZE, algorithm=self.algorithm)
+        name = self.storage.upload_fileobj(counter, remote_path)
+        codec = detect_codec(counter.head)
+        self.record(name, size=counter.bytes_read, codec=codec.name if codec else None, checksum=counter.checksum)
+        return name
+
+    def recover_uploads(self) -> List[str]:
+        names = self.storage.recover_uploads()
+        for name in names:
+            # The interrupted run never got to record the upload; read the stored copy once
+            with self.storage.open_read(name) as f:
+                counter = CountingReader(f, MAGIC_SIZE, algorithm=self.algorithm)
+                while counter.read(MB):
+                    pass
+            codec = detect_codec(counter.head)
+            self.record(name, size=counter.bytes_read, codec=codec.name if codec else None, checksum=counter.checksum)
+        return names
+
+    def download(self, remote_path: str, local_path: Path):
+        self.storage.download(remote_path, local_path)
+
+    def open_read(self, remote_path: str) -> BinaryIO:
+        return self.storage.open_read(remote_path)
+
+    def list_backups(self) -> List[str]:
+        return list(self._load(reload=True))
+
+    def delete(self, remote_path: str):
+        self.delete_many([remote_path])
+
+    def delete_many(self, remote_paths: List[str]):
+        self.storage.delete_many(remote_paths)
+
+        def change(entries: Dict[str, dict]):
+            for remote_path in remote_paths:
+                entries.pop(remote_path, None)
+        self._update(change)
@@ -0,0 +1,90 @@
+import hashlib
+import io
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, List, Optional, Tuple
+from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.streams import CountingReader
+
+MB = 1024 * 1024
+SIDECAR_SUFFIX = ".checksum"
+
+def sidecar_name(remote_path: str) -> str:
+    # Hidden, so listings and retention never see it as a backup
+    path = PurePosixPath(remote_path)
+    return str(path.with_name(f".{path.name}{SIDECAR_SUFFIX}"))
+
+def parse_checksum(checksum: str) -> Tuple[str, str]:
+    """Split "<algorithm>:<hex>" into its parts."""
+    algorithm, _, digest = checksum.strip().partition(":")
+    if not digest:
+        raise ValueError(f"Malformed checksum: {checksum!r}")
+    return algorithm, digest
+
+def file_checksum(path: Path, algorithm: str) -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(MB), b""):
+            digest.update(chunk)
+    return f"{digest.name}:{digest.hexdigest()}"
+
+class ChecksumStorage(StorageBackend):
+    """
+    Wraps a storage backend and records a checksum of every backup in a
+    hidden sidecar object (`.<name>.checksum`). Streams are hashed inline
+    as they are uploaded, with no extra read pass.
+    """
+
+    def __init__(self, storage: StorageBackend, algorithm: str = "sha256"):
+        self.storage = storage
+        self.algorithm = algorithm
+        hashlib.new(algorithm)  # Fail early on an unknown algorithm
+
+    def _write_sidecar(self, remote_path: str, checksum: str):
+        self.storage.upload_fileobj(io.BytesIO(f"{checksum}\n".encode()), sidecar_name(remote_path))
+
+    def checksum(self, remote_path: str) -> Optional[str]:
+        """The recorded checksum of a backup, or None if it has none."""
+        try:
+            with self.storage.open_read(sidecar_name(remote_path)) as f:
+                return f.read().decode().strip()
+        except FileNotFoundError:
+            return None
+
+    def upload(self, local_path: Path) -> str:
+        checksum = file_checksum(local_path, self.algorithm)
+        name = self.storage.upload(local_path)
+        self._write_sidecar(name, checksum)
+        return name
+
+    def upload_fileobj(self, fileobj: BinaryIO, remote_path: str) -> str:
+        reader = CountingReader(fileobj, algorithm=self.algorithm)
+        name = self.storage.upload_fileobj(reader, remote_path)
+        self._write_sidecar(name, reader.checksum)
+        return name
+
+    def download(self, remote_path: str, local_path: Path):
+        self.storage.download(remote_path, local_path)
+
+    def open_read(self, remote_path: str) -> BinaryIO:
+        return self.storage.open_read(remote_path)
+
+    def list_backups(self) -> List[str]:
+        return self.storage.list_backups()
+
+    def recover_uploads(self) -> List[str]:
+        names = self.storage.recover_uploads()
+        for name in names:
+            # The interrupted run never got to record the checksum; hash the stored copy
+            with self.storage.open_read(name) as f:
+                reader = CountingReader(f, algorithm=self.algorithm)
+                while reader.read(MB):
+                    pass
+            self._write_sidecar(name, reader.checksum)
+        return names
+
+    def delete(self, remote_path: str):
+        self.delete_many([remote_path])
+
+    def delete_many(self, remote_paths: List[str]):
+        self.storage.delete_many(remote_paths)
+        self.storage.delete_many([sidecar_name(remote_path) for remote_path in remote_paths])
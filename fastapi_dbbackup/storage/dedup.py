@@ -0,0 +1,438 @@
+import hashlib
+import io
+import json
+import shutil
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from fastapi_dbbackup.compress import get_codec, open_decompressed
+from fastapi_dbbackup.storage.base import StorageBackend, update_object
+
+KB = 1024
+MB = 1024 * KB
+
+# Hidden names are never reported as backups by the storage backends.
+CHUNK_DIR = ".chunks"
+INDEX_NAME = f"{CHUNK_DIR}/index.json"
+# Chunks are deleted this many at a time, re-checking the index before each batch
+COLLECT_BATCH = 1000
+MANIFEST_FORMAT = "fastapi-dbbackup-dedup"
+# Manifests are written with "format" first, so these bytes tell them apart
+# from backups stored before deduplication was turned on without parsing them
+MANIFEST_MAGIC = b'{"format": "%s"' % MANIFEST_FORMAT.encode()
+
+# Chunk boundaries are only considered at this byte. Hashing a window before
+# each candidate (rather than at every byte) keeps chunking at C speed while
+# boundaries still depend only on nearby content, so an insertion early in a
+# dump only changes the chunks around it.
+ANCHOR = b"\n"
+WINDOW = 48
+
+def _find_cut(buf: bytearray, start: int, end: int, min_size: int, mask: int) -> int:
+    pos = start + min_size
+    while True:
+        p = buf.find(ANCHOR, pos, end)
+        if p < 0:
+            return end
+        if zlib.crc32(buf[p - WINDOW:p]) & mask == 0:
+            return p + 1
+        pos = p + 1
+
+def iter_chunks(
+    fileobj: BinaryIO,
+    min_size: int = 256 * KB,
+    max_size: int = 8 * MB,
+    mask_bits: int = 12,
+) -> Iterator[bytes]:
+    """Split a stream into content-defined chunks of `min_size`..`max_size` bytes."""
+    mask = (1 << mask_bits) - 1
+    buf = bytearray()
+    start = 0
+    eof = False
+    while True:
+        while not eof and len(buf) - start < max_size:
+            data = fileobj.read(max_size)
+            if not data:
+                eof = True
+                break
+            if start:
+                # Compact lazily instead of shifting the buffer after every chunk
+                del buf[:start]
+                start = 0
+            buf += data
+        available = len(buf) - start
+        if not available:
+            return
+        if available <= min_size:
+            cut = len(buf)
+        else:
+            cut = _find_cut(buf, start, start + min(available, max_size), min_size, mask)
+        yield bytes(buf[start:cut])
+        start = cut
+
+def _is_metadata(remote_path: str) -> bool:
+    # Hidden objects (catalog, checksum sidecars) are small metadata, stored as is
+    return Path(remote_path).name.startswith(".")
+
+def _chunk_name(digest: str) -> str:
+    return f"{CHUNK_DIR}/{digest[:2]}/{digest}"
+
+class DedupReader(io.RawIOBase):
+    """Reassembles a deduplicated backup, prefetching chunks in parallel."""
+
+    def __init__(self, storage: StorageBackend, chunks: List[list], workers: int = 8):
+        self.storage = storage
+        self._chunks = iter(chunks)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._pending = deque()
+        self._ahead = workers * 2
+        self._current = memoryview(b"")
+        self._fill()
+
+    def readable(self) -> bool:
+        return True
+
+    def _fetch(self, digest: str) -> bytes:
+        with open_decompressed(self.storage.open_read(_chunk_name(digest))) as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise IOError(f"Chunk {digest} is corrupt")
+        return data
+
+    def _fill(self):
+        while len(self._pending) < self._ahead:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return
+            self._pending.append(self._pool.submit(self._fetch, chunk[0]))
+
+    def readinto(self, buffer) -> int:
+        if not self._current:
+            if not self._pending:
+                return 0
+            self._current = memoryview(self._pending.popleft().result())
+            self._fill()
+        view = memoryview(buffer).cast("B")
+        n = min(len(view), len(self._current))
+        view[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        for future in self._pending:
+            future.cancel()
+        self._pool.shutdown(wait=False)
+        super().close()
+
+class DedupStorage(StorageBackend):
+    """
+    Deduplicating repository layered on another storage backend.
+
+    Uploads are split into content-defined chunks, each stored once under its
+    SHA-256 in `.chunks/`, optionally compressed. A backup is a small JSON
+    manifest listing its chunks. `.chunks/index.json` keeps a reference
+    count per chunk so deletes can remove chunks no backup uses any more.
+
+    Other processes (`gc`, `retention apply`, the daemon) share the index.
+    Every change is applied to the latest stored index with a conditional
+    write, and a chunk is only deleted once it has had no references for
+    `gc_grace` seconds: uploads in progress index their new chunks before any
+    manifest references them, and rely on chunks a concurrent delete may
+    just have released.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        codec: Optional[str] = None,
+        level: Optional[int] = None,
+        workers: int = 8,
+        gc_grace: float = 24 * 3600,
+    ):
+        self.storage = storage
+        self.codec = get_codec(codec) if codec else None
+        self.level = level
+        self.workers = max(workers, 1)
+        self.gc_grace = gc_grace
+        self._refs: Optional[Dict[str, int]] = None
+        # When each chunk without references was left without them (Unix time)
+        self._unreferenced: Dict[str, float] = {}
+
+    def _read_manifest(self, remote_path: str) -> Optional[dict]:
+        """The manifest stored at `remote_path`, or None if it holds a plain (non-deduplicated) backup."""
+        with self.storage.open_read(remote_path) as f:
+            head = f.read(len(MANIFEST_MAGIC))
+            if head != MANIFEST_MAGIC:
+                return None
+            return json.loads(head + f.read())
+
+    def _parse_index(self, data: bytes):
+        index = json.loads(data)
+        refs, unreferenced = index["refs"], index.get("unreferenced", {})
+        now = time.time()
+        for digest, count in refs.items():
+            if count <= 0:
+                # Indexes written before grace periods: the grace period starts now
+                unreferenced.setdefault(digest, now)
+        return refs, unreferenced
+
+    def _load_refs(self, reload: bool = False) -> Dict[str, int]:
+        # Other processes (`gc`, `retention apply`) may have changed the index
+        # since it was loaded; callers about to rely on it ask for a reload
+        if self._refs is None or reload:
+            data, _ = self.storage.read_versioned(INDEX_NAME)
+            if data is None:
+                self._update_index(lambda refs, unreferenced: None)
+            else:
+                self._refs, self._unreferenced = self._parse_index(data)
+        return self._refs
+
+    def _update_index(self, change: Callable[[Dict[str, int], Dict[str, float]], None]):
+        """Apply `change` to the latest stored index and write it back."""
+        def apply(data: Optional[bytes]) -> bytes:
+            if data is None:
+                refs, unreferenced = self.count_references(), {}
+            else:
+                refs, unreferenced = self._parse_index(data)
+            change(refs, unreferenced)
+            self._refs, self._unreferenced = refs, unreferenced
+            return json.dumps({"refs": refs, "unreferenced": unreferenced}).encode()
+        update_object(self.storage, INDEX_NAME, apply)
+
+    def _claim(self, digests: Set[str]):
+        """Index chunks an upload in progress relies on, restarting their grace period if unreferenced."""
+        now = time.time()
+        def change(refs: Dict[str, int], unreferenced: Dict[str, float]):
+            for digest in digests:
+                if refs.setdefault(digest, 0) <= 0:
+                    unreferenced[digest] = now
+        self._update_index(change)
+
+    def count_references(self) -> Dict[str, int]:
+        """Count chunk references from every manifest (a full scan)."""
+        refs: Dict[str, int] = {}
+        for name in self.storage.list_backups():
+            try:
+                manifest = self._read_manifest(name)
+            except (FileNotFoundError, ValueError):
+                continue
+            if manifest is None:
+                continue
+            for digest in {chunk[0] for chunk in manifest["chunks"]}:
+                refs[digest] = refs.get(digest, 0) + 1
+        return refs
+
+    def _encode(self, data: bytes) -> bytes:
+        if not self.codec:
+            return data
+        out = io.BytesIO()
+        with self.codec.open_writer(out, level=self.level, workers=1) as writer:
+            writer.write(data)
+        return out.getvalue()
+
+    def _put_chunk(self, digest: str, data: bytes):
+        self.storage.upload_fileobj(io.BytesIO(self._encode(data)), _chunk_name(digest))
+
+    def upload(self, local_path: Path) -> str:
+        with open(local_path, "rb") as f:
+            return self.upload_fileobj(f, local_path.name)
+
+    def upload_fileobj(self, fileobj: BinaryIO, remote_path: str) -> str:
+        if _is_metadata(remote_path):
+            return self.storage.upload_fileobj(fileobj, remote_path)
+        # A chunk is only skipped if the current index knows it; a stale copy
+        # could point at chunks a concurrent `gc` has deleted
+        refs = self._load_refs(reload=True)
+        chunks = []
+        size = 0
+        uploading = deque()
+        in_flight = set()
+        # Every chunk this backup uses, and those of them already in the index
+        claimed: Set[str] = set()
+        indexed: Set[str] = set(refs)
+        revived: Set[str] = set()
+        stored = 0
+        last_claim = time.monotonic()
+
+        def claim():
+            # Index finished chunks and restart the grace period of unreferenced
+            # ones, so a crashed run leaves them for garbage collection and a
+            # long upload keeps them from it
+            nonlocal last_claim
+            ready = claimed - in_flight
+            self._claim(ready)
+            indexed.update(ready)
+            last_claim = time.monotonic()
+
+        def settle(block: bool):
+            nonlocal stored
+            while uploading and (block or uploading[0][1].done()):
+                digest, future = uploading.popleft()
+                future.result()
+                in_flight.discard(digest)
+                stored += 1
+                if stored % 256 == 0:
+                    claim()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for data in iter_chunks(fileobj):
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append([digest, len(data)])
+                size += len(data)
+                if time.monotonic() - last_claim > self.gc_grace / 4:
+                    claim()
+                if digest in claimed:
+                    continue
+                claimed.add(digest)
+                if digest in refs:
+                    released = self._unreferenced.get(digest) if refs[digest] <= 0 else None
+                    if released is None or time.time() - released < self.gc_grace / 2:
+                        # Referenced, or unreferenced recently enough that claims keep it
+                        continue
+                    # Due for collection: claim it before storing it again, so
+                    # a `gc` that has not deleted it yet leaves it alone
+                    self._claim({digest})
+                    revived.add(digest)
+                # Bound memory: at most two chunks per worker are queued
+                if len(uploading) >= self.workers * 2:
+                    uploading[0][1].result()
+                settle(block=False)
+                uploading.append((digest, pool.submit(self._put_chunk, digest, data)))
+                in_flight.add(digest)
+            settle(block=True)
+
+        def reference(refs: Dict[str, int], unreferenced: Dict[str, float]):
+            collected = [digest for digest in claimed & indexed if digest not in refs]
+            if collected:
+                raise IOError(f"{len(collected)} chunks of {remote_path} were garbage-collected during the upload; run the backup again")
+            for digest in claimed:
+                refs[digest] = refs.get(digest, 0) + 1
+                unreferenced.pop(digest, None)
+        self._update_index(reference)
+        for digest in revived:
+            # A `gc` that picked it before the claim may still have deleted it
+            try:
+                self.storage.open_read(_chunk_name(digest)).close()
+            except FileNotFoundError:
+                raise IOError(f"Chunk {digest} was garbage-collected during the upload of {remote_path}; run the backup again")
+
+        manifest = {
+            "format": MANIFEST_FORMAT,
+            "version": 1,
+            "size": size,
+            "codec": self.codec.name if self.codec else None,
+            "chunks": chunks,
+        }
+        self.storage.upload_fileobj(io.BytesIO(json.dumps(manifest).encode()), remote_path)
+        print(f"Stored {len(chunks)} chunks ({stored} new) for {remote_path}.")
+        return remote_path
+
+    def recover_uploads(self) -> List[str]:
+        # Chunks and manifests are single requests, so there is nothing to resume;
+        # this only cleans up multipart uploads left behind in the backend
+        self.storage.recover_uploads()
+        return []
+
+    def download(self, remote_path: str, local_path: Path):
+        with self.open_read(remote_path) as src, open(local_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, MB)
+
+    def open_read(self, remote_path: str) -> BinaryIO:
+        if _is_metadata(remote_path):
+            return self.storage.open_read(remote_path)
+        manifest = self._read_manifest(remote_path)
+        if manifest is None:
+            # Stored before deduplication was turned on
+            return self.storage.open_read(remote_path)
+        return DedupReader(self.storage, manifest["chunks"], workers=self.workers)
+
+    def read_versioned(self, remote_path: str) -> Tuple[Optional[bytes], Optional[str]]:
+        # Metadata objects (such as the catalog) are stored as is
+        return self.storage.read_versioned(remote_path)
+
+    def write_versioned(self, remote_path: str, data: bytes, version: Optional[str]) -> bool:
+        return self.storage.write_versioned(remote_path, data, version)
+
+    def list_backups(self) -> List[str]:
+        return self.storage.list_backups()
+
+    def delete(self, remote_path: str):
+        self.delete_many([remote_path])
+
+    def delete_many(self, remote_paths: List[str]):
+        metadata = [p for p in remote_paths if _is_metadata(p)]
+        if metadata:
+            self.storage.delete_many(metadata)
+            remote_paths = [p for p in remote_paths if not _is_metadata(p)]
+            if not remote_paths:
+                return
+        released = []
+        for remote_path in remote_paths:
+            try:
+                manifest = self._read_manifest(remote_path)
+            except FileNotFoundError:
+                continue
+            if manifest is None:
+                # Plain backups reference no chunks
+                continue
+            released.extend({chunk[0] for chunk in manifest["chunks"]})
+        # Drop the manifests first, so a crash leaves orphaned chunks rather than dangling backups
+        self.storage.delete_many(remote_paths)
+        now = time.time()
+
+        def release(refs: Dict[str, int], unreferenced: Dict[str, float]):
+            for digest in released:
+                refs[digest] = refs.get(digest, 1) - 1
+                if refs[digest] <= 0:
+                    unreferenced[digest] = now
+        self._update_index(release)
+        self.collect_unreferenced()
+
+    def recount_references(self):
+        """Rebuild reference counts from the manifests, keeping known chunks at zero."""
+        before = dict(self._load_refs(reload=True))
+        counted = self.count_references()
+        now = time.time()
+
+        def recount(refs: Dict[str, int], unreferenced: Dict[str, float]):
+            for digest in set(refs) | set(counted):
+                # Keep changes other processes made to the index during the scan
+                count = counted.get(digest, 0) + refs.get(digest, 0) - before.get(digest, 0)
+                refs[digest] = max(count, 0)
+                if count > 0:
+                    unreferenced.pop(digest, None)
+                else:
+                    unreferenced.setdefault(digest, now)
+        self._update_index(recount)
+
+    def collect_unreferenced(self) -> List[str]:
+        """
+        Delete chunks that have had no references for `gc_grace` seconds,
+        re-reading the index before each batch so chunks claimed meanwhile are kept.
+        """
+        garbage = []
+        tried = set()
+        while True:
+            self._load_refs(reload=True)
+            cutoff = time.time() - self.gc_grace
+            batch = [
+                digest for digest, count in self._refs.items()
+                if count <= 0 and self._unreferenced.get(digest, cutoff + 1) <= cutoff and digest not in tried
+            ][:COLLECT_BATCH]
+            if not batch:
+                return garbage
+            self.storage.delete_many([_chunk_name(digest) for digest in batch])
+
+            def forget(refs: Dict[str, int], unreferenced: Dict[str, float]):
+                for digest in batch:
+                    if refs.get(digest, 0) <= 0:
+                        refs.pop(digest, None)
+                        unreferenced.pop(digest, None)
+            self._update_index(forget)
+            tried.update(batch)
+            garbage.extend(batch)
@@ -0,0 +1,177 @@
+import io
+import queue
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional
+from fastapi_dbbackup.storage.base import StorageBackend
+
+MB = 1024 * 1024
+CHUNK_SIZE = MB
+# How often a blocked tee rechecks whether the target it waits on has failed
+POLL_INTERVAL = 0.5
+
+class TargetDropped(Exception):
+    pass
+
+class _QueueReader(io.RawIOBase):
+    """Reads the chunks the tee queues for one target; fails once the target is dropped."""
+
+    def __init__(self, chunks: queue.Queue):
+        self._chunks = chunks
+        self._current = memoryview(b"")
+        self._eof = False
+        self.error: Optional[Exception] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.error:
+            raise self.error
+        if not self._current:
+            if self._eof:
+                return 0
+            chunk = self._chunks.get()
+            if self.error:
+                # Woken up to abort
+                raise self.error
+            if chunk is None:
+                self._eof = True
+                return 0
+            self._current = memoryview(chunk)
+        view = memoryview(buffer).cast("B")
+        n = min(len(view), len(self._current))
+        view[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+class FanoutStorage(StorageBackend):
+    """
+    Stores every backup on several targets at once from a single stream.
+
+    The stream is read once and teed to each target through a queue of at
+    most `buffer_size` bytes, so a slower target applies backpressure. A
+    target that stays full for `timeout` seconds is dropped (its upload is
+    aborted) and the others carry on. Uploads succeed if at least one
+    target succeeds; `last_results` holds each target's error, or None.
+
+    Reads and listings are served by the first target.
+    """
+
+    def __init__(self, targets: Dict[str, StorageBackend], buffer_size: int = 64 * MB, timeout: float = 60):
+        if not targets:
+            raise ValueError("FanoutStorage needs at least one target")
+        self.targets = targets
+        self.buffer_size = max(buffer_size, CHUNK_SIZE)
+        self.timeout = timeout
+        self.last_results: Dict[str, Optional[Exception]] = {}
+
+    @property
+    def storage(self) -> StorageBackend:
+        return next(iter(self.targets.values()))
+
+    def with_prefix(self, prefix: str) -> "FanoutStorage":
+        targets = {name: target.with_prefix(prefix) for name, target in self.targets.items()}
+        return FanoutStorage(targets, buffer_size=self.buffer_size, timeout=self.timeout)
+
+    def _report(self, remote_path: str, futures: Dict[str, Future], dropped: Dict[str, Exception]) -> str:
+        results = {}
+        for name, future in futures.items():
+            # A dropped upload may be stuck in a network call; don't wait for it
+            results[name] = dropped[name] if name in dropped else future.exception()
+        self.last_results = results
+
+        failed = {name: error for name, error in results.items() if error is not None}
+        for name, error in failed.items():
+            print(f"Backup target {name} failed: {error}")
+        if len(failed) == len(results):
+            raise RuntimeError(f"All backup targets failed for {remote_path}")
+        print(f"Stored {remote_path} on {len(results) - len(failed)}/{len(results)} targets.")
+        return remote_path
+
+    def upload(self, local_path: Path) -> str:
+        with ThreadPoolExecutor(max_workers=len(self.targets)) as pool:
+            futures = {name: pool.submit(target.upload, local_path) for name, target in self.targets.items()}
+            return self._report(local_path.name, futures, {})
+
+    def upload_fileobj(self, fileobj: BinaryIO, remote_path: str) -> str:
+        depth = max(self.buffer_size // CHUNK_SIZE, 1)
+        queues = {name: queue.Queue(maxsize=depth) for name in self.targets}
+        readers = {name: _QueueReader(q) for name, q in queues.items()}
+        dropped: Dict[str, Exception] = {}
+        # Not a context manager: shutting down must not wait for dropped targets
+        pool = ThreadPoolExecutor(max_workers=len(self.targets))
+        futures = {
+            name: pool.submit(target.upload_fileobj, readers[name], remote_path)
+            for name, target in self.targets.items()
+        }
+
+        def put(name: str, item) -> bool:
+            deadline = time.monotonic() + self.timeout
+            while True:
+                if futures[name].done():
+                    # The target already failed; stop feeding it
+                    return False
+                try:
+                    queues[name].put(item, timeout=min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+                    return True
+                except queue.Full:
+                    if time.monotonic() >= deadline:
+                        dropped[name] = TargetDropped(f"no progress for {self.timeout:g}s")
+                        readers[name].error = dropped[name]
+                        return False
+
+        active = list(self.targets)
+        try:
+            while active:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                active = [name for name in active if put(name, chunk)]
+        except BaseException as e:
+            # The source failed: abort every upload rather than store a truncated backup
+            for reader in readers.values():
+                reader.error = e if isinstance(e, Exception) else RuntimeError("Upload interrupted")
+            for name in active:
+                try:
+                    queues[name].put_nowait(b"")
+                except queue.Full:
+                    pass
+            pool.shutdown(wait=False)
+            raise
+        for name in active:
+            put(name, None)
+        pool.shutdown(wait=False)
+        return self._report(remote_path, futures, dropped)
+
+    def recover_uploads(self) -> List[str]:
+        resumed = []
+        for name, target in self.targets.items():
+            try:
+                names = target.recover_uploads()
+            except Exception as e:
+                print(f"Backup target {name} could not recover uploads: {e}")
+                continue
+            resumed += [remote_path for remote_path in names if remote_path not in resumed]
+        return resumed
+
+    def download(self, remote_path: str, local_path: Path):
+        self.storage.download(remote_path, local_path)
+
+    def open_read(self, remote_path: str) -> BinaryIO:
+        return self.storage.open_read(remote_path)
+
+    def list_backups(self) -> List[str]:
+        return self.storage.list_backups()
+
+    def delete(self, remote_path: str):
+        self.delete_many([remote_path])
+
+    def delete_many(self, remote_paths: List[str]):
+        # Retention applies to every copy
+        with ThreadPoolExecutor(max_workers=len(self.targets)) as pool:
+            futures = [pool.submit(target.delete_many, remote_paths) for target in self.targets.values()]
+        errors = [f.exception() for f in futures if f.exception()]
+        if errors:
+            raise errors[0]
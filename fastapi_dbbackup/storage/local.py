@@ -1,13 +1,34 @@
+import io
+import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.streams import copy_stream
+
+try:
+    import fcntl
+except ImportError:  # Windows: metadata writes are not locked
+    fcntl = None
+
+def _version(stat: os.stat_result) -> str:
+    # Replacing a file renames a new inode into place, so the inode alone changes on every write
+    return f"{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}"
 
 class LocalStorage(StorageBackend):
     def __init__(self, backup_dir: Path):
         self.backup_dir = backup_dir
         self.backup_dir.mkdir(parents=True, exist_ok=True)
 
+    @classmethod
+    def from_settings(cls, settings) -> "LocalStorage":
+        return cls(settings.backup_dir)
+
+    def with_prefix(self, prefix: str) -> "LocalStorage":
+        """A storage in the `prefix` subdirectory of this one."""
+        return LocalStorage(self.backup_dir / prefix)
+
     def upload(self, local_path: Path) -> str:
         if local_path.parent != self.backup_dir:
             dest = self.backup_dir / local_path.name
@@ -17,8 +38,15 @@ class LocalStorage(StorageBackend):
 
     def upload_fileobj(self, fileobj: BinaryIO, remote_path: str) -> str:
         dest = self.backup_dir / remote_path
-        with open(dest, "wb") as f:
-            shutil.copyfileobj(fileobj, f)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a hidden temporary file and rename, so readers never see a partial file
+        tmp = dest.with_name(f".{dest.name}.part")
+        try:
+            with open(tmp, "wb") as f:
+                copy_stream(fileobj, f)
+            os.replace(tmp, dest)
+        finally:
+            tmp.unlink(missing_ok=True)
         return remote_path
 
     def download(self, remote_path: str, local_path: Path):
@@ -26,8 +54,44 @@ class LocalStorage(StorageBackend):
         if src != local_path:
             shutil.copy2(src, local_path)
 
+    def open_read(self, remote_path: str) -> BinaryIO:
+        return open(self.backup_dir / remote_path, "rb")
+
+    def read_versioned(self, remote_path: str) -> Tuple[Optional[bytes], Optional[str]]:
+        try:
+            with open(self.backup_dir / remote_path, "rb") as f:
+                return f.read(), _version(os.fstat(f.fileno()))
+        except FileNotFoundError:
+            return None, None
+
+    def write_versioned(self, remote_path: str, data: bytes, version: Optional[str]) -> bool:
+        dest = self.backup_dir / remote_path
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            self.upload_fileobj(io.BytesIO(data), remote_path)
+            return True
+        # Lock the directory, so the check and the replace happen as one step
+        fd = os.open(dest.parent, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                current = _version(dest.stat())
+            except FileNotFoundError:
+                current = None
+            if current != version:
+                return False
+            self.upload_fileobj(io.BytesIO(data), remote_path)
+            return True
+        finally:
+            os.close(fd)
+
     def list_backups(self) -> List[str]:
-        return [f.name for f in self.backup_dir.iterdir() if f.is_file()]
+        # Hidden files hold metadata (e.g. the catalog), not backups
+        return [f.name for f in self.backup_dir.iterdir() if f.is_file() and not f.name.startswith(".")]
 
     def delete(self, remote_path: str):
         (self.backup_dir / remote_path).unlink(missing_ok=True)
+
+    def delete_many(self, remote_paths: List[str]):
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(self.delete, remote_paths))
@@ -1,7 +1,178 @@
+import copy
+import io
+import math
+import time
 import boto3
+from botocore.exceptions import ClientError, ParamValidationError
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.storage.spool import UploadSpool
+
+MB = 1024 * 1024
+MIN_PART_SIZE = 5 * MB
+MAX_PART_SIZE = 5 * 1024 * MB
+MAX_PARTS = 10000
+# Part size doubles every PARTS_PER_SIZE parts so unknown-length streams
+# never hit the 10,000 part limit (16 MB parts reach ~16 TB).
+PARTS_PER_SIZE = 1000
+# delete_objects accepts at most this many keys per request
+DELETE_BATCH_SIZE = 1000
+
+class UploadInterrupted(Exception):
+    """A spooled upload failed after the whole stream was read; the next recover_uploads() finishes it."""
+
+def _read_part(fileobj: BinaryIO, size: int) -> bytes:
+    # Pipes return short reads; keep reading until the part is full or EOF.
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = fileobj.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+class _PartUploads:
+    """
+    Parts uploading on a thread pool. A part counts as stalled once its
+    request has been running for `timeout` seconds; time spent queued, or
+    reading the source while the part sits finished, does not count.
+    """
+
+    def __init__(self, max_workers: int, timeout: float):
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        # future -> (caller's info, [monotonic time its request started])
+        self.inflight = {}
+
+    def __len__(self) -> int:
+        return len(self.inflight)
+
+    def submit(self, info, func, *args):
+        started = [None]
+        def run():
+            started[0] = time.monotonic()
+            return func(*args)
+        self.inflight[self.pool.submit(run)] = (info, started)
+
+    def _stall_left(self) -> Optional[float]:
+        # Seconds until the longest-running pending request counts as stalled
+        starts = [started[0] for _, started in self.inflight.values() if started[0] is not None]
+        if not starts:
+            return None
+        return self.timeout - (time.monotonic() - min(starts))
+
+    def collect(self, block: bool) -> List[tuple]:
+        """
+        Harvest the finished parts as (info, future) pairs, waiting for one
+        if `block`. Raises TimeoutError if none finished and a running part
+        has stalled.
+        """
+        while True:
+            done = [future for future in self.inflight if future.done()]
+            if done:
+                return [(self.inflight.pop(future)[0], future) for future in done]
+            left = self._stall_left()
+            if left is not None and left <= 0:
+                raise TimeoutError(f"S3 part upload stalled for more than {self.timeout}s")
+            if not block or not self.inflight:
+                return []
+            wait(self.inflight, timeout=self.timeout if left is None else left, return_when=FIRST_COMPLETED)
+
+    def cancel(self):
+        for future in self.inflight:
+            future.cancel()
+        self.inflight.clear()
+
+    def shutdown(self):
+        self.cancel()
+        # Do not wait on a stalled worker; the upload is aborted or spooled by the caller
+        self.pool.shutdown(wait=False)
+
+class RangedReader(io.RawIOBase):
+    """
+    Readable stream over an S3 object fetched with concurrent ranged GETs.
+    Ranges are reassembled in order; at most `window` bytes are downloaded
+    ahead of the reader, so memory stays bounded for objects of any size.
+    """
+
+    def __init__(
+        self,
+        s3,
+        bucket: str,
+        key: str,
+        size: int,
+        etag: Optional[str] = None,
+        chunk_size: int = 16 * MB,
+        concurrency: int = 8,
+        window: int = 128 * MB,
+        retries: int = 5,
+    ):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.ahead = max(1, window // chunk_size)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, self.ahead)))
+        self._pending = deque()
+        self._next_offset = 0
+        self._current = memoryview(b"")
+        self._fill()
+
+    def readable(self) -> bool:
+        return True
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        kwargs = {"Bucket": self.bucket, "Key": self.key, "Range": f"bytes={start}-{end}"}
+        if self.etag:
+            # Fail rather than splice together two versions of the object
+            kwargs["IfMatch"] = self.etag
+        for attempt in range(self.retries + 1):
+            try:
+                data = self.s3.get_object(**kwargs)["Body"].read()
+                if len(data) != end - start + 1:
+                    raise IOError(f"Short read for {self.key} bytes {start}-{end}")
+                return data
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(min(0.5 * 2 ** attempt, 30))
+
+    def _fill(self):
+        while len(self._pending) < self.ahead and self._next_offset < self.size:
+            start = self._next_offset
+            end = min(start + self.chunk_size, self.size) - 1
+            self._pending.append(self._pool.submit(self._fetch, start, end))
+            self._next_offset = end + 1
+
+    def readinto(self, buffer) -> int:
+        if not self._current:
+            if not self._pending:
+                return 0
+            self._current = memoryview(self._pending.popleft().result())
+            self._fill()
+        view = memoryview(buffer).cast("B")
+        n = min(len(view), len(self._current))
+        view[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=False)
+        super().close()
 
 class S3Storage(StorageBackend):
     def __init__(
@@ -12,11 +183,33 @@ class S3Storage(StorageBackend):
         access_key: Optional[str] = None,
         secret_key: Optional[str] = None,
         endpoint_url: Optional[str] = None,
-        default_acl: str = "private"
+        default_acl: str = "private",
+        part_size: int = 16 * MB,
+        max_concurrency: int = 8,
+        max_buffer: int = 256 * MB,
+        part_retries: int = 5,
+        part_timeout: float = 300,
+        download_concurrency: int = 8,
+        download_window: int = 128 * MB,
+        spool_dir: Optional[Path] = None,
+        max_spool: int = 4096 * MB,
+        orphan_age: float = 24 * 3600,
     ):
         self.bucket_name = bucket
         self.prefix = prefix.strip("/")
         self.default_acl = default_acl
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_buffer = max(max_buffer, self.part_size)
+        self.part_retries = part_retries
+        self.part_timeout = part_timeout
+        self.download_concurrency = max(download_concurrency, 1)
+        self.download_window = download_window
+        # Spool streamed parts here so an interrupted upload can be resumed
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.max_spool = max(max_spool, self.part_size)
+        # `retention apply` aborts multipart uploads older than this (seconds) with no local spool
+        self.orphan_age = orphan_age
         
         client_kwargs = {"region_name": region}
         if access_key and secret_key:
@@ -27,6 +220,12 @@ class S3Storage(StorageBackend):
             
         self.s3 = boto3.client("s3", **client_kwargs)
 
+    def with_prefix(self, prefix: str) -> "S3Storage":
+        """A storage under `prefix` inside this one, sharing its client and connection pool."""
+        clone = copy.copy(self)
+        clone.prefix = "/".join(p for p in (self.prefix, prefix.strip("/")) if p)
+        return clone
+
     def _get_key(self, name: str) -> str:
         if self.prefix:
             return f"{self.prefix}/{name}"
@@ -51,32 +250,421 @@ class S3Storage(StorageBackend):
         extra_args = {}
         if self.default_acl:
             extra_args["ACL"] = self.default_acl
-            
-        self.s3.upload_fileobj(
-            fileobj,
-            self.bucket_name,
-            key,
-            ExtraArgs=extra_args
-        )
+
+        first = _read_part(fileobj, self.part_size)
+        if len(first) < self.part_size:
+            # Small enough for a single request
+            self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=first, **extra_args)
+            return remote_path
+
+        upload = self.s3.create_multipart_upload(Bucket=self.bucket_name, Key=key, **extra_args)
+        upload_id = upload["UploadId"]
+        if self.spool_dir:
+            return self._spooled_upload(fileobj, key, remote_path, upload_id, first)
+        try:
+            parts = self._upload_parts(fileobj, key, upload_id, first)
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            self._abort(key, upload_id)
+            raise
+        return remote_path
+
+    def _abort(self, key: str, upload_id: str):
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+        except ClientError as e:
+            # Already completed, aborted or expired by a lifecycle rule
+            if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                raise
+
+    def _part_size_for(self, part_number: int) -> int:
+        growth = 2 ** ((part_number - 1) // PARTS_PER_SIZE)
+        return min(self.part_size * growth, MAX_PART_SIZE)
+
+    def _upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> dict:
+        for attempt in range(self.part_retries + 1):
+            try:
+                response = self.s3.upload_part(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=data,
+                )
+                return {"PartNumber": part_number, "ETag": response["ETag"]}
+            except Exception:
+                if attempt == self.part_retries:
+                    raise
+                time.sleep(min(0.5 * 2 ** attempt, 30))
+
+    def _upload_parts(self, fileobj: BinaryIO, key: str, upload_id: str, first: bytes) -> List[dict]:
+        """
+        Upload parts concurrently while reading ahead from `fileobj`. At most
+        `max_concurrency` parts and `max_buffer` bytes are held at once, and a
+        part that makes no progress for `part_timeout` seconds fails the upload.
+        """
+        parts = []
+        buffered = 0
+        uploads = _PartUploads(self.max_concurrency, self.part_timeout)
+
+        def collect(block: bool):
+            nonlocal buffered
+            for size, future in uploads.collect(block):
+                buffered -= size
+                parts.append(future.result())
+
+        try:
+            part_number = 1
+            data = first
+            while data:
+                if part_number > MAX_PARTS:
+                    raise ValueError(f"Upload exceeds the S3 limit of {MAX_PARTS} parts")
+                while uploads and (
+                    len(uploads) >= self.max_concurrency
+                    or buffered + len(data) > self.max_buffer
+                ):
+                    collect(block=True)
+
+                uploads.submit(len(data), self._upload_part, key, upload_id, part_number, data)
+                buffered += len(data)
+
+                part_number += 1
+                data = _read_part(fileobj, self._part_size_for(part_number))
+                if uploads:
+                    collect(block=False)
+
+            while uploads:
+                collect(block=True)
+        finally:
+            uploads.shutdown()
+
+        return sorted(parts, key=lambda part: part["PartNumber"])
+
+    def _spooled_upload(self, fileobj: BinaryIO, key: str, remote_path: str, upload_id: str, first: bytes) -> str:
+        """
+        Upload through an on-disk spool. If S3 becomes unreachable, the rest
+        of the stream is still read into the spool, so the upload can be
+        finished later without running the dump again.
+        """
+        spool = UploadSpool.create(self.spool_dir, self.bucket_name, key, remote_path, upload_id)
+        try:
+            failure = self._upload_spooled_parts(fileobj, key, upload_id, spool, first)
+        except BaseException:
+            # The source failed or the spool overflowed: there is nothing to resume
+            self._abort(key, upload_id)
+            spool.remove()
+            raise
+        if failure:
+            spool.unlock()
+            raise UploadInterrupted(
+                f"Upload of {remote_path} was interrupted after {len(spool.parts)} parts; "
+                f"the rest is spooled in {spool.path} and will be resumed"
+            ) from failure
+        self._complete_spooled(spool)
         return remote_path
 
+    def _upload_spooled_parts(
+        self, fileobj: BinaryIO, key: str, upload_id: str, spool: UploadSpool, first: bytes
+    ) -> Optional[BaseException]:
+        """
+        Spool each part to disk and upload it from there, committing its ETag
+        to the checkpoint. Returns the upload error, if any, once the source
+        has been read to the end.
+        """
+        failure: Optional[BaseException] = None
+        uploads = _PartUploads(self.max_concurrency, self.part_timeout)
+
+        def upload(part_number: int) -> dict:
+            return self._upload_part(key, upload_id, part_number, spool.read_part(part_number))
+
+        def collect(block: bool):
+            nonlocal failure
+            try:
+                done = uploads.collect(block)
+            except TimeoutError as e:
+                failure, done = e, []
+            for _, future in done:
+                try:
+                    part = future.result()
+                except Exception as e:
+                    failure = failure or e
+                    continue
+                spool.commit(part["PartNumber"], part["ETag"])
+            if failure:
+                # Stop uploading; the remaining parts stay spooled
+                uploads.cancel()
+
+        try:
+            part_number = 1
+            data = first
+            while data:
+                if part_number > MAX_PARTS:
+                    raise ValueError(f"Upload exceeds the S3 limit of {MAX_PARTS} parts")
+                while uploads and (len(uploads) >= self.max_concurrency or spool.pending_bytes + len(data) > self.max_spool):
+                    collect(block=True)
+                if spool.pending_bytes + len(data) > self.max_spool:
+                    raise IOError(f"Upload spool {spool.path} exceeded {self.max_spool // MB} MB while S3 was unavailable")
+
+                spool.write_part(part_number, data)
+                if not failure:
+                    uploads.submit(part_number, upload, part_number)
+
+                part_number += 1
+                data = _read_part(fileobj, self._part_size_for(part_number))
+                if uploads:
+                    collect(block=False)
+
+            while uploads:
+                collect(block=True)
+            spool.mark_complete()
+        finally:
+            uploads.shutdown()
+        return failure
+
+    def _complete_spooled(self, spool: UploadSpool):
+        parts = spool.parts
+        if sorted(parts) != list(range(1, len(parts) + 1)):
+            raise IOError(f"Upload of {spool.remote_path} is missing parts")
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=spool.state["key"],
+            UploadId=spool.state["upload_id"],
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": parts[n]} for n in sorted(parts)]},
+        )
+        spool.remove()
+
+    def _list_parts(self, key: str, upload_id: str) -> dict:
+        paginator = self.s3.get_paginator("list_parts")
+        parts = {}
+        for page in paginator.paginate(Bucket=self.bucket_name, Key=key, UploadId=upload_id):
+            for part in page.get("Parts", []):
+                parts[part["PartNumber"]] = part["ETag"]
+        return parts
+
+    def _resume(self, spool: UploadSpool):
+        key, upload_id = spool.state["key"], spool.state["upload_id"]
+        # S3's list of parts is authoritative: a part may have been stored
+        # just before the process died, without reaching the checkpoint
+        uploaded = self._list_parts(key, upload_id)
+        pending = []
+        for part_number in spool.pending_parts():
+            if part_number in uploaded:
+                spool.commit(part_number, uploaded[part_number])
+            else:
+                pending.append(part_number)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            uploads = pool.map(lambda n: self._upload_part(key, upload_id, n, spool.read_part(n)), pending)
+            for part in uploads:
+                spool.commit(part["PartNumber"], part["ETag"])
+        self._complete_spooled(spool)
+
+    def recover_uploads(self) -> List[str]:
+        """
+        Finish spooled uploads that were interrupted after their stream was
+        fully read, and discard those whose stream was cut short. Only this
+        storage's own spool is touched; S3 is not listed. Returns the remote
+        paths completed.
+        """
+        resumed = []
+        for spool in UploadSpool.load_all(self.spool_dir) if self.spool_dir else []:
+            state = spool.state
+            if state["bucket"] != self.bucket_name or self._get_key(spool.remote_path) != state["key"]:
+                # Spooled by a storage with another bucket or prefix
+                continue
+            if not spool.lock():
+                # Still uploading in another job or process
+                continue
+            if not state["complete"]:
+                print(f"Discarding interrupted upload of {spool.remote_path}: its dump did not finish")
+                self._abort(state["key"], state["upload_id"])
+                spool.remove()
+                continue
+            print(f"Resuming upload of {spool.remote_path} ({len(spool.pending_parts())} parts left)...")
+            try:
+                self._resume(spool)
+            except Exception as e:
+                print(f"Warning: could not resume upload of {spool.remote_path}: {e}")
+                spool.unlock()
+                continue
+            resumed.append(spool.remote_path)
+        return resumed
+
+    def abort_orphaned_uploads(self) -> List[str]:
+        """
+        Abort multipart uploads directly under the prefix (not nested ones)
+        started more than `orphan_age` seconds ago, except those waiting in
+        the local spool. Run by `retention apply`, not by backups, since
+        uploads from other hosts sharing the prefix are aborted too.
+        Returns their keys.
+        """
+        if not self.orphan_age:
+            return []
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.orphan_age)
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        spooled = {spool.state["upload_id"] for spool in UploadSpool.load_all(self.spool_dir)} if self.spool_dir else set()
+        aborted = []
+        paginator = self.s3.get_paginator("list_multipart_uploads")
+        # The delimiter leaves out uploads under nested prefixes, such as the daemon's per-database ones
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, Delimiter="/"):
+            for upload in page.get("Uploads", []):
+                if upload["UploadId"] in spooled or upload["Initiated"] > cutoff:
+                    continue
+                self._abort(upload["Key"], upload["UploadId"])
+                aborted.append(upload["Key"])
+        if aborted:
+            print(f"Aborted {len(aborted)} orphaned multipart uploads.")
+        return aborted
+
     def download(self, remote_path: str, local_path: Path):
         key = self._get_key(remote_path)
         self.s3.download_file(self.bucket_name, key, str(local_path))
 
+    def open_read(self, remote_path: str) -> BinaryIO:
+        key = self._get_key(remote_path)
+        try:
+            head = self.s3.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(remote_path) from e
+            raise
+        size = head["ContentLength"]
+        if size <= self.part_size:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
+            return response["Body"]
+
+        return RangedReader(
+            self.s3,
+            self.bucket_name,
+            key,
+            size,
+            etag=head.get("ETag"),
+            chunk_size=self.part_size,
+            concurrency=self.download_concurrency,
+            window=self.download_window,
+            retries=self.part_retries,
+        )
+
+    def read_versioned(self, remote_path: str) -> Tuple[Optional[bytes], Optional[str]]:
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=self._get_key(remote_path))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None, None
+            raise
+        return response["Body"].read(), response["ETag"]
+
+    def write_versioned(self, remote_path: str, data: bytes, version: Optional[str]) -> bool:
+        condition = {"IfMatch": version} if version else {"IfNoneMatch": "*"}
+        extra_args = {"ACL": self.default_acl} if self.default_acl else {}
+        try:
+            self.s3.put_object(Bucket=self.bucket_name, Key=self._get_key(remote_path), Body=data, **condition, **extra_args)
+        except ParamValidationError:
+            # botocore from before S3 conditional writes
+            self.s3.put_object(Bucket=self.bucket_name, Key=self._get_key(remote_path), Body=data, **extra_args)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return False
+            raise
+        return True
+
     def list_backups(self) -> List[str]:
         paginator = self.s3.get_paginator("list_objects_v2")
         backups = []
-        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix):
+        # Like a local directory listing, objects under nested prefixes
+        # (per-database backups, the PITR archive) are not part of this one
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, Delimiter="/"):
             for obj in page.get("Contents", []):
                 key = obj["Key"]
                 # Return only the filename part if it's within the prefix
                 if self.prefix and key.startswith(f"{self.prefix}/"):
-                    backups.append(key[len(self.prefix)+1:])
+                    name = key[len(self.prefix)+1:]
                 elif not self.prefix:
-                    backups.append(key)
+                    name = key
+                else:
+                    continue
+                # Hidden objects hold metadata (e.g. the catalog), not backups
+                if not name.startswith(".") and "/" not in name:
+                    backups.append(name)
         return backups
 
     def delete(self, remote_path: str):
         key = self._get_key(remote_path)
         self.s3.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def _delete_batch(self, keys: List[str]):
+        response = self.s3.delete_objects(
+            Bucket=self.bucket_name,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+        return response.get("Errors", [])
+
+    def delete_many(self, remote_paths: List[str]):
+        keys = [self._get_key(remote_path) for remote_path in remote_paths]
+        batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            errors = [error for batch_errors in pool.map(self._delete_batch, batches) for error in batch_errors]
+        if errors:
+            failed = ", ".join(f"{error.get('Key')} ({error.get('Code')})" for error in errors[:5])
+            raise RuntimeError(f"Failed to delete {len(errors)} backups from S3: {failed}")
+
+    # Storage-side retention
+
+    @property
+    def lifecycle_rule_id(self) -> str:
+        return f"fastapi-dbbackup:{self.prefix or '/'}"
+
+    def lifecycle_rule(self, retention_days: int = 0, transitions: Optional[List[Tuple[int, str]]] = None) -> Optional[dict]:
+        """
+        The bucket lifecycle rule that enforces a retention policy on this
+        prefix: (days, storage class) transitions, expiry after `retention_days`,
+        and cleanup of multipart uploads orphaned for `orphan_age`. None if
+        there is nothing to enforce. Raises ValueError for a contradictory policy.
+        """
+        transitions = sorted(transitions or [])
+        if retention_days and transitions and transitions[-1][0] >= retention_days:
+            raise ValueError(f"Transition after {transitions[-1][0]} days never happens: backups expire after {retention_days} days")
+        rule = {
+            "ID": self.lifecycle_rule_id,
+            "Filter": {"Prefix": f"{self.prefix}/" if self.prefix else ""},
+            "Status": "Enabled",
+        }
+        if transitions:
+            rule["Transitions"] = [{"Days": days, "StorageClass": storage_class} for days, storage_class in transitions]
+        if retention_days:
+            rule["Expiration"] = {"Days": retention_days}
+        if self.orphan_age:
+            # Lifecycle counts whole days
+            rule["AbortIncompleteMultipartUpload"] = {"DaysAfterInitiation": max(math.ceil(self.orphan_age / 86400), 1)}
+        return rule if len(rule) > 3 else None
+
+    def _lifecycle_rules(self) -> List[dict]:
+        try:
+            return self.s3.get_bucket_lifecycle_configuration(Bucket=self.bucket_name)["Rules"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "NoSuchLifecycleConfiguration":
+                return []
+            raise
+
+    def get_lifecycle_rule(self) -> Optional[dict]:
+        """The installed lifecycle rule of this prefix, if any."""
+        return next((rule for rule in self._lifecycle_rules() if rule.get("ID") == self.lifecycle_rule_id), None)
+
+    def put_lifecycle_rule(self, rule: Optional[dict]):
+        """
+        Install `rule` in place of this prefix's previous one (None removes
+        it). The bucket's configuration is replaced as a whole, so the other
+        rules are read and written back with it.
+        """
+        rules = [r for r in self._lifecycle_rules() if r.get("ID") != self.lifecycle_rule_id]
+        if rule:
+            rules.append(rule)
+        if rules:
+            self.s3.put_bucket_lifecycle_configuration(Bucket=self.bucket_name, LifecycleConfiguration={"Rules": rules})
+        else:
+            self.s3.delete_bucket_lifecycle(Bucket=self.bucket_name)
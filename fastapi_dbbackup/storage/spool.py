@@ -0,0 +1,141 @@
+"""
+On-disk spool and checkpoint for resumable S3 multipart uploads.
+
+Each streamed upload gets a directory holding the parts that are not yet
+committed and a `checkpoint.json` with the upload id and the ETag of every
+committed part. A part's file is deleted once S3 has acknowledged it, so
+the spool only holds data that would otherwise be lost. Once the source
+stream has been read to the end the checkpoint is marked complete, and
+the upload can be finished by any later run, even if the dump tool that
+produced it is long gone.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: uploads in progress are not locked
+    fcntl = None
+
+CHECKPOINT_NAME = "checkpoint.json"
+CHECKPOINT_VERSION = 1
+
+class UploadSpool:
+    def __init__(self, path: Path, state: dict):
+        self.path = path
+        self.state = state
+        self.pending_bytes = sum(self.part_path(n).stat().st_size for n in self.pending_parts())
+        self._lock_file = None
+
+    @classmethod
+    def create(cls, spool_dir: Path, bucket: str, key: str, remote_path: str, upload_id: str) -> "UploadSpool":
+        name = hashlib.sha256(f"{bucket}/{key}/{upload_id}".encode()).hexdigest()[:16]
+        path = Path(spool_dir) / name
+        path.mkdir(parents=True, exist_ok=True)
+        spool = cls(path, {
+            "version": CHECKPOINT_VERSION,
+            "bucket": bucket,
+            "key": key,
+            "remote_path": remote_path,
+            "upload_id": upload_id,
+            "created": time.time(),
+            "complete": False,
+            "parts": {},
+        })
+        spool.lock()
+        spool._save()
+        return spool
+
+    @classmethod
+    def load_all(cls, spool_dir: Path) -> List["UploadSpool"]:
+        spools = []
+        if not Path(spool_dir).is_dir():
+            return spools
+        for path in sorted(Path(spool_dir).iterdir()):
+            checkpoint = path / CHECKPOINT_NAME
+            try:
+                with open(checkpoint) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            spools.append(cls(path, state))
+        return spools
+
+    @property
+    def remote_path(self) -> str:
+        return self.state["remote_path"]
+
+    @property
+    def parts(self) -> Dict[int, str]:
+        """ETags of the committed parts by part number."""
+        return {int(n): etag for n, etag in self.state["parts"].items()}
+
+    def lock(self) -> bool:
+        """Mark the upload as in progress in this process; False if another holds it."""
+        if fcntl is None:
+            return True
+        f = open(self.path / "lock", "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def unlock(self):
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def part_path(self, part_number: int) -> Path:
+        return self.path / f"part-{part_number:05d}"
+
+    def pending_parts(self) -> List[int]:
+        """Numbers of the parts spooled but not yet committed."""
+        return sorted(int(p.name[len("part-"):]) for p in self.path.glob("part-*"))
+
+    def write_part(self, part_number: int, data: bytes):
+        # Written aside and renamed, so a crash never leaves a short part behind
+        path = self.part_path(part_number)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self.pending_bytes += len(data)
+
+    def read_part(self, part_number: int) -> bytes:
+        return self.part_path(part_number).read_bytes()
+
+    def commit(self, part_number: int, etag: str):
+        """Record a part acknowledged by S3 and drop its spooled data."""
+        self.state["parts"][str(part_number)] = etag
+        self._save()
+        path = self.part_path(part_number)
+        if path.exists():
+            self.pending_bytes -= path.stat().st_size
+            path.unlink()
+
+    def mark_complete(self):
+        """The source was read to the end: every part is committed or spooled."""
+        self.state["complete"] = True
+        self._save()
+
+    def remove(self):
+        self.unlock()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _save(self):
+        tmp = self.path / f".{CHECKPOINT_NAME}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path / CHECKPOINT_NAME)
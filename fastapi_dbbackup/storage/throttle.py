@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple
+from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.throttle import RateLimiter, ThrottledReader
+
+class ThrottledStorage(StorageBackend):
+    """
+    Wraps a storage backend and limits the rate at which backups are
+    uploaded to it. Dump files are streamed through the limiter rather than
+    handed to the backend's own upload, so one limit covers both paths.
+    Share one limiter between storages to cap their combined rate.
+    """
+
+    def __init__(self, storage: StorageBackend, limiter: RateLimiter):
+        self.storage = storage
+        self.limiter = limiter
+
+    def with_prefix(self, prefix: str) -> "ThrottledStorage":
+        # The prefixed storage shares the limit rather than getting its own
+        return ThrottledStorage(self.storage.with_prefix(prefix), self.limiter)
+
+    def upload(self, local_path: Path) -> str:
+        with open(local_path, "rb") as f:
+            return self.storage.upload_fileobj(ThrottledReader(f, self.limiter), local_path.name)
+
+    def upload_fileobj(self, fileobj: BinaryIO, remote_path: str) -> str:
+        return self.storage.upload_fileobj(ThrottledReader(fileobj, self.limiter), remote_path)
+
+    def download(self, remote_path: str, local_path: Path):
+        self.storage.download(remote_path, local_path)
+
+    def open_read(self, remote_path: str) -> BinaryIO:
+        return self.storage.open_read(remote_path)
+
+    def list_backups(self) -> List[str]:
+        return self.storage.list_backups()
+
+    def delete(self, remote_path: str):
+        self.storage.delete(remote_path)
+
+    def delete_many(self, remote_paths: List[str]):
+        self.storage.delete_many(remote_paths)
+
+    def recover_uploads(self) -> List[str]:
+        return self.storage.recover_uploads()
+
+    def read_versioned(self, remote_path: str) -> Tuple[Optional[bytes], Optional[str]]:
+        return self.storage.read_versioned(remote_path)
+
+    def write_versioned(self, remote_path: str, data: bytes, version: Optional[str]) -> bool:
+        # Metadata is small; it is not throttled
+        return self.storage.write_versioned(remote_path, data, version)
@@ -0,0 +1,258 @@
+import hashlib
+import io
+import os
+import stat
+import subprocess
+import time
+from typing import BinaryIO, Callable, List, Optional
+
+# Buffer for user-space copies; large enough that per-call overhead vanishes
+COPY_BUFFER_SIZE = 1024 * 1024
+# Bytes moved per splice/sendfile call
+KERNEL_CHUNK_SIZE = 16 * 1024 * 1024
+# Pipe capacity requested between stages (Linux caps it at /proc/sys/fs/pipe-max-size, 1 MB by default)
+PIPE_SIZE = 1024 * 1024
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+class PeekableReader(io.RawIOBase):
+    """
+    Read-only wrapper that lets callers look at the first bytes of a
+    non-seekable stream (e.g. an S3 body or a pipe) without consuming them.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+        self._head = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def peek(self, size: int) -> bytes:
+        while len(self._head) < size:
+            chunk = self.fileobj.read(size - len(self._head))
+            if not chunk:
+                break
+            self._head += chunk
+        return self._head[:size]
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        if self._head:
+            n = min(len(view), len(self._head))
+            view[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        if hasattr(self.fileobj, "readinto"):
+            return self.fileobj.readinto(view) or 0
+        data = self.fileobj.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.fileobj.close()
+            finally:
+                super().close()
+
+class CountingReader(io.RawIOBase):
+    """
+    Read-only pass-through that counts the bytes read, keeps the first few
+    bytes and optionally hashes the data (any `hashlib` algorithm), so
+    metadata can be recorded without a second pass.
+    """
+
+    def __init__(self, fileobj: BinaryIO, head_size: int = 8, algorithm: Optional[str] = None):
+        self.fileobj = fileobj
+        self.bytes_read = 0
+        self.head = b""
+        self._head_size = head_size
+        self._hash = hashlib.new(algorithm) if algorithm else None
+
+    @property
+    def checksum(self) -> Optional[str]:
+        """The digest so far as "<algorithm>:<hex>", or None if not hashing."""
+        if not self._hash:
+            return None
+        return f"{self._hash.name}:{self._hash.hexdigest()}"
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        if hasattr(self.fileobj, "readinto"):
+            n = self.fileobj.readinto(view) or 0
+        else:
+            data = self.fileobj.read(len(view))
+            n = len(data)
+            view[:n] = data
+        if len(self.head) < self._head_size:
+            self.head += bytes(view[:self._head_size - len(self.head)][:n])
+        if self._hash and n:
+            self._hash.update(view[:n])
+        self.bytes_read += n
+        return n
+
+def grow_pipe(fd: int, size: int = PIPE_SIZE):
+    """
+    Enlarge a pipe so each side moves more data per wakeup; the default 64 KB
+    makes the writer and reader take turns in small steps. Best effort.
+    """
+    if fcntl is None or not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, size)
+    except OSError:
+        pass
+
+class ProcessReader(io.RawIOBase):
+    """
+    Unbuffered stdout of a dump process. Reaching EOF waits for the process
+    and raises CalledProcessError if it failed, so a truncated dump is never
+    stored as a complete backup.
+    """
+
+    def __init__(self, process: subprocess.Popen, cmd: List[str]):
+        self.process = process
+        self.cmd = cmd
+
+    def readable(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        return self.process.stdout.fileno()
+
+    def readinto(self, buffer) -> int:
+        n = self.process.stdout.readinto(buffer)
+        if not n:
+            returncode = self.process.wait()
+            if returncode:
+                raise subprocess.CalledProcessError(returncode, self.cmd)
+        return n or 0
+
+    def close(self):
+        if not self.closed:
+            try:
+                # The reader gave up early; don't leave the dump running
+                if self.process.poll() is None:
+                    self.process.kill()
+                self.process.stdout.close()
+                self.process.wait()
+            finally:
+                super().close()
+
+class CheckedReader(io.RawIOBase):
+    """
+    Unbuffered pass-through that calls `check` on reaching EOF, so a producer
+    thread's error fails the reader instead of looking like a clean end.
+    """
+
+    def __init__(self, fileobj: BinaryIO, check: Callable[[], None]):
+        self.fileobj = fileobj
+        self.check = check
+
+    def readable(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        return self.fileobj.fileno()
+
+    def readinto(self, buffer) -> int:
+        n = self.fileobj.readinto(buffer) or 0
+        if not n:
+            self.check()
+        return n
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.fileobj.close()
+            finally:
+                super().close()
+
+def _kernel_fd(fileobj) -> Optional[int]:
+    # Only unbuffered files: a buffered reader may hold data the kernel copy would skip
+    if not isinstance(fileobj, (io.RawIOBase, io.BufferedWriter)):
+        return None
+    try:
+        return fileobj.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+def _count(fileobj, n: int, start: float, end: float):
+    # Let pass-through wrappers (e.g. metrics) account for bytes they did not see
+    count = getattr(fileobj, "count", None)
+    if count:
+        count(n, start, end)
+
+def _copy_kernel(src, dst, in_fd: int, out_fd: int) -> Optional[int]:
+    """Copy with splice (either end a pipe) or sendfile (from a regular file); None if neither applies."""
+    in_mode, out_mode = os.fstat(in_fd).st_mode, os.fstat(out_fd).st_mode
+    if hasattr(os, "splice") and (stat.S_ISFIFO(in_mode) or stat.S_ISFIFO(out_mode)):
+        move = lambda: os.splice(in_fd, out_fd, KERNEL_CHUNK_SIZE)
+    elif hasattr(os, "sendfile") and stat.S_ISREG(in_mode) and _sendfile_to(out_mode):
+        move = lambda: os.sendfile(out_fd, in_fd, None, KERNEL_CHUNK_SIZE)
+    else:
+        return None
+
+    if hasattr(dst, "flush"):
+        dst.flush()
+    total = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            n = move()
+        except OSError:
+            if total:
+                raise
+            # Not supported between these files (e.g. some filesystems); copy in user space
+            return None
+        _count(src, n, start, time.perf_counter())
+        if not n:
+            break
+        total += n
+    # Confirm EOF through the wrapper, so it can report e.g. a failed dump process
+    src.readinto(bytearray(1))
+    return total
+
+def _sendfile_to(mode: int) -> bool:
+    # Linux can sendfile into any file; other systems only into sockets
+    return os.uname().sysname == "Linux" or stat.S_ISSOCK(mode)
+
+def copy_stream(src: BinaryIO, dst: BinaryIO, buffer_size: int = COPY_BUFFER_SIZE) -> int:
+    """
+    Copy `src` to `dst` and return the number of bytes copied. Between file
+    descriptors the data moves kernel-side with splice/sendfile; otherwise
+    one reusable buffer is filled with `readinto`, with no per-chunk allocation.
+    """
+    in_fd, out_fd = _kernel_fd(src), _kernel_fd(dst)
+    if in_fd is not None and out_fd is not None:
+        total = _copy_kernel(src, dst, in_fd, out_fd)
+        if total is not None:
+            return total
+
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    readinto = getattr(src, "readinto", None)
+    total = 0
+    while True:
+        if readinto:
+            n = readinto(view)
+        else:
+            data = src.read(buffer_size)
+            n = len(data)
+            view[:n] = data
+        if not n:
+            break
+        chunk = view[:n]
+        while chunk:
+            written = dst.write(chunk)
+            # Raw files may write less than asked
+            chunk = chunk[written:] if written is not None else chunk[:0]
+        total += n
+    return total
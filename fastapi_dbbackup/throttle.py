@@ -0,0 +1,173 @@
+"""
+Bandwidth limits and process priority for backups on busy hosts.
+
+Limits are token buckets in MB/s, optionally varying with the time of day:
+
+    "50"                        50 MB/s at all times
+    "08:00-20:00=10,100"        10 MB/s during the day, 100 MB/s otherwise
+    "22:00-06:00=0,20"          unlimited at night (0 = no limit), 20 MB/s by day
+
+The bucket is charged once per chunk (typically 1 MB) with a reservation in
+virtual time, so the long-run rate is exact at any throughput and the cost
+is one lock and one clock read per chunk.
+"""
+import io
+import shutil
+import threading
+import time
+from datetime import datetime, time as dtime
+from typing import BinaryIO, List, Optional, Tuple
+
+MB = 1024 * 1024
+# How often the time-of-day profile is re-evaluated, in seconds
+SCHEDULE_INTERVAL = 30
+IONICE_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+
+def _parse_time(value: str) -> dtime:
+    return datetime.strptime(value.strip(), "%H:%M").time()
+
+class RateSchedule:
+    """A rate in bytes per second by time of day; None means unlimited."""
+
+    def __init__(self, default: Optional[float] = None, windows: Optional[List[Tuple[dtime, dtime, Optional[float]]]] = None):
+        self.default = default
+        self.windows = windows or []
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateSchedule":
+        default = None
+        windows = []
+        for entry in filter(None, (e.strip() for e in spec.split(","))):
+            try:
+                if "=" in entry:
+                    span, _, rate = entry.partition("=")
+                    start, _, end = span.partition("-")
+                    windows.append((_parse_time(start), _parse_time(end), _to_rate(rate)))
+                else:
+                    default = _to_rate(entry)
+            except ValueError:
+                raise ValueError(f"Invalid rate limit {entry!r}; expected MB/s or HH:MM-HH:MM=MB/s")
+        return cls(default, windows)
+
+    def rate_at(self, now: datetime) -> Optional[float]:
+        current = now.time()
+        for start, end, rate in self.windows:
+            # Windows may wrap around midnight, e.g. 22:00-06:00
+            inside = start <= current < end if start <= end else (current >= start or current < end)
+            if inside:
+                return rate
+        return self.default
+
+def _to_rate(value: str) -> Optional[float]:
+    mbps = float(value)
+    if mbps < 0:
+        raise ValueError(value)
+    return mbps * MB if mbps else None
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread moving data under one limit. Up to
+    `burst` seconds of unused allowance may be spent at once.
+    """
+
+    def __init__(self, schedule: RateSchedule, burst: float = 0.5):
+        self.schedule = schedule
+        self.burst = burst
+        self._lock = threading.Lock()
+        # Virtual time at which the bytes reserved so far will have been sent
+        self._tat = time.monotonic()
+        self._rate: Optional[float] = None
+        self._rate_checked = float("-inf")
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> Optional["RateLimiter"]:
+        """A limiter for a limit spec, or None if it sets no limit."""
+        if not spec:
+            return None
+        schedule = RateSchedule.parse(spec)
+        if schedule.default is None and not any(rate for _, _, rate in schedule.windows):
+            return None
+        return cls(schedule)
+
+    def reserve(self, n: int) -> float:
+        """Charge `n` bytes and return how long the caller must wait before going on."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._rate_checked >= SCHEDULE_INTERVAL:
+                self._rate = self.schedule.rate_at(datetime.now())
+                self._rate_checked = now
+            if not self._rate:
+                self._tat = now
+                return 0.0
+            self._tat = max(self._tat, now) + n / self._rate
+            return max(self._tat - now - self.burst, 0.0)
+
+    def consume(self, n: int):
+        delay = self.reserve(n)
+        if delay:
+            time.sleep(delay)
+
+class ThrottledReader(io.RawIOBase):
+    """
+    Read-only pass-through limited by a RateLimiter. It has no fileno(), so
+    copies never bypass the limit with splice/sendfile.
+    """
+
+    def __init__(self, fileobj: BinaryIO, limiter: RateLimiter):
+        self.fileobj = fileobj
+        self.limiter = limiter
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if hasattr(self.fileobj, "readinto"):
+            n = self.fileobj.readinto(buffer) or 0
+        else:
+            data = self.fileobj.read(len(buffer))
+            n = len(data)
+            memoryview(buffer).cast("B")[:n] = data
+        if n:
+            self.limiter.consume(n)
+        return n
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.fileobj.close()
+            finally:
+                super().close()
+
+def throttled(fileobj: BinaryIO, limiter: Optional[RateLimiter]) -> BinaryIO:
+    return ThrottledReader(fileobj, limiter) if limiter else fileobj
+
+def parse_ionice(spec: str) -> List[str]:
+    """`ionice` arguments for "CLASS[:LEVEL]", e.g. "idle" or "best-effort:7"."""
+    name, _, level = spec.strip().lower().partition(":")
+    io_class = IONICE_CLASSES.get(name, name)
+    if io_class not in IONICE_CLASSES.values():
+        raise ValueError(f"Invalid ionice class {name!r}; expected idle, best-effort or realtime")
+    args = ["-c", io_class]
+    if level:
+        if not level.isdigit() or int(level) > 7:
+            raise ValueError(f"Invalid ionice level {level!r}; expected 0-7")
+        args += ["-n", level]
+    return args
+
+def priority_prefix(nice: Optional[int] = None, ionice: Optional[str] = None) -> List[str]:
+    """
+    Command prefix that runs a dump tool at a lower CPU (`nice`) and I/O
+    (`ionice`) priority. Tools missing on the host are skipped with a warning.
+    """
+    prefix = []
+    if ionice:
+        if shutil.which("ionice"):
+            prefix += ["ionice"] + parse_ionice(ionice)
+        else:
+            print("Warning: ionice not found; dumps run at the default I/O priority")
+    if nice is not None:
+        if shutil.which("nice"):
+            prefix += ["nice", "-n", str(nice)]
+        else:
+            print("Warning: nice not found; dumps run at the default CPU priority")
+    return prefix
@@ -0,0 +1,85 @@
+import io
+from typing import List, Optional
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import MAGIC_SIZE, detect_codec, open_decompressed
+from fastapi_dbbackup.encrypt import MAGIC as ENCRYPTION_MAGIC
+from fastapi_dbbackup.encrypt import Keyring, is_encrypted, open_decrypted
+from fastapi_dbbackup.storage.base import StorageBackend
+from fastapi_dbbackup.storage.checksum import parse_checksum
+from fastapi_dbbackup.streams import CountingReader
+
+MB = 1024 * 1024
+
+class VerificationError(Exception):
+    pass
+
+def find_checksum(storage: StorageBackend, remote_path: str) -> Optional[str]:
+    """The checksum recorded for a backup by the catalog or a sidecar, if any."""
+    # Walk down the wrapper layers (catalog, checksum sidecars, ...)
+    while storage is not None:
+        if hasattr(storage, "checksum"):
+            checksum = storage.checksum(remote_path)
+            if checksum:
+                return checksum
+        storage = getattr(storage, "storage", None)
+    return None
+
+def _drain(fileobj) -> None:
+    while fileobj.read(MB):
+        pass
+
+def verify_backup(
+    storage: StorageBackend,
+    remote_path: str,
+    engine: Optional[BackupEngine] = None,
+    keyring: Optional[Keyring] = None,
+) -> List[str]:
+    """
+    Check a backup in one streaming read: its checksum, the authenticity of
+    its encryption, the integrity of its compression, and (if the engine
+    can) its structure, without restoring it. Without a `keyring` only the
+    checksum of an encrypted backup is checked. Returns a note per check
+    that passed; raises VerificationError otherwise.
+    """
+    expected = find_checksum(storage, remote_path)
+    algorithm = parse_checksum(expected)[0] if expected else "sha256"
+    stream = storage.open_read(remote_path)
+    raw = CountingReader(stream, len(ENCRYPTION_MAGIC), algorithm=algorithm)
+    notes = []
+    problem = None
+
+    decrypted = decompressed = None
+    try:
+        try:
+            decrypted = open_decrypted(raw, keyring)
+            plain = CountingReader(decrypted, MAGIC_SIZE)
+            decompressed = io.BufferedReader(open_decompressed(plain), MB)
+            if engine and engine.verify_stream(decompressed):
+                notes.append(f"{engine.name} structure ok")
+            # Read to the end so the codec's own checks (e.g. gzip CRCs) run
+            _drain(decompressed)
+            if is_encrypted(raw.head):
+                notes.append("encryption ok")
+            codec = detect_codec(plain.head)
+            if codec:
+                notes.append(f"{codec.name} stream ok")
+        except Exception as e:
+            if keyring is None and is_encrypted(raw.head):
+                notes.append("encrypted, contents not checked (no key)")
+            else:
+                problem = f"{type(e).__name__}: {e}"
+        # Hash whatever the checks did not read
+        _drain(raw)
+    finally:
+        # Also stops the decryption threads; CountingReader leaves the stored stream open
+        for f in (decompressed, decrypted, raw, stream):
+            if f is not None:
+                f.close()
+
+    # A checksum mismatch explains any other failure, so report it first
+    if expected and raw.checksum != expected:
+        raise VerificationError(f"checksum mismatch: recorded {expected}, read {raw.checksum}")
+    if problem:
+        raise VerificationError(problem)
+    notes.insert(0, f"{algorithm} ok" if expected else "no checksum recorded")
+    return notes
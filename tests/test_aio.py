@@ -0,0 +1,136 @@
+# tests/test_aio.py
+import asyncio
+import gzip
+import sqlite3
+import sys
+import time
+import pytest
+from fastapi_dbbackup.aio import run_backup, run_restore
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import get_codec
+from fastapi_dbbackup.engines.sqlite import SQLiteBackup
+from fastapi_dbbackup.storage.local import LocalStorage
+
+# Writes 8 MB in slow 256 KB steps, then exits with the given status
+DUMP_SCRIPT = """
+import sys, time
+for i in range(32):
+    sys.stdout.buffer.write(bytes([i]) * 256 * 1024)
+    sys.stdout.flush()
+    time.sleep(0.01)
+sys.exit(int(sys.argv[1]))
+"""
+
+class ScriptBackup(BackupEngine):
+    name = "script"
+
+    def __init__(self, db_url, output_dir, status=0):
+        super().__init__(db_url, output_dir)
+        self.status = status
+        self.uploaded = []
+
+    def stream_command(self):
+        return [sys.executable, "-c", DUMP_SCRIPT, str(self.status)], None
+
+    def backup(self):
+        raise AssertionError("streaming engines should not fall back to files")
+
+    def backup_uploaded(self, backup_path):
+        self.uploaded.append(backup_path.name)
+
+    def restore(self, backup_path):
+        pass
+
+def expected_dump():
+    return b"".join(bytes([i]) * 256 * 1024 for i in range(32))
+
+def test_run_backup_streams_and_compresses(tmp_path, backup_dir):
+    engine = ScriptBackup("script://", tmp_path / "work")
+    storage = LocalStorage(backup_dir)
+
+    remote_path = asyncio.run(run_backup(engine, storage, codec=get_codec("gzip")))
+
+    assert remote_path.endswith(".dump.gz")
+    assert engine.uploaded == [remote_path]
+    assert gzip.decompress((backup_dir / remote_path).read_bytes()) == expected_dump()
+
+def test_run_backup_streams_through_encryption(tmp_path, backup_dir):
+    pytest.importorskip("cryptography")
+    from fastapi_dbbackup.encrypt import Encryptor, Keyring, decrypt_file, generate_key
+
+    keyring = Keyring.from_text(generate_key())
+    engine = ScriptBackup("script://", tmp_path / "work")
+
+    remote_path = asyncio.run(run_backup(engine, LocalStorage(backup_dir), codec=get_codec("gzip"), encryptor=Encryptor(keyring, workers=2)))
+
+    assert remote_path.endswith(".dump.gz.enc")
+    assert gzip.decompress(decrypt_file(backup_dir / remote_path, keyring).read_bytes()) == expected_dump()
+
+def test_run_backup_failed_dump_stores_nothing(tmp_path, backup_dir):
+    engine = ScriptBackup("script://", tmp_path / "work", status=3)
+    storage = LocalStorage(backup_dir)
+
+    with pytest.raises(RuntimeError, match="status 3"):
+        asyncio.run(run_backup(engine, storage))
+
+    assert list(backup_dir.iterdir()) == []
+    assert engine.uploaded == []
+
+def test_run_backup_keeps_event_loop_responsive(tmp_path, backup_dir):
+    engine = ScriptBackup("script://", tmp_path / "work")
+    storage = LocalStorage(backup_dir)
+
+    async def main():
+        lag = 0.0
+        task = asyncio.ensure_future(run_backup(engine, storage, codec=get_codec("gzip")))
+        while not task.done():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - start - 0.005)
+        await task
+        return lag
+
+    assert asyncio.run(main()) < 0.1
+
+def test_run_backup_prepares_the_dump_command_off_the_loop(tmp_path, backup_dir):
+    class SlowSetupBackup(ScriptBackup):
+        def stream_command(self):
+            # e.g. writing a credentials file or probing the server version
+            time.sleep(0.3)
+            return super().stream_command()
+
+    engine = SlowSetupBackup("script://", tmp_path / "work")
+    storage = LocalStorage(backup_dir)
+
+    async def main():
+        lag = 0.0
+        task = asyncio.ensure_future(run_backup(engine, storage))
+        while not task.done():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - start - 0.005)
+        await task
+        return lag
+
+    assert asyncio.run(main()) < 0.1
+    assert engine.uploaded
+
+def test_run_backup_and_restore_file_engine(tmp_path, backup_dir):
+    db_path = tmp_path / "app.sqlite3"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(100)])
+    engine = SQLiteBackup(f"sqlite:///{db_path}", backup_dir)
+    storage = LocalStorage(backup_dir)
+
+    remote_path = asyncio.run(run_backup(engine, storage, codec=get_codec("gzip")))
+    # Local storage in the engine's directory keeps the backup itself
+    assert storage.list_backups() == [remote_path]
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM t")
+    assert asyncio.run(run_restore(engine, storage)) == remote_path
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM t").fetchone()[0] == 100
+    assert storage.list_backups() == [remote_path]
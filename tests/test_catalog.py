@@ -0,0 +1,67 @@
+# tests/test_catalog.py
+import gzip
+import io
+import json
+from fastapi_dbbackup.storage.catalog import CATALOG_NAME, CatalogStorage
+from fastapi_dbbackup.storage.local import LocalStorage
+
+def test_catalog_bootstraps_from_listing(backup_dir):
+    (backup_dir / "default-20260101-000000.dump").write_bytes(b"old")
+
+    storage = CatalogStorage(LocalStorage(backup_dir))
+
+    assert storage.list_backups() == ["default-20260101-000000.dump"]
+    assert (backup_dir / CATALOG_NAME).exists()
+    # The catalog itself is never reported as a backup
+    assert LocalStorage(backup_dir).list_backups() == ["default-20260101-000000.dump"]
+
+def test_catalog_records_uploads_and_deletes(backup_dir):
+    storage = CatalogStorage(LocalStorage(backup_dir), engine="postgres")
+    storage.upload_fileobj(io.BytesIO(gzip.compress(b"dump")), "default-20260102-030405.dump.gz")
+
+    reloaded = CatalogStorage(LocalStorage(backup_dir))
+    [entry] = reloaded.entries()
+    assert entry["name"] == "default-20260102-030405.dump.gz"
+    assert entry["size"] == len(gzip.compress(b"dump"))
+    assert entry["codec"] == "gzip"
+    assert entry["engine"] == "postgres"
+    assert entry["timestamp"] == "2026-01-02T03:04:05"
+
+    reloaded.delete("default-20260102-030405.dump.gz")
+    data = json.loads((backup_dir / CATALOG_NAME).read_text())
+    assert data["backups"] == []
+    assert not (backup_dir / "default-20260102-030405.dump.gz").exists()
+
+def test_catalog_reindex_keeps_metadata(backup_dir):
+    storage = CatalogStorage(LocalStorage(backup_dir), engine="mysql")
+    storage.upload_fileobj(io.BytesIO(b"dump"), "default-20260103-000000.dump")
+    (backup_dir / "default-20260104-000000.dump").write_bytes(b"external")
+
+    assert storage.reindex() == 2
+    entries = {entry["name"]: entry for entry in storage.entries()}
+    assert entries["default-20260103-000000.dump"]["engine"] == "mysql"
+    assert entries["default-20260104-000000.dump"]["size"] is None
+
+def test_catalog_keeps_entries_written_by_other_processes(backup_dir):
+    daemon = CatalogStorage(LocalStorage(backup_dir))
+    daemon.upload_fileobj(io.BytesIO(b"dump"), "default-20260105-000000.dump")
+    # A CLI run records a backup after the daemon loaded the catalog
+    CatalogStorage(LocalStorage(backup_dir)).upload_fileobj(io.BytesIO(b"dump"), "default-20260106-000000.dump")
+
+    daemon.upload_fileobj(io.BytesIO(b"dump"), "default-20260107-000000.dump")
+
+    names = [entry["name"] for entry in json.loads((backup_dir / CATALOG_NAME).read_text())["backups"]]
+    assert names == ["default-20260105-000000.dump", "default-20260106-000000.dump", "default-20260107-000000.dump"]
+    assert daemon.list_backups() == names
+
+def test_local_conditional_write_detects_concurrent_writers(backup_dir):
+    storage = LocalStorage(backup_dir)
+    assert storage.read_versioned(CATALOG_NAME) == (None, None)
+    assert storage.write_versioned(CATALOG_NAME, b"first", None)
+
+    data, version = storage.read_versioned(CATALOG_NAME)
+    assert storage.write_versioned(CATALOG_NAME, b"second", version)
+    # Written from a copy read before "second"
+    assert not storage.write_versioned(CATALOG_NAME, b"stale", version)
+    assert not storage.write_versioned(CATALOG_NAME, b"stale", None)
+    assert (backup_dir / CATALOG_NAME).read_bytes() == b"second"
@@ -0,0 +1,46 @@
+# tests/test_cli.py
+import subprocess
+import sys
+import pytest
+from fastapi_dbbackup import cli, registry
+from fastapi_dbbackup.config import Settings
+from fastapi_dbbackup.engines.sqlite import SQLiteBackup
+
+def test_list_does_not_import_unused_backends(tmp_path, sqlite_url):
+    code = (
+        "import sys\n"
+        "sys.argv = ['fastapi-dbbackup', 'list']\n"
+        "from fastapi_dbbackup.cli import main\n"
+        "main()\n"
+        "print(sorted(m for m in ('boto3', 'sqlalchemy') if m in sys.modules))\n"
+    )
+    env = {"PATH": "", "DATABASE_URL": sqlite_url, "DBBACKUP_DIR": str(tmp_path / "backups")}
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=tmp_path, capture_output=True, text=True, check=True)
+
+    assert result.stdout.splitlines() == ["No backups found.", "[]"]
+
+def test_invalid_settings_name_the_variable():
+    with pytest.raises(ValueError, match="DBBACKUP_JOBS must be an integer"):
+        Settings({"DBBACKUP_JOBS": "many"})
+
+    settings = Settings({"DBBACKUP_COMPRESS": "zstd:3", "DBBACKUP_TARGETS": "Local, offsite"})
+    assert (settings.compress_codec, settings.compress_level, settings.targets) == ("zstd", 3, ["local", "offsite"])
+
+def test_engines_are_built_from_settings(sqlite_url, backup_dir):
+    settings = Settings({"DBBACKUP_JOBS": "3", "DBBACKUP_SQLITE_INCREMENTAL": "true", "DBBACKUP_DUMP_NICE": "10"})
+
+    engine = cli.build_engine(sqlite_url, backup_dir, settings=settings)
+
+    assert isinstance(engine, SQLiteBackup)
+    assert (engine.jobs, engine.incremental, engine.nice) == (3, True, 10)
+
+def test_registered_engines_can_be_selected(monkeypatch, backup_dir):
+    class CustomBackup(SQLiteBackup):
+        name = "custom"
+
+    monkeypatch.setitem(registry._ENGINES, "custom", CustomBackup)
+    settings = Settings({})
+
+    assert isinstance(cli.build_engine("custom://db", backup_dir, "custom", settings=settings), CustomBackup)
+    with pytest.raises(ValueError, match="Unsupported database backend 'oracle'"):
+        cli.build_engine("oracle://db", backup_dir, "oracle", settings=settings)
@@ -1,4 +1,5 @@
 # tests/test_compress.py
+import pytest
 from fastapi_dbbackup.compress import compress, decompress
 
 def test_compress_file(tmp_path):
@@ -22,3 +23,65 @@ def test_decompress_file(tmp_path):
     assert decompressed.suffix == ".dump"
     assert decompressed.read_text() == "hello"
     assert not gz.exists()
+
+def test_parallel_gzip_multi_member(tmp_path):
+    import gzip
+    import os
+    from fastapi_dbbackup.compress import ParallelGzipWriter
+
+    data = os.urandom(50_000) + b"x" * 200_000
+    out = tmp_path / "out.gz"
+    with open(out, "wb") as raw:
+        with ParallelGzipWriter(raw, workers=4, block_size=16_384) as gz:
+            gz.write(data[:1000])
+            gz.write(data[1000:])
+
+    assert gzip.decompress(out.read_bytes()) == data
+
+def test_parallel_gzip_empty_input(tmp_path):
+    import gzip
+    from fastapi_dbbackup.compress import ParallelGzipWriter
+
+    out = tmp_path / "empty.gz"
+    with open(out, "wb") as raw:
+        ParallelGzipWriter(raw).close()
+
+    assert gzip.decompress(out.read_bytes()) == b""
+
+def test_parse_codec():
+    from fastapi_dbbackup.compress import parse_codec
+
+    assert parse_codec("true") == ("gzip", None)
+    assert parse_codec("false") is None
+    assert parse_codec("zstd:3") == ("zstd", 3)
+    assert parse_codec("LZ4") == ("lz4", None)
+
+def test_decompress_detects_codec_from_magic(tmp_path):
+    from fastapi_dbbackup.compress import compress, decompress
+
+    file = tmp_path / "test.dump"
+    file.write_text("hello xz")
+
+    packed = compress(file, codec="xz", level=1)
+    renamed = packed.rename(tmp_path / "test.bin")
+    decompressed = decompress(renamed)
+
+    assert decompressed.read_text() == "hello xz"
+
+@pytest.mark.parametrize("name, module", [("zstd", "zstandard"), ("lz4", "lz4")])
+def test_optional_codec_stream_roundtrip(name, module):
+    import io
+    from fastapi_dbbackup.compress import detect_codec, get_codec
+
+    pytest.importorskip(module)
+    codec = get_codec(name)
+    data = b"select 1;\n" * 10_000
+
+    raw = io.BytesIO()
+    with codec.open_writer(raw) as writer:
+        writer.write(data)
+    raw.seek(0)
+
+    assert detect_codec(raw.getvalue()) is codec
+    with codec.open_reader(raw) as reader:
+        assert reader.read() == data
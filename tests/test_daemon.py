@@ -0,0 +1,120 @@
+# tests/test_daemon.py
+import asyncio
+import json
+import pytest
+from fastapi_dbbackup import daemon as daemon_module
+from fastapi_dbbackup.daemon import Daemon, DatabaseJob, host_key, load_config
+from fastapi_dbbackup.schedule import CronSchedule
+
+def make_job(name, host):
+    return DatabaseJob(name, engine=None, storage=None, schedule=CronSchedule("@daily"), host=host)
+
+def test_concurrency_limits(monkeypatch):
+    running = {"total": 0, "max_total": 0}
+    per_host = {}
+
+    async def fake_run_backup(engine, storage, **kwargs):
+        job = storage
+        running["total"] += 1
+        per_host[job.host] = per_host.get(job.host, 0) + 1
+        running["max_total"] = max(running["max_total"], running["total"])
+        assert per_host[job.host] <= 1
+        await asyncio.sleep(0.01)
+        per_host[job.host] -= 1
+        running["total"] -= 1
+        return f"{job.name}.dump"
+
+    monkeypatch.setattr(daemon_module.aio, "run_backup", fake_run_backup)
+    jobs = [make_job(f"db{i}", f"host{i % 3}") for i in range(9)]
+    for job in jobs:
+        job.storage = job  # lets the fake see which job it runs
+    daemon = Daemon(jobs, max_concurrent=2, max_per_host=1)
+
+    results = asyncio.run(daemon.run_once())
+
+    assert results == [f"db{i}.dump" for i in range(9)]
+    assert running["max_total"] == 2
+
+def test_failed_job_is_reported(monkeypatch, capsys):
+    async def failing_run_backup(engine, storage, **kwargs):
+        raise RuntimeError("pg_dump exited with status 1")
+
+    monkeypatch.setattr(daemon_module.aio, "run_backup", failing_run_backup)
+    daemon = Daemon([make_job("orders", "db:5432")])
+
+    assert asyncio.run(daemon.run_once()) == [None]
+    assert "[orders] Error: pg_dump exited with status 1" in capsys.readouterr().out
+
+def test_offline_retention_runs_after_the_backup_releases_its_slots(monkeypatch):
+    events = []
+
+    async def fake_run_backup(engine, storage, **kwargs):
+        events.append(("backup", kwargs["retention_days"], kwargs["max_backups"]))
+        return "orders.dump"
+
+    def fake_retention(storage, retention_days, max_backups, lifecycle):
+        events.append(("retention", daemon._global._value, retention_days, max_backups, lifecycle))
+        return []
+
+    monkeypatch.setattr(daemon_module.aio, "run_backup", fake_run_backup)
+    monkeypatch.setattr(daemon_module, "apply_offline_retention", fake_retention)
+    job = make_job("orders", "db:5432")
+    job.retention_days, job.max_backups = 14, 10
+    daemon = Daemon([job], max_concurrent=1, retention_mode="lifecycle")
+
+    assert asyncio.run(daemon.run_once()) == ["orders.dump"]
+    assert events == [("backup", 0, 0), ("retention", 1, 14, 10, True)]
+
+def test_stop_ends_schedule():
+    daemon = Daemon([make_job("orders", "db:5432")])
+
+    async def main():
+        task = asyncio.ensure_future(daemon.run())
+        await asyncio.sleep(0.05)
+        daemon.stop()
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(main())
+
+def test_host_key():
+    assert host_key("postgresql://u:p@db1:5432/a") == host_key("postgresql://x:y@db1:5432/b")
+    assert host_key("postgresql://u:p@db1:5432/a") != host_key("mysql://u:p@db2/a")
+    assert host_key("sqlite:///app.sqlite3") == "localhost"
+
+def test_load_config_validation(tmp_path):
+    path = tmp_path / "daemon.json"
+    path.write_text(json.dumps({"databases": [{"name": "a", "url": "sqlite:///a.db"}, {"name": "a", "url_env": "B"}]}))
+    with pytest.raises(ValueError, match="Duplicate"):
+        load_config(path)
+
+    path.write_text(json.dumps({"databases": [{"name": "../a", "url": "sqlite:///a.db"}]}))
+    with pytest.raises(ValueError, match="Invalid database name"):
+        load_config(path)
+
+    path.write_text(json.dumps({"databases": [{"name": "a"}]}))
+    with pytest.raises(ValueError, match="needs 'url'"):
+        load_config(path)
+
+def test_build_daemon_backs_up_each_database(tmp_path, monkeypatch, backup_dir):
+    import sqlite3
+    from fastapi_dbbackup.config import Settings
+    from fastapi_dbbackup.daemon import build_daemon
+    settings = Settings({"DBBACKUP_DIR": str(backup_dir), "DBBACKUP_STORAGE": "local"})
+    monkeypatch.setenv("AUTH_DATABASE_URL", f"sqlite:///{tmp_path}/auth.sqlite3")
+    for name in ("orders", "auth"):
+        with sqlite3.connect(tmp_path / f"{name}.sqlite3") as conn:
+            conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+
+    daemon = build_daemon({
+        "compress": "gzip",
+        "databases": [
+            {"name": "orders", "url": f"sqlite:///{tmp_path}/orders.sqlite3", "schedule": "*/5 * * * *"},
+            {"name": "auth", "url_env": "AUTH_DATABASE_URL", "compress": "false"},
+        ],
+    }, settings)
+    orders, auth = asyncio.run(daemon.run_once())
+
+    assert orders.endswith(".sqlite3.gz")
+    assert (backup_dir / "orders" / orders).exists()
+    assert auth.endswith(".sqlite3")
+    assert (backup_dir / "auth" / auth).exists()
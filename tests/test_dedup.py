@@ -0,0 +1,141 @@
+# tests/test_dedup.py
+import gzip
+import io
+import json
+import random
+import time
+from datetime import datetime
+from fastapi_dbbackup.retention import collect_garbage, purge_backups
+from fastapi_dbbackup.storage.catalog import CatalogStorage
+from fastapi_dbbackup.storage.dedup import DedupStorage, iter_chunks
+from fastapi_dbbackup.storage.local import LocalStorage
+
+def sql_dump(rows: int, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    return b"".join(
+        f"INSERT INTO t VALUES ({i}, '{rng.getrandbits(64):x}');\n".encode() for i in range(rows)
+    )
+
+def chunk_files(backup_dir):
+    return sorted(p.name for p in (backup_dir / ".chunks").rglob("*") if p.is_file() and p.name != "index.json")
+
+def test_chunk_boundaries_survive_insertions():
+    data = sql_dump(60_000)
+    edited = data[:1000] + b"INSERT INTO t VALUES (-1, 'inserted');\n" + data[1000:]
+
+    original = list(iter_chunks(io.BytesIO(data), min_size=16_384, max_size=262_144, mask_bits=8))
+    shifted = list(iter_chunks(io.BytesIO(edited), min_size=16_384, max_size=262_144, mask_bits=8))
+
+    assert b"".join(original) == data
+    assert len(original) > 10
+    # Only the chunk containing the insertion differs
+    assert len(set(original) - set(shifted)) == 1
+
+def test_dedup_roundtrip_and_reuse(backup_dir):
+    storage = DedupStorage(LocalStorage(backup_dir), codec="gzip")
+    first = sql_dump(200_000)
+    second = first + sql_dump(1000, seed=2)
+
+    storage.upload_fileobj(io.BytesIO(first), "default-20260101-000000.dump")
+    chunks_after_first = len(chunk_files(backup_dir))
+    storage.upload_fileobj(io.BytesIO(second), "default-20260102-000000.dump")
+
+    assert len(chunk_files(backup_dir)) <= chunks_after_first + 2
+    assert sorted(storage.list_backups()) == ["default-20260101-000000.dump", "default-20260102-000000.dump"]
+    with DedupStorage(LocalStorage(backup_dir)).open_read("default-20260102-000000.dump") as f:
+        assert f.read() == second
+
+def test_dedup_delete_keeps_shared_chunks(backup_dir):
+    storage = DedupStorage(LocalStorage(backup_dir), gc_grace=0)
+    storage.upload_fileobj(io.BytesIO(sql_dump(100_000)), "a.dump")
+    storage.upload_fileobj(io.BytesIO(sql_dump(100_000) + b"tail\n"), "b.dump")
+
+    storage.delete("a.dump")
+    with storage.open_read("b.dump") as f:
+        assert f.read() == sql_dump(100_000) + b"tail\n"
+
+    storage.delete_many(["b.dump"])
+    assert chunk_files(backup_dir) == []
+
+def test_collect_garbage_removes_orphaned_chunks(backup_dir):
+    storage = DedupStorage(LocalStorage(backup_dir))
+    storage.upload_fileobj(io.BytesIO(sql_dump(50_000)), "a.dump")
+    # Simulate an interrupted run: the manifest disappears, the chunks stay indexed
+    (backup_dir / "a.dump").unlink()
+
+    removed = collect_garbage(CatalogStorage(DedupStorage(LocalStorage(backup_dir), gc_grace=0)))
+
+    assert removed
+    assert chunk_files(backup_dir) == []
+
+def test_plain_backups_from_before_dedup_are_read_and_deleted(backup_dir):
+    legacy = gzip.compress(b"-- dump\n" * 1000)
+    (backup_dir / "default-20200101-000000.dump.gz").write_bytes(legacy)
+    recent = f"default-{datetime.now():%Y%m%d-%H%M%S}.dump"
+    storage = DedupStorage(LocalStorage(backup_dir))
+    storage.upload_fileobj(io.BytesIO(sql_dump(10_000)), recent)
+
+    with storage.open_read("default-20200101-000000.dump.gz") as f:
+        assert f.read() == legacy
+    assert purge_backups(storage, retention_days=30) == ["default-20200101-000000.dump.gz"]
+    assert storage.list_backups() == [recent]
+    assert chunk_files(backup_dir)
+
+def test_uploads_see_chunks_collected_by_another_process(backup_dir):
+    daemon = DedupStorage(LocalStorage(backup_dir))
+    daemon.upload_fileobj(io.BytesIO(sql_dump(20_000)), "a.dump")
+    # `retention apply` in another process deletes the backup and its chunks
+    DedupStorage(LocalStorage(backup_dir), gc_grace=0).delete("a.dump")
+
+    daemon.upload_fileobj(io.BytesIO(sql_dump(20_000)), "b.dump")
+
+    with DedupStorage(LocalStorage(backup_dir)).open_read("b.dump") as f:
+        assert f.read() == sql_dump(20_000)
+
+class Interrupted(io.BytesIO):
+    """A dump that runs `during` once half of it has been read."""
+
+    def __init__(self, data, during):
+        super().__init__(data)
+        self.during = during
+
+    def read(self, size=-1):
+        if self.during and self.tell() >= len(self.getvalue()) // 2:
+            self.during, during = None, self.during
+            during()
+        return super().read(size)
+
+def test_gc_in_another_process_keeps_chunks_of_an_upload_in_progress(backup_dir):
+    shared = sql_dump(50_000)
+    DedupStorage(LocalStorage(backup_dir)).upload_fileobj(io.BytesIO(shared), "a.dump")
+
+    def retention_elsewhere():
+        # Drops the last reference to chunks the upload is reusing, then collects garbage
+        other = DedupStorage(LocalStorage(backup_dir))
+        other.delete("a.dump")
+        collect_garbage(other)
+
+    storage = DedupStorage(LocalStorage(backup_dir))
+    storage.upload_fileobj(Interrupted(shared + sql_dump(50_000, seed=2), retention_elsewhere), "b.dump")
+
+    with DedupStorage(LocalStorage(backup_dir)).open_read("b.dump") as f:
+        assert f.read() == shared + sql_dump(50_000, seed=2)
+    # Both processes' index updates landed: b.dump holds the only reference to its chunks
+    refs = DedupStorage(LocalStorage(backup_dir))._load_refs()
+    used = {digest for digest, _ in json.loads((backup_dir / "b.dump").read_text())["chunks"]}
+    assert {refs[digest] for digest in used} == {1}
+    # a.dump's other chunks wait out the grace period
+    assert {count for digest, count in refs.items() if digest not in used} == {0}
+
+def test_chunks_past_the_grace_period_are_collected(backup_dir):
+    storage = DedupStorage(LocalStorage(backup_dir), gc_grace=3600)
+    storage.upload_fileobj(io.BytesIO(sql_dump(20_000)), "a.dump")
+    storage.delete("a.dump")
+    assert chunk_files(backup_dir)
+
+    index = json.loads((backup_dir / ".chunks" / "index.json").read_text())
+    index["unreferenced"] = {digest: time.time() - 7200 for digest in index["unreferenced"]}
+    (backup_dir / ".chunks" / "index.json").write_text(json.dumps(index))
+
+    assert storage.collect_unreferenced()
+    assert chunk_files(backup_dir) == []
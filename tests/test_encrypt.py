@@ -0,0 +1,134 @@
+# tests/test_encrypt.py
+import gzip
+import io
+import os
+from unittest.mock import MagicMock
+import pytest
+from fastapi_dbbackup import cli, pipeline
+from fastapi_dbbackup.compress import get_codec
+from fastapi_dbbackup.config import Settings
+from fastapi_dbbackup.encrypt import (
+    HEADER, TAG_SIZE, EncryptedFile, Encryptor, Keyring, decrypt_file, encrypt_file, generate_key, open_decrypted,
+)
+from fastapi_dbbackup.storage.checksum import ChecksumStorage
+from fastapi_dbbackup.storage.local import LocalStorage
+from fastapi_dbbackup.verify import VerificationError, verify_backup
+
+pytest.importorskip("cryptography")
+
+CHUNK = 1024
+
+def seal(data: bytes, keyring: Keyring, cipher: str = "aes-256-gcm") -> bytes:
+    out = io.BytesIO()
+    with Encryptor(keyring, cipher, workers=3, chunk_size=CHUNK).open_writer(out) as writer:
+        # Uneven writes, so chunks are cut across write boundaries
+        for start in range(0, len(data), 700):
+            writer.write(data[start:start + 700])
+    return out.getvalue()
+
+@pytest.fixture
+def keyring():
+    return Keyring.from_text(generate_key())
+
+@pytest.mark.parametrize("cipher", ["aes-256-gcm", "chacha20-poly1305"])
+@pytest.mark.parametrize("size", [0, 1, CHUNK, 5 * CHUNK + 3])
+def test_round_trip(keyring, cipher, size):
+    data = os.urandom(size)
+
+    sealed = seal(data, keyring, cipher)
+
+    assert len(sealed) == HEADER.size + max(-(-size // CHUNK), 1) * TAG_SIZE + size
+    assert size < 16 or data[:16] not in sealed
+    with open_decrypted(io.BytesIO(sealed), keyring) as reader:
+        assert reader.read() == data
+
+def test_tampering_truncation_and_reordering_are_detected(keyring):
+    sealed = seal(os.urandom(4 * CHUNK), keyring)
+    sealed_chunk = CHUNK + TAG_SIZE
+    header, chunks = sealed[:HEADER.size], sealed[HEADER.size:]
+
+    flipped = bytearray(sealed)
+    flipped[HEADER.size + sealed_chunk + 10] ^= 1
+    dropped_last = sealed[:-sealed_chunk]
+    swapped = header + chunks[sealed_chunk:2 * sealed_chunk] + chunks[:sealed_chunk] + chunks[2 * sealed_chunk:]
+    for bad in (bytes(flipped), dropped_last, swapped):
+        with pytest.raises(ValueError, match="failed authentication"):
+            open_decrypted(io.BytesIO(bad), keyring).read()
+
+    # Without the key, encrypted backups are refused rather than passed through
+    with pytest.raises(ValueError, match="Backup is encrypted"):
+        open_decrypted(io.BytesIO(sealed))
+    assert open_decrypted(io.BytesIO(b"plain")).read() == b"plain"
+
+def test_random_access(tmp_path, keyring):
+    data = os.urandom(10 * CHUNK + 123)
+    path = tmp_path / "backup.dump.enc"
+    path.write_bytes(seal(data, keyring))
+
+    with EncryptedFile(open(path, "rb"), keyring) as f:
+        assert f.size == len(data)
+        f.seek(7 * CHUNK - 5)
+        assert f.read(10) == data[7 * CHUNK - 5:7 * CHUNK + 5]
+        f.seek(-50, io.SEEK_END)
+        assert f.read() == data[-50:]
+
+def test_keys_rotate(tmp_path, keyring):
+    old = keyring
+    new = Keyring.from_text(f"{generate_key()},\n{old.current.hex()}")
+    file = tmp_path / "backup.dump"
+    file.write_bytes(b"-- dump\n" * 1000)
+
+    sealed = encrypt_file(file, Encryptor(old, chunk_size=CHUNK))
+    assert sealed.name == "backup.dump.enc" and not file.exists()
+
+    # Backups made with the old key still decrypt once a new key encrypts
+    assert decrypt_file(sealed, new).read_bytes() == b"-- dump\n" * 1000
+    with pytest.raises(ValueError, match="not configured"):
+        decrypt_file(sealed, Keyring.from_text(generate_key()))
+    with pytest.raises(ValueError, match="32 bytes"):
+        Keyring.from_text("c2hvcnQ=")
+
+def test_settings_build_encryptor(tmp_path):
+    key_file = tmp_path / "key"
+    key_file.write_text(generate_key() + "\n")
+    settings = Settings({"DBBACKUP_ENCRYPT": "chacha20-poly1305", "DBBACKUP_ENCRYPT_KEY_FILE": str(key_file), "DBBACKUP_ENCRYPT_CHUNK_KB": "64"})
+
+    encryptor = cli.build_encryptor(settings)
+
+    assert (encryptor.cipher, encryptor.chunk_size) == ("chacha20-poly1305", 64 * 1024)
+    with pytest.raises(ValueError, match="needs a key"):
+        cli.build_encryptor(Settings({"DBBACKUP_ENCRYPT": "true"}))
+    with pytest.raises(ValueError, match="DBBACKUP_DEDUP"):
+        cli.build_encryptor(Settings({"DBBACKUP_ENCRYPT": "true", "DBBACKUP_ENCRYPT_KEY": generate_key(), "DBBACKUP_DEDUP": "true"}))
+    with pytest.raises(ValueError, match="DBBACKUP_ENCRYPT must be"):
+        Settings({"DBBACKUP_ENCRYPT": "rot13"})
+
+def test_pipeline_streams_through_compression_and_encryption(backup_dir, keyring):
+    dump = b"-- dump\n" * 100000
+    engine = MagicMock(stream_suffix=".sql")
+    engine.backup_stream.return_value = io.BytesIO(dump)
+    storage = ChecksumStorage(LocalStorage(backup_dir))
+
+    remote_path = pipeline.backup(engine, storage, codec=get_codec("gzip"), encryptor=Encryptor(keyring, chunk_size=CHUNK))
+
+    assert remote_path.endswith(".sql.gz.enc")
+    assert gzip.decompress(decrypt_file(backup_dir / remote_path, keyring).read_bytes()) == dump
+    # The checksum covers the stored ciphertext, so it is checked without the key
+    assert verify_backup(storage, remote_path) == ["sha256 ok", "encrypted, contents not checked (no key)"]
+    assert verify_backup(storage, remote_path, keyring=keyring) == ["sha256 ok", "encryption ok", "gzip stream ok"]
+
+    restored = []
+    engine.restore_stream.side_effect = lambda f: restored.append(f.read()) or True
+    assert pipeline.restore(engine, storage, remote_path, keyring=keyring) == remote_path
+    assert restored == [dump]
+    with pytest.raises(ValueError, match="Backup is encrypted"):
+        pipeline.restore(engine, storage, remote_path)
+
+def test_verify_reports_failed_authentication(backup_dir, keyring):
+    storage = LocalStorage(backup_dir)
+    sealed = bytearray(seal(gzip.compress(b"x" * 5000), keyring))
+    sealed[-1] ^= 1
+    (backup_dir / "backup.sql.gz.enc").write_bytes(bytes(sealed))
+
+    with pytest.raises(VerificationError, match="failed authentication"):
+        verify_backup(storage, "backup.sql.gz.enc", keyring=keyring)
@@ -0,0 +1,111 @@
+# tests/test_fanout.py
+import io
+import time
+import pytest
+from fastapi_dbbackup.storage.fanout import FanoutStorage, TargetDropped
+from fastapi_dbbackup.storage.local import LocalStorage
+
+MB = 1024 * 1024
+
+class SlowStorage(LocalStorage):
+    """Local storage that stalls after reading `stall_after` bytes."""
+
+    def __init__(self, backup_dir, stall_after=0, stall=10):
+        super().__init__(backup_dir)
+        self.stall_after = stall_after
+        self.stall = stall
+
+    def upload_fileobj(self, fileobj, remote_path):
+        outer = self
+
+        class Stalling(io.RawIOBase):
+            read_bytes = 0
+
+            def readable(self):
+                return True
+
+            def readinto(self, buffer):
+                if self.read_bytes >= outer.stall_after:
+                    time.sleep(outer.stall)
+                n = fileobj.readinto(buffer)
+                self.read_bytes += n
+                return n
+
+        return super().upload_fileobj(Stalling(), remote_path)
+
+class FailingStorage(LocalStorage):
+    def upload_fileobj(self, fileobj, remote_path):
+        fileobj.read(1)
+        raise IOError("bucket unavailable")
+
+def test_fanout_stores_one_stream_on_every_target(tmp_path):
+    targets = {name: LocalStorage(tmp_path / name) for name in ("primary", "offsite", "archive")}
+    storage = FanoutStorage(targets, buffer_size=2 * MB)
+    data = bytes(range(256)) * 40000  # ~10 MB
+
+    assert storage.upload_fileobj(io.BytesIO(data), "backup.dump") == "backup.dump"
+
+    for name in targets:
+        assert (tmp_path / name / "backup.dump").read_bytes() == data
+    assert storage.last_results == {"primary": None, "offsite": None, "archive": None}
+    assert storage.list_backups() == ["backup.dump"]
+
+def test_failed_target_does_not_stop_others(tmp_path):
+    storage = FanoutStorage({"primary": LocalStorage(tmp_path / "a"), "broken": FailingStorage(tmp_path / "b")}, buffer_size=MB)
+    data = b"x" * (8 * MB)
+
+    storage.upload_fileobj(io.BytesIO(data), "backup.dump")
+
+    assert (tmp_path / "a" / "backup.dump").read_bytes() == data
+    assert isinstance(storage.last_results["broken"], IOError)
+    assert not (tmp_path / "b" / "backup.dump").exists()
+
+def test_slow_target_is_dropped_after_timeout(tmp_path):
+    slow = SlowStorage(tmp_path / "slow", stall_after=MB, stall=3)
+    storage = FanoutStorage({"primary": LocalStorage(tmp_path / "fast"), "slow": slow}, buffer_size=MB, timeout=0.5)
+    data = b"y" * (8 * MB)
+
+    start = time.monotonic()
+    storage.upload_fileobj(io.BytesIO(data), "backup.dump")
+
+    assert time.monotonic() - start < 2.5
+    assert (tmp_path / "fast" / "backup.dump").read_bytes() == data
+    assert isinstance(storage.last_results["slow"], TargetDropped)
+
+def test_all_targets_failing_raises(tmp_path):
+    storage = FanoutStorage({"a": FailingStorage(tmp_path / "a"), "b": FailingStorage(tmp_path / "b")})
+
+    with pytest.raises(RuntimeError, match="All backup targets failed"):
+        storage.upload_fileobj(io.BytesIO(b"data"), "backup.dump")
+
+def test_source_failure_aborts_every_target(tmp_path):
+    class BrokenSource(io.RawIOBase):
+        sent = 0
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            if self.sent >= 3 * MB:
+                raise IOError("dump failed")
+            self.sent += len(buffer)
+            return len(buffer)
+
+    storage = FanoutStorage({"a": LocalStorage(tmp_path / "a"), "b": LocalStorage(tmp_path / "b")})
+    with pytest.raises(IOError, match="dump failed"):
+        storage.upload_fileobj(io.BufferedReader(BrokenSource()), "backup.dump")
+
+    time.sleep(0.2)
+    assert list((tmp_path / "a").iterdir()) == []
+    assert list((tmp_path / "b").iterdir()) == []
+
+def test_delete_many_applies_to_every_target(tmp_path):
+    targets = {name: LocalStorage(tmp_path / name) for name in ("a", "b")}
+    storage = FanoutStorage(targets)
+    storage.upload_fileobj(io.BytesIO(b"1"), "old.dump")
+    storage.upload_fileobj(io.BytesIO(b"2"), "new.dump")
+
+    storage.delete_many(["old.dump"])
+
+    for target in targets.values():
+        assert target.list_backups() == ["new.dump"]
@@ -0,0 +1,137 @@
+# tests/test_metrics.py
+import gzip
+import io
+import json
+import sqlite3
+import sys
+from unittest.mock import patch
+import pytest
+from fastapi_dbbackup import pipeline
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import get_codec
+from fastapi_dbbackup.engines.sqlite import SQLiteBackup
+from fastapi_dbbackup.metrics import MetricsExporter, RunMetrics, prometheus_text
+from fastapi_dbbackup.storage.local import LocalStorage
+
+DATA = b"INSERT INTO t VALUES (1);\n" * 100000
+
+class StreamBackup(BackupEngine):
+    name = "stream"
+
+    def backup(self):
+        raise AssertionError("should stream")
+
+    def backup_stream(self):
+        return io.BytesIO(DATA)
+
+    def restore(self, backup_path):
+        pass
+
+    def restore_stream(self, fileobj):
+        self.restored = fileobj.read()
+        return True
+
+def test_streamed_backup_records_every_stage(backup_dir):
+    metrics = RunMetrics("backup")
+    remote_path = pipeline.backup(StreamBackup("stream://", backup_dir), LocalStorage(backup_dir), codec=get_codec("gzip"), metrics=metrics)
+
+    stages = metrics.stages
+    assert sorted(stages) == ["compress", "dump", "retention", "upload"]
+    assert stages["dump"].bytes == stages["compress"].bytes == len(DATA)
+    assert stages["upload"].bytes == (backup_dir / remote_path).stat().st_size
+    assert all(stage.seconds >= 0 and stage.io_seconds >= 0 for stage in stages.values())
+
+def test_streamed_restore_counts_download_and_restore(backup_dir):
+    (backup_dir / "backup.dump.gz").write_bytes(gzip.compress(DATA))
+    engine = StreamBackup("stream://", backup_dir)
+    metrics = RunMetrics("restore")
+
+    pipeline.restore(engine, LocalStorage(backup_dir), "backup.dump.gz", metrics=metrics)
+
+    assert engine.restored == DATA
+    assert metrics.stages["download"].bytes == (backup_dir / "backup.dump.gz").stat().st_size
+    assert metrics.stages["restore"].bytes == len(DATA)
+
+def test_file_backup_times_each_stage(tmp_path, backup_dir):
+    db_path = tmp_path / "app.sqlite3"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    metrics = RunMetrics("backup")
+
+    pipeline.backup(SQLiteBackup(f"sqlite:///{db_path}", backup_dir), LocalStorage(backup_dir), codec=get_codec("gzip"), keep_local=True, metrics=metrics)
+
+    assert list(metrics.stages) == ["dump", "compress", "upload", "retention"]
+    assert metrics.stages["dump"].bytes == db_path.stat().st_size
+
+def test_prometheus_text_and_summary(tmp_path, capsys):
+    textfile = tmp_path / "dbbackup.prom"
+    exporter = MetricsExporter(textfile=textfile)
+    for name in ("orders", 'a"b'):
+        run = RunMetrics("backup", database=name)
+        with run.timed("upload") as stage:
+            stage.bytes += 1024
+        run.finish(backup="default.dump.gz")
+        exporter.export(run)
+
+    text = textfile.read_text()
+    assert text.count("# TYPE dbbackup_stage_bytes gauge") == 1
+    assert 'dbbackup_stage_bytes{operation="backup",database="orders",stage="upload"} 1024' in text
+    assert 'database="a\\"b"' in text
+    assert 'dbbackup_last_run_success{operation="backup",database="orders"} 1' in text
+
+    summary = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert summary["status"] == "succeeded"
+    assert summary["database"] == "orders"
+    assert summary["backup"] == "default.dump.gz"
+    assert summary["stages"]["upload"]["bytes"] == 1024
+
+def test_failed_run_is_exported(capsys):
+    run = RunMetrics("restore")
+    run.finish(FileNotFoundError("backup.dump"))
+
+    assert 'dbbackup_last_run_success{operation="restore"} 0' in prometheus_text([run])
+    MetricsExporter().export(run)
+    assert json.loads(capsys.readouterr().out)["error"] == "FileNotFoundError: backup.dump"
+
+@patch("urllib.request.urlopen")
+def test_pushgateway_groups_by_labels(mock_urlopen):
+    run = RunMetrics("backup", database="orders")
+    run.finish()
+
+    MetricsExporter(pushgateway="http://gateway:9091/", summary=False).export(run)
+
+    request = mock_urlopen.call_args[0][0]
+    assert request.full_url == "http://gateway:9091/metrics/job/fastapi_dbbackup/operation/backup/database/orders"
+    assert request.get_method() == "PUT"
+    assert b"dbbackup_last_run_duration_seconds" in request.data
+
+def test_otel_spans_are_emitted_from_recorded_times():
+    pytest.importorskip("opentelemetry.trace")
+    spans = []
+
+    class Span:
+        def __init__(self, name, **kwargs):
+            self.name, self.kwargs, self.end_time = name, kwargs, None
+            spans.append(self)
+
+        def end(self, end_time=None):
+            self.end_time = end_time
+
+        def set_status(self, status):
+            self.status = status
+
+    class Tracer:
+        def start_span(self, name, **kwargs):
+            return Span(name, **kwargs)
+
+    run = RunMetrics("backup", database="orders")
+    with run.timed("dump") as stage:
+        stage.bytes += 10
+    run.finish()
+    with patch("fastapi_dbbackup.metrics._otel_tracer", return_value=Tracer()):
+        MetricsExporter(summary=False, otel=True).export(run)
+
+    assert [span.name for span in spans] == ["dbbackup.backup", "dbbackup.backup.dump"]
+    root, dump = spans
+    assert root.kwargs["start_time"] <= dump.kwargs["start_time"] <= dump.end_time <= root.end_time
+    assert dump.kwargs["attributes"]["dbbackup.bytes"] == 10
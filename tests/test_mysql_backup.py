@@ -0,0 +1,161 @@
+# tests/test_mysql_backup.py
+import io
+import json
+import tarfile
+import threading
+from unittest.mock import MagicMock, patch
+import pytest
+from fastapi_dbbackup.engines.mysql import MySQLBackup
+
+TABLES = {
+    "users": ("BASE TABLE", 5000),
+    "orders": ("BASE TABLE", 9000),
+    "audit_log": ("BASE TABLE", 90000),
+    "active_users": ("VIEW", 0),
+}
+
+CREATE = {
+    "users": (
+        "CREATE TABLE `users` (\n"
+        "  `id` int NOT NULL AUTO_INCREMENT,\n"
+        "  `email` varchar(255) NOT NULL,\n"
+        "  PRIMARY KEY (`id`),\n"
+        "  UNIQUE KEY `email` (`email`)\n"
+        ") ENGINE=InnoDB;\n"
+    ),
+    "orders": (
+        "CREATE TABLE `orders` (\n"
+        "  `id` int NOT NULL AUTO_INCREMENT,\n"
+        "  `user_id` int NOT NULL,\n"
+        "  PRIMARY KEY (`id`),\n"
+        "  KEY `user_id` (`user_id`),\n"
+        "  CONSTRAINT `orders_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`)\n"
+        ") ENGINE=InnoDB;\n"
+    ),
+    "audit_log": (
+        "CREATE TABLE `audit_log` (\n"
+        "  `id` int NOT NULL AUTO_INCREMENT,\n"
+        "  KEY `id` (`id`)\n"
+        ") ENGINE=InnoDB;\n"
+    ),
+}
+
+def fake_dump(tables):
+    out = "-- MySQL dump\n/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n\n"
+    for table in tables:
+        out += f"--\n-- Table structure for table `{table}`\n--\n\n"
+        out += f"DROP TABLE IF EXISTS `{table}`;\n{CREATE.get(table, '')}\n"
+        out += f"INSERT INTO `{table}` VALUES (1);\n\n"
+    out += "/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;\n\n-- Dump completed on 2026-01-01  0:00:00\n"
+    return out.encode()
+
+class FakeMySQL:
+    """Stands in for the mysql and mysqldump clients."""
+
+    def __init__(self):
+        self.dumps = []
+        self.loaded = []
+        self.lock = threading.Lock()
+
+    def run(self, cmd, stdout=None, **kwargs):
+        if cmd[0] == "mysql":
+            listing = "".join(f"{name}\t{kind}\t{size}\n" for name, (kind, size) in TABLES.items())
+            return MagicMock(stdout=listing.encode())
+        self.dumps.append(cmd)
+        stdout.write(fake_dump(cmd[cmd.index("dbname") + 1:]))
+
+    def popen(self, cmd, **kwargs):
+        process = MagicMock()
+        process.wait.return_value = 0
+        if cmd[0] == "mysqldump":
+            with self.lock:
+                self.dumps.append(cmd)
+            process.stdout = io.BytesIO(fake_dump(cmd[cmd.index("dbname") + 1:]))
+        elif kwargs.get("stdout") is not None:
+            # Control session holding the global read lock
+            process.stdout = io.BytesIO(b"locked\n")
+            process.communicate.return_value = (b"", b"")
+        else:
+            process.stdin = io.BytesIO()
+            process.stdin.close = lambda: self.loaded.append(process.stdin.getvalue().decode())
+        return process
+
+@pytest.fixture
+def fake_mysql():
+    fake = FakeMySQL()
+    with patch("subprocess.run", side_effect=fake.run), patch("subprocess.Popen", side_effect=fake.popen):
+        yield fake
+
+def test_sql_dump_uses_consistent_snapshot(fake_mysql, mysql_url, backup_dir):
+    engine = MySQLBackup(mysql_url, backup_dir)
+    cmd, env = engine.stream_command()
+
+    assert cmd[:3] == ["mysqldump", "--single-transaction", "--quick"]
+    assert cmd[-1] == "dbname"
+    assert env["MYSQL_PWD"] == "pass"
+
+def test_table_filters(fake_mysql, mysql_url, backup_dir):
+    excluded = MySQLBackup(mysql_url, backup_dir, exclude_tables=["audit_*"])
+    assert "--ignore-table=dbname.audit_log" in excluded.stream_command()[0]
+
+    included = MySQLBackup(mysql_url, backup_dir, include_tables=["audit_*"])
+    assert included.stream_command()[0][-2:] == ["dbname", "audit_log"]
+
+    with pytest.raises(ValueError, match="No tables"):
+        MySQLBackup(mysql_url, backup_dir, include_tables=["missing"]).stream_command()
+
+def test_parallel_dump_writes_per_table_archive(fake_mysql, mysql_url, backup_dir):
+    engine = MySQLBackup(mysql_url, backup_dir, jobs=2, dump_format="tables")
+    assert engine.stream_command() is None
+
+    backup = engine.backup()
+
+    # Largest table alone in one worker, the rest in the other
+    groups = sorted(cmd[cmd.index("dbname") + 1:] for cmd in fake_mysql.dumps if "--no-data" not in cmd)
+    assert groups == [["audit_log"], ["orders", "users"]]
+    with tarfile.open(backup) as tar:
+        assert tar.getnames()[0] == "index.json"
+        index = json.load(tar.extractfile("index.json"))
+        header = tar.extractfile("header.sql").read()
+        users = tar.extractfile(next(t["file"] for t in index["tables"] if t["name"] == "users")).read()
+    assert [t["name"] for t in index["tables"]] == ["audit_log", "orders", "users"]
+    assert index["views"] == "views.sql"
+    assert b"FOREIGN_KEY_CHECKS=0" in header and b"Table structure" not in header
+    assert users.startswith(b"--\n-- Table structure for table `users`")
+    assert b"TIME_ZONE" not in users
+    assert [p for p in backup_dir.iterdir() if p.is_dir()] == []
+    assert engine.verify_stream(io.BytesIO(backup.read_bytes()))
+
+def test_parallel_restore_defers_keys(fake_mysql, mysql_url, backup_dir):
+    backup = MySQLBackup(mysql_url, backup_dir, jobs=2, dump_format="tables").backup()
+
+    engine = MySQLBackup(mysql_url, backup_dir, jobs=3)
+    assert engine.restore_stream(io.BytesIO(backup.read_bytes()))
+
+    loads = {}
+    for sql in fake_mysql.loaded:
+        loads.setdefault("alter" if "ALTER TABLE" in sql else sql.split("DROP TABLE IF EXISTS `")[-1].split("`")[0], []).append(sql)
+    users = loads["users"][0]
+    assert "UNIQUE KEY" not in users and "  PRIMARY KEY (`id`)\n) ENGINE" in users
+    assert "FOREIGN KEY" not in loads["orders"][0]
+    # Keys on the AUTO_INCREMENT column must stay
+    assert "KEY `id` (`id`)" in loads["audit_log"][0]
+    alters = [sql.splitlines()[-1] for sql in loads["alter"]]
+    assert "ALTER TABLE `users` ADD UNIQUE KEY `email` (`email`);" in alters
+    assert alters[-1] == "ALTER TABLE `orders` ADD CONSTRAINT `orders_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`);"
+
+def test_verify_rejects_incomplete_archive(fake_mysql, mysql_url, backup_dir):
+    engine = MySQLBackup(mysql_url, backup_dir, dump_format="tables")
+    backup = engine.backup()
+
+    truncated = io.BytesIO()
+    with tarfile.open(backup) as src, tarfile.open(fileobj=truncated, mode="w") as dst:
+        for member in src:
+            if member.name != "00001.sql":
+                dst.addfile(member, src.extractfile(member))
+    with pytest.raises(ValueError, match="incomplete: orders"):
+        engine.verify_stream(io.BytesIO(truncated.getvalue()))
+
+def test_unknown_format_is_rejected(mysql_url, backup_dir):
+    with pytest.raises(ValueError, match="Unsupported"):
+        MySQLBackup(mysql_url, backup_dir, dump_format="csv")
@@ -0,0 +1,198 @@
+# tests/test_pitr.py
+import gzip
+import io
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tarfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+import pytest
+from fastapi_dbbackup.compress import get_codec
+from fastapi_dbbackup.engines.postgres import PostgresBaseBackup
+from fastapi_dbbackup.pitr import WALArchive, next_segment, parse_target_time
+from fastapi_dbbackup.storage.local import LocalStorage
+
+SEGMENTS = ["000000010000000000000001", "000000010000000000000002", "000000010000000000000003"]
+
+def make_wal_dir(tmp_path, names):
+    wal_dir = tmp_path / "pg_wal"
+    (wal_dir / "archive_status").mkdir(parents=True)
+    for name in names:
+        (wal_dir / name).write_bytes(name.encode() * 1000)
+        (wal_dir / "archive_status" / f"{name}.ready").touch()
+    return wal_dir
+
+def mark_archived(wal_dir, name):
+    # What PostgreSQL does once archive_command succeeds
+    status = wal_dir / "archive_status"
+    (status / f"{name}.ready").rename(status / f"{name}.done")
+
+def make_base_tar(label_segment="000000010000000000000002") -> bytes:
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w") as tar:
+        for name, data in [
+            ("backup_label", f"START WAL LOCATION: 0/2000028 (file {label_segment})\nLABEL: test\n".encode()),
+            ("PG_VERSION", b"16\n"),
+            ("postgresql.auto.conf", b"# Do not edit this file manually!\n"),
+        ]:
+            member = tarfile.TarInfo(name)
+            member.size = len(data)
+            tar.addfile(member, io.BytesIO(data))
+    return out.getvalue()
+
+@pytest.fixture
+def archive(tmp_path, backup_dir):
+    return WALArchive(LocalStorage(backup_dir), codec=get_codec("gzip"), jobs=3, state_dir=tmp_path / "state")
+
+def test_push_uploads_ready_segments_ahead(tmp_path, backup_dir, archive):
+    wal_dir = make_wal_dir(tmp_path, SEGMENTS)
+
+    assert archive.push(wal_dir / SEGMENTS[0]) == [f"{name}.gz" for name in SEGMENTS]
+    assert gzip.decompress((backup_dir / "wal" / f"{SEGMENTS[2]}.gz").read_bytes()) == SEGMENTS[2].encode() * 1000
+    mark_archived(wal_dir, SEGMENTS[0])
+
+    # PostgreSQL asking for a segment uploaded ahead costs nothing...
+    (backup_dir / "wal" / f"{SEGMENTS[1]}.gz").unlink()
+    assert archive.push(wal_dir / SEGMENTS[1]) == []
+    mark_archived(wal_dir, SEGMENTS[1])
+    # ...unless the file is not the one that was uploaded (e.g. a new cluster at the same path)
+    (wal_dir / SEGMENTS[2]).write_bytes(b"other cluster")
+    assert archive.push(wal_dir / SEGMENTS[2]) == [f"{SEGMENTS[2]}.gz"]
+
+def test_fetch_prefetches_following_segments(tmp_path, archive):
+    wal_dir = make_wal_dir(tmp_path, SEGMENTS)
+    archive.push(wal_dir / SEGMENTS[0])
+    restored = tmp_path / "restored"
+    restored.mkdir()
+
+    with patch.object(archive, "_download", wraps=archive._download) as download:
+        assert archive.fetch(SEGMENTS[0], restored / "RECOVERYXLOG")
+        assert download.call_count == 3
+        assert archive.fetch(SEGMENTS[1], restored / "RECOVERYXLOG")
+        assert download.call_count == 3
+    assert (restored / "RECOVERYXLOG").read_bytes() == SEGMENTS[1].encode() * 1000
+    assert not archive.fetch("000000010000000000000009", restored / "RECOVERYXLOG")
+    assert next_segment("0000000100000001000000FF") == "000000010000000200000000"
+
+def test_prune_keeps_wal_of_the_oldest_base_backup(tmp_path, backup_dir, archive):
+    wal_dir = make_wal_dir(tmp_path, SEGMENTS + ["00000002.history"])
+    for name in SEGMENTS + ["00000002.history"]:
+        archive._upload(wal_dir / name)
+    for name, start in [("default-20260101-000000.tar.gz", SEGMENTS[1]), ("default-20260102-000000.tar.gz", SEGMENTS[2])]:
+        archive.base.upload_fileobj(io.BytesIO(b"base"), name)
+        archive.record_base(name, 0, 0, start)
+
+    assert archive.prune() == [f"{SEGMENTS[0]}.gz"]
+
+    # Retention removed the older base backup; its WAL goes too, and so does its index entry
+    archive.base.delete("default-20260101-000000.tar.gz")
+    assert archive.prune() == [f"{SEGMENTS[1]}.gz"]
+    assert list(archive._load_index()) == ["default-20260102-000000.tar.gz"]
+    assert sorted(os.listdir(backup_dir / "wal")) == [f"{SEGMENTS[2]}.gz", "00000002.history.gz"]
+
+def test_prepare_restore_configures_recovery(tmp_path, archive):
+    target = parse_target_time("2026-01-31 22:05:00+00:00")
+    for name, finished in [("default-20260131-210000.tar.gz", "2026-01-31 21:10:00+00:00"), ("default-20260131-230000.tar.gz", "2026-01-31 23:10:00+00:00")]:
+        archive.base.upload_fileobj(io.BytesIO(gzip.compress(make_base_tar())), name)
+        archive.record_base(name, 0, parse_target_time(finished).timestamp(), None)
+    pgdata = tmp_path / "pgdata"
+
+    assert archive.prepare_restore(pgdata, target, restore_command="wal-fetch %f %p") == "default-20260131-210000.tar.gz"
+
+    assert (pgdata / "recovery.signal").exists()
+    assert (pgdata / "pg_wal").is_dir()
+    assert oct(pgdata.stat().st_mode & 0o777) == "0o700"
+    conf = (pgdata / "postgresql.auto.conf").read_text()
+    assert "restore_command = 'wal-fetch %f %p'" in conf
+    assert "recovery_target_time = '2026-01-31 22:05:00+00:00'" in conf
+    with pytest.raises(ValueError, match="not empty"):
+        archive.prepare_restore(pgdata, target)
+    with pytest.raises(ValueError, match="No base backup finished before"):
+        archive.prepare_restore(tmp_path / "other", datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+@patch("fastapi_dbbackup.base.BackupEngine.backup_stream")
+def test_base_backup_reads_start_segment(mock_stream, postgres_url, backup_dir):
+    mock_stream.return_value = io.BytesIO(make_base_tar())
+    engine = PostgresBaseBackup(postgres_url, backup_dir)
+
+    cmd, env = engine.stream_command()
+    reader = engine.backup_stream()
+
+    assert cmd[:8] == ["pg_basebackup", "-D", "-", "-F", "t", "-X", "none", "--label"]
+    assert cmd[9:] == ["-h", "localhost", "-p", "5432", "-U", "user"]
+    assert env["PGPASSWORD"] == "pass"
+    assert engine.start_segment == "000000010000000000000002"
+    # Nothing was consumed
+    assert reader.read() == make_base_tar()
+
+POSTGRES_TOOLS = ["initdb", "pg_ctl", "pg_basebackup", "psql"]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+@pytest.mark.skipif(not all(shutil.which(tool) for tool in POSTGRES_TOOLS), reason="PostgreSQL server binaries not installed")
+def test_point_in_time_recovery_with_local_postgres(tmp_path):
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"postgresql://postgres@localhost:{port}/postgres",
+        "DBBACKUP_DIR": str(tmp_path / "backups"),
+        "DBBACKUP_STORAGE": "local",
+        "DBBACKUP_WAL_STATE_DIR": str(tmp_path / "state"),
+        "PYTHONPATH": str(Path(__file__).resolve().parents[1]),
+    }
+    cli = [sys.executable, "-m", "fastapi_dbbackup.cli"]
+
+    def psql(sql, port=port):
+        result = subprocess.run(
+            ["psql", "-h", "localhost", "-p", str(port), "-U", "postgres", "-Atc", sql],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        return result.stdout.strip()
+
+    def start(pgdata, port):
+        with open(pgdata / "postgresql.conf", "a") as f:
+            f.write(f"\nport = {port}\nlisten_addresses = 'localhost'\nunix_socket_directories = '{tmp_path}'\n")
+        subprocess.run(["pg_ctl", "-D", str(pgdata), "-l", str(tmp_path / f"{pgdata.name}.log"), "-w", "start"], env=env, check=True)
+
+    primary, restored = tmp_path / "primary", tmp_path / "restored"
+    subprocess.run(["initdb", "-D", str(primary), "-A", "trust", "-U", "postgres"], env=env, check=True, capture_output=True)
+    with open(primary / "postgresql.conf", "a") as f:
+        f.write("wal_level = replica\narchive_mode = on\n")
+        f.write(f"archive_command = '{' '.join(cli)} wal-push %p'\n")
+    start(primary, port)
+    try:
+        psql("CREATE TABLE events (id int)")
+        psql("INSERT INTO events VALUES (1)")
+        subprocess.run(cli + ["basebackup"], env=env, check=True)
+        psql("INSERT INTO events VALUES (2)")
+        time.sleep(1.5)
+        target = psql("SELECT now()")
+        time.sleep(1.5)
+        psql("INSERT INTO events VALUES (3)")
+        psql("SELECT pg_switch_wal()")
+        deadline = time.time() + 30
+        while psql("SELECT last_failed_wal IS NULL AND archived_count >= 2 FROM pg_stat_archiver") != "t":
+            assert time.time() < deadline, "WAL was not archived"
+            time.sleep(0.5)
+    finally:
+        subprocess.run(["pg_ctl", "-D", str(primary), "-m", "fast", "stop"], env=env, check=True)
+
+    subprocess.run(cli + ["pitr-restore", "--pgdata", str(restored), "--target-time", target], env=env, check=True)
+    restored_port = free_port()
+    start(restored, restored_port)
+    try:
+        deadline = time.time() + 30
+        while psql("SELECT pg_is_in_recovery()", restored_port) != "f":
+            assert time.time() < deadline, "Recovery did not finish"
+            time.sleep(0.5)
+        assert psql("SELECT array_agg(id ORDER BY id) FROM events", restored_port) == "{1,2}"
+    finally:
+        subprocess.run(["pg_ctl", "-D", str(restored), "-m", "fast", "stop"], env=env, check=True)
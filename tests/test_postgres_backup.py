@@ -0,0 +1,56 @@
+# tests/test_postgres_backup.py
+import io
+import tarfile
+from pathlib import Path
+from unittest.mock import patch
+from fastapi_dbbackup.engines.postgres import PostgresBackup
+
+def fake_pg_dump(cmd, **kwargs):
+    dump_dir = Path(cmd[cmd.index("-f") + 1])
+    dump_dir.mkdir()
+    (dump_dir / "toc.dat").write_bytes(b"PGDMP toc")
+    (dump_dir / "3001.dat.gz").write_bytes(b"table data" * 1000)
+
+@patch("subprocess.run", side_effect=fake_pg_dump)
+def test_directory_backup_is_packaged_as_tar(mock_run, postgres_url, backup_dir):
+    engine = PostgresBackup(postgres_url, backup_dir, jobs=4, dump_format="directory")
+    backup = engine.backup()
+
+    cmd = mock_run.call_args[0][0]
+    assert cmd[:2] == ["pg_dump", "-Fd"]
+    assert cmd[cmd.index("-j") + 1] == "4"
+    assert backup.suffix == ".tar"
+    with tarfile.open(backup) as tar:
+        assert sorted(tar.getnames()) == ["3001.dat.gz", "toc.dat"]
+    assert [p for p in backup_dir.iterdir() if p.is_dir()] == []
+
+def test_directory_restore_extracts_and_runs_parallel(postgres_url, backup_dir):
+    with patch("subprocess.run", side_effect=fake_pg_dump):
+        backup = PostgresBackup(postgres_url, backup_dir, dump_format="directory").backup()
+
+    seen = {}
+    def fake_pg_restore(cmd, **kwargs):
+        seen["cmd"] = cmd
+        seen["files"] = {p.name: p.read_bytes() for p in Path(cmd[-1]).iterdir()}
+
+    engine = PostgresBackup(postgres_url, backup_dir, jobs=3)
+    with patch("subprocess.run", side_effect=fake_pg_restore):
+        engine.restore(backup)
+
+    assert seen["cmd"][seen["cmd"].index("-j") + 1] == "3"
+    assert seen["cmd"][seen["cmd"].index("-F") + 1] == "d"
+    assert seen["files"]["3001.dat.gz"] == b"table data" * 1000
+
+def test_restore_stream_unpacks_tar(postgres_url, backup_dir):
+    with patch("subprocess.run", side_effect=fake_pg_dump):
+        backup = PostgresBackup(postgres_url, backup_dir, dump_format="directory").backup()
+
+    seen = {}
+    def fake_pg_restore(cmd, **kwargs):
+        seen["files"] = sorted(p.name for p in Path(cmd[-1]).iterdir())
+
+    engine = PostgresBackup(postgres_url, backup_dir)
+    with patch("subprocess.run", side_effect=fake_pg_restore):
+        assert engine.restore_stream(io.BytesIO(backup.read_bytes()))
+
+    assert seen["files"] == ["3001.dat.gz", "toc.dat"]
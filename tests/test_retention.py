@@ -0,0 +1,92 @@
+# tests/test_retention.py
+import argparse
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import pytest
+from fastapi_dbbackup import cli
+from fastapi_dbbackup.config import Settings
+from fastapi_dbbackup.daemon import build_daemon
+from fastapi_dbbackup.retention import apply_offline_retention, client_retention_days, purge_backups, select_backups_to_delete
+from fastapi_dbbackup.storage.local import LocalStorage
+
+def name_for(days_ago: int) -> str:
+    return f"default-{datetime.now() - timedelta(days=days_ago):%Y%m%d-%H%M%S}.dump.gz"
+
+def test_select_backups_to_delete_combines_rules():
+    backups = [name_for(d) for d in (30, 20, 3, 2, 1, 0)]
+
+    to_delete = select_backups_to_delete(backups, retention_days=7, max_backups=3)
+
+    assert sorted(to_delete) == sorted([name_for(30), name_for(20), name_for(3)])
+
+def test_purge_backups_lists_once_and_deletes_in_one_call():
+    storage = MagicMock()
+    storage.list_backups.return_value = [name_for(d) for d in range(10)]
+
+    deleted = purge_backups(storage, retention_days=0, max_backups=4)
+
+    storage.list_backups.assert_called_once_with()
+    storage.delete_many.assert_called_once_with(deleted)
+    assert len(deleted) == 6
+
+def test_local_delete_many(backup_dir):
+    for i in range(5):
+        (backup_dir / f"b{i}").write_bytes(b"x")
+
+    LocalStorage(backup_dir).delete_many(["b0", "b1", "b2", "missing"])
+
+    assert sorted(p.name for p in backup_dir.iterdir()) == ["b3", "b4"]
+
+def test_incremental_chain_is_kept_for_newer_increments():
+    backups = [
+        "default-20260101-000000.sqlite3",
+        "default-20260101-010000.sqlite3.inc.gz",
+        "default-20260101-020000.sqlite3.inc.gz",
+        "default-20260101-030000.sqlite3.gz",
+        "default-20260101-040000.sqlite3.inc.gz",
+    ]
+
+    to_delete = select_backups_to_delete(backups, max_backups=2)
+
+    # The last increment needs the full backup before it; the older chain can go
+    assert to_delete == backups[:3]
+
+    to_delete = select_backups_to_delete(backups[:3], max_backups=1)
+    assert to_delete == []
+
+def test_offline_retention_leaves_age_to_lifecycle_rules(backup_dir):
+    s3 = MagicMock(spec=["put_lifecycle_rule", "list_backups", "delete_many"])
+    local = LocalStorage(backup_dir)
+    fanout = MagicMock(spec=["targets", "list_backups", "delete_many"], targets={"s3": s3, "local": local})
+    fanout.list_backups.return_value = [name_for(d) for d in (40, 2, 1, 0)]
+    s3.list_backups.return_value = fanout.list_backups.return_value
+
+    # Local targets have no lifecycle rules, so the client still enforces the age limit there
+    assert client_retention_days(fanout, 30, lifecycle=True) == 30
+    assert client_retention_days(s3, 30, lifecycle=True) == 0
+    assert client_retention_days(s3, 30, lifecycle=False) == 30
+
+    assert apply_offline_retention(s3, retention_days=30, max_backups=2, lifecycle=True) == [name_for(40), name_for(2)]
+
+def test_lifecycle_mode_refuses_incremental_sqlite(monkeypatch, capsys):
+    settings = Settings({"DBBACKUP_RETENTION_MODE": "lifecycle", "DBBACKUP_SQLITE_INCREMENTAL": "true", "DBBACKUP_RETENTION_DAYS": "30"})
+    monkeypatch.setattr(cli, "get_settings", lambda: settings)
+
+    # S3 would expire full backups that newer increments still need
+    with pytest.raises(SystemExit):
+        cli.cmd_retention(argparse.Namespace(action="plan"))
+    assert "DBBACKUP_SQLITE_INCREMENTAL" in capsys.readouterr().out
+    with pytest.raises(ValueError, match="DBBACKUP_SQLITE_INCREMENTAL"):
+        build_daemon({"databases": []}, settings)
+
+def test_retention_apply_aborts_orphaned_uploads(monkeypatch):
+    s3 = MagicMock(spec=["put_lifecycle_rule", "abort_orphaned_uploads", "list_backups", "delete_many"])
+    s3.list_backups.return_value = []
+    monkeypatch.setattr(cli, "get_settings", lambda: Settings({"DBBACKUP_RETENTION_MODE": "offline"}))
+    monkeypatch.setattr(cli, "get_storage", lambda settings=None: s3)
+
+    # Backups leave uploads alone; the sweep runs only when retention is applied
+    cli.cmd_retention(argparse.Namespace(action="plan"))
+    s3.abort_orphaned_uploads.assert_not_called()
+    cli.cmd_retention(argparse.Namespace(action="apply"))
+    s3.abort_orphaned_uploads.assert_called_once_with()
@@ -0,0 +1,80 @@
+# tests/test_router.py
+import time
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_dbbackup.engines.sqlite import SQLiteBackup
+from fastapi_dbbackup.router import BackupManager, backup_lifespan, create_router
+from fastapi_dbbackup.storage.local import LocalStorage
+
+def wait_for(client, job_id):
+    for _ in range(200):
+        job = client.get(f"/backups/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+def test_router_runs_backup_and_reports_status(tmp_path, backup_dir):
+    import sqlite3
+    db_path = tmp_path / "app.sqlite3"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+
+    manager = BackupManager(SQLiteBackup(f"sqlite:///{db_path}", backup_dir), LocalStorage(backup_dir))
+    app = FastAPI(lifespan=backup_lifespan(manager))
+    app.include_router(create_router(manager), prefix="/backups")
+
+    with TestClient(app) as client:
+        response = client.post("/backups/")
+        assert response.status_code == 202
+        job = wait_for(client, response.json()["id"])
+        assert job["status"] == "succeeded"
+        assert client.get("/backups/").json() == {"backups": [job["result"]]}
+        assert job["metrics"]["stages"]["dump"]["bytes"] > 0
+        time.sleep(0.1)
+        assert 'dbbackup_last_run_success{operation="backup"} 1' in client.get("/backups/metrics").text
+
+        job = wait_for(client, client.post("/backups/restore").json()["id"])
+        assert job["status"] == "succeeded"
+        assert len(client.get("/backups/jobs").json()["jobs"]) == 2
+
+        assert client.get("/backups/jobs/missing").status_code == 404
+
+def test_router_reports_failed_job(tmp_path, backup_dir):
+    manager = BackupManager(SQLiteBackup(f"sqlite:///{tmp_path}/app.sqlite3", backup_dir), LocalStorage(backup_dir))
+    app = FastAPI(lifespan=backup_lifespan(manager))
+    app.include_router(create_router(manager), prefix="/backups")
+
+    with TestClient(app) as client:
+        job = wait_for(client, client.post("/backups/restore", params={"filename": "missing.sqlite3"}).json()["id"])
+
+    assert job["status"] == "failed"
+    assert job["error"]
+
+def test_router_encrypts_with_the_configured_key(tmp_path, backup_dir, monkeypatch):
+    pytest.importorskip("cryptography")
+    import sqlite3
+    from fastapi_dbbackup import cli
+    from fastapi_dbbackup.config import Settings
+    from fastapi_dbbackup.encrypt import generate_key, is_encrypted
+    db_path = tmp_path / "app.sqlite3"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    monkeypatch.setattr(cli, "get_settings", lambda: Settings({"DBBACKUP_ENCRYPT": "true", "DBBACKUP_ENCRYPT_KEY": generate_key()}))
+
+    manager = BackupManager(SQLiteBackup(f"sqlite:///{db_path}", backup_dir), LocalStorage(backup_dir))
+    app = FastAPI(lifespan=backup_lifespan(manager))
+    app.include_router(create_router(manager), prefix="/backups")
+
+    with TestClient(app) as client:
+        backup = wait_for(client, client.post("/backups/").json()["id"])
+        restore = wait_for(client, client.post("/backups/restore").json()["id"])
+
+    assert backup["status"] == "succeeded" and backup["result"].endswith(".enc")
+    assert is_encrypted((backup_dir / backup["result"]).read_bytes())
+    assert restore["status"] == "succeeded", restore["error"]
@@ -0,0 +1,22 @@
+# tests/test_schedule.py
+from datetime import datetime
+import pytest
+from fastapi_dbbackup.schedule import CronSchedule
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    ("*/15 * * * *", datetime(2026, 1, 1, 10, 7), datetime(2026, 1, 1, 10, 15)),
+    ("0 * * * *", datetime(2026, 1, 1, 10, 0), datetime(2026, 1, 1, 11, 0)),
+    ("@daily", datetime(2026, 1, 31, 23, 59), datetime(2026, 2, 1, 0, 0)),
+    ("30 2 * * 1-5", datetime(2026, 1, 2, 3, 0), datetime(2026, 1, 5, 2, 30)),  # Friday -> Monday
+    ("0 0 * * 7", datetime(2026, 1, 1), datetime(2026, 1, 4)),  # Sunday
+    ("0 0 29 2 *", datetime(2026, 3, 1), datetime(2028, 2, 29)),
+    ("0 12 1 * 1", datetime(2026, 1, 1, 13, 0), datetime(2026, 1, 5, 12, 0)),  # day OR weekday
+    ("5/20 8,20 * 12 *", datetime(2026, 1, 1), datetime(2026, 12, 1, 8, 5)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "*/0 * * * *", "a * * * *", "0 0 31 2 *"])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression).next_after(datetime(2026, 1, 1))
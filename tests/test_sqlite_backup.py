@@ -1,5 +1,6 @@
 # tests/test_sqlite_backup.py
 import sqlite3
+import pytest
 from fastapi_dbbackup.engines.sqlite import SQLiteBackup
 
 def test_sqlite_backup(sqlite_url, backup_dir):
@@ -21,3 +22,105 @@ def test_sqlite_async_url(tmp_path, backup_dir):
 
     assert backup.exists()
     assert backup.suffix == ".sqlite3"
+
+def make_db(path, journal_mode="delete"):
+    with sqlite3.connect(path) as conn:
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, payload TEXT)")
+        conn.executemany("INSERT INTO t (payload) VALUES (?)", [("x" * 200,) for _ in range(5000)])
+
+def rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT id, payload FROM t ORDER BY id").fetchall()
+
+@pytest.mark.parametrize("journal_mode", ["delete", "wal"])
+def test_sqlite_incremental_backup_and_restore(tmp_path, backup_dir, journal_mode):
+    import time
+    db_path = tmp_path / "inc.sqlite3"
+    make_db(db_path, journal_mode)
+    url = f"sqlite:///{db_path}"
+
+    engine = SQLiteBackup(url, backup_dir, incremental=True)
+    full = engine.backup()
+    engine.backup_uploaded(full)
+    assert full.suffix == ".sqlite3"
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE t SET payload = 'changed' WHERE id = 42")
+        conn.execute("INSERT INTO t (payload) VALUES ('new row')")
+    expected = rows(db_path)
+
+    time.sleep(1)  # backup names have one-second resolution
+    inc = SQLiteBackup(url, backup_dir, incremental=True).backup()
+    assert inc.name.endswith(".sqlite3.inc")
+    assert inc.stat().st_size < full.stat().st_size / 10
+
+    db_path.unlink()
+    restorer = SQLiteBackup(url, backup_dir)
+    assert restorer.restore_dependencies(inc) == [full.name]
+    restorer.restore(inc)
+    assert rows(db_path) == expected
+
+def test_sqlite_incremental_starts_new_chain(tmp_path, backup_dir):
+    db_path = tmp_path / "inc.sqlite3"
+    make_db(db_path)
+    url = f"sqlite:///{db_path}"
+
+    engine = SQLiteBackup(url, backup_dir, incremental=True, full_every=1)
+    names = []
+    for _ in range(3):
+        backup = engine.backup()
+        engine.backup_uploaded(backup)
+        names.append(backup.name)
+        backup.unlink()
+
+    assert [n.endswith(".inc") for n in names] == [False, True, False]
+
+def test_sqlite_wal_backup_streams_a_pinned_snapshot(tmp_path, backup_dir):
+    db_path = tmp_path / "wal.sqlite3"
+    make_db(db_path, "wal")
+    expected = rows(db_path)
+    engine = SQLiteBackup(f"sqlite:///{db_path}", backup_dir)
+
+    stream = engine.backup_stream()
+    # Writers are not blocked while the snapshot is read, and their commits stay out of it
+    with sqlite3.connect(db_path, timeout=0) as conn:
+        conn.execute("UPDATE t SET payload = 'changed' WHERE id = 42")
+    with stream:
+        (tmp_path / "copy.sqlite3").write_bytes(stream.read())
+
+    assert rows(tmp_path / "copy.sqlite3") == expected
+    assert rows(db_path) != expected
+
+def test_sqlite_streaming_backup_keeps_sqlite_suffix(tmp_path, backup_dir):
+    from fastapi_dbbackup import pipeline
+    from fastapi_dbbackup.storage.local import LocalStorage
+    db_path = tmp_path / "wal.sqlite3"
+    make_db(db_path, "wal")
+    storage_dir = tmp_path / "storage"
+
+    name = pipeline.backup(SQLiteBackup(f"sqlite:///{db_path}", backup_dir), LocalStorage(storage_dir))
+
+    assert name.endswith(".sqlite3")
+    assert rows(storage_dir / name) == rows(db_path)
+    # Journal-mode databases would block writers for the whole upload, so they use a file
+    make_db(tmp_path / "journal.sqlite3")
+    assert SQLiteBackup(f"sqlite:///{tmp_path / 'journal.sqlite3'}", backup_dir).backup_stream() is None
+
+def test_sqlite_stepped_backup_survives_concurrent_writes(tmp_path, backup_dir, capsys):
+    from unittest.mock import patch
+    db_path = tmp_path / "busy.sqlite3"
+    make_db(db_path)
+    writer = sqlite3.connect(db_path, isolation_level=None)
+    engine = SQLiteBackup(f"sqlite:///{db_path}", backup_dir, step_pages=50, step_sleep=0.001)
+
+    # Commit from another connection between every step, restarting the copy
+    def write_between_steps(seconds):
+        writer.execute("INSERT INTO t (payload) VALUES ('concurrent')")
+
+    with patch("fastapi_dbbackup.engines.sqlite.time.sleep", side_effect=write_between_steps):
+        backup = engine.backup()
+    writer.close()
+
+    assert "restarted 3 times" in capsys.readouterr().out
+    assert rows(backup) == rows(db_path)
@@ -1,3 +1,4 @@
+import io
 import pytest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -109,9 +110,350 @@ def test_s3_storage_upload_fileobj(mock_boto_client):
     fileobj = io.BytesIO(b"test data")
     storage.upload_fileobj(fileobj, "test.sql")
     
-    mock_s3.upload_fileobj.assert_called_once_with(
-        fileobj,
-        "test-bucket",
-        "dbback/test.sql",
-        ExtraArgs={"ACL": "private"}
+    # Streams smaller than one part are sent in a single request
+    mock_s3.put_object.assert_called_once_with(
+        Bucket="test-bucket",
+        Key="dbback/test.sql",
+        Body=b"test data",
+        ACL="private"
+    )
+    mock_s3.create_multipart_upload.assert_not_called()
+
+MB = 1024 * 1024
+
+def make_multipart_client(mock_boto_client):
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_s3.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    mock_s3.upload_part.side_effect = lambda **kw: {"ETag": f"etag-{kw['PartNumber']}"}
+    return mock_s3
+
+@patch("boto3.client")
+def test_s3_storage_upload_fileobj_multipart(mock_boto_client):
+    import io
+    mock_s3 = make_multipart_client(mock_boto_client)
+    storage = S3Storage(bucket="test-bucket", prefix="dbback", part_size=5 * MB, max_concurrency=2)
+
+    storage.upload_fileobj(io.BytesIO(b"x" * (11 * MB)), "big.dump")
+
+    sizes = sorted((c.kwargs["PartNumber"], len(c.kwargs["Body"])) for c in mock_s3.upload_part.call_args_list)
+    assert sizes == [(1, 5 * MB), (2, 5 * MB), (3, 1 * MB)]
+    mock_s3.complete_multipart_upload.assert_called_once_with(
+        Bucket="test-bucket",
+        Key="dbback/big.dump",
+        UploadId="upload-1",
+        MultipartUpload={"Parts": [{"PartNumber": n, "ETag": f"etag-{n}"} for n in (1, 2, 3)]},
+    )
+
+@patch("time.sleep")
+@patch("boto3.client")
+def test_s3_storage_upload_part_retries(mock_boto_client, mock_sleep):
+    import io
+    mock_s3 = make_multipart_client(mock_boto_client)
+    calls = {"n": 0}
+    def flaky(**kw):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise ConnectionError("reset")
+        return {"ETag": f"etag-{kw['PartNumber']}"}
+    mock_s3.upload_part.side_effect = flaky
+
+    storage = S3Storage(bucket="test-bucket", part_size=5 * MB, max_concurrency=1)
+    storage.upload_fileobj(io.BytesIO(b"x" * (6 * MB)), "big.dump")
+
+    assert mock_s3.upload_part.call_count == 3
+    mock_s3.complete_multipart_upload.assert_called_once()
+
+@patch("boto3.client")
+def test_s3_storage_stalled_part_aborts(mock_boto_client):
+    import io
+    import time
+    mock_s3 = make_multipart_client(mock_boto_client)
+    mock_s3.upload_part.side_effect = lambda **kw: time.sleep(1)
+
+    storage = S3Storage(bucket="test-bucket", part_size=5 * MB, part_timeout=0.1)
+    with pytest.raises(TimeoutError):
+        storage.upload_fileobj(io.BytesIO(b"x" * (6 * MB)), "big.dump")
+
+    mock_s3.abort_multipart_upload.assert_called_once_with(
+        Bucket="test-bucket", Key="big.dump", UploadId="upload-1"
+    )
+    mock_s3.complete_multipart_upload.assert_not_called()
+
+class SlowDump(io.RawIOBase):
+    """A dump that takes `delay` seconds to produce each 5 MB."""
+
+    def __init__(self, size, delay):
+        self.remaining = size
+        self.delay = delay
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        import time
+        n = min(len(buffer), 5 * MB, self.remaining)
+        if n:
+            time.sleep(self.delay)
+        buffer[:n] = b"x" * n
+        self.remaining -= n
+        return n
+
+@patch("boto3.client")
+def test_s3_storage_slow_source_is_not_a_stalled_part(mock_boto_client):
+    mock_s3 = make_multipart_client(mock_boto_client)
+
+    # S3 acknowledges at once; only reading the next part takes longer than the timeout
+    storage = S3Storage(bucket="test-bucket", part_size=5 * MB, part_timeout=0.3)
+    storage.upload_fileobj(SlowDump(16 * MB, 0.5), "big.dump")
+
+    mock_s3.abort_multipart_upload.assert_not_called()
+    mock_s3.complete_multipart_upload.assert_called_once()
+
+@patch("boto3.client")
+def test_s3_storage_part_size_grows(mock_boto_client):
+    storage = S3Storage(bucket="test-bucket", part_size=16 * MB)
+
+    assert storage._part_size_for(1) == 16 * MB
+    assert storage._part_size_for(1001) == 32 * MB
+    # 10,000 parts comfortably cover dumps far larger than 80 GB
+    total = sum(storage._part_size_for(n) for n in range(1, 10001))
+    assert total > 5 * 1024 * 1024 * MB
+
+def make_ranged_client(mock_boto_client, data):
+    import io
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_s3.head_object.return_value = {"ContentLength": len(data), "ETag": '"v1"'}
+
+    def get_object(Bucket, Key, Range=None, IfMatch=None):
+        if Range is None:
+            return {"Body": io.BytesIO(data)}
+        start, end = map(int, Range[len("bytes="):].split("-"))
+        return {"Body": io.BytesIO(data[start:end + 1])}
+
+    mock_s3.get_object.side_effect = get_object
+    return mock_s3
+
+@patch("boto3.client")
+def test_s3_storage_open_read_ranged(mock_boto_client):
+    import os
+    data = os.urandom(12 * MB + 123)
+    mock_s3 = make_ranged_client(mock_boto_client, data)
+
+    storage = S3Storage(bucket="test-bucket", prefix="dbback", part_size=5 * MB, download_window=10 * MB)
+    with storage.open_read("big.dump") as f:
+        assert f.read() == data
+
+    ranges = sorted(c.kwargs["Range"] for c in mock_s3.get_object.call_args_list)
+    assert ranges == [
+        f"bytes=0-{5 * MB - 1}",
+        f"bytes={10 * MB}-{12 * MB + 122}",
+        f"bytes={5 * MB}-{10 * MB - 1}",
+    ]
+    assert all(c.kwargs["IfMatch"] == '"v1"' for c in mock_s3.get_object.call_args_list)
+
+@patch("boto3.client")
+def test_s3_storage_open_read_small_object(mock_boto_client):
+    mock_s3 = make_ranged_client(mock_boto_client, b"small dump")
+
+    storage = S3Storage(bucket="test-bucket", prefix="dbback")
+
+    assert storage.open_read("small.dump").read() == b"small dump"
+    mock_s3.get_object.assert_called_once_with(Bucket="test-bucket", Key="dbback/small.dump")
+
+@patch("boto3.client")
+def test_s3_storage_delete_many_batches(mock_boto_client):
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_s3.delete_objects.return_value = {}
+
+    storage = S3Storage(bucket="test-bucket", prefix="dbback")
+    storage.delete_many([f"b{i}" for i in range(2500)])
+
+    batches = sorted(len(c.kwargs["Delete"]["Objects"]) for c in mock_s3.delete_objects.call_args_list)
+    assert batches == [500, 1000, 1000]
+    first = mock_s3.delete_objects.call_args_list[0].kwargs["Delete"]["Objects"][0]["Key"]
+    assert first.startswith("dbback/b")
+    mock_s3.delete_object.assert_not_called()
+
+@patch("boto3.client")
+def test_s3_storage_delete_many_reports_errors(mock_boto_client):
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_s3.delete_objects.return_value = {"Errors": [{"Key": "b1", "Code": "AccessDenied"}]}
+
+    storage = S3Storage(bucket="test-bucket")
+    with pytest.raises(RuntimeError, match="AccessDenied"):
+        storage.delete_many(["b1"])
+
+def make_paginators(mock_s3, **pages):
+    paginators = {name: MagicMock(**{"paginate.return_value": value}) for name, value in pages.items()}
+    mock_s3.get_paginator.side_effect = lambda name: paginators[name]
+
+@patch("boto3.client")
+def test_s3_storage_spooled_upload_resumes(mock_boto_client, tmp_path):
+    import io
+    from fastapi_dbbackup.storage.s3 import UploadInterrupted
+    from fastapi_dbbackup.storage.spool import UploadSpool
+    mock_s3 = make_multipart_client(mock_boto_client)
+    def network_down(**kw):
+        if kw["PartNumber"] > 1:
+            raise ConnectionError("network unreachable")
+        return {"ETag": "etag-1"}
+    mock_s3.upload_part.side_effect = network_down
+
+    source = io.BytesIO(b"x" * (11 * MB))
+    storage = S3Storage(bucket="test-bucket", prefix="dbback", part_size=5 * MB, max_concurrency=1, part_retries=0, spool_dir=tmp_path)
+    with pytest.raises(UploadInterrupted):
+        storage.upload_fileobj(source, "big.dump")
+
+    # The dump was read to the end and what S3 did not acknowledge is on disk
+    assert source.tell() == 11 * MB
+    [spool] = UploadSpool.load_all(tmp_path)
+    assert spool.state["complete"] and spool.parts == {1: "etag-1"}
+    assert spool.pending_parts() == [2, 3]
+    mock_s3.abort_multipart_upload.assert_not_called()
+
+    # The next run resumes the same upload from the last committed part
+    mock_s3.upload_part.side_effect = lambda **kw: {"ETag": f"etag-{kw['PartNumber']}"}
+    mock_s3.upload_part.reset_mock()
+    make_paginators(mock_s3, list_parts=[{"Parts": [{"PartNumber": 1, "ETag": "etag-1"}]}])
+    assert storage.recover_uploads() == ["big.dump"]
+
+    assert sorted(c.kwargs["PartNumber"] for c in mock_s3.upload_part.call_args_list) == [2, 3]
+    mock_s3.complete_multipart_upload.assert_called_once_with(
+        Bucket="test-bucket",
+        Key="dbback/big.dump",
+        UploadId="upload-1",
+        MultipartUpload={"Parts": [{"PartNumber": n, "ETag": f"etag-{n}"} for n in (1, 2, 3)]},
     )
+    assert list(tmp_path.iterdir()) == []
+
+@patch("boto3.client")
+def test_s3_storage_spooled_upload_from_slow_source_completes(mock_boto_client, tmp_path):
+    mock_s3 = make_multipart_client(mock_boto_client)
+
+    storage = S3Storage(bucket="test-bucket", part_size=5 * MB, part_timeout=0.3, spool_dir=tmp_path)
+    storage.upload_fileobj(SlowDump(16 * MB, 0.5), "big.dump")
+
+    mock_s3.complete_multipart_upload.assert_called_once()
+    assert list(tmp_path.iterdir()) == []
+
+@patch("boto3.client")
+def test_s3_storage_spooled_upload_source_failure_aborts(mock_boto_client, tmp_path):
+    import io
+    mock_s3 = make_multipart_client(mock_boto_client)
+
+    class FailingDump(io.RawIOBase):
+        sent = 0
+        def readable(self):
+            return True
+        def readinto(self, buffer):
+            if self.sent >= 6 * MB:
+                raise IOError("pg_dump exited with status 1")
+            n = min(len(buffer), MB)
+            buffer[:n] = b"x" * n
+            self.sent += n
+            return n
+
+    storage = S3Storage(bucket="test-bucket", part_size=5 * MB, spool_dir=tmp_path)
+    with pytest.raises(IOError, match="pg_dump"):
+        storage.upload_fileobj(FailingDump(), "big.dump")
+
+    mock_s3.abort_multipart_upload.assert_called_once_with(Bucket="test-bucket", Key="big.dump", UploadId="upload-1")
+    assert list(tmp_path.iterdir()) == []
+
+@patch("boto3.client")
+def test_s3_storage_recover_discards_only_its_own_unfinished_dumps(mock_boto_client, tmp_path):
+    from fastapi_dbbackup.storage.spool import UploadSpool
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    # A run that died before its dump finished cannot be resumed
+    spool = UploadSpool.create(tmp_path, "test-bucket", "dbback/cut.dump", "cut.dump", "upload-cut")
+    spool.write_part(1, b"x" * 10)
+    spool.unlock()
+    # The daemon's per-database storage spools under a nested prefix
+    nested = UploadSpool.create(tmp_path, "test-bucket", "dbback/app/cut.dump", "cut.dump", "upload-nested")
+    nested.unlock()
+
+    storage = S3Storage(bucket="test-bucket", prefix="dbback", spool_dir=tmp_path)
+    assert storage.recover_uploads() == []
+
+    mock_s3.abort_multipart_upload.assert_called_once_with(Bucket="test-bucket", Key="dbback/cut.dump", UploadId="upload-cut")
+    mock_s3.get_paginator.assert_not_called()
+    assert [s.state["upload_id"] for s in UploadSpool.load_all(tmp_path)] == ["upload-nested"]
+
+@patch("boto3.client")
+def test_s3_storage_abort_orphaned_uploads(mock_boto_client, tmp_path):
+    from datetime import datetime, timedelta, timezone
+    from fastapi_dbbackup.storage.spool import UploadSpool
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    UploadSpool.create(tmp_path, "test-bucket", "dbback/spooled.dump", "spooled.dump", "upload-spooled").unlock()
+    now = datetime.now(timezone.utc)
+    make_paginators(mock_s3, list_multipart_uploads=[{"Uploads": [
+        {"Key": "dbback/old.dump", "UploadId": "upload-old", "Initiated": now - timedelta(days=3)},
+        {"Key": "dbback/spooled.dump", "UploadId": "upload-spooled", "Initiated": now - timedelta(days=3)},
+        {"Key": "dbback/running.dump", "UploadId": "upload-new", "Initiated": now - timedelta(minutes=5)},
+    ], "CommonPrefixes": [{"Prefix": "dbback/app/"}]}])
+
+    storage = S3Storage(bucket="test-bucket", prefix="dbback", spool_dir=tmp_path)
+    assert storage.abort_orphaned_uploads() == ["dbback/old.dump"]
+
+    mock_s3.abort_multipart_upload.assert_called_once_with(Bucket="test-bucket", Key="dbback/old.dump", UploadId="upload-old")
+    mock_s3.get_paginator("list_multipart_uploads").paginate.assert_called_once_with(Bucket="test-bucket", Prefix="dbback/", Delimiter="/")
+
+@patch("boto3.client")
+def test_s3_storage_list_backups_skips_nested_prefixes(mock_boto_client):
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    make_paginators(mock_s3, list_objects_v2=[
+        {"Contents": [{"Key": "dbback/backup1.sql"}, {"Key": "dbback/pitr/wal/000000010000000000000001.gz"}]}
+    ])
+
+    storage = S3Storage(bucket="test-bucket", prefix="dbback")
+
+    assert storage.list_backups() == ["backup1.sql"]
+    mock_s3.get_paginator("list_objects_v2").paginate.assert_called_once_with(Bucket="test-bucket", Prefix="dbback/", Delimiter="/")
+
+@patch("boto3.client")
+def test_s3_storage_lifecycle_rule_keeps_other_rules(mock_boto_client):
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    other = {"ID": "logs", "Filter": {"Prefix": "logs/"}, "Status": "Enabled", "Expiration": {"Days": 7}}
+    mock_s3.get_bucket_lifecycle_configuration.return_value = {"Rules": [other]}
+    storage = S3Storage(bucket="test-bucket", prefix="dbback", orphan_age=36 * 3600)
+
+    rule = storage.lifecycle_rule(90, [(30, "STANDARD_IA")])
+    storage.put_lifecycle_rule(rule)
+
+    assert rule == {
+        "ID": "fastapi-dbbackup:dbback",
+        "Filter": {"Prefix": "dbback/"},
+        "Status": "Enabled",
+        "Transitions": [{"Days": 30, "StorageClass": "STANDARD_IA"}],
+        "Expiration": {"Days": 90},
+        "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": 2},
+    }
+    mock_s3.put_bucket_lifecycle_configuration.assert_called_once_with(
+        Bucket="test-bucket", LifecycleConfiguration={"Rules": [other, rule]}
+    )
+    with pytest.raises(ValueError, match="never happens"):
+        storage.lifecycle_rule(30, [(60, "GLACIER")])
+
+@patch("boto3.client")
+def test_s3_storage_conditional_metadata_writes(mock_boto_client):
+    from botocore.exceptions import ClientError
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_s3.get_object.return_value = {"Body": io.BytesIO(b"{}"), "ETag": '"v1"'}
+    storage = S3Storage(bucket="test-bucket", prefix="dbback")
+
+    assert storage.read_versioned(".catalog.json") == (b"{}", '"v1"')
+    assert storage.write_versioned(".catalog.json", b"{}", '"v1"')
+    mock_s3.put_object.assert_called_once_with(Bucket="test-bucket", Key="dbback/.catalog.json", Body=b"{}", IfMatch='"v1"', ACL="private")
+
+    mock_s3.put_object.side_effect = ClientError({"Error": {"Code": "PreconditionFailed"}}, "PutObject")
+    assert not storage.write_versioned(".catalog.json", b"{}", None)
+    assert mock_s3.put_object.call_args.kwargs["IfNoneMatch"] == "*"
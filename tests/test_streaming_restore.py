@@ -0,0 +1,80 @@
+# tests/test_streaming_restore.py
+import subprocess
+import sys
+import pytest
+from fastapi_dbbackup.compress import compress, open_decompressed
+from fastapi_dbbackup.engines.postgres import PostgresBackup
+from fastapi_dbbackup.storage.local import LocalStorage
+
+@pytest.mark.parametrize("codec", ["gzip", "xz"])
+def test_open_decompressed_from_storage(backup_dir, codec):
+    dump = backup_dir / "default-20260101-000000.dump"
+    dump.write_bytes(b"PGDMP" + b"\x00" * 1000)
+    packed = compress(dump, codec=codec)
+
+    storage = LocalStorage(backup_dir)
+    with open_decompressed(storage.open_read(packed.name)) as f:
+        assert f.read() == b"PGDMP" + b"\x00" * 1000
+
+def test_open_decompressed_passes_raw_through(backup_dir):
+    (backup_dir / "plain.sql").write_bytes(b"select 1;")
+
+    storage = LocalStorage(backup_dir)
+    with open_decompressed(storage.open_read("plain.sql")) as f:
+        assert f.read() == b"select 1;"
+
+def test_pipe_to_command_feeds_stdin(postgres_url, backup_dir, tmp_path):
+    import io
+
+    engine = PostgresBackup(postgres_url, backup_dir)
+    out = tmp_path / "out.bin"
+    cmd = [sys.executable, "-c", f"import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open({str(out)!r}, 'wb'))"]
+
+    engine._pipe_to_command(cmd, io.BytesIO(b"x" * 3_000_000), env=None)
+
+    assert out.read_bytes() == b"x" * 3_000_000
+
+def test_pipe_to_command_raises_on_failure(postgres_url, backup_dir):
+    import io
+
+    engine = PostgresBackup(postgres_url, backup_dir)
+    cmd = [sys.executable, "-c", "import sys; sys.exit(3)"]
+
+    with pytest.raises(subprocess.CalledProcessError):
+        engine._pipe_to_command(cmd, io.BytesIO(b"x" * 3_000_000), env=None)
+
+def test_file_restore_engines_never_open_a_stream(tmp_path, backup_dir):
+    import sqlite3
+    from unittest.mock import MagicMock
+    from fastapi_dbbackup import pipeline
+    from fastapi_dbbackup.engines.sqlite import SQLiteBackup
+    db_path = tmp_path / "app.sqlite3"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    engine = SQLiteBackup(f"sqlite:///{db_path}", tmp_path / "work")
+    storage = LocalStorage(backup_dir)
+    remote_path = storage.upload(engine.backup())
+    storage.open_read = MagicMock(side_effect=AssertionError("opened a stream for a file-based restore"))
+
+    assert not engine.supports_stream_restore
+    assert PostgresBackup("postgresql://localhost/db", tmp_path / "pg").supports_stream_restore
+    assert pipeline.restore(engine, storage, remote_path, work_dir=tmp_path / "restore") == remote_path
+
+def test_storages_without_open_read_download_to_a_temporary_file(tmp_path, backup_dir):
+    import shutil
+    from pathlib import Path
+    from fastapi_dbbackup.storage.base import StorageBackend
+
+    class CopyStorage(StorageBackend):
+        # A third-party backend written before open_read existed
+        def upload(self, local_path): pass
+        def upload_fileobj(self, fileobj, remote_path): pass
+        def download(self, remote_path, local_path): shutil.copy(backup_dir / remote_path, local_path)
+        def list_backups(self): return []
+        def delete(self, remote_path): pass
+
+    (backup_dir / "plain.sql").write_bytes(b"select 1;")
+    with CopyStorage().open_read("plain.sql") as f:
+        assert f.read() == b"select 1;"
+        downloaded = Path(f.name)
+    assert not downloaded.exists()
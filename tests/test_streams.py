@@ -0,0 +1,81 @@
+# tests/test_streams.py
+import io
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+import pytest
+from fastapi_dbbackup import pipeline
+from fastapi_dbbackup.base import BackupEngine
+from fastapi_dbbackup.compress import get_codec, open_decompressed
+from fastapi_dbbackup.metrics import RunMetrics
+from fastapi_dbbackup.storage.local import LocalStorage
+from fastapi_dbbackup.streams import copy_stream
+
+DATA = os.urandom(256 * 1024) * 12
+
+class CommandBackup(BackupEngine):
+    name = "command"
+
+    def __init__(self, output_dir, code):
+        super().__init__("command://", output_dir)
+        self.code = code
+
+    def backup(self):
+        raise AssertionError("should stream")
+
+    def stream_command(self):
+        return [sys.executable, "-c", self.code], dict(os.environ)
+
+    def restore(self, backup_path):
+        pass
+
+# A dump command writing 3 MB to stdout
+DUMP = bytes(range(256)) * 12 * 1024
+EMIT = "import sys; sys.stdout.buffer.write(bytes(range(256)) * 12 * 1024)"
+
+def test_copy_stream_between_python_objects():
+    dst = io.BytesIO()
+    assert copy_stream(io.BytesIO(DATA), dst, buffer_size=1000) == len(DATA)
+    assert dst.getvalue() == DATA
+
+@pytest.mark.skipif(not hasattr(os, "sendfile"), reason="requires os.sendfile")
+def test_copy_stream_sendfile_from_regular_file(tmp_path):
+    src_path, dst_path = tmp_path / "src", tmp_path / "dst"
+    src_path.write_bytes(DATA)
+
+    with patch("os.sendfile", wraps=os.sendfile) as sendfile:
+        with open(src_path, "rb", buffering=0) as src, open(dst_path, "wb") as dst:
+            dst.write(b"header")
+            assert copy_stream(src, dst) == len(DATA)
+
+    assert sendfile.called
+    assert dst_path.read_bytes() == b"header" + DATA
+
+@pytest.mark.skipif(not hasattr(os, "splice"), reason="requires os.splice (Linux, Python 3.10+)")
+def test_uncompressed_local_backup_is_spliced_into_place(backup_dir):
+    metrics = RunMetrics("backup")
+    with patch("os.splice", wraps=os.splice) as splice:
+        remote_path = pipeline.backup(CommandBackup(backup_dir, EMIT), LocalStorage(backup_dir), metrics=metrics)
+
+    assert (backup_dir / remote_path).read_bytes() == DUMP
+    assert [p.name for p in backup_dir.iterdir()] == [remote_path]
+    assert splice.called
+    # Kernel-side copies are still accounted to their stages
+    assert metrics.stages["dump"].bytes == metrics.stages["upload"].bytes == len(DUMP)
+
+def test_compressed_local_backup_has_no_intermediate_file(backup_dir):
+    remote_path = pipeline.backup(CommandBackup(backup_dir, EMIT), LocalStorage(backup_dir), codec=get_codec("zstd"))
+
+    assert [p.name for p in backup_dir.iterdir()] == [remote_path]
+    with open_decompressed(open(backup_dir / remote_path, "rb")) as f:
+        assert f.read() == DUMP
+
+@pytest.mark.parametrize("codec", [None, "gzip"])
+def test_failed_dump_is_not_stored(backup_dir, codec):
+    engine = CommandBackup(backup_dir, "import sys; sys.stdout.buffer.write(b'partial'); sys.exit(2)")
+
+    with pytest.raises(subprocess.CalledProcessError):
+        pipeline.backup(engine, LocalStorage(backup_dir), codec=codec and get_codec(codec))
+
+    assert list(backup_dir.iterdir()) == []
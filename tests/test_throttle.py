@@ -0,0 +1,84 @@
+# tests/test_throttle.py
+import io
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+import pytest
+from fastapi_dbbackup.engines.postgres import PostgresBackup
+from fastapi_dbbackup.storage.throttle import ThrottledStorage
+from fastapi_dbbackup.throttle import MB, RateLimiter, RateSchedule, ThrottledReader, parse_ionice, priority_prefix
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def test_schedule_by_time_of_day():
+    schedule = RateSchedule.parse("08:00-20:00=10, 22:00-06:00=0, 100")
+
+    assert schedule.rate_at(datetime(2024, 1, 1, 12, 0)) == 10 * MB
+    assert schedule.rate_at(datetime(2024, 1, 1, 21, 0)) == 100 * MB
+    # Windows wrap around midnight; 0 lifts the limit
+    assert schedule.rate_at(datetime(2024, 1, 1, 23, 30)) is None
+    assert schedule.rate_at(datetime(2024, 1, 1, 5, 59)) is None
+
+def test_invalid_limits_are_rejected():
+    with pytest.raises(ValueError, match="Invalid rate limit"):
+        RateSchedule.parse("8-20=10")
+    with pytest.raises(ValueError, match="ionice"):
+        parse_ionice("lowest")
+    assert RateLimiter.parse("") is None
+    assert RateLimiter.parse("0") is None
+    assert parse_ionice("best-effort:7") == ["-c", "2", "-n", "7"]
+
+def test_limiter_holds_the_long_run_rate():
+    clock = FakeClock()
+    with patch("fastapi_dbbackup.throttle.time", clock):
+        limiter = RateLimiter(RateSchedule(default=20 * MB), burst=0.5)
+        reader = ThrottledReader(io.BytesIO(b"x" * (100 * MB)), limiter)
+        start = clock.now
+        while reader.read(MB):
+            pass
+
+    # 100 MB at 20 MB/s, less the half-second burst allowance
+    assert clock.now - start == pytest.approx(100 / 20 - 0.5, abs=0.06)
+
+def test_limiter_is_shared_between_threads():
+    clock = FakeClock()
+    with patch("fastapi_dbbackup.throttle.time", clock):
+        limiter = RateLimiter(RateSchedule(default=10 * MB), burst=0)
+        delays = [limiter.reserve(MB) for _ in range(4)]
+
+    # Each caller reserves the next slot, so concurrent uploads split the rate
+    assert delays == pytest.approx([0.1, 0.2, 0.3, 0.4])
+
+@patch("shutil.which", return_value="/usr/bin/tool")
+@patch("subprocess.run")
+def test_dump_runs_at_lower_priority(mock_run, mock_which, postgres_url, backup_dir):
+    engine = PostgresBackup(postgres_url, backup_dir)
+    engine.nice, engine.ionice = 10, "idle"
+
+    engine.backup()
+
+    cmd = mock_run.call_args[0][0]
+    assert cmd[:7] == ["ionice", "-c", "3", "nice", "-n", "10", "pg_dump"]
+
+@patch("shutil.which", return_value=None)
+def test_missing_priority_tools_are_skipped(mock_which, capsys):
+    assert priority_prefix(nice=10, ionice="idle") == []
+    assert "ionice not found" in capsys.readouterr().out
+
+def test_throttled_storage_streams_files_through_the_limit(tmp_path):
+    dump = tmp_path / "default-20240101-000000.dump"
+    dump.write_bytes(b"x" * 1000)
+    base = MagicMock()
+    base.upload_fileobj.side_effect = lambda fileobj, name: (fileobj.read(), name)[1]
+    limiter = RateLimiter(RateSchedule(default=100 * MB))
+
+    assert ThrottledStorage(base, limiter).upload(dump) == dump.name
+    base.upload.assert_not_called()
+    assert isinstance(base.upload_fileobj.call_args[0][0], ThrottledReader)
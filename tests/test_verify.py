@@ -0,0 +1,113 @@
+# tests/test_verify.py
+import gzip
+import hashlib
+import io
+import sqlite3
+from unittest.mock import MagicMock, patch
+import pytest
+from fastapi_dbbackup.engines.mysql import MySQLBackup
+from fastapi_dbbackup.engines.postgres import PostgresBackup
+from fastapi_dbbackup.engines.sqlite import SQLiteBackup
+from fastapi_dbbackup.storage.catalog import CatalogStorage
+from fastapi_dbbackup.storage.checksum import ChecksumStorage
+from fastapi_dbbackup.storage.dedup import DedupStorage
+from fastapi_dbbackup.storage.local import LocalStorage
+from fastapi_dbbackup.verify import VerificationError, find_checksum, verify_backup
+
+def test_checksum_sidecar_is_written_inline(backup_dir):
+    storage = ChecksumStorage(LocalStorage(backup_dir))
+    data = gzip.compress(b"-- dump\n" * 1000)
+
+    storage.upload_fileobj(io.BytesIO(data), "default-20260101-000000.dump.gz")
+
+    expected = f"sha256:{hashlib.sha256(data).hexdigest()}"
+    assert storage.checksum("default-20260101-000000.dump.gz") == expected
+    assert (backup_dir / ".default-20260101-000000.dump.gz.checksum").read_text() == expected + "\n"
+    # The sidecar is hidden from listings and removed with its backup
+    assert storage.list_backups() == ["default-20260101-000000.dump.gz"]
+    storage.delete_many(["default-20260101-000000.dump.gz"])
+    assert list(backup_dir.iterdir()) == []
+
+def test_verify_detects_corruption(backup_dir):
+    storage = ChecksumStorage(LocalStorage(backup_dir), algorithm="blake2b")
+    data = gzip.compress(b"-- dump\n" * 1000)
+    storage.upload_fileobj(io.BytesIO(data), "backup.dump.gz")
+
+    assert verify_backup(storage, "backup.dump.gz") == ["blake2b ok", "gzip stream ok"]
+
+    corrupt = bytearray(data)
+    corrupt[len(corrupt) // 2] ^= 0xFF
+    (backup_dir / "backup.dump.gz").write_bytes(bytes(corrupt))
+    with pytest.raises(VerificationError, match="checksum mismatch"):
+        verify_backup(storage, "backup.dump.gz")
+
+def test_verify_without_checksum_still_checks_compression(backup_dir):
+    storage = LocalStorage(backup_dir)
+    (backup_dir / "backup.dump.gz").write_bytes(gzip.compress(b"x" * 100000)[:-10])
+
+    with pytest.raises(VerificationError):
+        verify_backup(storage, "backup.dump.gz")
+
+def test_verify_closes_the_stored_stream(backup_dir):
+    storage = LocalStorage(backup_dir)
+    (backup_dir / "good.dump.gz").write_bytes(gzip.compress(b"x" * 1000))
+    (backup_dir / "bad.dump.gz").write_bytes(gzip.compress(b"x" * 100000)[:-10])
+    opened = []
+    open_read = storage.open_read
+    storage.open_read = lambda name: opened.append(open_read(name)) or opened[-1]
+
+    verify_backup(storage, "good.dump.gz")
+    with pytest.raises(VerificationError):
+        verify_backup(storage, "bad.dump.gz")
+
+    # `verify --all` would otherwise leak a file handle or download pool per backup
+    assert [f.closed for f in opened] == [True, True]
+
+def test_catalog_records_checksum(backup_dir):
+    storage = CatalogStorage(LocalStorage(backup_dir), checksum="sha256")
+    storage.upload_fileobj(io.BytesIO(b"data"), "backup.dump")
+
+    assert find_checksum(storage, "backup.dump") == f"sha256:{hashlib.sha256(b'data').hexdigest()}"
+    assert verify_backup(storage, "backup.dump") == ["sha256 ok"]
+
+def test_dedup_keeps_sidecars_as_plain_objects(backup_dir):
+    storage = ChecksumStorage(DedupStorage(LocalStorage(backup_dir)))
+    storage.upload_fileobj(io.BytesIO(b"line\n" * 100000), "backup.dump")
+
+    assert (backup_dir / ".backup.dump.checksum").read_text().startswith("sha256:")
+    assert verify_backup(storage, "backup.dump") == ["sha256 ok"]
+
+def test_sqlite_structure_check(tmp_path, backup_dir):
+    db_path = tmp_path / "app.sqlite3"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, payload TEXT)")
+        conn.executemany("INSERT INTO t (payload) VALUES (?)", [("x" * 100,) for _ in range(500)])
+    engine = SQLiteBackup(f"sqlite:///{db_path}", backup_dir)
+    backup = engine.backup()
+    storage = LocalStorage(backup_dir)
+
+    assert verify_backup(storage, backup.name, engine) == ["no checksum recorded", "sqlite structure ok"]
+
+    backup.write_bytes(backup.read_bytes()[:-100])
+    with pytest.raises(VerificationError, match="whole number"):
+        verify_backup(storage, backup.name, engine)
+
+def test_mysql_structure_check(mysql_url, backup_dir):
+    engine = MySQLBackup(mysql_url, backup_dir)
+    complete = b"INSERT INTO t VALUES (1);\n-- Dump completed on 2026-01-01  0:00:00\n"
+
+    assert engine.verify_stream(io.BytesIO(complete))
+    with pytest.raises(ValueError, match="incomplete"):
+        engine.verify_stream(io.BytesIO(complete[:30]))
+
+@patch("subprocess.Popen")
+def test_postgres_structure_check_lists_archive(mock_popen, postgres_url, backup_dir):
+    process = MagicMock()
+    process.wait.return_value = 0
+    mock_popen.return_value = process
+
+    engine = PostgresBackup(postgres_url, backup_dir)
+    assert engine.verify_stream(io.BytesIO(b"PGDMP" + b"\x00" * 1000))
+
+    cmd = mock_popen.call_args[0][0]
+    assert cmd == ["pg_restore", "--list"]